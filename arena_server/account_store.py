@@ -0,0 +1,488 @@
+"""
+列式账户存储 (Columnar Account Store)
+MatchingEngine 的可选存储后端：余额、持仓数量、均价存放在 NumPy 列数组里
+
+布局：
+- 账户列：balance / initial_balance / active，按 agent 行号 (row) 索引
+- 持仓槽 (COO)：pos_row / pos_sym / pos_amount / pos_avg，一个 (agent, symbol) 占一个槽
+- PnL 历史：pnl_ring[row, PNL_HISTORY_LIMIT] 环形缓冲
+
+整组估值 (mark-to-market)、PnL 分位数、Epoch 结束时的 pnl_history 追加都是单次数组运算。
+AccountView / PositionView 继承原 AgentAccount / Position，是数组上的薄视图，
+所以 main.py、state_manager.py、group_manager.py 无需任何改动。
+
+启用: DARWIN_ACCOUNT_STORE=columnar (需要 numpy)
+"""
+
+from collections.abc import MutableMapping, Sequence
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，仅列式后端需要
+    np = None
+
+from config import PNL_HISTORY_LIMIT
+from matching import AgentAccount, Position
+
+
+class PositionView(Position):
+    """持仓槽上的视图；持仓被删除后自动脱离，保留删除时的数值"""
+
+    def __init__(self, store: "ColumnarAccountStore", slot: int, symbol: str):
+        self._store = store
+        self._slot = slot
+        self._symbol = symbol
+        self._detached = None
+
+    def _detach(self):
+        self._detached = (float(self._store.pos_amount[self._slot]),
+                          float(self._store.pos_avg[self._slot]))
+        self._slot = None
+
+    @property
+    def symbol(self) -> str:
+        return self._symbol
+
+    @property
+    def amount(self) -> float:
+        if self._slot is None:
+            return self._detached[0]
+        return float(self._store.pos_amount[self._slot])
+
+    @amount.setter
+    def amount(self, value: float):
+        if self._slot is None:
+            self._detached = (value, self._detached[1])
+        else:
+            self._store.pos_amount[self._slot] = value
+
+    @property
+    def avg_price(self) -> float:
+        if self._slot is None:
+            return self._detached[1]
+        return float(self._store.pos_avg[self._slot])
+
+    @avg_price.setter
+    def avg_price(self, value: float):
+        if self._slot is None:
+            self._detached = (self._detached[0], value)
+        else:
+            self._store.pos_avg[self._slot] = value
+
+    def __repr__(self) -> str:
+        return f"PositionView(symbol={self.symbol!r}, amount={self.amount}, avg_price={self.avg_price})"
+
+
+class PositionsView(MutableMapping):
+    """account.positions 的替身：symbol -> PositionView"""
+
+    def __init__(self, store: "ColumnarAccountStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, symbol: str) -> PositionView:
+        slot = self._store.row_slots[self._row][symbol]
+        return self._store.position_view(slot, symbol)
+
+    def __setitem__(self, symbol: str, position: Position):
+        self._store.set_position(self._row, symbol, position.amount, position.avg_price)
+
+    def __delitem__(self, symbol: str):
+        self._store.close_position(self._row, symbol)
+
+    def __iter__(self):
+        return iter(list(self._store.row_slots[self._row]))
+
+    def __len__(self) -> int:
+        return len(self._store.row_slots[self._row])
+
+    def __contains__(self, symbol) -> bool:
+        return symbol in self._store.row_slots[self._row]
+
+    def __repr__(self) -> str:
+        return f"PositionsView({dict(self.items())!r})"
+
+
+class PnlHistoryView(Sequence):
+    """account.pnl_history 的替身 (环形缓冲，最多保留 PNL_HISTORY_LIMIT 条)"""
+
+    def __init__(self, store: "ColumnarAccountStore", row: int):
+        self._store = store
+        self._row = row
+
+    def _values(self) -> list:
+        return self._store.history(self._row)
+
+    def __getitem__(self, index):
+        return self._values()[index]
+
+    def __len__(self) -> int:
+        return int(self._store.pnl_len[self._row])
+
+    def __iter__(self):
+        return iter(self._values())
+
+    def append(self, value: float):
+        self._store.append_history(self._row, value)
+
+    def extend(self, values: Iterable[float]):
+        for value in values:
+            self.append(value)
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(self._values())
+
+
+class AccountView(AgentAccount):
+    """AgentAccount 在列数组上的视图 (不调用 dataclass 的 __init__)
+
+    账户被删除 (行释放) 后自动脱离：变成删除时数值的独立 AgentAccount，
+    之后的读写不会触及该行 (行可能已分配给别的 Agent)
+    """
+
+    def __init__(self, store: "ColumnarAccountStore", row: int, agent_id: str):
+        self._store = store
+        self._row = row
+        self.agent_id = agent_id
+        self._orders = None
+        self._detached: Optional[AgentAccount] = None
+
+    def _detach(self):
+        store, row = self._store, self._row
+        self._detached = AgentAccount(
+            agent_id=self.agent_id,
+            balance=float(store.balance[row]),
+            initial_balance=float(store.initial_balance[row]),
+            positions={
+                symbol: Position(symbol=symbol, amount=float(store.pos_amount[slot]), avg_price=float(store.pos_avg[slot]))
+                for symbol, slot in store.row_slots[row].items()
+            },
+            orders=self.orders,
+            pnl_history=store.history(row),
+        )
+        self._row = None
+
+    @property
+    def orders(self) -> list:
+        if self._orders is None:
+            self._orders = []
+        return self._orders
+
+    @orders.setter
+    def orders(self, orders: list):
+        self._orders = orders
+
+    @property
+    def balance(self) -> float:
+        if self._row is None:
+            return self._detached.balance
+        return float(self._store.balance[self._row])
+
+    @balance.setter
+    def balance(self, value: float):
+        if self._row is None:
+            self._detached.balance = value
+        else:
+            self._store.balance[self._row] = value
+
+    @property
+    def initial_balance(self) -> float:
+        if self._row is None:
+            return self._detached.initial_balance
+        return float(self._store.initial_balance[self._row])
+
+    @initial_balance.setter
+    def initial_balance(self, value: float):
+        if self._row is None:
+            self._detached.initial_balance = value
+        else:
+            self._store.initial_balance[self._row] = value
+
+    @property
+    def positions(self) -> PositionsView:
+        if self._row is None:
+            return self._detached.positions
+        return PositionsView(self._store, self._row)
+
+    @positions.setter
+    def positions(self, positions: Dict[str, Position]):
+        if self._row is None:
+            self._detached.positions = dict(positions)
+            return
+        view = PositionsView(self._store, self._row)
+        view.clear()
+        for symbol, pos in positions.items():
+            view[symbol] = pos
+
+    @property
+    def pnl_history(self) -> PnlHistoryView:
+        if self._row is None:
+            return self._detached.pnl_history
+        return PnlHistoryView(self._store, self._row)
+
+    @pnl_history.setter
+    def pnl_history(self, values: Iterable[float]):
+        if self._row is None:
+            self._detached.pnl_history = list(values)
+        else:
+            self._store.set_history(self._row, list(values))
+
+    def get_total_value(self, current_prices: Dict[str, float] = None) -> float:
+        if self._row is None:
+            return self._detached.get_total_value(current_prices)
+        return self._store.account_value(self._row, current_prices)
+
+    def __repr__(self) -> str:
+        return (f"AccountView(agent_id={self.agent_id!r}, balance={self.balance}, "
+                f"positions={len(self.positions)}{', detached' if self._row is None else ''})")
+
+
+class ColumnarAccountStore:
+    """按 agent 行 / 持仓槽组织的列式存储"""
+
+    def __init__(self, capacity: int = 1024, slot_capacity: int = 4096,
+                 history: int = PNL_HISTORY_LIMIT):
+        if np is None:
+            raise RuntimeError("ColumnarAccountStore requires numpy (pip install numpy)")
+        self.history_limit = history
+
+        # 账户列
+        self.rows: Dict[str, int] = {}
+        self.agent_ids: List[Optional[str]] = []
+        self._free_rows: List[int] = []
+        self.balance = np.zeros(capacity)
+        self.initial_balance = np.zeros(capacity)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.pnl_ring = np.zeros((capacity, history))
+        self.pnl_len = np.zeros(capacity, dtype=np.int32)
+        self.pnl_head = np.zeros(capacity, dtype=np.int32)
+
+        # 持仓槽
+        self.symbols: Dict[str, int] = {}
+        self.symbol_names: List[str] = []
+        self.row_slots: List[Dict[str, int]] = []  # row -> {symbol: slot}
+        self._free_slots: List[int] = []
+        self._slot_top = 0
+        self.pos_row = np.full(slot_capacity, -1, dtype=np.int32)
+        self.pos_sym = np.zeros(slot_capacity, dtype=np.int32)
+        self.pos_amount = np.zeros(slot_capacity)
+        self.pos_avg = np.zeros(slot_capacity)
+        self._pos_views: Dict[int, PositionView] = {}
+        self._account_views: Dict[int, AccountView] = {}  # row -> 当前持有该行的视图 (释放时脱离)
+
+    # ========== 容量管理 ==========
+
+    @staticmethod
+    def _grow(array, size: int, fill=0):
+        grown = np.full((size,) + array.shape[1:], fill, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _ensure_rows(self, n: int):
+        if n <= len(self.balance):
+            return
+        size = max(n, len(self.balance) * 2)
+        self.balance = self._grow(self.balance, size)
+        self.initial_balance = self._grow(self.initial_balance, size)
+        self.active = self._grow(self.active, size, False)
+        self.pnl_ring = self._grow(self.pnl_ring, size)
+        self.pnl_len = self._grow(self.pnl_len, size)
+        self.pnl_head = self._grow(self.pnl_head, size)
+
+    def _ensure_slots(self, n: int):
+        if n <= len(self.pos_row):
+            return
+        size = max(n, len(self.pos_row) * 2)
+        self.pos_row = self._grow(self.pos_row, size, -1)
+        self.pos_sym = self._grow(self.pos_sym, size)
+        self.pos_amount = self._grow(self.pos_amount, size)
+        self.pos_avg = self._grow(self.pos_avg, size)
+
+    def _symbol_id(self, symbol: str) -> int:
+        sid = self.symbols.get(symbol)
+        if sid is None:
+            sid = len(self.symbol_names)
+            self.symbols[symbol] = sid
+            self.symbol_names.append(symbol)
+        return sid
+
+    # ========== 账户 ==========
+
+    def adopt(self, agent_id: str, account: AgentAccount) -> AccountView:
+        """把普通 AgentAccount 转存到列数组，返回对应视图 (AccountBook 写入时调用)"""
+        if isinstance(account, AccountView) and account._store is self:
+            return account
+        self.release(agent_id)
+
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self.agent_ids[row] = agent_id
+        else:
+            row = len(self.agent_ids)
+            self._ensure_rows(row + 1)
+            self.agent_ids.append(agent_id)
+            self.row_slots.append({})
+        self.rows[agent_id] = row
+        self.active[row] = True
+        self.balance[row] = account.balance
+        self.initial_balance[row] = account.initial_balance
+        self.set_history(row, list(account.pnl_history))
+
+        view = AccountView(self, row, agent_id)
+        self._account_views[row] = view
+        for symbol, pos in account.positions.items():
+            self.set_position(row, symbol, pos.amount, pos.avg_price)
+        return view
+
+    def release(self, agent_id: str):
+        """账户被删除：释放行与持仓槽"""
+        row = self.rows.pop(agent_id, None)
+        if row is None:
+            return
+        view = self._account_views.pop(row, None)
+        if view is not None:
+            view._detach()  # 仍持有旧视图的调用方不会读写到复用该行的新账户
+        for symbol in list(self.row_slots[row]):
+            self.close_position(row, symbol)
+        self.active[row] = False
+        self.balance[row] = 0.0
+        self.initial_balance[row] = 0.0
+        self.pnl_len[row] = 0
+        self.pnl_head[row] = 0
+        self.agent_ids[row] = None
+        self._free_rows.append(row)
+
+    # ========== 持仓 ==========
+
+    def position_view(self, slot: int, symbol: str) -> PositionView:
+        view = self._pos_views.get(slot)
+        if view is None:
+            view = PositionView(self, slot, symbol)
+            self._pos_views[slot] = view
+        return view
+
+    def set_position(self, row: int, symbol: str, amount: float, avg_price: float):
+        slots = self.row_slots[row]
+        slot = slots.get(symbol)
+        if slot is None:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            else:
+                slot = self._slot_top
+                self._slot_top += 1
+                self._ensure_slots(self._slot_top)
+            slots[symbol] = slot
+            self.pos_row[slot] = row
+            self.pos_sym[slot] = self._symbol_id(symbol)
+        self.pos_amount[slot] = amount
+        self.pos_avg[slot] = avg_price
+
+    def close_position(self, row: int, symbol: str):
+        slot = self.row_slots[row].pop(symbol)
+        view = self._pos_views.pop(slot, None)
+        if view is not None:
+            view._detach()  # 调用方可能在删除后仍读取 pos.avg_price
+        self.pos_row[slot] = -1
+        self.pos_amount[slot] = 0.0
+        self.pos_avg[slot] = 0.0
+        self._free_slots.append(slot)
+
+    # ========== PnL 历史 ==========
+
+    def history(self, row: int) -> list:
+        length = int(self.pnl_len[row])
+        if not length:
+            return []
+        start = (int(self.pnl_head[row]) - length) % self.history_limit
+        idx = (start + np.arange(length)) % self.history_limit
+        return self.pnl_ring[row, idx].tolist()
+
+    def append_history(self, row: int, value: float):
+        head = int(self.pnl_head[row])
+        self.pnl_ring[row, head] = value
+        self.pnl_head[row] = (head + 1) % self.history_limit
+        self.pnl_len[row] = min(int(self.pnl_len[row]) + 1, self.history_limit)
+
+    def set_history(self, row: int, values: list):
+        values = values[-self.history_limit:]
+        self.pnl_ring[row, :len(values)] = values
+        self.pnl_len[row] = len(values)
+        self.pnl_head[row] = len(values) % self.history_limit
+
+    # ========== 向量化运算 ==========
+
+    def price_vector(self, prices: Optional[Dict[str, float]]):
+        """symbol id → 价格 (缺价为 NaN，估值时回退到 avg_price)"""
+        vec = np.full(len(self.symbol_names), np.nan)
+        if prices:
+            for symbol, sid in self.symbols.items():
+                price = prices.get(symbol)
+                if price is not None:
+                    vec[sid] = price
+        return vec
+
+    def account_value(self, row: int, prices: Optional[Dict[str, float]] = None) -> float:
+        """单账户估值 (与 AgentAccount.get_total_value 相同的口径)"""
+        value = float(self.balance[row])
+        for symbol, slot in self.row_slots[row].items():
+            price = prices.get(symbol) if prices else None
+            if price is None:
+                price = self.pos_avg[slot]
+            value += float(self.pos_amount[slot]) * price
+        return value
+
+    def total_values(self, prices: Optional[Dict[str, float]] = None):
+        """所有行的总资产 (非活跃行为 0)"""
+        n = len(self.agent_ids)
+        top = self._slot_top
+        used = self.pos_row[:top] >= 0
+        rows = self.pos_row[:top][used]
+        px = self.price_vector(prices)[self.pos_sym[:top][used]]
+        avg = self.pos_avg[:top][used]
+        px = np.where(np.isnan(px), avg, px)
+        marked = np.bincount(rows, weights=self.pos_amount[:top][used] * px, minlength=n)
+        return np.where(self.active[:n], self.balance[:n] + marked, 0.0)
+
+    def pnl_percents(self, prices: Optional[Dict[str, float]] = None):
+        n = len(self.agent_ids)
+        values = self.total_values(prices)
+        initial = self.initial_balance[:n]
+        safe = np.where(initial > 0, initial, 1.0)
+        return np.where(self.active[:n], (values - initial) / safe * 100, 0.0)
+
+    def active_rows(self):
+        return np.flatnonzero(self.active[:len(self.agent_ids)])
+
+    def record_pnl(self, prices: Optional[Dict[str, float]] = None):
+        """Epoch 结束：所有活跃账户的 pnl_history 追加当前 PnL% (单次数组写入)"""
+        rows = self.active_rows()
+        if not len(rows):
+            return
+        pnl = self.pnl_percents(prices)[rows]
+        heads = self.pnl_head[rows]
+        self.pnl_ring[rows, heads] = pnl
+        self.pnl_head[rows] = (heads + 1) % self.history_limit
+        self.pnl_len[rows] = np.minimum(self.pnl_len[rows] + 1, self.history_limit)
+
+    def pnl_percentiles(self, qs: List[float], prices: Optional[Dict[str, float]] = None) -> List[float]:
+        rows = self.active_rows()
+        if not len(rows):
+            return [0.0 for _ in qs]
+        return np.percentile(self.pnl_percents(prices)[rows], qs).tolist()
+
+    def leaderboard(self, prices: Optional[Dict[str, float]] = None) -> List[tuple]:
+        rows = self.active_rows()
+        values = self.total_values(prices)[rows]
+        pnl = self.pnl_percents(prices)[rows]
+        order = np.argsort(-pnl, kind="stable")
+        return [(self.agent_ids[rows[i]], float(pnl[i]), float(values[i])) for i in order]
+
+    def memory_bytes(self) -> int:
+        arrays = (self.balance, self.initial_balance, self.active, self.pnl_ring,
+                  self.pnl_len, self.pnl_head, self.pos_row, self.pos_sym,
+                  self.pos_amount, self.pos_avg)
+        return sum(a.nbytes for a in arrays)
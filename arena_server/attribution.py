@@ -1,21 +1,127 @@
 """
 归因分析器 (Attribution Analyzer)
 分析策略标签的有效性，识别哪些策略在当前市场有效
+
+统计是流式的，内存与成交量无关：
+- 每个标签维护累计的运行计数 + Welford 均值 / 方差 (决定 status / weight)
+- 滚动时间窗口 (ATTRIBUTION_WINDOWS，默认 1h / 1d) 切成固定数量的时间桶，
+  每个桶一份 Welford 统计，查询时按并行公式合并；另有按 Epoch 清零的 "epoch" 窗口
+- 待复盘的 BUY 放在按到期时间排序的堆里，复盘只弹出已到期的部分
 """
 
+import heapq
+import itertools
 import time
-from typing import Dict, List, Optional
-from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import defaultdict, deque
 from dataclasses import dataclass, field
 
+from config import ATTRIBUTION_WINDOWS, ATTRIBUTION_WINDOW_BUCKETS, ATTRIBUTION_PENDING_MAX
+from trade_journal import trade_timestamp
+
+
+class RunningStats:
+    """运行计数 + Welford 均值 / 方差"""
+
+    __slots__ = ("count", "wins", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.wins = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x: float):
+        self.count += 1
+        if x > 0:
+            self.wins += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x: float):
+        """撤销一次 add (滑动窗口淘汰最旧样本)"""
+        if self.count <= 1:
+            self.__init__()
+            return
+        if x > 0:
+            self.wins -= 1
+        mean = (self.mean * self.count - x) / (self.count - 1)
+        self.m2 = max(0.0, self.m2 - (x - self.mean) * (x - mean))
+        self.mean = mean
+        self.count -= 1
+
+    def merge(self, other: "RunningStats"):
+        """合并另一份统计 (Chan 并行公式)"""
+        if not other.count:
+            return
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / n
+        self.m2 += other.m2 + delta * delta * self.count * other.count / n
+        self.count = n
+        self.wins += other.wins
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "total_trades": self.count,
+            "winning_trades": self.wins,
+            "avg_pnl": round(self.mean, 2),
+            "std_pnl": round(self.variance ** 0.5, 2),
+            "win_rate": round(self.wins / self.count * 100, 1) if self.count else 0.0,
+        }
+
+
+class RollingStats:
+    """滚动时间窗口：窗口切成 buckets 个时间桶，每桶一份 RunningStats"""
+
+    __slots__ = ("width", "size", "buckets")
+
+    def __init__(self, window: float, buckets: int = ATTRIBUTION_WINDOW_BUCKETS):
+        self.width = window / buckets
+        self.size = buckets
+        self.buckets: deque = deque()  # [(桶序号, RunningStats)]，旧 → 新
+
+    def add(self, ts: float, x: float):
+        slot = int(ts // self.width)
+        if self.buckets and slot <= self.buckets[-1][0]:
+            if slot <= self.buckets[-1][0] - self.size:
+                return  # 早于窗口的乱序样本
+            self.buckets[-1][1].add(x)  # 同一个桶 (窗口内的乱序样本并入最新桶)
+        else:
+            stats = RunningStats()
+            stats.add(x)
+            self.buckets.append((slot, stats))
+        self._evict(slot)
+
+    def _evict(self, slot: int):
+        while self.buckets and self.buckets[0][0] <= slot - self.size:
+            self.buckets.popleft()
+
+    def snapshot(self, now: float) -> RunningStats:
+        self._evict(int(now // self.width))
+        total = RunningStats()
+        for _, stats in self.buckets:
+            total.merge(stats)
+        return total
+
+
+def _default_windows() -> Dict[str, RollingStats]:
+    return {name: RollingStats(seconds) for name, seconds in ATTRIBUTION_WINDOWS.items()}
+
 
 @dataclass
 class TagPerformance:
     """标签表现"""
     tag: str
-    trades: List[Dict] = field(default_factory=list)  # 已完成的交易
-    pending: List[Dict] = field(default_factory=list)  # 待复盘的交易
-    
+    stats: RunningStats = field(default_factory=RunningStats)  # 累计
+    epoch: RunningStats = field(default_factory=RunningStats)  # 本 Epoch (start_epoch 清零)
+    windows: Dict[str, RollingStats] = field(default_factory=_default_windows)  # 滚动时间窗口
+
     # 统计数据
     total_trades: int = 0
     winning_trades: int = 0
@@ -25,15 +131,29 @@ class TagPerformance:
     # 状态
     status: str = "NEUTRAL"  # EFFECTIVE, INEFFECTIVE, NEUTRAL
     weight: float = 0.5  # 推荐权重
+
+    def add(self, pnl_pct: float, ts: float):
+        """记录一笔已完成交易的收益"""
+        self.stats.add(pnl_pct)
+        self.epoch.add(pnl_pct)
+        for window in self.windows.values():
+            window.add(ts, pnl_pct)
+        self.update_stats()
+
+    def window(self, name: str, now: Optional[float] = None) -> RunningStats:
+        """某个窗口的统计 ("epoch" 或 ATTRIBUTION_WINDOWS 的键)"""
+        if name == "epoch":
+            return self.epoch
+        return self.windows[name].snapshot(now if now is not None else time.time())
     
     def update_stats(self):
         """更新统计数据"""
-        if not self.trades:
+        if not self.stats.count:
             return
         
-        self.total_trades = len(self.trades)
-        self.winning_trades = sum(1 for t in self.trades if t["pnl_pct"] > 0)
-        self.avg_pnl = sum(t["pnl_pct"] for t in self.trades) / self.total_trades
+        self.total_trades = self.stats.count
+        self.winning_trades = self.stats.wins
+        self.avg_pnl = self.stats.mean
         self.win_rate = self.winning_trades / self.total_trades
         
         # 判断有效性
@@ -51,14 +171,19 @@ class TagPerformance:
 class AttributionAnalyzer:
     """归因分析器"""
     
-    def __init__(self, review_interval: int = 3600):
+    def __init__(self, review_interval: int = 3600, pending_limit: int = ATTRIBUTION_PENDING_MAX):
         """
         Args:
-            review_interval: 复盘间隔（秒），默认 1 小时
+            review_interval: 复盘间隔（秒），默认 1 小时：BUY 在入场 review_interval 秒后按当时价格复盘
+            pending_limit: 待复盘 BUY 的上限
         """
         self.review_interval = review_interval
+        self.pending_limit = pending_limit
         self.tag_performance: Dict[str, TagPerformance] = {}
-        self.last_review_time = time.time()
+        # 待复盘堆: (到期时间, 序号, 入场时间, symbol, 入场价, 标签)
+        self.pending: List[Tuple[float, int, float, str, float, Tuple[str, ...]]] = []
+        self._seq = itertools.count()
+        self.dropped_pending = 0
         
         # 预定义标签
         self.known_tags = [
@@ -78,6 +203,12 @@ class AttributionAnalyzer:
         # 初始化所有标签
         for tag in self.known_tags:
             self.tag_performance[tag] = TagPerformance(tag=tag)
+
+    def _perf(self, tag: str) -> TagPerformance:
+        perf = self.tag_performance.get(tag)
+        if perf is None:
+            perf = self.tag_performance[tag] = TagPerformance(tag=tag)
+        return perf
     
     def record_trade(self, trade: Dict):
         """
@@ -98,92 +229,105 @@ class AttributionAnalyzer:
         """
         # 只记录 BUY 交易到 pending（等待复盘）
         if trade["side"] == "BUY":
-            for tag in trade.get("reason", []):
-                if tag not in self.tag_performance:
-                    self.tag_performance[tag] = TagPerformance(tag=tag)
-                
-                self.tag_performance[tag].pending.append({
-                    "agent_id": trade["agent_id"],
-                    "symbol": trade["symbol"],
-                    "entry_price": trade["price"],
-                    "entry_time": time.time(),
-                    "amount": trade["amount"],
-                    "value": trade["value"]
-                })
+            tags = tuple(trade.get("reason", []))
+            if not tags:
+                return
+            for tag in tags:
+                self._perf(tag)
+            entry_time = trade_timestamp(trade)
+            heapq.heappush(self.pending, (
+                entry_time + self.review_interval, next(self._seq),
+                entry_time, trade["symbol"], trade["price"], tags,
+            ))
+            if len(self.pending) > self.pending_limit:
+                heapq.heappop(self.pending)  # 丢弃最早到期的
+                self.dropped_pending += 1
         
         # SELL 交易直接记录结果
         elif trade["side"] == "SELL" and trade.get("trade_pnl") is not None:
+            exit_time = trade_timestamp(trade)
             for tag in trade.get("reason", []):
-                if tag not in self.tag_performance:
-                    self.tag_performance[tag] = TagPerformance(tag=tag)
-                
-                self.tag_performance[tag].trades.append({
-                    "symbol": trade["symbol"],
-                    "pnl_pct": trade["trade_pnl"],
-                    "exit_time": time.time()
-                })
-                
-                # 更新统计
-                self.tag_performance[tag].update_stats()
+                self._perf(tag).add(trade["trade_pnl"], exit_time)
     
-    def review_pending_trades(self, current_prices: Dict[str, float]):
+    def backfill(self, trades: Iterable[Dict]) -> int:
+        """
+        从成交日志回灌历史交易 (按时间从旧到新)
+
+        Args:
+            trades: 成交记录迭代器，如 TradeJournal.scan(since=..., newest_first=False)
+
+        Returns:
+            回灌的交易数
+        """
+        count = 0
+        for trade in trades:
+            self.record_trade(trade)
+            count += 1
+        return count
+
+    def start_epoch(self):
+        """新 Epoch 开始：清零各标签的 "epoch" 窗口"""
+        for perf in self.tag_performance.values():
+            perf.epoch = RunningStats()
+
+    def review_pending_trades(self, current_prices: Dict[str, float], now: Optional[float] = None) -> int:
         """
-        复盘待评估的交易
+        复盘已到期的交易 (入场 review_interval 秒后，按当前价格计算收益)
+
+        价格暂不可用的留到下次；超过到期时间一个 review_interval 仍未复盘的视为过期丢弃
+        (当前价格已不代表持有期收益，如重启回灌的旧 BUY)。
         
         Args:
             current_prices: 当前价格字典 {symbol: price}
+            now: 当前时间 (默认 time.time())
+
+        Returns:
+            复盘的交易数
         """
-        now = time.time()
-        
-        # 检查是否到了复盘时间
-        if now - self.last_review_time < self.review_interval:
-            return
-        
-        self.last_review_time = now
-        
-        print(f"\n🔍 归因分析 - 复盘 {self.review_interval}s 前的交易")
-        print("=" * 60)
-        
+        now = time.time() if now is None else now
         reviewed_count = 0
+        deferred = []
         
-        for tag, perf in self.tag_performance.items():
-            if not perf.pending:
+        while self.pending and self.pending[0][0] <= now:
+            entry = heapq.heappop(self.pending)
+            due, _, _, symbol, entry_price, tags = entry
+            if now - due > self.review_interval or entry_price <= 0:
+                self.dropped_pending += 1
+                continue
+            current_price = current_prices.get(symbol)
+            if current_price is None:
+                # 价格不可用，下次再试
+                deferred.append(entry)
                 continue
             
-            # 检查每个待复盘的交易
-            for trade in list(perf.pending):
-                # 如果超过复盘间隔
-                if now - trade["entry_time"] >= self.review_interval:
-                    symbol = trade["symbol"]
-                    current_price = current_prices.get(symbol)
-                    
-                    if current_price is None:
-                        # 价格不可用，跳过
-                        continue
-                    
-                    # 计算收益
-                    pnl_pct = (current_price - trade["entry_price"]) / trade["entry_price"] * 100
-                    
-                    # 记录结果
-                    perf.trades.append({
-                        "symbol": symbol,
-                        "pnl_pct": pnl_pct,
-                        "exit_time": now
-                    })
-                    
-                    # 从 pending 移除
-                    perf.pending.remove(trade)
-                    reviewed_count += 1
-            
-            # 更新统计
-            if perf.trades:
-                perf.update_stats()
+            # 计算收益
+            pnl_pct = (current_price - entry_price) / entry_price * 100
+            for tag in tags:
+                self._perf(tag).add(pnl_pct, now)
+            reviewed_count += 1
+
+        for entry in deferred:
+            heapq.heappush(self.pending, entry)
         
         if reviewed_count > 0:
-            print(f"✅ 复盘了 {reviewed_count} 笔交易")
+            print(f"\n🔍 归因分析 - 复盘了 {reviewed_count} 笔 {self.review_interval}s 前的交易")
             self.print_summary()
-        else:
-            print("⏳ 没有需要复盘的交易")
+        return reviewed_count
+
+    def window_report(self, window: str = "1h", now: Optional[float] = None) -> Dict:
+        """
+        某个窗口内各标签的统计 (window: "epoch" 或 ATTRIBUTION_WINDOWS 的键)
+
+        Returns:
+            {tag: {"total_trades", "winning_trades", "avg_pnl", "std_pnl", "win_rate"}}
+        """
+        now = time.time() if now is None else now
+        report = {}
+        for tag, perf in self.tag_performance.items():
+            stats = perf.window(window, now)
+            if stats.count:
+                report[tag] = stats.as_dict()
+        return report
     
     def get_strategy_update(self) -> Dict:
         """
@@ -237,11 +381,6 @@ class AttributionAnalyzer:
                 "tag_stats": Dict
             }
         """
-        # 更新所有标签的统计数据
-        for perf in self.tag_performance.values():
-            if perf.trades:
-                perf.update_stats()
-        
         # 收集有交易数据的标签
         active_tags = [(tag, perf) for tag, perf in self.tag_performance.items() 
                       if perf.total_trades > 0]
@@ -454,6 +593,8 @@ class AttributionAnalyzer:
 
 # 测试
 if __name__ == "__main__":
+    from datetime import datetime
+
     analyzer = AttributionAnalyzer(review_interval=10)  # 10 秒复盘
     
     # 模拟交易
@@ -465,7 +606,7 @@ if __name__ == "__main__":
         "price": 0.01,
         "value": 10,
         "reason": ["VOL_SPIKE", "MOMENTUM"],
-        "time": "2024-01-01T00:00:00"
+        "time": datetime.now().isoformat()
     })
     
     analyzer.record_trade({
@@ -476,7 +617,7 @@ if __name__ == "__main__":
         "price": 0.05,
         "value": 25,
         "reason": ["RSI_OVERSOLD"],
-        "time": "2024-01-01T00:00:00"
+        "time": datetime.now().isoformat()
     })
     
     # 等待 10 秒
@@ -0,0 +1,404 @@
+"""
+批量策略回测 (Backtest Sweep)
+把 N 个策略放在同一组行情场景上并行回测，输出按综合评分排序的 PnL / 回撤 / 夏普矩阵
+
+用途: 基线晋级前的离线对比 —— 全体 data/agents/*/strategy.py + 当前 baseline + 本轮赢家，
+赢家必须在同一组路径上跑赢当前 baseline 才会被融合进新 baseline (见 main.end_epoch)。
+
+结构:
+  run_sweep()            ProcessPoolExecutor，每个策略一个任务；worker 内按 seed / 夹具缓存场景
+                         (见 market_scenarios.py)，所有策略看到完全相同的行情路径
+  sweep_in_subprocess()  Arena 内部使用：用独立的解释器运行本模块 (stdin/stdout JSON)，
+                         与 sandbox_pool 一样不在 Arena 进程里 fork / 重新导入 main.py
+  命令行                  python backtest_sweep.py --rounds 15 [--fixture data/sandbox_fixtures/arena.npy]
+
+指标全部来自 metrics.py：每轮收益率 → 夏普 / 索提诺 / 胜率，逐轮复利净值 → 最大回撤 / 卡尔玛 / 综合评分。
+实盘接口的策略 (on_price_update) 先经 adapt_live_strategy 改写成沙盒接口 (on_tick)。
+"""
+
+import ast
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from config import (
+    SANDBOX_WORKERS, SANDBOX_JOB_CPU_SECONDS, SANDBOX_MEMORY_MB,
+    SANDBOX_SCENARIO_SEED, SANDBOX_FIXTURE,
+)
+from metrics import calculate_composite_score
+
+logger = logging.getLogger(__name__)
+
+AGENTS_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "agents")
+BASELINE_NAME = "__baseline__"
+INITIAL_BALANCE = 10000.0
+
+
+@dataclass
+class SweepRow:
+    """一个策略在整组场景上的回测结果"""
+    name: str
+    status: str = "ok"  # ok / rejected (语法/安全/结构) / failed (运行时错误) / timeout / error
+    error: Optional[str] = None
+    rank: int = 0
+    round_pnls: List[float] = field(default_factory=list)  # 每轮收益率 (%)
+    total_pnl: float = 0.0
+    avg_pnl: float = 0.0
+    worst_round_drawdown: float = 0.0  # 轮内最大回撤 (负数百分比)
+    composite_score: float = 0.0
+    sharpe_ratio: float = 0.0
+    sortino_ratio: float = 0.0
+    max_drawdown: float = 0.0
+    calmar_ratio: float = 0.0
+    win_rate: float = 0.0
+    volatility: float = 0.0
+    seconds: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+# ========== 实盘策略 → 沙盒接口 ==========
+
+PRINT_SHIM = "print = lambda *args, **kwargs: None\n"
+
+# 实盘 BUY 的 amount 是美元金额，沙盒是代币数量；SELL 两边都是代币数量
+ON_TICK_SHIM = """
+def on_tick(self, market_data):
+    prices = market_data['prices']
+    volumes = market_data.get('volumes', {})
+    liquidities = market_data.get('liquidities', {})
+    decisions = self.on_price_update({
+        sym: {'priceUsd': p, 'price': p, 'priceChange24h': 0.0,
+              'volume24h': volumes.get(sym, 0.0), 'liquidity': liquidities.get(sym, 0.0)}
+        for sym, p in prices.items()
+    })
+    if isinstance(decisions, dict):
+        decisions = [decisions]
+    orders = []
+    for decision in decisions or []:
+        if not isinstance(decision, dict) or decision.get('symbol') not in prices:
+            continue
+        side = str(decision.get('side', '')).upper()
+        amount = decision.get('amount', 0) or 0
+        if side == 'BUY' and prices[decision['symbol']] > 0:
+            amount = amount / prices[decision['symbol']]
+        orders.append({'symbol': decision['symbol'], 'side': side, 'amount': amount})
+    return orders
+"""
+
+
+class _StripTyping(ast.NodeTransformer):
+    def visit_ImportFrom(self, node):
+        return None if node.module == "typing" else node
+
+    def visit_arg(self, node):
+        node.annotation = None
+        return node
+
+    def visit_FunctionDef(self, node):
+        node.returns = None
+        self.generic_visit(node)
+        return node
+
+    def visit_AnnAssign(self, node):
+        if node.value is None:
+            return None
+        return ast.copy_location(ast.Assign(targets=[node.target], value=node.value), node)
+
+
+def adapt_live_strategy(code: str) -> str:
+    """
+    把实盘策略改写成沙盒接口 (解析失败则原样返回，交给沙盒报语法错误)
+
+    - 去掉类型注解与 `from typing import ...` (沙盒不允许导入 typing)
+    - 给 MyStrategy 加一个 on_tick，把 market_data 转成实盘行情格式 ({symbol: {"priceUsd": p, ...}})
+      调用 on_price_update，返回的决策 (dict / list / None) 转成沙盒订单
+    - 沙盒没有 print，模块顶部补一个空实现
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code
+    tree = _StripTyping().visit(tree)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == "MyStrategy":
+            methods = {item.name for item in node.body if isinstance(item, ast.FunctionDef)}
+            if "on_tick" not in methods and "on_price_update" in methods:
+                node.body.append(ast.parse(ON_TICK_SHIM).body[0])
+    return PRINT_SHIM + ast.unparse(ast.fix_missing_locations(tree))
+
+
+def collect_strategies(agents_dir: str = AGENTS_DIR, baseline_code: Optional[str] = None) -> Dict[str, str]:
+    """读取 agents_dir/*/strategy.py (+ 当前 baseline)，返回 {名称: 源码}"""
+    strategies = {}
+    for path in sorted(glob.glob(os.path.join(agents_dir, "*", "strategy.py"))):
+        try:
+            with open(path) as f:
+                strategies[os.path.basename(os.path.dirname(path))] = f.read()
+        except OSError as e:
+            logger.warning(f"Skip strategy {path}: {e}")
+    if baseline_code:
+        strategies[BASELINE_NAME] = baseline_code
+    return strategies
+
+
+# ========== 单个策略回测 (在 worker 进程里执行) ==========
+
+def _round_histories(symbols: List[str], rounds: int, ticks: int, seed: Optional[int], fixture: Optional[str]):
+    """所有策略共用的行情：有 numpy 时用场景数组 / 夹具，否则用固定种子的旧生成器"""
+    from market_scenarios import SCENARIOS_AVAILABLE, generate_scenario, load_fixture
+    from strategy_sandbox import BacktestEngine
+
+    if SCENARIOS_AVAILABLE:
+        if fixture and os.path.exists(fixture):
+            scenario = load_fixture(fixture)
+        else:
+            scenario = generate_scenario(symbols, rounds, ticks, seed=seed)
+        return scenario.symbols, [scenario.round(i) for i in range(rounds)]
+
+    rng_state = random.getstate()
+    random.seed(seed)
+    try:
+        engine = BacktestEngine()
+        histories = [
+            engine.generate_mock_market_data(symbols, ticks, volatility=random.uniform(0.015, 0.025))
+            for _ in range(rounds)
+        ]
+    finally:
+        random.setstate(rng_state)
+    return list(symbols), histories
+
+
+def evaluate_strategy(
+    name: str,
+    code: str,
+    rounds: int = 15,
+    ticks: int = 100,
+    symbols: Optional[List[str]] = None,
+    seed: Optional[int] = SANDBOX_SCENARIO_SEED,
+    fixture: Optional[str] = None,
+    cpu_seconds: Optional[int] = None,
+) -> SweepRow:
+    """对一个策略跑完整组场景并计算指标 (cpu_seconds: 本任务的 RLIMIT_CPU 预算)"""
+    from strategy_sandbox import BacktestEngine, SecurityValidator, TimeoutException
+
+    row = SweepRow(name=name)
+    start = time.perf_counter()
+    try:
+        if cpu_seconds:
+            from sandbox_pool import _limit_cpu
+            _limit_cpu(cpu_seconds)
+
+        code = adapt_live_strategy(code)
+        for check in (SecurityValidator.validate_syntax, SecurityValidator.validate_security,
+                      SecurityValidator.validate_class_structure):
+            ok, errors = check(code)
+            if not ok:
+                row.status, row.error = "rejected", "; ".join(errors)
+                return row
+
+        symbols, histories = _round_histories(symbols or ['VIRTUAL', 'BRETT', 'DEGEN'], rounds, ticks, seed, fixture)
+        engine = BacktestEngine(initial_balance=INITIAL_BALANCE)
+        worst_drawdown = 0.0
+        for market_history in histories:
+            success, results, logs = engine.run_backtest(code, market_history, symbols)
+            if not success:
+                row.status, row.error = "failed", "\n".join(logs[-3:])
+                return row
+            row.round_pnls.append(results['final_pnl_percent'])
+            worst_drawdown = max(worst_drawdown, results['max_drawdown'])
+
+        values = [INITIAL_BALANCE]
+        for pnl in row.round_pnls:
+            values.append(values[-1] * (1 + pnl / 100))
+        row.total_pnl = sum(row.round_pnls)
+        row.avg_pnl = row.total_pnl / len(row.round_pnls) if row.round_pnls else 0.0
+        row.worst_round_drawdown = -worst_drawdown * 100
+        for key, value in calculate_composite_score(row.round_pnls, values, row.total_pnl).items():
+            setattr(row, key, value)
+    except TimeoutException as e:
+        row.status, row.error = "timeout", str(e)
+    except MemoryError:
+        row.status, row.error = "error", "Memory limit exceeded"
+    except Exception as e:
+        row.status, row.error = "error", f"{type(e).__name__}: {e}"
+    finally:
+        row.seconds = time.perf_counter() - start
+    return row
+
+
+def _init_worker(memory_mb: int):
+    """worker 进程初始化：地址空间上限 + CPU 超限信号转成 TimeoutException (与 sandbox_pool 相同)"""
+    import signal
+    from sandbox_pool import _limit_memory
+    from strategy_sandbox import TimeoutException
+
+    def on_cpu_limit(signum, frame):
+        raise TimeoutException("CPU time limit exceeded")
+
+    signal.signal(signal.SIGXCPU, on_cpu_limit)
+    try:
+        _limit_memory(memory_mb)
+    except (ValueError, OSError):
+        pass
+
+
+def rank_rows(rows: List[SweepRow]) -> List[SweepRow]:
+    """按综合评分 (并列时按总收益) 排序；失败的策略排在最后"""
+    rows = sorted(rows, key=lambda r: (r.status != "ok", -r.composite_score, -r.total_pnl, r.name))
+    for rank, row in enumerate(rows, 1):
+        row.rank = rank
+    return rows
+
+
+def run_sweep(
+    strategies: Dict[str, str],
+    rounds: int = 15,
+    ticks: int = 100,
+    symbols: Optional[List[str]] = None,
+    seed: Optional[int] = SANDBOX_SCENARIO_SEED,
+    fixture: Optional[str] = SANDBOX_FIXTURE,
+    workers: int = SANDBOX_WORKERS,
+    cpu_seconds: int = SANDBOX_JOB_CPU_SECONDS,
+    memory_mb: int = SANDBOX_MEMORY_MB,
+    timeout: Optional[float] = None,
+) -> List[SweepRow]:
+    """
+    并行回测一组策略，返回排好名次的结果
+
+    Args:
+        strategies: {名称: 源码}
+        seed / fixture: 行情场景 (同 StrategySandbox)；seed=None 时为所有策略随机生成一次种子
+        timeout: 整个批次的墙钟上限 (秒)，超时未完成的策略记为 timeout
+    """
+    if not strategies:
+        return []
+    if seed is None:
+        seed = random.randrange(2 ** 32)  # 每个 worker 必须用同一个种子才能得到同一组路径
+    fixture = fixture or None
+    deadline = time.monotonic() + timeout if timeout else None
+
+    rows = []
+    timed_out = False
+    pool = ProcessPoolExecutor(max_workers=max(1, min(workers, len(strategies))),
+                               initializer=_init_worker, initargs=(memory_mb,))
+    try:
+        futures = {
+            name: pool.submit(evaluate_strategy, name, code, rounds, ticks, symbols, seed, fixture, cpu_seconds)
+            for name, code in strategies.items()
+        }
+        for name, future in futures.items():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                rows.append(future.result(timeout=remaining))
+            except FutureTimeout:
+                timed_out = True
+                rows.append(SweepRow(name=name, status="timeout", error="Sweep deadline exceeded"))
+            except Exception as e:  # worker 崩溃 (BrokenProcessPool 等)
+                rows.append(SweepRow(name=name, status="error", error=f"{type(e).__name__}: {e}"))
+    finally:
+        stuck = list((pool._processes or {}).values()) if timed_out else []
+        pool.shutdown(wait=not timed_out, cancel_futures=True)
+        for proc in stuck:  # 超时后不等卡住的 worker
+            proc.kill()
+    return rank_rows(rows)
+
+
+async def sweep_in_subprocess(
+    strategies: Dict[str, str],
+    timeout: float,
+    **options,
+) -> List[SweepRow]:
+    """
+    在独立解释器里运行 run_sweep (Arena 内部使用，不阻塞事件循环)
+
+    options 透传给 run_sweep (rounds / ticks / seed / fixture / workers ...)
+    超时杀掉子进程并抛出 asyncio.TimeoutError
+    """
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.abspath(__file__), "--stdin-json",
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    request = json.dumps({"strategies": strategies, "options": options, "timeout": timeout}).encode()
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(request), timeout=timeout + 10)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise RuntimeError(f"Backtest sweep exited with code {proc.returncode}")
+    return [SweepRow(**row) for row in json.loads(stdout)]
+
+
+def format_matrix(rows: List[SweepRow], show_rounds: bool = False) -> str:
+    """排名矩阵的文本表格"""
+    lines = [f"{'#':>3} {'strategy':<24}{'status':>9}{'score':>8}{'PnL%':>10}{'avg%':>9}"
+             f"{'MDD%':>9}{'roundDD%':>10}{'sharpe':>9}{'sortino':>9}{'win%':>7}{'sec':>7}"]
+    for row in rows:
+        lines.append(
+            f"{row.rank:>3} {row.name[:24]:<24}{row.status:>9}{row.composite_score:>8.2f}{row.total_pnl:>+10.2f}"
+            f"{row.avg_pnl:>+9.2f}{row.max_drawdown:>9.2f}{row.worst_round_drawdown:>10.2f}"
+            f"{row.sharpe_ratio:>9.3f}{row.sortino_ratio:>9.3f}{row.win_rate:>7.1f}{row.seconds:>7.2f}"
+        )
+        if show_rounds and row.round_pnls:
+            lines.append("      " + " ".join(f"{p:+.2f}" for p in row.round_pnls))
+        if row.error:
+            lines.append(f"      {row.error.splitlines()[-1][:100]}")
+    return "\n".join(lines)
+
+
+def _load_baseline_code() -> Optional[str]:
+    path = os.path.join(os.path.dirname(__file__), "..", "data", "baselines", "current_baseline.json")
+    try:
+        with open(path) as f:
+            return json.load(f).get("strategy_code")
+    except (OSError, ValueError):
+        return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backtest a population of strategies on identical market scenarios")
+    parser.add_argument("--agents-dir", default=AGENTS_DIR, help="读取 <dir>/*/strategy.py")
+    parser.add_argument("--no-baseline", action="store_true", help="不加入当前 baseline")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=SANDBOX_SCENARIO_SEED)
+    parser.add_argument("--fixture", default=SANDBOX_FIXTURE, help="回放夹具路径 (见 market_scenarios.py)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--timeout", type=float, default=None, help="整个批次的墙钟上限 (秒)")
+    parser.add_argument("--rounds-detail", action="store_true", help="打印每轮收益率")
+    parser.add_argument("--json", action="store_true", help="输出 JSON 而不是表格")
+    parser.add_argument("--stdin-json", action="store_true", help=argparse.SUPPRESS)  # sweep_in_subprocess 使用
+    args = parser.parse_args()
+
+    if args.stdin_json:
+        out = sys.stdout
+        sys.stdout = sys.stderr  # 策略的 print 不能混进结果通道
+        request = json.load(sys.stdin)
+        result = run_sweep(request["strategies"], timeout=request.get("timeout"), **request.get("options", {}))
+        out.write(json.dumps([row.to_dict() for row in result]))
+        out.flush()
+        sys.exit(0)
+
+    population = collect_strategies(args.agents_dir, None if args.no_baseline else _load_baseline_code())
+    result = run_sweep(population, rounds=args.rounds, ticks=args.ticks, seed=args.seed,
+                       fixture=args.fixture, workers=args.workers, timeout=args.timeout)
+    if args.json:
+        print(json.dumps([row.to_dict() for row in result], indent=2))
+    else:
+        print(f"strategies={len(population)} rounds={args.rounds} ticks/round={args.ticks} "
+              f"seed={args.seed} fixture={args.fixture or '-'}")
+        print(format_matrix(result, show_rounds=args.rounds_detail))
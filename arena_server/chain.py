@@ -9,6 +9,7 @@ Fallback 到直接私钥 (如果配置了)
 import os
 import json
 import hashlib
+import math
 from typing import Optional
 from dataclasses import dataclass
 from datetime import datetime
@@ -618,6 +619,40 @@ class AscensionTracker:
 
         # 资金池模拟 (50个炮灰 * 0.01 ETH)
         self.pool_eth = 0.5 
+
+        # 风险指标摘要 (tier, agent_id) -> RiskSummary，随收益历史增量更新 (不持久化，恢复后按历史重建)
+        self._risk: dict = {}
+
+    def _risk_summary(self, tier: str, agent_id: str):
+        """与 {tier}_returns_history 同步的风险摘要；长度对不上 (刚恢复) 时按历史重建"""
+        from arena_server.risk_metrics import summarize
+
+        returns = getattr(self, f"{tier}_returns_history").get(agent_id, [])
+        summary = self._risk.get((tier, agent_id))
+        if summary is None or summary.count != len(returns):
+            values = getattr(self, f"{tier}_values_history").get(agent_id, [10000.0])
+            steps = self._value_steps(values) if len(values) == len(returns) + 1 else None  # 旧存档没有对齐的资产序列
+            summary = self._risk[(tier, agent_id)] = summarize(returns, steps)
+        return summary
+
+    def _risk_metrics(self, tier: str, agent_id: str) -> dict:
+        return self._risk_summary(tier, agent_id).metrics()
+
+    @staticmethod
+    def _value_steps(values: list) -> list:
+        """总资产序列的逐期对数变化 (回撤按实际总资产计算)"""
+        return [
+            math.log(max(cur, 1e-12) / max(prev, 1e-12))
+            for prev, cur in zip(values, values[1:])
+        ]
+
+    def _record_return(self, tier: str, agent_id: str, pnl: float, total_value: float):
+        """追加一期收益：历史列表与风险摘要一起更新"""
+        summary = self._risk_summary(tier, agent_id)
+        values = getattr(self, f"{tier}_values_history")[agent_id]
+        getattr(self, f"{tier}_returns_history")[agent_id].append(pnl)
+        values.append(total_value)
+        summary.add(pnl, self._value_steps(values[-2:])[0])
     
     def record_epoch_result(self, rankings: list[tuple]) -> dict:
         """
@@ -636,7 +671,6 @@ class AscensionTracker:
             return {}
 
         from arena_server.metrics import (
-            calculate_composite_score,
             check_l1_promotion_criteria,
             check_l2_launch_criteria
         )
@@ -665,17 +699,12 @@ class AscensionTracker:
                         self.l2_total_returns[agent_id] = 0.0
 
                     # 记录本轮收益
-                    self.l2_returns_history[agent_id].append(pnl)
-                    self.l2_values_history[agent_id].append(total_value)
+                    self._record_return("l2", agent_id, pnl, total_value)
                     self.l2_total_returns[agent_id] += pnl
 
             # 计算风险指标
             if winner_id in self.l2_returns_history:
-                metrics = calculate_composite_score(
-                    returns=self.l2_returns_history[winner_id],
-                    cumulative_values=self.l2_values_history[winner_id],
-                    cumulative_return=self.l2_total_returns[winner_id]
-                )
+                metrics = self._risk_metrics("l2", winner_id)
 
                 # 检查发币条件（使用科学指标）
                 wins = self.l2_consecutive_wins.get(winner_id, 0)
@@ -701,8 +730,7 @@ class AscensionTracker:
                         self.l1_consecutive_positive[agent_id] = 0
 
                     # 记录本轮收益
-                    self.l1_returns_history[agent_id].append(pnl)
-                    self.l1_values_history[agent_id].append(total_value)
+                    self._record_return("l1", agent_id, pnl, total_value)
                     self.l1_total_returns[agent_id] += pnl
 
                     # 更新连续正收益计数
@@ -713,11 +741,7 @@ class AscensionTracker:
 
             # 计算风险指标
             if winner_id in self.l1_returns_history:
-                metrics = calculate_composite_score(
-                    returns=self.l1_returns_history[winner_id],
-                    cumulative_values=self.l1_values_history[winner_id],
-                    cumulative_return=self.l1_total_returns[winner_id]
-                )
+                metrics = self._risk_metrics("l1", winner_id)
 
                 # 检查晋级条件（使用科学指标）
                 consecutive_positive = self.l1_consecutive_positive.get(winner_id, 0)
@@ -732,20 +756,18 @@ class AscensionTracker:
         return result
     
     def get_stats(self, agent_id: str) -> dict:
-        """获取 Agent 的进度和风险指标"""
-        from arena_server.metrics import calculate_composite_score
-
+        """获取 Agent 的进度和风险指标 (读增量维护的摘要，不重算整段历史)"""
         is_l2 = agent_id in self.l2_qualified
+        tier = "l2" if is_l2 else "l1"
 
         if is_l2:
             # L2 统计
             returns = self.l2_returns_history.get(agent_id, [])
-            values = self.l2_values_history.get(agent_id, [10000.0])
             total_return = self.l2_total_returns.get(agent_id, 0.0)
             wins = self.l2_consecutive_wins.get(agent_id, 0)
 
             if returns:
-                metrics = calculate_composite_score(returns, values, total_return)
+                metrics = self._risk_metrics(tier, agent_id)
             else:
                 metrics = {
                     "composite_score": 0.0,
@@ -778,12 +800,11 @@ class AscensionTracker:
         else:
             # L1 统计
             returns = self.l1_returns_history.get(agent_id, [])
-            values = self.l1_values_history.get(agent_id, [10000.0])
             total_return = self.l1_total_returns.get(agent_id, 0.0)
             consecutive_positive = self.l1_consecutive_positive.get(agent_id, 0)
 
             if returns:
-                metrics = calculate_composite_score(returns, values, total_return)
+                metrics = self._risk_metrics(tier, agent_id)
             else:
                 metrics = {
                     "composite_score": 0.0,
@@ -92,9 +92,104 @@ LLM_MODEL = os.getenv("LLM_MODEL", "claude-3-opus-20240229")
 LLM_API_KEY = os.getenv("LLM_API_KEY", "")
 LLM_ENABLED = bool(LLM_BASE_URL)
 
+# 议事厅批量评分 (消息先按规则评分入库，后台攒批调用 LLM 回填)
+COUNCIL_SCORE_BATCH_SIZE = 20  # 每个 prompt 最多评分的消息数
+COUNCIL_SCORE_BATCH_WAIT = 2.0  # 秒: 不满一批时最多等待
+COUNCIL_SCORE_CACHE_SIZE = 10000  # 内容哈希 → 分数的 LRU 缓存条数
+COUNCIL_SCORE_QUEUE_MAX = 5000  # 待评分队列上限，超过时保留规则评分
+
+# 议事厅归档 (内存只保留最近几个会话，更早的会话写入磁盘，按游标分页读取)
+COUNCIL_ARCHIVE_DIR = os.getenv("DARWIN_COUNCIL_ARCHIVE_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "council"))
+COUNCIL_HOT_SESSIONS = 3  # 内存中保留的最近会话数
+COUNCIL_PAGE_SIZE = 200  # /council/{epoch} 每页默认消息数
+COUNCIL_INDEX_STRIDE = 64  # 归档索引每隔多少条消息记录一个字节偏移
+
+# 观众推送流 (/ws/observer：版本化快照 + 增量帧)
+OBSERVER_FEED_TICK = 1.0  # 秒: 生产者计算增量的间隔
+OBSERVER_QUEUE_MAX = 64  # 每个观众的待发送帧上限，满了改发快照
+OBSERVER_MAX_FILLS = 50  # 快照中携带 / 每帧最多推送的最近成交数
+
+# 热门只读端点的响应缓存 (按版本键失效，ETag / 304)
+RESPONSE_CACHE_ENABLED = os.getenv("DARWIN_RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_VARIANTS = 32  # 每个端点保留的查询参数组合数
+RESPONSE_CACHE_LIVE_TTL = 2.0  # 秒: 含在线状态 / 运行时计数的端点 (/leaderboard /stats /ascension) 的有效期
+
 # DexScreener API
 DEXSCREENER_BASE_URL = "https://api.dexscreener.com"
 PRICE_UPDATE_INTERVAL = 10  # 秒
 
+# 共享价格预言机 (所有组共用一个进程级缓存)
+PRICE_ORACLE_TTL = 30  # 秒: 价格新鲜期 (与 DexScreener 自身 30 秒缓存对齐)
+PRICE_ORACLE_STALE_TTL = 120  # 秒: 过期后仍先返回旧价、后台刷新的窗口
+PRICE_ORACLE_NEGATIVE_TTL = 10  # 秒: 查不到价格的 symbol 短暂负缓存，避免反复打上游
+PRICE_ORACLE_BATCH_WINDOW = 0.02  # 秒: 冷查询合并等待窗口
+PRICE_ORACLE_BATCH_SIZE = 30  # DexScreener /tokens 单次最多 30 个地址
+# 可信合约地址 (symbol -> address)：预言机只按这些地址或 symbol 第一次出现的地址查价，
+# 不会被之后订单里不同的 contract_address 覆盖
+PRICE_ORACLE_ADDRESSES = {
+    symbol: address for pool in [TARGET_TOKENS, *TOKEN_POOLS] for symbol, address in pool.items()
+}
+PRICE_REFRESH_INTERVAL = 60  # 秒: 持仓价格全量刷新周期 (> DexScreener 30 秒缓存)
+PRICE_REFRESH_CONCURRENCY = 32  # 全量刷新时同时在途的上游查询上限
+
+# 账户存储后端: "dict" (默认, 每个账户一个 dataclass) / "columnar" (NumPy 列数组, 需要 numpy)
+ACCOUNT_STORE = os.getenv("DARWIN_ACCOUNT_STORE", "dict")
+PNL_HISTORY_LIMIT = 100  # 每个 Agent 保留的 Epoch PnL 历史条数
+# 批次持仓 (FIFO lots): 每笔 BUY 记一个批次，SELL 按先进先出平仓并在成交记录里附上逐批次已实现盈亏
+POSITION_LOTS = os.getenv("DARWIN_POSITION_LOTS", "0") == "1"
+POSITION_LOTS_MAX = 64  # 单个持仓最多保留的批次数，超过后最新的两个批次合并 (标签取并集)
+POSITION_LOTS_TAG_TABLE_MAX = 4096  # 标签表达到此大小时压缩，只保留未平仓批次还在引用的标签组合
+
+# 下单管线 (每 Agent FIFO 队列 + 组内微批撮合)
+ORDER_QUEUE_PER_AGENT = 32  # 单个 Agent 排队中的订单上限，超过即返回 queue_full
+ORDER_QUEUE_PER_GROUP = 5000  # 单组排队中的订单上限
+ORDER_BATCH_SIZE = 256  # 每个撮合微批最多订单数
+POST_TRADE_QUEUE_LIMIT = 20000  # 成交后处理 (归因/Council/广播) 队列上限
+POST_TRADE_WORKERS = 32  # 并发的成交后处理 worker (慢对端只占用一个 worker)
+ORDER_BATCH_MAX_LEGS = ORDER_QUEUE_PER_AGENT  # 批量下单 (WS orders / REST 批量) 单次最多的订单数
+WS_MAX_INFLIGHT = 64  # 单个 Agent WebSocket 上带 id 并发处理的请求上限，超过后暂停读取
+
+# 成交日志 (只追加分段文件，替代 500 条上限的 trade_history)
+TRADE_JOURNAL_DIR = os.getenv("DARWIN_TRADE_JOURNAL_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "journal"))
+TRADE_JOURNAL_SEGMENT_BYTES = 8 * 1024 * 1024  # 单个段文件写满后滚动
+TRADE_HISTORY_HOT_SIZE = 500  # 内存中保留的最近成交条数 (兼容旧 deque 读取)
+MERGED_TRADE_RING_SIZE = 2000  # GroupManager.trade_history: 跨组最近成交环形缓冲
+HIVE_MIND_LOOKBACK = 5000  # HiveMind 归因回看的成交条数
+HIVE_MIND_TREND_WINDOW = 3600  # 秒: 标签趋势 = 最近一个窗口 vs 前一个窗口的平均 PnL
+HIVE_MIND_TREND_MIN_TRADES = 5  # 每个趋势窗口至少需要的样本数
+HIVE_MIND_REPORT_TTL = 30  # 秒: 没有新成交时归因报告缓存的有效期 (趋势窗口随时间滑动)
+ATTRIBUTION_BACKFILL_WINDOW = 24 * 3600  # 秒: 启动时从日志回灌归因分析器的时间窗口
+ATTRIBUTION_WINDOWS = {"1h": 3600, "1d": 24 * 3600}  # 归因分析器的滚动统计窗口 (另有按 Epoch 清零的 "epoch")
+ATTRIBUTION_WINDOW_BUCKETS = 60  # 每个滚动窗口切成的时间桶数 (内存与成交量无关)
+ATTRIBUTION_PENDING_MAX = 50000  # 待复盘 BUY 的上限，超过时丢弃最早到期的
+
+# Redis 增量持久化 (只写变更的账户 / API Key / 议事厅会话，写入在线程里执行)
+PERSIST_FLUSH_INTERVAL = 60  # 秒: 增量保存周期
+PERSIST_FLUSH_DEBOUNCE = 1.0  # 秒: 注册/删除等事件触发的保存合并等待
+PERSIST_SNAPSHOT_INTERVAL = 15 * 60  # 秒: 全量压缩快照周期 (整表原子替换，清理残留字段)
+
+# 分片模式: 各组分散到 N 个 worker 进程 (0 = 单进程, 默认)
+ARENA_SHARDS = int(os.getenv("DARWIN_ARENA_SHARDS", "0"))
+SHARD_SOCKET_DIR = os.getenv("DARWIN_SHARD_SOCKET_DIR", "/tmp/darwin-shards")  # worker 的 Unix socket 目录
+SHARD_VNODES = 64  # 一致性哈希环上每个 worker 的虚拟节点数
+SHARD_SUMMARY_INTERVAL = 2.0  # 秒: 前端汇总各 worker 排行榜 / 统计的周期
+SHARD_RPC_TIMEOUT = 10.0  # 秒: 单次 IPC 调用超时
+SHARD_ORDER_STATUS_LIMIT = 10000  # 前端保留的未决订单 (超时 / 断连) 状态条数，供按 order_id 查询
+
+# 策略沙盒进程池 (POST /agent/strategy 的回测在独立 worker 进程里执行，不占用事件循环)
+SANDBOX_WORKERS = int(os.getenv("DARWIN_SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1))))
+SANDBOX_QUEUE_LIMIT = 32  # 排队中的验证任务上限，超过即返回 429
+SANDBOX_JOB_TIMEOUT = 60.0  # 秒: 单个任务的墙钟上限，超时直接杀掉 worker
+SANDBOX_JOB_CPU_SECONDS = 30  # 单个任务的 CPU 时间上限 (RLIMIT_CPU)
+SANDBOX_MEMORY_MB = 512  # worker 进程的地址空间上限 (RLIMIT_AS)
+SANDBOX_JOB_HISTORY = 500  # 保留的已完成任务数 (供状态查询)
+# 回测行情：固定种子让所有策略在同一组路径上比较；设置夹具路径则回放真实价格历史 (见 market_scenarios.py)
+SANDBOX_SCENARIO_SEED = int(os.getenv("DARWIN_SANDBOX_SEED", "20240601"))
+SANDBOX_FIXTURE = os.getenv("DARWIN_SANDBOX_FIXTURE", "")
+# 基线晋级前的批量回测 (backtest_sweep.py)：本轮赢家需在同一组场景上排名高于当前 baseline 才会被融合
+BASELINE_SWEEP_ENABLED = os.getenv("DARWIN_BASELINE_SWEEP", "0") == "1"
+BASELINE_SWEEP_ROUNDS = 10
+BASELINE_SWEEP_TIMEOUT = 180.0  # 秒: 整个批次 (全体策略) 的墙钟上限
+
 # Platform Wallet (接收费用)
 PLATFORM_WALLET = os.getenv("DARWIN_PLATFORM_WALLET", "0x3775f940502fAbC9CD4C84478A8CB262e55AadF9")
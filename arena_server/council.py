@@ -1,15 +1,34 @@
 """
 议事厅 (Council)
 Agent 分享策略、讨论、获取贡献值
+
+评分：提交时立即给出规则评分 (不等待 LLM)；启用 LLM 时消息进入 CouncilScorer 的批量评分队列，
+LLM 分数回填到 message.score 与 contribution_scores (见 council_scorer.py)
+
+存储：内存里只保留最近 COUNCIL_HOT_SESSIONS 个会话，更早的会话溢出到 CouncilArchive (见 council_store.py)；
+消息读取走游标分页 (page / recent)，contribution_scores 是随提交与回填维护的聚合，恢复时直接加载。
+归档写入 (fsync) 在事件循环里经由 asyncio.to_thread 执行，写完之前会话留在内存中照常读写。
 """
 
 import asyncio
 import re
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Set
 from enum import Enum
-from llm_client import call_llm
+from config import LLM_ENABLED, COUNCIL_HOT_SESSIONS
+from council_scorer import CouncilScorer
+from council_store import CouncilArchive
+
+
+class InvalidCursor(ValueError):
+    """分页游标格式错误 (API 层返回 400)"""
+
+
+def _parse_position(value: str, cursor: str) -> int:
+    if not value.isdigit():
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    return int(value)
 
 
 def score_council_message_rule_based(content: str) -> float:
@@ -98,6 +117,7 @@ class CouncilSession:
     messages: List[CouncilMessage] = field(default_factory=list)
     is_open: bool = False
     winner_id: Optional[str] = None
+    revision: int = 0  # 消息被原地修改 (LLM 分数回填等) 的计数，快照据此判断能否复用已压缩的字节
     
     def get_messages_for_agent(self, agent_id: str) -> List[CouncilMessage]:
         """获取其他 Agent 的消息"""
@@ -107,25 +127,88 @@ class CouncilSession:
 class Council:
     """议事厅管理器"""
     
-    def __init__(self):
-        self.sessions: Dict[int, CouncilSession] = {}
+    def __init__(
+        self,
+        llm_scoring: Optional[bool] = None,
+        scorer: Optional[CouncilScorer] = None,
+        archive_dir: Optional[str] = None,
+        hot_sessions: int = COUNCIL_HOT_SESSIONS,
+    ):
+        """
+        Args:
+            llm_scoring: 是否用 LLM 批量评分回填 (默认 LLM_ENABLED)
+            scorer: 自定义评分队列 (测试用)；on_scored 会被指向本 Council
+            archive_dir: 会话归档目录 (None = 全部留在内存)
+            hot_sessions: 内存中保留的最近会话数
+        """
+        self.sessions: Dict[int, CouncilSession] = {}  # 热会话 (最近 hot_sessions 个 Epoch)
+        self.archive = CouncilArchive(archive_dir) if archive_dir else None
+        self.hot_sessions = max(1, hot_sessions)
         self.current_epoch = 0
         self.contribution_scores: Dict[str, float] = {}  # agent_id -> total score
-        self.message_count = 0
+        self.message_count = self.archive.total_messages if self.archive else 0
+        self.dirty_sessions: Set[int] = set()  # 变更过、尚未持久化的会话 (增量保存用)
+        self.dirty_scores: Set[str] = set()  # 贡献值变更过的 Agent (增量保存用)
+        self.spilled: Set[int] = set()  # 已溢出到归档、需从 Redis 删除的会话
+        self._spilling: Set[int] = set()  # 正在后台写入归档的会话 (写完之前仍在内存)
+        self._spill_task: Optional[asyncio.Task] = None  # 最近一次后台归档 (每次先等待上一次，保证串行写入)
+        self.version = 0  # 会话 / 消息 / 分数的变更计数 (响应缓存的失效键)
+        self.message_observers: List[Callable[[CouncilMessage], None]] = []  # 每条发言入库后调用 (观众推送)
+        self.llm_scoring = LLM_ENABLED if llm_scoring is None else llm_scoring
+        self.scorer = scorer or CouncilScorer(on_scored=self._apply_llm_score)
+        self.scorer.on_scored = self._apply_llm_score
+
+    def mark_session_dirty(self, epoch: int = None):
+        """会话被外部直接修改后调用 (None = 全部)"""
+        self.version += 1
+        if epoch is None:
+            self.dirty_sessions.update(self.sessions.keys())
+            for session in self.sessions.values():
+                session.revision += 1
+        else:
+            self.dirty_sessions.add(epoch)
+            if epoch in self.sessions:
+                self.sessions[epoch].revision += 1
+
+    def drain_spilled(self) -> Set[int]:
+        """取出已溢出到归档的会话 (增量保存时从 Redis 删除)"""
+        spilled, self.spilled = self.spilled, set()
+        return spilled
+
+    def drain_dirty_scores(self) -> Dict[str, float]:
+        """取出贡献值变更过的 Agent 及其当前总分"""
+        dirty, self.dirty_scores = self.dirty_scores, set()
+        return {aid: self.contribution_scores[aid] for aid in dirty if aid in self.contribution_scores}
+
+    def drain_dirty_sessions(self) -> dict:
+        """取出变更过的会话并序列化 (与 serialize_sessions 格式一致)"""
+        dirty, self.dirty_sessions = self.dirty_sessions, set()
+        return {
+            str(epoch): self.serialize_session(self.sessions[epoch])
+            for epoch in dirty if epoch in self.sessions
+        }
     
     def start_session(self, epoch: int, winner_id: str) -> CouncilSession:
         """开启新的议事厅会话"""
+        if self.archive is not None and epoch in self.archive:
+            self.archive.remove(epoch)  # 新会话覆盖同一 Epoch 的旧归档
         session = CouncilSession(epoch=epoch, is_open=True, winner_id=winner_id)
         self.sessions[epoch] = session
         self.current_epoch = epoch
+        self.dirty_sessions.add(epoch)
+        self.version += 1
         print(f"\n🏛️ Council Session #{epoch} opened. Winner: {winner_id}")
+        self.spill()
         return session
     
     def close_session(self, epoch: int):
         """关闭议事厅会话"""
         if epoch in self.sessions:
             self.sessions[epoch].is_open = False
+            self.dirty_sessions.add(epoch)
+            self.version += 1
             print(f"🏛️ Council Session #{epoch} closed.")
+            self.spill()
     
     async def submit_message(
         self, 
@@ -137,10 +220,13 @@ class Council:
         """提交消息到议事厅"""
         # Auto-create session if missing (e.g. after restart or new epoch)
         session = self.sessions.get(epoch)
+        if not session and self.archive is not None and epoch in self.archive:
+            session = self._rehydrate(epoch)
         if not session:
             session = CouncilSession(epoch=epoch, is_open=True, winner_id="Unknown")
             self.sessions[epoch] = session
             print(f"🏛️ Council Session #{epoch} auto-created (recovered).")
+            self.spill()
         
         # We allow messages even if session is technically "closed" (for chat/insights)
         
@@ -153,69 +239,256 @@ class Council:
             epoch=epoch
         )
         
-        # 评分 (用 LLM)
-        message.score = await self._score_message(message, session)
+        # 先用规则评分入库；LLM 分数由评分队列异步回填 (不阻塞提交方，如交易回执)
+        message.score = score_council_message_rule_based(content)
         
         # 累加贡献值
         if agent_id not in self.contribution_scores:
             self.contribution_scores[agent_id] = 0
         self.contribution_scores[agent_id] += message.score
+        self.dirty_scores.add(agent_id)
         
         session.messages.append(message)
+        self.dirty_sessions.add(epoch)
+        self.version += 1
         
         role_emoji = {"winner": "🏆", "loser": "📝", "question": "❓", "insight": "💡"}
         print(f"{role_emoji.get(role.value, '💬')} [{agent_id}] ({message.score:.1f}pts): {content[:100]}...")
+
+        if self.llm_scoring:
+            self.scorer.submit(message)
+        for observer in self.message_observers:
+            observer(message)
         
         return message
     
-    async def _score_message(self, message: CouncilMessage, session: CouncilSession) -> float:
-        """用 LLM 评分消息质量 (如果 LLM 可用)，否则用规则评分"""
-        from config import LLM_ENABLED
-
-        # 如果 LLM 未启用，使用规则评分
-        if not LLM_ENABLED:
-            score = score_council_message_rule_based(message.content)
-            print(f"📊 Rule-based score: {score:.1f}/10")
-            return score
-
-        prompt = f"""你是一个交易策略议事厅的评委。请给以下发言打分 (0-10):
+    def _apply_llm_score(self, message: CouncilMessage, score: float):
+        """LLM 分数回填：替换规则评分，并把差值计入贡献值"""
+        delta = score - message.score
+        message.score = score
+        self.version += 1
+        if message.agent_id in self.contribution_scores:  # Agent 已被删除时不再复活
+            self.contribution_scores[message.agent_id] += delta
+            self.dirty_scores.add(message.agent_id)
+        if message.epoch in self.sessions:  # 已溢出的会话以归档为准
+            self.dirty_sessions.add(message.epoch)
+            self.sessions[message.epoch].revision += 1
+
+    def scoring_stats(self) -> dict:
+        """评分队列指标 (队列延迟 / 缓存命中率)"""
+        return {"llm_scoring": self.llm_scoring, **self.scorer.stats()}
+    
+    # ========== 归档 ==========
+
+    @staticmethod
+    def _row(m: CouncilMessage) -> list:
+        """紧凑消息行 (与 StateManager 快照 / 归档文件格式一致)"""
+        return [m.id, m.agent_id, m.role.value, m.content, m.timestamp.isoformat(), m.score]
+
+    def spill(self) -> int:
+        """
+        把最近 hot_sessions 个 Epoch 之外的会话写入归档并移出内存，返回溢出的会话数
+
+        在事件循环中调用时写入交给后台任务 (asyncio.to_thread)，会话写完才移出内存；
+        没有运行中的事件循环 (启动恢复 / 脚本) 时直接同步写入。
+        """
+        if self.archive is None:
+            return 0
+        epochs = [e for e in sorted(self.sessions)[:-self.hot_sessions] if e not in self._spilling]
+        if not epochs:
+            return 0
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            for epoch in epochs:
+                session = self.sessions.pop(epoch)
+                self.archive.write(epoch, session.winner_id, [self._row(m) for m in session.messages])
+                self._mark_spilled(epoch)
+            print(f"🗄️ Council: archived {len(epochs)} session(s), {len(self.sessions)} kept in memory")
+            return len(epochs)
+        self._spilling.update(epochs)
+        snapshots = [(self.sessions[e], self.sessions[e].revision, [self._row(m) for m in self.sessions[e].messages])
+                     for e in epochs]
+        previous = self._spill_task if self._spill_task is not None and not self._spill_task.done() else None
+        self._spill_task = loop.create_task(self._spill_async(snapshots, previous))
+        return len(epochs)
+
+    def _mark_spilled(self, epoch: int):
+        self.dirty_sessions.discard(epoch)
+        self.spilled.add(epoch)
+
+    async def _spill_async(self, snapshots: List[tuple], previous: Optional[asyncio.Task]):
+        """snapshots: [(session, revision, rows)]，在 spill() 调用时截取"""
+        if previous is not None:  # 同一时间只有一个线程写归档
+            await asyncio.gather(previous, return_exceptions=True)
+        spilled = 0
+        for session, revision, rows in snapshots:
+            epoch = session.epoch
+            try:
+                await asyncio.to_thread(self.archive.write, epoch, session.winner_id, rows)
+                if (self.sessions.get(epoch) is session and session.revision == revision
+                        and len(session.messages) == len(rows)):
+                    del self.sessions[epoch]
+                    self._mark_spilled(epoch)
+                    spilled += 1
+                else:
+                    # 写入期间会话又有变化 (新消息 / 分数回填 / 同 Epoch 新会话)：作废这份归档，下次重新溢出
+                    await asyncio.to_thread(self.archive.remove, epoch)
+            except Exception as e:
+                print(f"⚠️ Council: failed to archive session #{epoch}: {e}")
+            finally:
+                self._spilling.discard(epoch)
+        if spilled:
+            print(f"🗄️ Council: archived {spilled} session(s), {len(self.sessions)} kept in memory")
+
+    async def flush_archive(self):
+        """等待后台归档写入完成 (关闭前 / 测试)"""
+        while self._spill_task is not None and not self._spill_task.done():
+            await asyncio.gather(self._spill_task, return_exceptions=True)
+
+    async def delete_agent(self, agent_id: str) -> int:
+        """
+        删除某 Agent 的全部发言 (热会话 + 归档) 与贡献值，返回删除的消息数
+
+        先等待进行中的溢出写完，再在线程中重写含其消息的归档文件；消息序号不回收 (避免 id 重复)
+        """
+        removed = 0
+        for session in self.sessions.values():
+            kept = [m for m in session.messages if m.agent_id != agent_id]
+            if len(kept) != len(session.messages):
+                removed += len(session.messages) - len(kept)
+                session.messages = kept
+                self.mark_session_dirty(session.epoch)
+        self.contribution_scores.pop(agent_id, None)
+        if self.archive is not None:
+            await self.flush_archive()
+            removed += await asyncio.to_thread(self.archive.remove_agent, agent_id)
+        self.version += 1
+        return removed
+
+    def _rehydrate(self, epoch: int) -> CouncilSession:
+        """已归档的 Epoch 又收到消息：读回内存，之后按新内容重新溢出"""
+        session = CouncilSession(epoch=epoch, is_open=False, winner_id=self.archive.winner(epoch))
+        for msg_id, agent_id, role, content, timestamp, score in self.archive.read(epoch):
+            session.messages.append(CouncilMessage(
+                id=msg_id, agent_id=agent_id, role=MessageRole(role), content=content,
+                timestamp=datetime.fromisoformat(timestamp), score=score, epoch=epoch,
+            ))
+        self.archive.remove(epoch)
+        self.sessions[epoch] = session
+        self.dirty_sessions.add(epoch)
+        self.spilled.discard(epoch)
+        return session
 
-发言者: {message.agent_id}
-角色: {message.role.value}
-内容: {message.content}
+    def finish_restore(self):
+        """从持久化恢复热会话之后调用：丢弃已归档的重复会话，重算消息序号，溢出多余会话"""
+        self.version += 1
+        if self.archive is not None:
+            for epoch in [e for e in self.sessions if e in self.archive]:
+                del self.sessions[epoch]
+                self.dirty_sessions.discard(epoch)
+        archived = self.archive.total_messages if self.archive is not None else 0
+        self.message_count = archived + sum(len(s.messages) for s in self.sessions.values())
+        if self.sessions:
+            self.current_epoch = max(self.current_epoch, max(self.sessions))
+        self.spill()
+
+    # ========== 读取 (游标分页) ==========
+
+    def epochs(self) -> List[int]:
+        """有记录的 Epoch (热会话 + 归档)，升序"""
+        archived = self.archive.epochs() if self.archive is not None else []
+        return sorted(set(self.sessions) | set(archived))
+
+    def has_session(self, epoch: int) -> bool:
+        return epoch in self.sessions or (self.archive is not None and epoch in self.archive)
+
+    def message_total(self, epoch: int) -> int:
+        session = self.sessions.get(epoch)
+        if session is not None:
+            return len(session.messages)
+        return self.archive.count(epoch) if self.archive is not None else 0
 
-评分标准:
-- 0-2: 垃圾话/复读机/无意义
-- 3-5: 一般性描述，没有深度
-- 6-8: 有具体策略/数据支撑
-- 9-10: 深刻洞察/创新思路
+    def session_info(self, epoch: int) -> dict:
+        session = self.sessions.get(epoch)
+        if session is not None:
+            return {"is_open": session.is_open, "winner": session.winner_id}
+        return {"is_open": False, "winner": self.archive.winner(epoch) if self.archive is not None else None}
 
-只回复一个数字 (0-10):"""
+    def _rows(self, epoch: int, start: int, limit: int) -> List[list]:
+        session = self.sessions.get(epoch)
+        if session is not None:
+            return [self._row(m) for m in session.messages[start:start + limit]]
+        return self.archive.read(epoch, start, limit) if self.archive is not None else []
+
+    @staticmethod
+    def _message_dict(row: list, epoch: int) -> dict:
+        msg_id, agent_id, role, content, timestamp, score = row
+        return {"id": msg_id, "epoch": epoch, "agent_id": agent_id, "role": role,
+                "content": content, "score": score, "timestamp": timestamp}
+
+    def page(self, epoch: int, cursor: Optional[str] = None, limit: int = 200) -> dict:
+        """
+        一个会话的消息 (旧 → 新)
+
+        Args:
+            cursor: 上一页返回的 next_cursor (None = 从头开始)；格式错误时抛出 InvalidCursor
+
+        Returns:
+            {"messages": [...], "next_cursor": str | None, "total": int}
+        """
+        start = _parse_position(cursor, cursor) if cursor else 0
+        total = self.message_total(epoch)
+        rows = self._rows(epoch, start, limit)
+        end = start + len(rows)
+        return {
+            "messages": [self._message_dict(row, epoch) for row in rows],
+            "next_cursor": str(end) if end < total else None,
+            "total": total,
+        }
+
+    def recent(self, limit: int = 50, cursor: Optional[str] = None) -> dict:
+        """
+        跨 Epoch 的最近消息 (新 → 旧)
+
+        Args:
+            cursor: 上一页返回的 next_cursor ("<epoch>:<位置>"，None = 从最新开始)；格式错误时抛出 InvalidCursor
+
+        Returns:
+            {"messages": [...], "next_cursor": str | None}
+        """
+        before_epoch, before_pos = None, None
+        if cursor:
+            epoch_part, sep, pos_part = cursor.partition(":")
+            if not sep:
+                raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+            before_epoch, before_pos = _parse_position(epoch_part, cursor), _parse_position(pos_part, cursor)
+        messages = []
+        epochs = [e for e in reversed(self.epochs()) if before_epoch is None or e <= before_epoch]
+        for i, epoch in enumerate(epochs):
+            total = self.message_total(epoch)
+            end = min(before_pos, total) if epoch == before_epoch else total
+            start = max(0, end - (limit - len(messages)))
+            rows = self._rows(epoch, start, end - start)
+            messages.extend(self._message_dict(row, epoch) for row in reversed(rows))
+            if len(messages) >= limit:
+                more = start > 0 or any(self.message_total(e) for e in epochs[i + 1:])
+                return {"messages": messages, "next_cursor": f"{epoch}:{start}" if more else None}
+        return {"messages": messages, "next_cursor": None}
 
-        try:
-            result = await call_llm(
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=10,
-                temperature=0.1,
-                timeout=10.0,
-                max_retries=1,
-            )
-            if result:
-                score_text = result.strip()
-                return min(10, max(0, float(score_text)))
-        except Exception as e:
-            print(f"Scoring error (LLM unavailable): {e}")
-
-        # 默认使用规则评分
-        score = score_council_message_rule_based(message.content)
-        print(f"📊 Fallback rule-based score: {score:.1f}/10")
-        return score
-    
     def get_winner_wisdom(self, epoch: int) -> str:
         """获取赢家的分享内容"""
         session = self.sessions.get(epoch)
         if not session:
-            return ""
+            if self.archive is None or epoch not in self.archive:
+                return ""
+            winner_id = self.archive.winner(epoch)
+            return "\n".join(
+                content for _, agent_id, role, content, _, _ in self.archive.read(epoch)
+                if agent_id == winner_id and role == MessageRole.WINNER.value
+            )
         
         winner_messages = [
             m for m in session.messages 
@@ -229,33 +502,43 @@ class Council:
         rankings.sort(key=lambda x: x[1], reverse=True)
         return rankings
 
+    @staticmethod
+    def serialize_session(session: CouncilSession) -> dict:
+        return {
+            "epoch": session.epoch,
+            "is_open": session.is_open,
+            "winner_id": session.winner_id,
+            "messages": [
+                {
+                    "id": m.id,
+                    "agent_id": m.agent_id,
+                    "role": m.role.value,
+                    "content": m.content,
+                    "score": m.score,
+                    "epoch": m.epoch,
+                    "timestamp": m.timestamp.isoformat(),
+                }
+                for m in session.messages
+            ]
+        }
+
     def serialize_sessions(self) -> dict:
-        """Serialize all sessions for Redis persistence"""
-        result = {}
-        for epoch, session in self.sessions.items():
-            result[str(epoch)] = {
-                "epoch": session.epoch,
-                "is_open": session.is_open,
-                "winner_id": session.winner_id,
-                "messages": [
-                    {
-                        "id": m.id,
-                        "agent_id": m.agent_id,
-                        "role": m.role.value,
-                        "content": m.content,
-                        "score": m.score,
-                        "epoch": m.epoch,
-                        "timestamp": m.timestamp.isoformat(),
-                    }
-                    for m in session.messages
-                ]
-            }
-        return result
-
-    def restore_sessions(self, data: dict):
-        """Restore sessions from Redis data"""
+        """Serialize hot sessions for Redis persistence (归档的会话只存在于归档目录)"""
+        return {str(epoch): self.serialize_session(session) for epoch, session in self.sessions.items()}
+
+    def restore_sessions(self, data: dict, scores: Optional[Dict[str, float]] = None):
+        """
+        Restore sessions from Redis data
+
+        Args:
+            scores: 持久化的贡献值聚合；旧数据没有时才由消息重新累加 (只含未归档的会话)
+        """
+        if scores is not None:
+            self.contribution_scores = dict(scores)
         for epoch_str, session_data in data.items():
             epoch = int(epoch_str)
+            if self.archive is not None and epoch in self.archive:
+                continue
             session = CouncilSession(
                 epoch=epoch,
                 is_open=session_data.get("is_open", False),
@@ -272,14 +555,14 @@ class Council:
                     timestamp=datetime.fromisoformat(m_data["timestamp"]) if m_data.get("timestamp") else datetime.now(),
                 )
                 session.messages.append(msg)
-                # Restore contribution scores
-                if msg.agent_id not in self.contribution_scores:
-                    self.contribution_scores[msg.agent_id] = 0
-                self.contribution_scores[msg.agent_id] += msg.score
+                if scores is None:
+                    self.contribution_scores[msg.agent_id] = self.contribution_scores.get(msg.agent_id, 0) + msg.score
             self.sessions[epoch] = session
-            self.message_count += len(session.messages)
+        if scores is None:
+            self.dirty_scores.update(self.contribution_scores)  # 迁移：下次保存写入聚合
         if data:
             self.current_epoch = max(int(k) for k in data.keys())
+        self.finish_restore()
 
 
 # 测试
@@ -0,0 +1,146 @@
+"""
+议事厅归档 (Council Archive)
+已结束的会话从内存溢出到磁盘，Council 只在内存里保留当前与最近几个会话
+
+文件布局 (COUNCIL_ARCHIVE_DIR):
+    epoch_<epoch>.jsonl   每行一条消息 [id, agent_id, role, content, timestamp, score]，写入后只读
+    index.json            {epoch: {"winner_id", "count", "offsets"}}；offsets 为每 stride 条消息的字节偏移
+
+分页读取按稀疏偏移 seek 到所在块，再跳过块内的行，不需要把整个会话读进内存。
+
+保留策略：归档会话一直保留 (没有按时间过期)；管理员删除 Agent 时 remove_agent 把含其消息的
+Epoch 文件整体重写，删除后的归档里不再有该 Agent 的发言。
+
+write 会 fsync，Council 在事件循环中经由 asyncio.to_thread 调用；index 采用写时复制 (整体替换字典)，
+事件循环上的读取不会看到写线程修改到一半的索引，index.json 的写入由锁串行化。
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from config import COUNCIL_INDEX_STRIDE
+
+INDEX_FILE = "index.json"
+
+
+def _fsync_replace(tmp: str, path: str):
+    os.replace(tmp, path)
+    try:
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:  # Windows 不支持打开目录
+        return
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class CouncilArchive:
+    """已关闭会话的磁盘归档"""
+
+    def __init__(self, directory: str, stride: int = COUNCIL_INDEX_STRIDE):
+        self.directory = directory
+        self.stride = stride
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()  # 串行化索引更新与 index.json 写入
+        self.index: Dict[int, dict] = {}
+        path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.index = {int(epoch): entry for epoch, entry in json.load(f).items()}
+
+    def __contains__(self, epoch: int) -> bool:
+        return epoch in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def epochs(self) -> List[int]:
+        return sorted(self.index)
+
+    def count(self, epoch: int) -> int:
+        entry = self.index.get(epoch)
+        return entry["count"] if entry else 0
+
+    def winner(self, epoch: int) -> Optional[str]:
+        entry = self.index.get(epoch)
+        return entry["winner_id"] if entry else None
+
+    @property
+    def total_messages(self) -> int:
+        return sum(entry["count"] for entry in self.index.values())
+
+    def _path(self, epoch: int) -> str:
+        return os.path.join(self.directory, f"epoch_{epoch}.jsonl")
+
+    def _save_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({str(epoch): entry for epoch, entry in self.index.items()}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        _fsync_replace(tmp, path)
+
+    def write(self, epoch: int, winner_id: Optional[str], rows: List[list]):
+        """归档一个会话 (rows 为紧凑的消息行)；先写数据文件再更新索引，中途崩溃不会留下半个会话"""
+        path = self._path(epoch)
+        tmp = path + ".tmp"
+        offsets = []
+        position = 0
+        with open(tmp, "wb") as f:
+            for i, row in enumerate(rows):
+                if i % self.stride == 0:
+                    offsets.append(position)
+                line = json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+                f.write(line)
+                position += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+        _fsync_replace(tmp, path)
+        with self._lock:
+            index = dict(self.index)
+            index[epoch] = {"winner_id": winner_id, "count": len(rows), "offsets": offsets}
+            self.index = index
+            self._save_index()
+
+    def read(self, epoch: int, start: int = 0, limit: Optional[int] = None) -> List[list]:
+        """读取第 [start, start + limit) 条消息"""
+        entry = self.index.get(epoch)
+        if entry is None or start >= entry["count"]:
+            return []
+        end = entry["count"] if limit is None else min(entry["count"], start + limit)
+        block = start // self.stride
+        rows = []
+        with open(self._path(epoch), "rb") as f:
+            f.seek(entry["offsets"][block])
+            for _ in range(start - block * self.stride):
+                f.readline()
+            for _ in range(end - start):
+                rows.append(json.loads(f.readline()))
+        return rows
+
+    def remove_agent(self, agent_id: str) -> int:
+        """删除某 Agent 在所有归档会话里的消息 (受影响的 Epoch 文件整体重写)，返回删除的消息数"""
+        removed = 0
+        for epoch in self.epochs():
+            rows = self.read(epoch)
+            kept = [row for row in rows if row[1] != agent_id]
+            if len(kept) != len(rows):
+                self.write(epoch, self.winner(epoch), kept)
+                removed += len(rows) - len(kept)
+        return removed
+
+    def remove(self, epoch: int):
+        """会话重新变热 (如重启后又有该 Epoch 的消息)：删除归档，之后重新溢出"""
+        with self._lock:
+            if epoch not in self.index:
+                return
+            self.index = {e: entry for e, entry in self.index.items() if e != epoch}
+            self._save_index()
+            try:
+                os.remove(self._path(epoch))
+            except FileNotFoundError:
+                pass
@@ -12,7 +12,7 @@
 import os
 import asyncio
 from typing import Dict, Any, List, Optional, Tuple
-from arena_server.llm_client import call_llm
+from llm_client import call_llm  # 与 council / baseline 共用同一个连接池与限流器
 from arena_server.strategy_sandbox import (
     validate_strategy_before_submission,
     SandboxTestResult,
@@ -109,6 +109,7 @@ async def run_council_and_evolution(
     broadcast_fn=None,  # async function to broadcast to group
     group_id: int = 0,
     enable_sandbox: bool = True,  # 🧪 新增：是否启用沙盒测试
+    rankings: Optional[List[tuple]] = None,  # 组内排行 (分片模式下来自 worker；None = engine.get_leaderboard())
 ) -> Dict[str, Any]:
     """
     议事厅 + 通知客户端进化
@@ -127,7 +128,8 @@ async def run_council_and_evolution(
     mutation_engine = MutationEngine()
 
     # 获取排行榜
-    rankings = engine.get_leaderboard()
+    if rankings is None:
+        rankings = engine.get_leaderboard()
     winner_pnl = next((r[1] for r in rankings if r[0] == winner_id), 0)
 
     # === 第1步: 赢家分享 ===
@@ -220,6 +222,21 @@ async def validate_and_deploy_strategy(
     print(f"✅ Strategy validated for {agent_id}")
     print(f"   {message}")
 
+    deployed, deploy_message = deploy_strategy(agent_id, new_strategy_code, data_dir)
+    if deployed:
+        print(f"📊 Predicted performance: {test_result.predicted_pnl:+.2f}% over {test_result.backtest_rounds} rounds")
+    return deployed, deploy_message, test_result
+
+
+def deploy_strategy(agent_id: str, strategy_code: str, data_dir: str) -> Tuple[bool, str]:
+    """
+    保存已通过沙盒验证的策略（备份旧策略）
+
+    沙盒进程池 (sandbox_pool) 在 worker 验证通过后也调用这里部署。
+
+    Returns:
+        (success, message)
+    """
     agent_dir = os.path.join(data_dir, "agents", agent_id)
     os.makedirs(agent_dir, exist_ok=True)
 
@@ -240,14 +257,13 @@ async def validate_and_deploy_strategy(
     # 保存新策略
     try:
         with open(strategy_path, "w") as f:
-            f.write(new_strategy_code)
+            f.write(strategy_code)
         print(f"💾 New strategy deployed: {strategy_path}")
-        print(f"📊 Predicted performance: {test_result.predicted_pnl:+.2f}% over {test_result.backtest_rounds} rounds")
-        return True, "Strategy deployed successfully", test_result
+        return True, "Strategy deployed successfully"
     except Exception as e:
         error_msg = f"Failed to save strategy file: {str(e)}"
         print(f"❌ {error_msg}")
-        return False, error_msg, test_result
+        return False, error_msg
 
 
 def epoch_timestamp() -> str:
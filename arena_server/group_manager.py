@@ -21,18 +21,33 @@ GroupManager - 分组竞技管理器
 """
 
 import asyncio
+import heapq
 import logging
-from typing import Dict, List, Optional, Set
-from collections import deque
+import os
+import time
+from itertools import islice
+from typing import Dict, List, Mapping, Optional, Set, Tuple
 
-from matching import MatchingEngine, OrderSide, Position
+from matching import AgentAccount, MatchingEngine, OrderSide, Position
 from hive_mind import HiveMind
 from attribution import AttributionAnalyzer
-from config import GROUP_SIZE_THRESHOLDS, GROUP_DEFAULT_SIZE, INITIAL_BALANCE
+from price_refresh import PriceRefresher
+from trade_journal import TradeJournal
+from merged_views import MergedViews
+from risk_metrics import EMPTY_METRICS, RiskSummary, population_summary, summarize
+from config import (
+    GROUP_SIZE_THRESHOLDS, GROUP_DEFAULT_SIZE, INITIAL_BALANCE,
+    TRADE_JOURNAL_SEGMENT_BYTES, TRADE_HISTORY_HOT_SIZE, ATTRIBUTION_BACKFILL_WINDOW, MERGED_TRADE_RING_SIZE,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def _rank_key(entry: tuple) -> tuple:
+    """排行榜排序键：PnL 降序，同分按 agent_id (与 ValuationIndex 一致)"""
+    return (-entry[1], entry[0])
+
+
 class Group:
     """一个竞技小组 — 独立的交易+进化单元
     
@@ -40,13 +55,22 @@ class Group:
     Agents 可以自主选择交易任何代币。
     """
 
-    def __init__(self, group_id: int):
+    def __init__(self, group_id: int, journal_dir: Optional[str] = None):
         self.group_id = group_id
         self.members: Set[str] = set()
-        self.engine = MatchingEngine()
+        journal = None
+        if journal_dir:
+            journal = TradeJournal(
+                os.path.join(journal_dir, f"group_{group_id}"),
+                hot_size=TRADE_HISTORY_HOT_SIZE, segment_bytes=TRADE_JOURNAL_SEGMENT_BYTES,
+            )
+        self.engine = MatchingEngine(journal=journal)
         self.hive_mind = HiveMind(self.engine)
         self.attribution = AttributionAnalyzer(review_interval=3600)  # 1 小时复盘
-        # 价格通过 execute_order 中的 _fetch_price_realtime 按需获取
+        if journal is not None and journal.records:
+            # 重启后用最近的成交日志回灌归因统计 (旧 → 新)
+            self.attribution.backfill(journal.scan(since=time.time() - ATTRIBUTION_BACKFILL_WINDOW, newest_first=False))
+        # 价格通过共享的 PriceOracle 按需获取 (见 price_oracle.py)
         self.feeder = None
         self._feeder_task: Optional[asyncio.Task] = None
 
@@ -85,11 +109,17 @@ class GroupManager:
     4. 统一的对外接口（兼容原 MatchingEngine API）
     """
 
-    def __init__(self):
+    def __init__(self, journal_dir: Optional[str] = None):
         self.groups: Dict[int, Group] = {}
+        self.journal_dir = journal_dir  # 每组成交日志目录的父目录 (None = 仅内存)
         self.agent_to_group: Dict[str, int] = {}
         self._next_group_id = 0
         self._pool_index = 0
+        self.price_refresher = PriceRefresher()
+        # 跨组合并视图：由各组引擎在写入时回调维护，读取不再遍历所有组
+        self.views = MergedViews(trade_ring_size=MERGED_TRADE_RING_SIZE)
+        self._population_risk: Optional[dict] = None  # 全体风险指标 (/stats)，Epoch 结束时刷新
+        self._population_summary: Optional[RiskSummary] = None
 
     # ========== Properties for backward compat ==========
 
@@ -98,12 +128,9 @@ class GroupManager:
         return sum(g.size for g in self.groups.values())
 
     @property
-    def accounts(self) -> Dict:
-        """Merged accounts from all groups (for StateManager compat)"""
-        merged = {}
-        for group in self.groups.values():
-            merged.update(group.engine.accounts)
-        return merged
+    def accounts(self) -> Mapping[str, AgentAccount]:
+        """Merged accounts from all groups (只读视图，O(1))"""
+        return self.views.accounts_view
 
     @property
     def agents(self):
@@ -111,20 +138,45 @@ class GroupManager:
         return self.accounts
 
     @property
-    def current_prices(self) -> Dict[str, float]:
-        """Merged prices from all groups"""
-        merged = {}
-        for group in self.groups.values():
-            merged.update(group.engine.current_prices)
-        return merged
+    def current_prices(self) -> Mapping[str, float]:
+        """Merged prices from all groups (各 symbol 取最近一次写入的价格；版本化快照)"""
+        return self.views.prices_snapshot()
+
+    def price_source(self, symbol: str) -> Optional[int]:
+        """最近一次写入该 symbol 价格的组"""
+        return self.views.price_source(symbol)
 
     @property
-    def trade_history(self) -> deque:
-        """Merged trade history from all groups"""
-        merged = deque(maxlen=2000)
+    def trade_history(self) -> Tuple[dict, ...]:
+        """Merged recent trades from all groups (新 → 旧；版本化快照)"""
+        return self.views.trades_snapshot()
+
+    def scan_trades(self, since: float = None, until: float = None, agent_id: str = None,
+                    symbol: str = None, limit: int = 100) -> List[dict]:
+        """跨组扫描成交日志 (新 → 旧)，各组结果按成交时间归并"""
+        # Agent 换组后旧成交仍留在原组日志里，因此总是扫描所有组 (段索引会跳过无关段)
+        streams = [
+            group.engine.trade_history.scan(since=since, until=until, agent_id=agent_id, symbol=symbol, limit=limit)
+            for group in self.groups.values()
+        ]
+        merged = heapq.merge(*streams, key=lambda t: t.get("time", ""), reverse=True)
+        return list(islice(merged, limit))
+
+    def remove_agent_trades(self, agent_id: str):
+        """从所有组的成交日志与跨组最近成交中删除某 Agent 的记录"""
         for group in self.groups.values():
-            merged.extend(group.engine.trade_history)
-        return merged
+            group.engine.trade_history.remove_agent(agent_id)
+        self.views.remove_agent(agent_id)
+
+    @property
+    def version(self) -> int:
+        """跨组的账户 / 价格 / 成交 / 排行 / 风险指标变更计数 (只增不减，响应缓存的失效键)"""
+        return sum(self.views.versions.values()) + sum(g.engine.version for g in self.groups.values())
+
+    @property
+    def trades_version(self) -> int:
+        """成交视图的版本：新成交 / 账户增删 (删除 Agent 时会清理其成交)"""
+        return self.views.versions["trades"] + self.views.versions["accounts"]
 
     @property
     def order_count(self) -> int:
@@ -146,11 +198,36 @@ class GroupManager:
         """创建新组 - 不限制代币池"""
         group_id = self._next_group_id
         self._next_group_id += 1
-        group = Group(group_id=group_id)  # 不传 token_pool
-        self.groups[group_id] = group
+        group = Group(group_id=group_id, journal_dir=self.journal_dir)  # 不传 token_pool
+        self._add_group(group)
         logger.info(f"🆕 Created Group {group_id} (open token pool - agents can trade any token)")
         return group
 
+    def _add_group(self, group: Group):
+        self.groups[group.group_id] = group
+        group.engine.attach_listener(self.views.listener(group.group_id))
+        if len(group.engine.trade_history):  # 从成交日志恢复的组
+            self.views.seed_trades(group.engine.trade_history)
+
+    def ensure_group(self, group_id: int) -> Group:
+        """获取指定 ID 的组，不存在则创建 (分片模式下组 ID 由前端进程分配)"""
+        group = self.groups.get(group_id)
+        if group is None:
+            group = Group(group_id=group_id, journal_dir=self.journal_dir)
+            self._add_group(group)
+            self._next_group_id = max(self._next_group_id, group_id + 1)
+            logger.info(f"🆕 Created Group {group_id} (assigned by router)")
+        return group
+
+    def place_agent(self, agent_id: str, group_id: int) -> Group:
+        """把 Agent 放进指定的组 (分片 worker 使用)"""
+        if agent_id in self.agent_to_group:
+            return self.groups[self.agent_to_group[agent_id]]
+        group = self.ensure_group(group_id)
+        group.add_member(agent_id)
+        self.agent_to_group[agent_id] = group_id
+        return group
+
     async def assign_agent(self, agent_id: str) -> Group:
         """
         将Agent分配到组。已有组则返回现有组，否则找未满组或创建新组。
@@ -269,13 +346,43 @@ class GroupManager:
             group = self.groups.get(group_id)
             return group.engine.get_leaderboard() if group else []
 
-        # Global merged leaderboard
-        all_rankings = []
-        for group in self.groups.values():
-            for agent_id, pnl_pct, total_val in group.engine.get_leaderboard():
-                all_rankings.append((agent_id, pnl_pct, total_val))
-        all_rankings.sort(key=lambda x: x[1], reverse=True)
-        return all_rankings
+        # Global merged leaderboard: 各组排行已有序，k 路归并即可
+        return list(heapq.merge(
+            *(group.engine.get_leaderboard() for group in self.groups.values()),
+            key=_rank_key,
+        ))
+
+    def get_top(self, k: int) -> list:
+        """全局前 k 名 (每组只取前 k 再归并)"""
+        merged = heapq.merge(
+            *(group.engine.get_top(k) for group in self.groups.values()),
+            key=_rank_key,
+        )
+        return [entry for _, entry in zip(range(k), merged)]
+
+    def get_rank(self, agent_id: str) -> Optional[int]:
+        """全局名次 (1 开始)：本组名次 + 其他组中排在其前面的人数"""
+        group = self.get_group(agent_id)
+        if not group:
+            return None
+        entry = group.engine.valuation.entry(agent_id)
+        if entry is None:
+            return None
+        rank = group.engine.get_rank(agent_id)
+        for other in self.groups.values():
+            if other is not group:
+                rank += other.engine.valuation.count_before(entry[0], agent_id)
+        return rank
+
+    def mark_account_dirty(self, agent_id: str = None):
+        """外部直接修改账户后通知估值索引 (None = 所有组全部账户)"""
+        if agent_id is None:
+            for group in self.groups.values():
+                group.engine.mark_account_dirty()
+            return
+        group = self.get_group(agent_id)
+        if group:
+            group.engine.mark_account_dirty(agent_id)
 
     def print_leaderboard(self):
         """Print per-group leaderboards"""
@@ -302,6 +409,18 @@ class GroupManager:
         for group in self.groups.values():
             group.stop_feeder()
 
+    # ========== Price Refresh ==========
+
+    async def refresh_all_position_prices(self) -> int:
+        """跨组刷新所有持仓价格：symbol 去重、并发查询、发布统一快照
+
+        Returns:
+            int: 成功更新的代币数量
+        """
+        engines = [group.engine for group in self.groups.values()]
+        snapshot = await self.price_refresher.refresh(engines)
+        return len(snapshot.prices)
+
     # ========== Hive Mind ==========
 
     async def hive_mind_tick(self, epoch: int, broadcast_fn) -> int:
@@ -323,6 +442,59 @@ class GroupManager:
                 logger.error(f"Hive Mind error (Group {group.group_id}): {e}")
         return patches
 
+    # ========== Epoch ==========
+
+    def end_epoch(self) -> Tuple[list, Dict[int, dict]]:
+        """
+        Epoch 结束：各组记录 PnL 历史 (增量更新风险指标)、归因窗口重新累计、刷新全体风险指标
+
+        Returns:
+            (全局排行, {group_id: epoch_report})；分片模式下 worker 用同一方法结算自己的组
+        """
+        for group in self.groups.values():
+            group.engine.record_pnl_snapshot()  # 限制历史长度，避免内存无限增长；同时增量更新风险指标缓存
+            if group.attribution is not None:
+                group.attribution.start_epoch()  # 归因的 "epoch" 窗口从下一个 Epoch 重新累计
+        self.refresh_population_risk()
+        return self.get_leaderboard(), {gid: self.epoch_report(group) for gid, group in self.groups.items()}
+
+    @staticmethod
+    def epoch_report(group: Group, recent_trades: int = 15) -> dict:
+        """一个组的结算数据 (组内排名 / Hive 补丁 / 议事厅简报)，全部为可序列化的普通 dict"""
+        eng = group.engine
+        report = {
+            "rankings": [list(r) for r in eng.get_leaderboard()],
+            "hive_patch": group.hive_mind.generate_patch(),
+            "prices": {},
+            "agents": {},
+            "recent_trades": [],
+            "hive_alpha": {},
+        }
+        try:
+            report["prices"] = {sym: round(price, 6) for sym, price in eng.current_prices.items()}
+            for aid, account in eng.accounts.items():
+                report["agents"][aid] = {
+                    "balance": round(account.balance, 2),
+                    "pnl_pct": round(account.get_pnl_percent(eng.current_prices), 2),
+                    "positions": {s: {"amount": round(p.amount, 4), "avg_price": round(p.avg_price, 6)}
+                                  for s, p in account.positions.items() if p.amount > 0},
+                }
+            for t in islice(eng.trade_history, recent_trades):
+                report["recent_trades"].append({
+                    "agent_id": t.get("agent_id"),
+                    "side": t.get("side"),
+                    "symbol": t.get("symbol"),
+                    "value": round(t.get("value", 0), 2),
+                    "reason": t.get("reason", []),
+                    "trade_pnl": t.get("trade_pnl"),
+                })
+            for tag, stats in group.hive_mind.analyze_alpha().items():
+                report["hive_alpha"][tag] = {"win_rate": stats.get("win_rate", 0), "avg_pnl": stats.get("avg_pnl", 0),
+                                             "count": stats.get("count", 0)}
+        except Exception as e:
+            logger.error(f"Error building council briefing (Group {group.group_id}): {e}")
+        return report
+
     # ========== Agent Removal ==========
 
     def remove_agent(self, agent_id: str) -> bool:
@@ -334,8 +506,60 @@ class GroupManager:
         if group:
             group.members.discard(agent_id)
             group.engine.accounts.pop(agent_id, None)
+            group.engine.risk.discard(agent_id)
+            if group.engine.lots is not None:
+                group.engine.lots.remove_agent(agent_id)
+        self._population_risk = None
         return True
 
+    # ========== Risk Metrics ==========
+
+    def risk_metrics(self, agent_id: str) -> dict:
+        """单个 Agent 的缓存风险指标 (O(1))"""
+        group = self.get_group(agent_id)
+        return group.engine.risk_metrics(agent_id) if group else dict(EMPTY_METRICS)
+
+    def leaderboard_risk(self, agent_id: str) -> Optional[dict]:
+        """排行榜的风险列：pnl_history 不足 2 期时返回 None (指标没有意义)"""
+        account = self.accounts.get(agent_id)
+        if account is None or len(account.pnl_history) < 2:
+            return None
+        return self.risk_metrics(agent_id)
+
+    @property
+    def risk_version(self) -> int:
+        """各组风险指标缓存的变更计数 (分片 worker 据此决定是否重新上报)"""
+        return sum(g.engine.risk.version for g in self.groups.values())
+
+    def rebuild_risk(self):
+        """从持久化恢复 pnl_history 之后调用：每组一次向量化重算"""
+        for group in self.groups.values():
+            group.engine.risk.rebuild({aid: acc.pnl_history for aid, acc in group.engine.accounts.items()})
+        self._population_risk = None
+
+    def refresh_population_risk(self) -> dict:
+        """Epoch 结束后调用：按账户顺序拼接各 Agent 的摘要得到全体指标，缓存到下一个 Epoch"""
+        summaries = []
+        for agent_id, account in self.accounts.items():
+            group = self.get_group(agent_id)
+            if group is not None:
+                summaries.append(group.engine.risk.get(agent_id, account.pnl_history).summary)
+            else:
+                summaries.append(summarize(account.pnl_history))
+        self._population_summary = population_summary(summaries)
+        self._population_risk = self._population_summary.metrics()
+        return self._population_risk
+
+    def population_risk(self) -> dict:
+        if self._population_risk is None:
+            return self.refresh_population_risk()
+        return self._population_risk
+
+    def population_summary(self) -> RiskSummary:
+        if self._population_summary is None or self._population_risk is None:
+            self.refresh_population_risk()
+        return self._population_summary
+
     # ========== Stats ==========
 
     def get_stats(self) -> dict:
@@ -344,12 +568,15 @@ class GroupManager:
             "total_agents": self.total_agents,
             "total_groups": len(self.groups),
             "current_group_size": self.dynamic_group_size(),
+            "price_refresh": self.price_refresher.stats(),
+            "merged_views": self.views.stats(),
             "groups": {
                 gid: {
                     "members": group.size,
                     "member_list": list(group.members),
                     "tokens": group.token_symbols,
                     "trades": group.engine.order_count,
+                    "journal": group.engine.trade_history.stats(),
                 }
                 for gid, group in self.groups.items()
             }
@@ -357,20 +584,35 @@ class GroupManager:
 
     # ========== State Persistence Helpers ==========
 
+    @staticmethod
+    def _account_data(group: Group, acc) -> dict:
+        return {
+            "balance": acc.balance,
+            "positions": {
+                sym: {"amount": pos.amount, "avg_price": pos.avg_price}
+                for sym, pos in acc.positions.items()
+            },
+            "pnl": acc.get_pnl(group.engine.current_prices),
+            "group_id": group.group_id,
+        }
+
     def get_all_accounts_data(self) -> dict:
         """Serialize all agent accounts across groups for state saving"""
         result = {}
         for group in self.groups.values():
             for aid, acc in group.engine.accounts.items():
-                result[aid] = {
-                    "balance": acc.balance,
-                    "positions": {
-                        sym: {"amount": pos.amount, "avg_price": pos.avg_price}
-                        for sym, pos in acc.positions.items()
-                    },
-                    "pnl": acc.get_pnl(group.engine.current_prices),
-                    "group_id": group.group_id,
-                }
+                result[aid] = self._account_data(group, acc)
+        return result
+
+    def collect_account_changes(self) -> dict:
+        """只序列化上次持久化以来余额/持仓变过的账户 (增量保存用)"""
+        result = {}
+        for group in self.groups.values():
+            accounts = group.engine.accounts
+            for aid in group.engine.valuation.drain_changed():
+                acc = accounts.get(aid)
+                if acc is not None:
+                    result[aid] = self._account_data(group, acc)
         return result
 
     def restore_agent(self, agent_id: str, balance: float,
@@ -406,3 +648,4 @@ class GroupManager:
                         amount=pdata.get("amount", 0.0),
                         avg_price=pdata.get("avg_price", 0.0)
                     )
+            group.engine.mark_account_dirty(agent_id)
@@ -3,145 +3,255 @@ Hive Mind (蜂巢大脑)
 三步闭环：分布式试错 → 中央学习 → 广播进化
 
 Step 1: Agent 下单带标签 (reason tags) — 由 Strategy 和 matching.py 完成
-Step 2: 归因分析 (Attribution) — 本模块的 analyze_alpha()
+Step 2: 归因分析 (Attribution) — 本模块的 record_trade() / analyze_alpha()
 Step 3: 全网热更新 (Hot Patch) — 本模块的 generate_patch()
 
 归因逻辑：
 - 追踪每笔 SELL 的 trade_pnl (已平仓盈亏)
-- 回溯该 Agent 同 symbol 的 BUY 标签
-- 将盈亏归因到 BUY 标签上
+- 回溯该 Agent 同 symbol 最近一笔 BUY 的标签；引擎启用批次持仓时 (position_lots.py)，
+  SELL 记录自带逐批次已实现盈亏，每个批次按自己的入场标签精确归因
+- 将盈亏归因到 BUY 标签上 (SELL 自身的退出标签也记录)
 - 统计每个标签的胜率和平均 PnL
+
+增量维护：
+- 引擎每写入一笔成交就调用 record_trade (MatchingEngine.trade_observers)，
+  按标签 / 标签×币种 / 标签组合累加，O(1) / 笔
+- 统计覆盖最近 HIVE_MIND_LOOKBACK 笔成交：滑出窗口的成交把自己的贡献减掉
+- 趋势按时间滑动窗口计算：最近 HIVE_MIND_TREND_WINDOW 秒 vs 前一个窗口的平均 PnL
+- analyze_alpha 返回缓存的报告，只有新成交或缓存超过 HIVE_MIND_REPORT_TTL 时才重建
 """
 
 import logging
-from typing import List, Dict
-from collections import defaultdict
+import time
+from typing import Dict, Iterable, Optional, Tuple
+from collections import defaultdict, deque
 from matching import MatchingEngine
+from trade_journal import trade_timestamp
+from config import HIVE_MIND_LOOKBACK, HIVE_MIND_TREND_WINDOW, HIVE_MIND_TREND_MIN_TRADES, HIVE_MIND_REPORT_TTL
 
 logger = logging.getLogger(__name__)
 
 
+def _new_stats() -> dict:
+    return {"wins": 0, "losses": 0, "total_pnl": 0.0, "trades": 0}
+
+
+def _apply(stats: dict, pnl: float, is_win: bool, sign: int):
+    """把一笔已平仓交易加到 (sign=1) / 减出 (sign=-1) 统计"""
+    stats["trades"] += sign
+    stats["total_pnl"] += sign * pnl
+    if is_win:
+        stats["wins"] += sign
+    else:
+        stats["losses"] += sign
+
+
+class _Attribution:
+    """窗口内一笔 SELL 的归因贡献 (滑出窗口时原样减掉)
+
+    entries: [(入场标签, 组合键, pnl, is_win)] —— 批次模式下每个平仓批次一条，否则只有最近一笔 BUY 一条
+    """
+    __slots__ = ("agent_id", "symbol", "entries", "exit_tags", "pnl", "is_win")
+
+    def __init__(self, agent_id, symbol, entries, exit_tags, pnl, is_win):
+        self.agent_id = agent_id
+        self.symbol = symbol
+        self.entries = entries
+        self.exit_tags = exit_tags
+        self.pnl = pnl
+        self.is_win = is_win
+
+
 class HiveMind:
-    def __init__(self, engine: MatchingEngine):
+    def __init__(self, engine: MatchingEngine, lookback: int = HIVE_MIND_LOOKBACK,
+                 trend_window: float = HIVE_MIND_TREND_WINDOW):
         self.engine = engine
+        self.lookback = lookback
+        self.trend_window = trend_window
         # Per-tag attribution: {tag: {"wins": N, "losses": N, "total_pnl": X, "trades": N}}
-        self.tag_stats = defaultdict(lambda: {"wins": 0, "losses": 0, "total_pnl": 0.0, "trades": 0})
+        self.tag_stats = defaultdict(_new_stats)
         # Per-agent tag usage: {agent_id: {tag: count}}
         self.agent_tags = defaultdict(lambda: defaultdict(int))
         # Enhanced granular stats
-        self.tag_by_token = defaultdict(lambda: defaultdict(lambda: {"wins": 0, "losses": 0, "total_pnl": 0.0, "trades": 0}))
-        self.tag_combos = defaultdict(lambda: {"wins": 0, "losses": 0, "total_pnl": 0.0, "trades": 0})
-        self.tag_history = defaultdict(list)  # Track recent performance for trend analysis
-
-    def analyze_alpha(self) -> Dict[str, dict]:
-        """
-        精确归因：基于每笔已平仓交易的实际 PnL。
-        增强版：添加 by_token, by_combo, trend 等细粒度分析
-
-        逻辑:
-        1. 找到所有 SELL 记录 (有 trade_pnl)
-        2. 回溯同 Agent + 同 Symbol 的 BUY 记录的 reason tags
-        3. 将 SELL 的 PnL 归因到这些 BUY tags 上
-        4. SELL 自身的 tags (TAKE_PROFIT, STOP_LOSS 等) 也记录
-        5. 细分统计：by_token, by_combo, trend
+        self.tag_by_token = defaultdict(lambda: defaultdict(_new_stats))
+        self.tag_combos = defaultdict(_new_stats)
+        # 趋势：每个标签最近两个时间窗口内的 (timestamp, pnl)
+        self.tag_history: Dict[str, deque] = defaultdict(deque)
+
+        # 最近 lookback 笔成交：BUY 存 (agent, symbol) 键，已平仓 SELL 存归因贡献，其余为 None
+        self._window: deque = deque()
+        self._seq = 0
+        # (agent, symbol) → (seq, 入场标签)：窗口内最近一笔 BUY
+        self._last_buy: Dict[Tuple[str, str], Tuple[int, Tuple[str, ...]]] = {}
+
+        self._version = 0
+        self._report: Optional[dict] = None
+        self._report_version = -1
+        self._report_built_at = 0.0
+
+        # 用已有成交回灌 (旧 → 新)，之后由引擎逐笔推送
+        trades = list(engine.trade_history.scan(limit=lookback))
+        self.backfill(reversed(trades))
+        engine.trade_observers.append(self.record_trade)
+
+    @property
+    def version(self) -> int:
+        """归因统计的变更计数 (每笔成交 / 重置加一)"""
+        return self._version
+
+    # ========== 增量归因 ==========
+
+    def record_trade(self, trade: dict):
+        """消费一笔新成交 (引擎写入成交日志后调用)"""
+        self._seq += 1
+        if len(self._window) >= self.lookback:  # 先滑出最旧的一笔，窗口外的 BUY 不参与归因
+            self._evict(self._window.popleft(), self._seq - self.lookback)
+        agent_id = trade.get("agent_id", trade.get("agent"))
+        symbol = trade.get("symbol")
+        side = trade.get("side")
+        entry = None
+
+        if side == "BUY":
+            key = (agent_id, symbol)
+            self._last_buy[key] = (self._seq, tuple(trade.get("reason") or ()))
+            entry = key
+        elif side == "SELL" and trade.get("trade_pnl") is not None:
+            entry = self._attribute(trade, agent_id, symbol)
+
+        self._window.append(entry)
+        self._version += 1
+
+    def backfill(self, trades: Iterable[dict]) -> int:
         """
-        trades = list(self.engine.trade_history)
-        self.tag_stats.clear()
-        self.agent_tags.clear()
-        self.tag_by_token.clear()
-        self.tag_combos.clear()
-
-        # Index BUY trades by (agent, symbol) for fast lookup
-        buy_index = defaultdict(list)  # {(agent, symbol): [trade, ...]}
-        for t in trades:
-            if t.get("side") == "BUY":
-                key = (t.get("agent_id", t.get("agent")), t["symbol"])
-                buy_index[key].append(t)
-
-        # Process all SELL trades with known PnL
-        for t in trades:
-            if t.get("side") != "SELL":
-                continue
-            trade_pnl = t.get("trade_pnl")
-            if trade_pnl is None:
-                continue
+        从成交日志回灌历史交易 (按时间从旧到新)
 
-            agent_id = t.get("agent_id", t.get("agent"))
-            symbol = t["symbol"]
-            is_win = trade_pnl > 0
-            timestamp = t.get("timestamp", 0)
+        Returns:
+            回灌的交易数
+        """
+        count = 0
+        for trade in trades:
+            self.record_trade(trade)
+            count += 1
+        return count
+
+    def reset(self):
+        """清空全部归因 (成交日志被清空时调用)"""
+        for table in (self.tag_stats, self.agent_tags, self.tag_by_token, self.tag_combos, self.tag_history):
+            table.clear()
+        self._window.clear()
+        self._last_buy.clear()
+        self._version += 1
+
+    def _attribute(self, trade: dict, agent_id: str, symbol: str) -> _Attribution:
+        trade_pnl = trade["trade_pnl"]
+        is_win = trade_pnl > 0
+
+        # 1. Attribute to the entry tags (WHY did we enter?)
+        #    批次模式：每个 FIFO 平仓批次按自己的入场标签和已实现盈亏归因；否则用最近一笔 BUY 的标签
+        if trade.get("lots") is not None:
+            lots = [(tuple(lot.get("reason") or ()), lot["trade_pnl"]) for lot in trade["lots"]]
+        else:
+            last_buy = self._last_buy.get((agent_id, symbol))
+            lots = [(last_buy[1] if last_buy else (), trade_pnl)]
+        # 2. Tag combinations (if multiple entry tags)
+        entries = tuple(
+            (tags, "+".join(sorted(tags)) if len(tags) >= 2 else None, pnl, pnl > 0)
+            for tags, pnl in lots if tags
+        )
+        # 3. Also record the SELL tags (WHY did we exit?), skipping PnL info tags
+        exit_tags = tuple(tag for tag in (trade.get("reason") or ()) if not tag.startswith("PNL_"))
+
+        attribution = _Attribution(agent_id, symbol, entries, exit_tags, trade_pnl, is_win)
+        self._apply(attribution, 1)
+
+        timestamp = trade_timestamp(trade)
+        for tags, _, pnl, _ in entries:
+            for tag in tags:
+                history = self.tag_history[tag]
+                history.append((timestamp, pnl))
+                self._trim_history(history, timestamp)
+        return attribution
+
+    def _apply(self, a: _Attribution, sign: int):
+        for tags, combo, pnl, is_win in a.entries:
+            for tag in tags:
+                _apply(self.tag_stats[tag], pnl, is_win, sign)
+                _apply(self.tag_by_token[tag][a.symbol], pnl, is_win, sign)
+                self.agent_tags[a.agent_id][tag] += sign
+            if combo is not None:
+                _apply(self.tag_combos[combo], pnl, is_win, sign)
+        for tag in a.exit_tags:
+            _apply(self.tag_stats[tag], a.pnl, a.is_win, sign)
+            _apply(self.tag_by_token[tag][a.symbol], a.pnl, a.is_win, sign)
+
+    def _evict(self, entry, seq: int):
+        """成交滑出回看窗口：减掉它的贡献，清理归零的键"""
+        if entry is None:
+            return
+        if isinstance(entry, tuple):  # BUY：不再作为窗口内最近的入场
+            if self._last_buy.get(entry, (None,))[0] == seq:
+                del self._last_buy[entry]
+            return
+
+        self._apply(entry, -1)
+        entry_tags = {tag for tags, _, _, _ in entry.entries for tag in tags}
+        for tag in entry_tags.union(entry.exit_tags):
+            if tag in self.tag_stats and self.tag_stats[tag]["trades"] <= 0:
+                del self.tag_stats[tag]
+            by_token = self.tag_by_token.get(tag)
+            if by_token is not None and entry.symbol in by_token and by_token[entry.symbol]["trades"] <= 0:
+                del by_token[entry.symbol]
+                if not by_token:
+                    del self.tag_by_token[tag]
+        usage = self.agent_tags.get(entry.agent_id)
+        if usage is not None:
+            for tag in entry_tags:
+                if usage.get(tag, 0) <= 0:
+                    usage.pop(tag, None)
+            if not usage:
+                del self.agent_tags[entry.agent_id]
+        for _, combo, _, _ in entry.entries:
+            if combo is not None and combo in self.tag_combos and self.tag_combos[combo]["trades"] <= 0:
+                del self.tag_combos[combo]
+
+    def _trim_history(self, history: deque, now: float):
+        cutoff = now - 2 * self.trend_window
+        while history and history[0][0] <= cutoff:
+            history.popleft()
+
+    def _trend(self, tag: str, now: float) -> str:
+        """最近一个窗口 vs 前一个窗口的平均 PnL (样本不足时为 stable)"""
+        history = self.tag_history.get(tag)
+        if not history:
+            return "stable"
+        self._trim_history(history, now)
+        boundary = now - self.trend_window
+        recent = [pnl for ts, pnl in history if ts > boundary]
+        older = [pnl for ts, pnl in history if ts <= boundary]
+        if len(recent) < HIVE_MIND_TREND_MIN_TRADES or len(older) < HIVE_MIND_TREND_MIN_TRADES:
+            return "stable"
+        recent_pnl = sum(recent) / len(recent)
+        older_pnl = sum(older) / len(older)
+        if recent_pnl > older_pnl * 1.2:
+            return "improving"
+        if recent_pnl < older_pnl * 0.8:
+            return "declining"
+        return "stable"
+
+    # ========== 报告 ==========
 
-            # 1. Attribute to the BUY entry tags (WHY did we enter?)
-            buy_key = (agent_id, symbol)
-            entry_tags = []
-            if buy_key in buy_index and buy_index[buy_key]:
-                # Use the most recent BUY for this (agent, symbol)
-                latest_buy = buy_index[buy_key][-1]
-                entry_tags = latest_buy.get("reason", [])
+    def analyze_alpha(self) -> Dict[str, dict]:
+        """
+        归因报告：基于每笔已平仓交易的实际 PnL，含 by_token / best_combos / recent_trend
 
-            # 2. Also record the SELL tags (WHY did we exit?)
-            exit_tags = t.get("reason", [])
+        统计由 record_trade 增量维护；这里只在有新成交 (或缓存过期，趋势窗口随时间滑动) 时
+        从聚合结果重建报告。返回的是共享的缓存对象，调用方不要修改。
+        """
+        now = time.time()
+        if (self._report is not None and self._report_version == self._version
+                and now - self._report_built_at < HIVE_MIND_REPORT_TTL):
+            return self._report
 
-            # 3. Attribute PnL to entry tags (most important)
-            for tag in entry_tags:
-                # Overall stats
-                self.tag_stats[tag]["trades"] += 1
-                self.tag_stats[tag]["total_pnl"] += trade_pnl
-                if is_win:
-                    self.tag_stats[tag]["wins"] += 1
-                else:
-                    self.tag_stats[tag]["losses"] += 1
-
-                # Track per-agent usage
-                self.agent_tags[agent_id][tag] += 1
-
-                # By-token breakdown
-                self.tag_by_token[tag][symbol]["trades"] += 1
-                self.tag_by_token[tag][symbol]["total_pnl"] += trade_pnl
-                if is_win:
-                    self.tag_by_token[tag][symbol]["wins"] += 1
-                else:
-                    self.tag_by_token[tag][symbol]["losses"] += 1
-
-                # Track history for trend analysis (keep last 20 trades per tag)
-                self.tag_history[tag].append({
-                    "pnl": trade_pnl,
-                    "timestamp": timestamp,
-                    "is_win": is_win
-                })
-                if len(self.tag_history[tag]) > 20:
-                    self.tag_history[tag].pop(0)
-
-            # 4. Track tag combinations (if multiple entry tags)
-            if len(entry_tags) >= 2:
-                combo_key = "+".join(sorted(entry_tags))
-                self.tag_combos[combo_key]["trades"] += 1
-                self.tag_combos[combo_key]["total_pnl"] += trade_pnl
-                if is_win:
-                    self.tag_combos[combo_key]["wins"] += 1
-                else:
-                    self.tag_combos[combo_key]["losses"] += 1
-
-            # 5. Also attribute to exit tags (secondary signal)
-            for tag in exit_tags:
-                if tag.startswith("PNL_"):
-                    continue  # Skip PnL info tags
-                self.tag_stats[tag]["trades"] += 1
-                self.tag_stats[tag]["total_pnl"] += trade_pnl
-                if is_win:
-                    self.tag_stats[tag]["wins"] += 1
-                else:
-                    self.tag_stats[tag]["losses"] += 1
-                
-                # Also build by_token for exit tags (TAKE_PROFIT, STOP_LOSS, etc.)
-                self.tag_by_token[tag][symbol]["trades"] += 1
-                self.tag_by_token[tag][symbol]["total_pnl"] += trade_pnl
-                if is_win:
-                    self.tag_by_token[tag][symbol]["wins"] += 1
-                else:
-                    self.tag_by_token[tag][symbol]["losses"] += 1
-
-        # Build enhanced alpha report
         alpha_report = {}
         for tag, stats in self.tag_stats.items():
             total = stats["wins"] + stats["losses"]
@@ -153,27 +263,14 @@ class HiveMind:
 
             # Build by_token breakdown
             by_token = {}
-            if tag in self.tag_by_token:
-                for symbol, token_stats in self.tag_by_token[tag].items():
-                    token_total = token_stats["wins"] + token_stats["losses"]
-                    if token_total >= 1:
-                        by_token[symbol] = {
-                            "win_rate": round((token_stats["wins"] / token_total) * 100, 1),
-                            "avg_pnl": round(token_stats["total_pnl"] / token_total, 2),
-                            "trades": token_total
-                        }
-
-            # Calculate trend (recent 10 trades vs older 10 trades)
-            trend = "stable"
-            if tag in self.tag_history and len(self.tag_history[tag]) >= 10:
-                history = self.tag_history[tag]
-                recent_pnl = sum(h["pnl"] for h in history[-10:]) / 10
-                older_pnl = sum(h["pnl"] for h in history[-20:-10]) / 10 if len(history) >= 20 else recent_pnl
-
-                if recent_pnl > older_pnl * 1.2:
-                    trend = "improving"
-                elif recent_pnl < older_pnl * 0.8:
-                    trend = "declining"
+            for symbol, token_stats in self.tag_by_token.get(tag, {}).items():
+                token_total = token_stats["wins"] + token_stats["losses"]
+                if token_total >= 1:
+                    by_token[symbol] = {
+                        "win_rate": round((token_stats["wins"] / token_total) * 100, 1),
+                        "avg_pnl": round(token_stats["total_pnl"] / token_total, 2),
+                        "trades": token_total
+                    }
 
             alpha_report[tag] = {
                 "win_rate": round(win_rate, 1),
@@ -182,7 +279,7 @@ class HiveMind:
                 "impact": "POSITIVE" if avg_pnl > 0 else "NEGATIVE",
                 "score": round(stats["total_pnl"], 2),
                 "by_token": by_token,
-                "recent_trend": trend
+                "recent_trend": self._trend(tag, now)
             }
 
         # Add best combos to report
@@ -209,6 +306,9 @@ class HiveMind:
             "note": "You can trade ANY token on DexScreener (50+ chains supported). The 'by_token' field only shows historical performance data for tokens that have been traded with complete buy-sell cycles. Don't limit yourself to these tokens - explore and discover new opportunities!"
         }
 
+        self._report = alpha_report
+        self._report_version = self._version
+        self._report_built_at = now
         return alpha_report
 
     def get_agent_profile(self, agent_id: str) -> Dict[str, int]:
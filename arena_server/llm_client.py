@@ -3,7 +3,8 @@ Unified LLM Client with retry + fallback for Project Darwin
 
 Supports both OpenAI and Anthropic API formats.
 Auto-detects format based on provider URL or explicit configuration.
-Includes rate limiting to prevent quota exhaustion.
+Includes rate limiting to prevent quota exhaustion (token bucket, callers queue with deadlines).
+Keeps one pooled keep-alive client per provider and hedges slow primaries to the next provider.
 Includes auto-recovery for quota resets (Gemini: 3 hours).
 
 Fallback Strategy:
@@ -15,35 +16,132 @@ Fallback Strategy:
 
 import os
 import asyncio
+import bisect
 import httpx
 import time
+from collections import deque
 from typing import Optional, List, Dict, Any
 
+try:
+    import h2  # noqa: F401  (httpx[http2])
+    _HTTP2 = True
+except ImportError:  # h2 optional: fall back to HTTP/1.1 keep-alive
+    _HTTP2 = False
 
-# Rate limiting: Track call timestamps per provider
-_call_timestamps: Dict[str, List[float]] = {}
-_RATE_LIMIT_CALLS = int(os.getenv("LLM_RATE_LIMIT_CALLS", "10"))  # Max calls per window
-_RATE_LIMIT_WINDOW = int(os.getenv("LLM_RATE_LIMIT_WINDOW", "60"))  # Window in seconds
 
+# Rate limiting: token bucket per provider (callers queue until a token frees up or their deadline passes)
+_RATE_LIMIT_CALLS = int(os.getenv("LLM_RATE_LIMIT_CALLS", "10"))  # Max calls per window (bucket capacity)
+_RATE_LIMIT_WINDOW = int(os.getenv("LLM_RATE_LIMIT_WINDOW", "60"))  # Window in seconds (refill period)
+_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))  # Max seconds a caller waits for a token
 
-def _check_rate_limit(provider_name: str) -> bool:
-    """Check if we're within rate limits. Returns True if allowed."""
-    now = time.time()
-    
-    if provider_name not in _call_timestamps:
-        _call_timestamps[provider_name] = []
-    
-    # Clean old timestamps
-    _call_timestamps[provider_name] = [
-        ts for ts in _call_timestamps[provider_name] 
-        if now - ts < _RATE_LIMIT_WINDOW
-    ]
-    
-    if len(_call_timestamps[provider_name]) >= _RATE_LIMIT_CALLS:
+# Connection pool per provider (long-lived client, reused across calls)
+_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+
+# Hedged requests: if the primary hasn't answered within its recent p95, also ask the next provider
+_HEDGE_ENABLED = os.getenv("LLM_HEDGE", "1") == "1"
+_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # p95 needs this many successful samples
+
+# Latency histogram bucket upper bounds (seconds)
+_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+
+class TokenBucket:
+    """Token bucket limiter: `capacity` calls per `window` seconds, waiters served FIFO."""
+
+    def __init__(self, capacity: int = _RATE_LIMIT_CALLS, window: float = _RATE_LIMIT_WINDOW):
+        self.capacity = max(1, capacity)
+        self.rate = self.capacity / window  # tokens per second
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()  # FIFO: the head waiter gets the next token
+        self.waiting = 0
+        self.rejected = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        """Take a token without waiting (only if nobody is queued ahead)."""
+        if self._lock.locked():
+            return False
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
         return False
-    
-    _call_timestamps[provider_name].append(now)
-    return True
+
+    async def acquire(self, timeout: float = _QUEUE_TIMEOUT) -> bool:
+        """Wait for a token up to `timeout` seconds. Returns False if the deadline would be missed."""
+        deadline = time.monotonic() + timeout
+        self.waiting += 1
+        try:
+            # Waiting in line for the lock counts against the same budget as waiting for a token
+            try:
+                await asyncio.wait_for(self._lock.acquire(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return True
+                    wait = (1 - self.tokens) / self.rate
+                    if now + wait > deadline:
+                        self.rejected += 1
+                        return False
+                    await asyncio.sleep(wait)
+            finally:
+                self._lock.release()
+        finally:
+            self.waiting -= 1
+
+
+class ProviderStats:
+    """Per-provider latency histogram, error counts and a recent-latency window for p95."""
+
+    def __init__(self, recent: int = 200):
+        self.buckets = [0] * (len(_LATENCY_BUCKETS) + 1)  # last bucket = overflow
+        self.recent = deque(maxlen=recent)
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, latency: float):
+        self.requests += 1
+        self.buckets[bisect.bisect_left(_LATENCY_BUCKETS, latency)] += 1
+        self.recent.append(latency)
+
+    def record_error(self, timeout: bool = False):
+        self.requests += 1
+        self.errors += 1
+        if timeout:
+            self.timeouts += 1
+
+    def p95(self) -> Optional[float]:
+        if len(self.recent) < _HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{b:g}s" for b in _LATENCY_BUCKETS] + ["inf"]
+        p95 = self.p95()
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+            "latency_histogram": dict(zip(labels, self.buckets)),
+        }
 
 
 class LLMProvider:
@@ -60,6 +158,24 @@ class LLMProvider:
         # Gemini quota resets after 3 hours (10800 seconds)
         self.recovery_window = int(os.getenv("LLM_RECOVERY_WINDOW", "10800"))
         self.accounts_json = os.getenv("ACCOUNTS_JSON", "{}")
+        self.limiter = TokenBucket()
+        self.stats = ProviderStats()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Long-lived pooled client (keep-alive, HTTP/2 when h2 is installed); per-request timeouts."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=_HTTP2,
+                limits=httpx.Limits(max_connections=_MAX_CONNECTIONS, max_keepalive_connections=_MAX_KEEPALIVE),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     @property
     def is_healthy(self) -> bool:
@@ -154,6 +270,7 @@ async def _call_openai_format(
     messages: List[Dict[str, str]],
     max_tokens: int,
     temperature: float,
+    timeout: float = 60.0,
 ) -> Optional[str]:
     """Call LLM using OpenAI API format"""
     response = await client.post(
@@ -168,6 +285,7 @@ async def _call_openai_format(
             "max_tokens": max_tokens,
             "temperature": temperature,
         },
+        timeout=timeout,
     )
 
     if response.status_code == 200:
@@ -183,6 +301,7 @@ async def _call_anthropic_format(
     messages: List[Dict[str, str]],
     max_tokens: int,
     temperature: float,
+    timeout: float = 60.0,
 ) -> Optional[str]:
     """Call LLM using Anthropic API format"""
     headers = {
@@ -204,6 +323,7 @@ async def _call_anthropic_format(
             "max_tokens": max_tokens,
             "temperature": temperature,
         },
+        timeout=timeout,
     )
 
     if response.status_code == 200:
@@ -218,16 +338,100 @@ async def _call_anthropic_format(
     return None
 
 
+async def _request(
+    provider: LLMProvider,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    timeout: float,
+) -> Optional[str]:
+    """One request over the provider's pooled client, recorded in its latency/error stats."""
+    call = _call_anthropic_format if provider.detect_format() == "anthropic" else _call_openai_format
+    start = time.monotonic()
+    try:
+        text = await call(provider.client, provider, messages, max_tokens, temperature, timeout)
+    except asyncio.CancelledError:
+        raise
+    except httpx.TimeoutException:
+        provider.stats.record_error(timeout=True)
+        raise
+    except Exception:
+        provider.stats.record_error()
+        raise
+    if text:
+        provider.stats.record(time.monotonic() - start)
+    else:
+        provider.stats.record_error()
+    return text
+
+
+async def _hedged_request(
+    provider: LLMProvider,
+    hedge: LLMProvider,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    timeout: float,
+) -> Optional[str]:
+    """
+    Send to `provider`; if it hasn't answered within its recent p95, also send to `hedge`
+    and return whichever non-empty answer arrives first (the loser is cancelled).
+    """
+    primary = asyncio.ensure_future(_request(provider, messages, max_tokens, temperature, timeout))
+    done, _ = await asyncio.wait({primary}, timeout=provider.stats.p95())
+    if done or not hedge.limiter.try_acquire():
+        return await primary
+
+    provider.stats.hedges += 1
+    print(f"🪁 [{provider.name}] slower than p95, hedging to {hedge.name}")
+    backup = asyncio.ensure_future(_request(hedge, messages, max_tokens, temperature, timeout))
+    pending = {primary, backup}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                if task.result():
+                    if task is backup:
+                        provider.stats.hedge_wins += 1
+                        hedge.record_success()
+                    return task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+    if error is not None:
+        raise error
+    return None
+
+
+def _hedge_for(providers: List[LLMProvider], index: int) -> Optional[LLMProvider]:
+    """Next healthy provider after `index`, if hedging applies to providers[index]."""
+    if not _HEDGE_ENABLED or providers[index].stats.p95() is None:
+        return None
+    for candidate in providers[index + 1:]:
+        if candidate.consecutive_failures < candidate.max_failures:
+            return candidate
+    return None
+
+
 async def call_llm(
     messages: List[Dict[str, str]],
     max_tokens: int = 500,
     temperature: float = 0.7,
     timeout: float = 60.0,
     max_retries: int = 2,
+    queue_timeout: float = _QUEUE_TIMEOUT,
 ) -> Optional[str]:
     """
     Call LLM with retry + provider fallback + rate limiting.
     Supports both OpenAI and Anthropic API formats.
+
+    Each provider keeps a pooled keep-alive client. Over the rate limit, callers queue on the
+    provider's token bucket for up to `queue_timeout` seconds before falling through to the next
+    provider. The first attempt is hedged to the next healthy provider once the primary has a p95.
     Returns response text or None on total failure.
     """
     providers = get_providers()
@@ -235,35 +439,29 @@ async def call_llm(
         print("⚠️ No LLM providers configured")
         return None
 
-    for provider in providers:
+    for index, provider in enumerate(providers):
         if not provider.is_healthy:
             print(f"⏭️ Skipping unhealthy provider: {provider.name}")
             continue
         
-        # Rate limit check
-        if not _check_rate_limit(provider.name):
-            print(f"⏳ Rate limit hit for {provider.name} ({_RATE_LIMIT_CALLS} calls/{_RATE_LIMIT_WINDOW}s). Trying next...")
+        # Rate limit: wait for a token (bounded by queue_timeout) instead of rejecting outright
+        if not await provider.limiter.acquire(queue_timeout):
+            print(f"⏳ Rate limit queue timeout for {provider.name} ({_RATE_LIMIT_CALLS} calls/{_RATE_LIMIT_WINDOW}s). Trying next...")
             continue
 
-        api_format = provider.detect_format()
-        
         for attempt in range(max_retries + 1):
             try:
-                async with httpx.AsyncClient(timeout=timeout) as client:
-                    if api_format == "anthropic":
-                        text = await _call_anthropic_format(
-                            client, provider, messages, max_tokens, temperature
-                        )
-                    else:
-                        text = await _call_openai_format(
-                            client, provider, messages, max_tokens, temperature
-                        )
-                    
-                    if text:
-                        provider.record_success()
-                        return text
-                    
-                    print(f"⚠️ [{provider.name}] Empty response")
+                hedge = _hedge_for(providers, index) if attempt == 0 else None
+                if hedge is not None:
+                    text = await _hedged_request(provider, hedge, messages, max_tokens, temperature, timeout)
+                else:
+                    text = await _request(provider, messages, max_tokens, temperature, timeout)
+                
+                if text:
+                    provider.record_success()
+                    return text
+                
+                print(f"⚠️ [{provider.name}] Empty response")
 
             except httpx.TimeoutException:
                 print(f"⏰ [{provider.name}] Timeout (attempt {attempt + 1}/{max_retries + 1})")
@@ -283,6 +481,25 @@ async def call_llm(
     return None
 
 
+def llm_stats() -> Dict[str, Any]:
+    """Per-provider latency histogram / errors / hedging / limiter queue (for /stats)."""
+    return {
+        p.name: {
+            **p.stats.to_dict(),
+            "healthy": p.consecutive_failures < p.max_failures,
+            "queued": p.limiter.waiting,
+            "rate_limited": p.limiter.rejected,
+        }
+        for p in get_providers()
+    }
+
+
+async def close_clients():
+    """Close pooled clients (server shutdown)."""
+    for provider in get_providers():
+        await provider.close()
+
+
 async def call_llm_with_fallback(
     prompt: str,
     max_tokens: int = 500,
@@ -6,7 +6,7 @@ Project Darwin - Arena Server
 import asyncio
 import logging
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query, Request, Header, Body
 from fastapi.responses import FileResponse, Response, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -25,11 +25,25 @@ from dotenv import load_dotenv
 env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
 load_dotenv(env_path)
 
-from config import EPOCH_DURATION_HOURS, ELIMINATION_THRESHOLD, ASCENSION_THRESHOLD, INITIAL_BALANCE
+from config import EPOCH_DURATION_HOURS, ELIMINATION_THRESHOLD, ASCENSION_THRESHOLD, INITIAL_BALANCE, PRICE_REFRESH_INTERVAL, TRADE_JOURNAL_DIR, ARENA_SHARDS
+from config import BASELINE_SWEEP_ENABLED, BASELINE_SWEEP_ROUNDS, BASELINE_SWEEP_TIMEOUT
+from config import COUNCIL_ARCHIVE_DIR, COUNCIL_PAGE_SIZE
+from config import RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_LIVE_TTL, HIVE_MIND_REPORT_TTL
+from config import ORDER_BATCH_MAX_LEGS, WS_MAX_INFLIGHT
 from feeder import DexScreenerFeeder
 from feeder_futures import FuturesFeeder
 from matching import MatchingEngine, OrderSide
-from council import Council, MessageRole
+from price_oracle import price_oracle
+from trade_journal import trade_timestamp
+from state_persistence import StatePersistence, TrackedDict
+from observer_feed import ObserverFeed
+from response_cache import ResponseCache
+from order_pipeline import OrderPipeline, OrderQueueFull, PostTradeEvent
+from sharding import ShardRouter
+from sandbox_pool import SandboxPool, SandboxQueueFull
+from backtest_sweep import BASELINE_NAME, collect_strategies, format_matrix, sweep_in_subprocess
+from council import Council, InvalidCursor, MessageRole
+from llm_client import close_clients, llm_stats
 from chain import ChainIntegration, AscensionTracker
 from state_manager import StateManager
 from hive_mind import HiveMind
@@ -51,7 +65,7 @@ logger = logging.getLogger(__name__)
 # 全局状态
 # GroupManager 取代了全局 engine + hive_mind
 # 每个 Group 有自己的 engine + hive_mind + feeder (不同代币池)
-group_manager = GroupManager()
+group_manager = GroupManager(journal_dir=TRADE_JOURNAL_DIR)  # 每组成交写入 data/journal/group_N
 
 # 合约区 Feeder (全局，供所有组使用)
 futures_feeder = FuturesFeeder()
@@ -59,7 +73,7 @@ futures_feeder = FuturesFeeder()
 # 兼容层: engine 指向 group_manager (提供相同接口)
 engine = group_manager
 
-council = Council()
+council = Council(archive_dir=COUNCIL_ARCHIVE_DIR)
 chain = ChainIntegration(testnet=True)
 ascension_tracker = AscensionTracker()
 state_manager = StateManager(group_manager, council, ascension_tracker)
@@ -100,12 +114,8 @@ def load_api_keys():
     return {"dk_test_key_12345": "Agent_Test_User"}
 
 def save_api_keys(keys_db):
-    """Save API keys to both Redis and disk"""
-    # 保存到Redis
-    for k, v in keys_db.items():
-        redis_state.save_api_key(k, v)
-    
-    # 也保存到磁盘（备份）
+    """Save API keys to disk (Redis 由 state_persistence 增量写入变更的 key)"""
+    # 保存到磁盘（备份）
     try:
         os.makedirs(DATA_DIR, exist_ok=True)
         with open(KEYS_FILE, 'w') as f:
@@ -113,7 +123,7 @@ def save_api_keys(keys_db):
     except Exception as e:
         logger.error(f"Failed to save keys to disk: {e}")
 
-API_KEYS_DB = load_api_keys()
+API_KEYS_DB = TrackedDict(load_api_keys())  # 记录增删，供 Redis 增量保存
 
 connected_agents: Dict[str, WebSocket] = {}
 connected_observers: set = set()  # 观众连接追踪
@@ -127,15 +137,50 @@ total_volume = 0.0
 FRONTEND_DIR = os.path.join(os.path.dirname(__file__), "..", "frontend")
 
 
-def save_all_state_to_redis():
-    """Save full arena state including trade history and council to Redis"""
-    agents_data = group_manager.get_all_accounts_data()
-    trade_history = list(engine.trade_history)
-    council_data = council.serialize_sessions()
-    redis_state.save_full_state(
-        current_epoch, trade_count, total_volume, API_KEYS_DB, agents_data,
-        trade_history=trade_history, council_sessions=council_data,
+# Redis 持久化：只写变更的账户 / API Key / 议事厅会话，写入在线程中执行 (见 state_persistence.py)
+state_persistence = StatePersistence(
+    redis_state, group_manager, council, API_KEYS_DB,
+    get_meta=lambda: (current_epoch, trade_count, total_volume),
+)
+
+# 观众推送流：一个生产者每秒计算一次增量，扇出给所有 /ws/observer 连接 (见 observer_feed.py)
+observer_feed = ObserverFeed(
+    get_state=lambda: observer_state(),
+    get_trades=lambda: engine.trade_history,
+)
+# 热门只读端点的响应缓存：版本键不变时复用序列化好的字节，支持 ETag / 304 (见 response_cache.py)
+response_cache = ResponseCache()
+
+
+def cached_json(request: Request, endpoint: str, key, build, ttl: float = None) -> Response:
+    """
+    通过响应缓存返回 JSON
+
+    Args:
+        key: 版本键 (引擎 / 议事厅 / 基线版本等)，变化即重建
+        build: (headers) -> 负载；需要额外响应头时写入 headers
+        ttl: 含墙钟相关字段 (在线状态、运行时计数) 时的有效期
+    """
+    if not RESPONSE_CACHE_ENABLED:
+        headers = {}
+        data = build(headers)
+        return JSONResponse(content=data, headers=headers)
+    status, entry = response_cache.fetch(
+        endpoint, key, build,
+        params=tuple(sorted(request.query_params.multi_items())),
+        ttl=ttl,
+        if_none_match=request.headers.get("if-none-match"),
     )
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", **entry.headers}
+    if status == 304:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+council.message_observers.append(
+    lambda m: observer_feed.publish("council", epoch=m.epoch, agent_id=m.agent_id, role=m.role.value,
+                                    content=m.content, score=m.score)
+)
 
 
 @asynccontextmanager
@@ -146,6 +191,10 @@ async def lifespan(app: FastAPI):
     logger.info("🧬 Project Darwin Arena Server starting...")
     logger.info(f"Frontend directory: {FRONTEND_DIR}")
 
+    # 分片模式先拉起 worker：恢复的账户要下发到所属 worker
+    if ARENA_SHARDS > 0:
+        await order_pipeline.start()
+
     # 尝试从Redis加载状态（优先），然后是本地文件
     redis_loaded = redis_state.load_full_state()
     if redis_loaded:
@@ -165,25 +214,33 @@ async def lifespan(app: FastAPI):
 
         logger.info(f"🔄 Resumed from Redis: Epoch {current_epoch}, {len(saved_agents)} agents restored across {len(group_manager.groups)} groups")
 
-        # 🔧 恢复交易记录到各组引擎
+        # 🔧 恢复交易记录到各组引擎 (成交日志已从磁盘恢复时跳过，避免重复)
         saved_trades = redis_loaded.get("trade_history", [])
-        if saved_trades:
+        journal_recovered = any(len(g.engine.trade_history) for g in group_manager.groups.values())
+        if saved_trades and not journal_recovered:
             # Distribute trades back to their group engines
             for trade in reversed(saved_trades):  # reversed because appendleft
                 agent_id = trade.get("agent_id", trade.get("agent"))
                 group = group_manager.get_group(agent_id)
                 if group:
-                    group.engine.trade_history.appendleft(trade)
+                    group.engine.record_trade(trade, ts=trade_timestamp(trade))
             logger.info(f"📊 Restored {len(saved_trades)} trade records")
+        if ARENA_SHARDS > 0:
+            await order_pipeline.restore_accounts(saved_agents, saved_trades)
+            logger.info(f"🧩 Restored {len(saved_agents)} agents across {ARENA_SHARDS} shard workers")
 
         # 🔧 恢复议事厅记录
         saved_council = redis_loaded.get("council_sessions", {})
         if saved_council:
-            council.restore_sessions(saved_council)
+            council.restore_sessions(saved_council, scores=redis_loaded.get("council_scores"))
             logger.info(f"🏛️ Restored {len(saved_council)} council sessions")
+
+        # 内存状态与 Redis 一致：之后只增量保存变更
+        state_persistence.mark_clean()
     else:
         # 尝试加载本地状态
         saved_state = state_manager.load_state()
+        council.finish_restore()  # 快照里已归档的会话以归档为准
         if saved_state:
             current_epoch = saved_state.get("current_epoch", 0)
             logger.info(f"🔄 Resumed from local: Epoch {current_epoch}")
@@ -191,17 +248,20 @@ async def lifespan(app: FastAPI):
             current_epoch = 1
             logger.info("🆕 Starting fresh from Epoch 1")
 
+    group_manager.rebuild_risk()  # 恢复的 pnl_history 一次向量化重算风险指标缓存
     epoch_start_time = datetime.now()
 
     # 合约区数据订阅 (全局推送给所有组的 engine)
     futures_feeder.subscribe(lambda prices: group_manager.update_prices(prices))
+    if ARENA_SHARDS > 0:
+        futures_feeder.subscribe(forward_shard_prices)
 
     # 启动后台任务
     # 每组的 feeder 在 assign_agent 时按需启动，这里启动已有组的 feeders
     await group_manager.start_all_feeders()
     futures_task = asyncio.create_task(futures_feeder.start())
     epoch_task = asyncio.create_task(epoch_loop())
-    autosave_task = asyncio.create_task(state_manager.auto_save_loop(lambda: current_epoch, save_all_state_to_redis))
+    autosave_task = asyncio.create_task(state_manager.auto_save_loop(lambda: current_epoch, state_persistence.flush))
 
     # 🧠 蜂巢大脑: 每 60 秒对每个组独立分析
     async def hive_mind_loop():
@@ -225,6 +285,9 @@ async def lifespan(app: FastAPI):
             await asyncio.sleep(600)  # 10 分钟
             try:
                 for group_id, group in group_manager.groups.items():
+                    # 复盘入场已满 review_interval 的 BUY (按到期时间出堆，未到期的不扫描)
+                    group.attribution.review_pending_trades(group.engine.current_prices)
+
                     # 运行归因分析
                     report = group.attribution.analyze()
                     
@@ -260,19 +323,21 @@ async def lifespan(app: FastAPI):
 
     # 💰 Price refresh loop: Update all position prices for accurate PnL calculation
     async def price_refresh_loop():
-        """每 60 秒刷新所有持仓代币的价格（用于准确的 PnL 计算）"""
+        """定期刷新所有持仓代币的价格（用于准确的 PnL 计算）"""
         while True:
-            await asyncio.sleep(60)  # 60秒 > DexScreener缓存30秒
+            await asyncio.sleep(PRICE_REFRESH_INTERVAL)  # > DexScreener缓存30秒
             try:
-                total_symbols = 0
-                for group_id, group in group_manager.groups.items():
-                    await group.engine.refresh_all_position_prices()
-                    total_symbols += len(group.engine.current_prices)
-                logger.info(f"💰 Refreshed prices for {total_symbols} symbols across {len(group_manager.groups)} groups")
+                updated = await group_manager.refresh_all_position_prices()
+                last = group_manager.price_refresher.stats().get("last_pass", {})
+                logger.info(
+                    f"💰 Refreshed prices for {updated}/{last.get('symbols', 0)} symbols "
+                    f"across {len(group_manager.groups)} groups in {last.get('duration_ms', 0)}ms"
+                )
             except Exception as e:
                 logger.error(f"Price refresh loop error: {e}")
 
     price_refresh_task = asyncio.create_task(price_refresh_loop())
+    observer_task = asyncio.create_task(observer_feed.run())
 
     # 📡 REMOVED: Price broadcasting (Pure Execution Layer)
     # Darwin Arena is a pure execution layer - agents fetch their own market data.
@@ -297,6 +362,9 @@ async def lifespan(app: FastAPI):
     # 🤖 Spawn demo bots so dashboard is never empty
     await bot_manager.spawn_bots()
 
+    # 🧪 策略沙盒进程池 (预热 worker，上传策略时不再冷启动)
+    await sandbox_pool.start()
+
     logger.info("✅ Arena Server ready!")
     logger.info(f"📊 Live dashboard: http://localhost:8888/live")
     logger.info(f"📦 Groups: {len(group_manager.groups)} | Group size: {group_manager.dynamic_group_size()}")
@@ -307,8 +375,8 @@ async def lifespan(app: FastAPI):
     logger.info("🛑 Shutting down Arena Server...")
 
     # 保存最终状态到本地和Redis
-    state_manager.save_state(current_epoch)
-    save_all_state_to_redis()
+    await state_manager.save_state_async(current_epoch)
+    await state_persistence.flush()
 
     group_manager.stop_all_feeders()
     bot_manager.stop()
@@ -319,6 +387,15 @@ async def lifespan(app: FastAPI):
     # price_broadcast_task is None (agents fetch their own prices)
     hive_task.cancel()
     attribution_task.cancel()
+    observer_task.cancel()
+    await order_pipeline.stop()
+    await sandbox_pool.stop()
+    await council.scorer.stop()
+    await council.flush_archive()
+    await close_clients()
+    await price_oracle.close()
+    for group in group_manager.groups.values():
+        group.engine.trade_history.close()
 
 
 app = FastAPI(
@@ -367,6 +444,7 @@ async def epoch_loop():
             epoch_start_time = datetime.now()
 
             logger.info(f"{'='*20} 🏁 EPOCH {current_epoch} STARTED @ {epoch_start_time} {'='*20}")
+            observer_feed.publish("epoch_start", epoch=current_epoch, started_at=epoch_start_time.isoformat())
 
             await asyncio.sleep(epoch_duration)
             await end_epoch()
@@ -399,9 +477,13 @@ async def broadcast_to_agents(message: dict):
 
 async def broadcast_to_group(group_id: int, message: dict, exclude: str = None):
     """广播消息给指定组内所有连接的 Agent (并发发送)"""
-    group = group_manager.get_group_by_id(group_id)
-    if not group:
-        return
+    if ARENA_SHARDS > 0:
+        members = order_pipeline.group_members(group_id)
+    else:
+        group = group_manager.get_group_by_id(group_id)
+        if not group:
+            return
+        members = group.members
 
     disconnected = []
     msg_json = json.dumps(message)
@@ -415,13 +497,103 @@ async def broadcast_to_group(group_id: int, message: dict, exclude: str = None):
                 disconnected.append(agent_id)
 
     # 过滤掉被排除的 agent
-    target_agents = [aid for aid in group.members if aid != exclude]
+    target_agents = [aid for aid in members if aid != exclude]
     await asyncio.gather(*[_send(aid) for aid in target_agents])
 
     for agent_id in disconnected:
         connected_agents.pop(agent_id, None)
 
 
+async def handle_post_trade(event: PostTradeEvent):
+    """成交后处理 (在 OrderPipeline 的 post-trade worker 中运行，不阻塞下单回执；队列满时可被丢弃)
+
+    归因已由管线在撮合时同步记录 (分片模式下在 worker 进程内)，这里只做通知：
+    1. Council 广播：让同组其他 Agents 看到这笔交易
+    2. 记录到 Council Logs（实时交易记录）
+    """
+    request, result, group = event.request, event.result, event.group
+    side_str = request.side.value
+    amount, fill_price, reason = request.amount, result.fill_price, request.reason
+    chain = request.chain if request.chain and request.chain != "unknown" else None
+
+    council_message = {
+        "type": "council_trade",
+        "agent_id": request.agent_id,
+        "symbol": request.symbol,
+        "side": side_str,
+        "amount": amount,
+        "price": fill_price,
+        "reason": reason,
+        "timestamp": datetime.now().isoformat(),
+        "chain": chain,
+        "contract_address": request.contract_address
+    }
+    # 广播给同组所有其他 Agents（排除发送者）
+    await broadcast_to_group(group.group_id, council_message, exclude=request.agent_id)
+
+    reason_str = ", ".join(reason) if isinstance(reason, list) else str(reason)
+    chain_str = f" on {chain.upper()}" if chain else ""
+    trade_content = f"💰 {side_str} ${amount:.0f} {request.symbol}{chain_str} @ ${fill_price:.6f}\n📊 Reason: {reason_str}"
+    await council.submit_message(
+        epoch=current_epoch,
+        agent_id=request.agent_id,
+        role=MessageRole.INSIGHT,  # 使用 INSIGHT 角色表示实时交易
+        content=trade_content
+    )
+
+
+# 📥 下单管线：每 Agent FIFO 队列 + 组内微批撮合，成交后处理异步进行
+# 分片模式 (DARWIN_ARENA_SHARDS=N)：各组在 N 个 worker 进程中撮合，这里只做路由与汇总
+if ARENA_SHARDS > 0:
+    order_pipeline = ShardRouter(ARENA_SHARDS, post_trade=handle_post_trade, journal_dir=TRADE_JOURNAL_DIR)
+    state_persistence.shards = order_pipeline  # 账户只在 worker 里：保存前经 RPC 拉取
+else:
+    order_pipeline = OrderPipeline(group_manager, post_trade=handle_post_trade)
+
+
+shard_price_tasks: set = set()  # 转发给 worker 的价格推送 (持有引用，避免任务被回收)
+
+
+def forward_shard_prices(prices: dict):
+    task = asyncio.ensure_future(order_pipeline.update_prices(prices))
+    shard_price_tasks.add(task)
+    task.add_done_callback(_shard_prices_done)
+
+
+def _shard_prices_done(task: asyncio.Task):
+    shard_price_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Shard price update failed: {task.exception()}")
+
+
+def arena_view():
+    """跨组视图 (排行榜 / 统计)：分片模式下为各 worker 汇总的归并结果"""
+    return order_pipeline if ARENA_SHARDS > 0 else group_manager
+
+
+async def sweep_before_promotion(winner_id: str, winner_code: str) -> Optional[str]:
+    """批量回测全体策略；赢家排名不高于当前 baseline 时返回 None (本轮不融合赢家代码)"""
+    strategies = collect_strategies(baseline_code=baseline_manager.current_baseline.get("strategy_code"))
+    strategies[winner_id] = winner_code
+    try:
+        rows = await sweep_in_subprocess(strategies, BASELINE_SWEEP_TIMEOUT, rounds=BASELINE_SWEEP_ROUNDS)
+    except Exception as e:
+        logger.warning(f"Backtest sweep failed ({type(e).__name__}: {e}) - promoting winner without sweep")
+        return winner_code
+
+    ranks = {row.name: row for row in rows}
+    winner, baseline = ranks.get(winner_id), ranks.get(BASELINE_NAME)
+    logger.info(f"🧪 Backtest sweep: {len(rows)} strategies, top 5:\n" + format_matrix(rows[:5]))
+    if winner is None or winner.status != "ok":
+        logger.info(f"🧪 Winner {winner_id} failed the sweep ({winner.error if winner else 'missing'}) - keeping baseline code")
+        return None
+    if baseline is not None and baseline.status == "ok" and baseline.rank < winner.rank:
+        logger.info(f"🧪 Winner {winner_id} ranked #{winner.rank} below baseline #{baseline.rank} - keeping baseline code")
+        return None
+    logger.info(f"🧪 Winner {winner_id} ranked #{winner.rank}/{len(rows)} (score {winner.composite_score})")
+    return winner_code
+
+
 async def end_epoch():
     """结束当前 Epoch — 每组独立评比+进化"""
     global current_epoch
@@ -429,19 +601,15 @@ async def end_epoch():
     logger.info(f"{'='*60}")
     logger.info(f"🏁 EPOCH {current_epoch} ENDED | {len(group_manager.groups)} groups")
     logger.info(f"{'='*60}")
+    observer_feed.publish("epoch_end", epoch=current_epoch)
 
-    # === 记录所有 Agent 的 PnL 历史（用于风险指标计算）===
-    for group_id, group in group_manager.groups.items():
-        for agent_id, account in group.engine.accounts.items():
-            current_pnl_percent = account.get_pnl_percent(group.engine.current_prices)
-            account.pnl_history.append(current_pnl_percent)
-            # 限制历史长度，避免内存无限增长
-            if len(account.pnl_history) > 100:
-                account.pnl_history = account.pnl_history[-100:]
-
-    # === 全局排行（跨组）用于 Ascension ===
-    global_rankings = group_manager.get_leaderboard()
-    group_manager.print_leaderboard()
+    # === 记录所有 Agent 的 PnL 历史（用于风险指标计算）+ 全局排行（跨组）用于 Ascension ===
+    # 分片模式下成交只发生在 worker 里：组内排名 / Hive 补丁 / 简报都由持有该组的 worker 结算
+    if ARENA_SHARDS > 0:
+        global_rankings, group_reports = await order_pipeline.end_epoch()
+    else:
+        global_rankings, group_reports = group_manager.end_epoch()
+        group_manager.print_leaderboard()
 
     if not global_rankings:
         return
@@ -473,8 +641,8 @@ async def end_epoch():
     all_hive_data = []
     winner_strategies = []
 
-    for group_id, group in group_manager.groups.items():
-        rankings = group.engine.get_leaderboard()
+    for group_id, report in group_reports.items():
+        rankings = [tuple(r) for r in report["rankings"]]
         if not rankings:
             continue
 
@@ -489,8 +657,7 @@ async def end_epoch():
         logger.info(f"  Group {group_id}: 🏆 {winner_id} | 💀 {losers}")
 
         # 收集 Hive Mind 数据
-        hive_patch = group.hive_mind.generate_patch()
-        all_hive_data.append(hive_patch)
+        all_hive_data.append(report["hive_patch"])
 
         # 收集赢家策略
         try:
@@ -525,7 +692,8 @@ async def end_epoch():
                 await broadcast_to_group(group_id, msg)
 
             results = await run_council_and_evolution(
-                engine=group.engine,
+                engine=None,
+                rankings=rankings,
                 council=council,
                 epoch=current_epoch,
                 winner_id=winner_id,
@@ -599,38 +767,11 @@ async def end_epoch():
     agent_summaries = {}
     recent_trades = []
     hive_stats = {}
-    try:
-        for group_id, group in group_manager.groups.items():
-            eng = group.engine
-            for sym, price in eng.current_prices.items():
-                market_briefing[sym] = round(price, 6)
-            for aid, account in eng.accounts.items():
-                pnl_pct = account.get_pnl_percent(eng.current_prices)
-                positions_list = {s: {"amount": round(p.amount, 4), "avg_price": round(p.avg_price, 6)}
-                                 for s, p in account.positions.items() if p.amount > 0}
-                agent_summaries[aid] = {
-                    "balance": round(account.balance, 2),
-                    "pnl_pct": round(pnl_pct, 2),
-                    "positions": positions_list
-                }
-
-        for group_id, group in group_manager.groups.items():
-            for t in list(group.engine.trade_history)[:15]:
-                recent_trades.append({
-                    "agent_id": t.get("agent_id"),
-                    "side": t.get("side"),
-                    "symbol": t.get("symbol"),
-                    "value": round(t.get("value", 0), 2),
-                    "reason": t.get("reason", []),
-                    "trade_pnl": t.get("trade_pnl")
-                })
-
-        for group_id, group in group_manager.groups.items():
-            alpha = group.hive_mind.analyze_alpha()
-            for tag, stats in alpha.items():
-                hive_stats[tag] = {"win_rate": stats.get("win_rate", 0), "avg_pnl": stats.get("avg_pnl", 0), "count": stats.get("count", 0)}
-    except Exception as e:
-        logger.error(f"Error building council briefing: {e}")
+    for report in group_reports.values():
+        market_briefing.update(report["prices"])
+        agent_summaries.update(report["agents"])
+        recent_trades.extend(report["recent_trades"])
+        hive_stats.update(report["hive_alpha"])
 
     await broadcast_to_agents({
         "type": "council_open",
@@ -723,6 +864,10 @@ async def end_epoch():
             )
             winner_strategy_code = global_winner_strategy["code"]
 
+        # 晋级前离线对比：赢家与全体策略、当前 baseline 在同一组场景上回测
+        if winner_strategy_code and BASELINE_SWEEP_ENABLED:
+            winner_strategy_code = await sweep_before_promotion(global_winner_id, winner_strategy_code)
+
         # 更新 baseline
         new_baseline = baseline_manager.update_baseline(
             epoch=current_epoch,
@@ -749,8 +894,8 @@ async def end_epoch():
         logger.error(traceback.format_exc())
 
     # 保存状态
-    state_manager.save_state(current_epoch)
-    save_all_state_to_redis()
+    await state_manager.save_state_async(current_epoch)
+    state_persistence.request_flush()
 
 
 # ========== 鉴权 API ==========
@@ -794,6 +939,7 @@ async def register_api_key(agent_id: str, request: Request):
     new_key = f"dk_{secrets.token_hex(16)}"
     API_KEYS_DB[new_key] = agent_id
     save_api_keys(API_KEYS_DB) # Save to disk
+    state_persistence.request_flush()
     
     logger.info(f"🔑 Generated new API Key for {agent_id} (IP: {client_ip}): {new_key}")
     return {
@@ -820,31 +966,27 @@ async def delete_agent(agent_id: str, admin_key: str = Header(None, alias="X-Adm
         del API_KEYS_DB[key]
         redis_state.delete_api_key(key)
 
-    # 2. 从 GroupManager 删除账户
+    # 2. 从 GroupManager 删除账户 (分片模式下同时从所属 worker 删除)
+    if ARENA_SHARDS > 0:
+        await order_pipeline.remove_agent(agent_id)
     group = group_manager.get_group(agent_id)
     if group:
         if agent_id in group.engine.accounts:
             del group.engine.accounts[agent_id]
+        if group.engine.lots is not None:
+            group.engine.lots.remove_agent(agent_id)
         if agent_id in group.agent_states:
             del group.agent_states[agent_id]
 
     # 3. 删除交易记录（从所有组）
-    for group in group_manager.groups.values():
-        group.engine.trade_history = [
-            t for t in group.engine.trade_history
-            if t.get("agent_id") != agent_id and t.get("agent") != agent_id
-        ]
+    group_manager.remove_agent_trades(agent_id)
 
-    # 4. 删除 Council 消息
-    for session in council.sessions.values():
-        session.messages = [m for m in session.messages if m.agent_id != agent_id]
-
-    if agent_id in council.contribution_scores:
-        del council.contribution_scores[agent_id]
+    # 4. 删除 Council 消息 (内存中的会话与磁盘归档) 与贡献值
+    await council.delete_agent(agent_id)
 
     # 5. 保存状态
     save_api_keys(API_KEYS_DB)
-    save_all_state_to_redis()
+    state_persistence.request_flush()
 
     logger.info(f"🗑️ Deleted agent: {agent_id}")
     return {"status": "success", "message": f"Agent {agent_id} deleted"}
@@ -853,28 +995,73 @@ async def delete_agent(agent_id: str, admin_key: str = Header(None, alias="X-Adm
 class StrategyUpload(BaseModel):
     code: str
 
+
+STRATEGY_DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+# 每个 Agent 已部署策略的任务序号；多个 worker 并行时旧任务可能晚于新任务完成，不能覆盖新策略
+deployed_strategy_seq: Dict[str, int] = {}
+strategy_deploy_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def deploy_validated_strategy(job):
+    """沙盒任务完成回调：验证通过则部署 (文件写入在线程中执行)
+
+    同一 Agent 的部署串行执行；序号不大于已部署任务的完成结果直接丢弃 (superseded)。
+    """
+    if not job.allowed:
+        logger.warning(f"❌ Strategy rejected for {job.agent_id} ({job.status}): {job.message}")
+        return
+    from evolution import deploy_strategy
+
+    lock = strategy_deploy_locks.setdefault(job.agent_id, asyncio.Lock())
+    async with lock:
+        current = deployed_strategy_seq.get(job.agent_id, 0)
+        if job.seq <= current:
+            job.status, job.allowed = "superseded", False
+            job.message = "Superseded by a newer strategy that is already deployed"
+            logger.info(f"⏭️ Dropping stale sandbox result for {job.agent_id} (job {job.job_id}, seq {job.seq} <= {current})")
+            return
+        deployed, message = await asyncio.to_thread(deploy_strategy, job.agent_id, job.code, STRATEGY_DATA_DIR)
+        if not deployed:
+            job.status, job.allowed, job.message = "error", False, message
+            logger.error(f"❌ Strategy deploy failed for {job.agent_id}: {message}")
+            return
+        deployed_strategy_seq[job.agent_id] = job.seq
+    logger.info(f"✅ Strategy validated and deployed for {job.agent_id} (job {job.job_id})")
+
+
+# 🧪 沙盒验证在独立 worker 进程中执行 (RLIMIT + 墙钟超时)，不阻塞事件循环
+sandbox_pool = SandboxPool(on_complete=deploy_validated_strategy)
+
+
+def _authorize_agent(x_agent_id: Optional[str], x_api_key: Optional[str]):
+    if not x_agent_id or not x_api_key:
+        raise HTTPException(status_code=401, detail="Missing Auth Headers")
+    if API_KEYS_DB.get(x_api_key) != x_agent_id:
+        raise HTTPException(status_code=403, detail="Invalid API Key")
+
+
 @app.post("/agent/strategy")
 async def upload_strategy(
     upload: StrategyUpload,
     x_agent_id: str = Header(None),
     x_api_key: str = Header(None),
-    skip_sandbox: bool = Query(False, description="Skip sandbox testing (admin only)")
+    skip_sandbox: bool = Query(False, description="Skip sandbox testing (admin only)"),
+    wait: bool = Query(False, description="Block until the sandbox job finishes (legacy synchronous response)"),
 ):
     """
     允许 Agent 上传最新的策略代码
 
-    🧪 新增：沙盒测试系统
+    🧪 沙盒测试系统
     - 自动验证语法、安全性、运行时错误
     - 回测预测性能
     - 测试通过才允许部署
-    """
-    if not x_agent_id or not x_api_key:
-        raise HTTPException(status_code=401, detail="Missing Auth Headers")
 
-    # 鉴权
-    stored_agent_id = API_KEYS_DB.get(x_api_key)
-    if stored_agent_id != x_agent_id:
-        raise HTTPException(status_code=403, detail="Invalid API Key")
+    验证在沙盒进程池中异步执行：立即返回 job_id，
+    通过 GET /agent/strategy/jobs/{job_id} 查询结果。wait=true 时等待结果 (旧接口行为)。
+    """
+    _authorize_agent(x_agent_id, x_api_key)
 
     # 基础格式检查
     if "class MyStrategy" not in upload.code:
@@ -882,38 +1069,41 @@ async def upload_strategy(
 
     # 🧪 沙盒测试（除非管理员跳过）
     if not skip_sandbox:
-        from evolution import validate_and_deploy_strategy
-
-        logger.info(f"🧪 Running sandbox tests for {x_agent_id}...")
+        try:
+            job = sandbox_pool.submit(x_agent_id, upload.code, rounds=10)
+        except SandboxQueueFull as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
 
-        data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
-        success, message, test_result = await validate_and_deploy_strategy(
-            agent_id=x_agent_id,
-            new_strategy_code=upload.code,
-            data_dir=data_dir,
-            min_backtest_rounds=10,
-        )
+        logger.info(f"🧪 Sandbox job {job.job_id} queued for {x_agent_id}")
+        if not wait:
+            return {
+                "status": "queued",
+                "job_id": job.job_id,
+                "status_url": f"/agent/strategy/jobs/{job.job_id}",
+            }
 
-        if not success:
-            logger.warning(f"❌ Strategy rejected for {x_agent_id}: {message}")
+        await sandbox_pool.wait(job.job_id)
+        if not job.allowed:
             raise HTTPException(
                 status_code=400,
                 detail={
                     "error": "Strategy validation failed",
-                    "message": message,
-                    "test_result": test_result.to_dict() if test_result else None,
+                    "message": job.message,
+                    "job_id": job.job_id,
+                    "test_result": job.result,
                 }
             )
 
-        logger.info(f"✅ Strategy validated and deployed for {x_agent_id}")
+        result = job.result or {}
         return {
             "status": "success",
             "message": "Strategy validated and deployed",
+            "job_id": job.job_id,
             "test_result": {
-                "predicted_pnl": test_result.predicted_pnl,
-                "avg_pnl_per_round": test_result.avg_pnl_per_round,
-                "win_rate": test_result.win_rate,
-                "backtest_rounds": test_result.backtest_rounds,
+                "predicted_pnl": result.get("predicted_pnl"),
+                "avg_pnl_per_round": result.get("avg_pnl_per_round"),
+                "win_rate": result.get("win_rate"),
+                "backtest_rounds": result.get("backtest_rounds"),
             }
         }
 
@@ -928,17 +1118,33 @@ async def upload_strategy(
         with open(save_path, "w") as f:
             f.write(upload.code)
 
+        deployed_strategy_seq[x_agent_id] = sandbox_pool.last_seq  # 之前排队的沙盒任务不再覆盖它
         logger.info(f"📥 Strategy saved for {x_agent_id} (no validation)")
         return {"status": "success", "message": "Strategy updated (sandbox skipped)"}
 
 
+@app.get("/agent/strategy/jobs/{job_id}")
+async def get_strategy_job(
+    job_id: str,
+    x_agent_id: str = Header(None),
+    x_api_key: str = Header(None),
+    include_log: bool = Query(False, description="Include the sandbox test log"),
+):
+    """查询沙盒验证任务状态：queued / running / passed / rejected / timeout / error"""
+    _authorize_agent(x_agent_id, x_api_key)
+    job = sandbox_pool.get(job_id)
+    if job is None or job.agent_id != x_agent_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict(include_log=include_log)
+
+
 # ========== WebSocket ==========
 
 @app.websocket("/ws/observer")
 async def observer_websocket(websocket: WebSocket):
     """
     观众 WebSocket 连接（无需鉴权）
-    用于 Dashboard 实时更新和观众统计
+    用于 Dashboard 实时更新和观众统计：先发快照，再推送排行 / 成交 / Epoch / 议事厅增量 (协议见 observer_feed.py)
     """
     observer_id = f"observer_{id(websocket)}"
 
@@ -948,8 +1154,8 @@ async def observer_websocket(websocket: WebSocket):
     logger.info(f"👁️ Observer connected: {observer_id} (Total observers: {len(connected_observers)})")
 
     try:
-        # 发送欢迎消息
-        await websocket.send_json({
+        # 欢迎消息 + 完整快照，之后由 observer_feed 推送增量并处理心跳 / resync
+        await observer_feed.serve(websocket, welcome={
             "type": "welcome",
             "message": "Welcome to Darwin Arena Live!",
             "epoch": current_epoch,
@@ -957,19 +1163,6 @@ async def observer_websocket(websocket: WebSocket):
             "connected_observers": len(connected_observers)
         })
 
-        # 保持连接，接收心跳
-        while True:
-            try:
-                data = await asyncio.wait_for(websocket.receive_json(), timeout=30.0)
-
-                # 处理心跳
-                if data.get("type") == "ping":
-                    await websocket.send_json({"type": "pong"})
-
-            except asyncio.TimeoutError:
-                # 30秒没有消息，发送心跳检查
-                await websocket.send_json({"type": "ping"})
-
     except WebSocketDisconnect:
         logger.info(f"👁️ Observer disconnected: {observer_id}")
     except Exception as e:
@@ -979,11 +1172,78 @@ async def observer_websocket(websocket: WebSocket):
         logger.info(f"👁️ Observer removed: {observer_id} (Total observers: {len(connected_observers)})")
 
 
+async def submit_order_leg(agent_id: str, leg: dict, source: str) -> tuple:
+    """
+    提交一笔订单 (WebSocket order / orders 与 REST 共用)
+
+    Returns:
+        (回执 {"success", "message", "fill_price"[, "error"]}, OrderResult 或 None)
+    """
+    global trade_count, total_volume
+    try:
+        symbol = leg["symbol"]
+        side = OrderSide(str(leg["side"]).upper())
+        amount = float(leg["amount"])
+        if not symbol or amount <= 0:
+            raise ValueError("symbol and a positive amount are required")
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return {"success": False, "error": "invalid_order", "message": f"Invalid order: {e}", "fill_price": 0.0}, None
+    reason = leg.get("reason") or []  # 🏷️ Get tags
+    if isinstance(reason, str):
+        reason = [reason]
+    chain = leg.get("chain", "unknown")  # 🔗 Get chain
+    contract_address = leg.get("contract_address", "")  # 📝 Get contract address
+
+    try:
+        result = await order_pipeline.submit(
+            agent_id, symbol, side, amount, reason, chain, contract_address, source=source
+        )
+    except OrderQueueFull as e:
+        return {"success": False, "error": "queue_full", "message": str(e), "fill_price": 0.0}, None
+
+    if result.pending:
+        # 分片超时：订单可能仍会成交，结果未知 (不是失败，客户端不应重试)，凭 order_id 查询
+        return {"success": None, "status": "pending", "order_id": result.order_id,
+                "message": result.message, "fill_price": 0.0}, result
+    if result.success:
+        trade_count += 1
+        total_volume += amount
+        # 归因 / Council 广播 / Council Logs 由 handle_post_trade 异步处理
+    return {"success": result.success, "message": result.message, "fill_price": result.fill_price}, result
+
+
+async def agent_account(engine, agent_id: str) -> dict:
+    """
+    Agent 当前的余额 / 持仓 / PnL
+    分片模式下从所属 worker 读取 (前端进程的 engine 不撮合，其中的账户是过期的)
+    """
+    if ARENA_SHARDS > 0:
+        account = await order_pipeline.get_account(agent_id)
+        if account is None:
+            raise LookupError(f"No account for {agent_id} on its shard")
+        return account
+    return {
+        "balance": engine.get_balance(agent_id),
+        "positions": engine.get_positions(agent_id),
+        "pnl": engine.calculate_pnl(agent_id) if agent_id in engine.agents else 0,
+    }
+
+
+async def account_snapshot(engine, agent_id: str, result=None) -> dict:
+    """回执附带的余额与持仓 (分片模式下优先用 worker 随回执带回的，否则向 worker 查询)"""
+    if result is not None and result.balance is not None and result.positions is not None:
+        return {"balance": result.balance, "positions": result.positions}
+    try:
+        account = await agent_account(engine, agent_id)
+    except Exception as e:
+        logger.warning(f"Account lookup failed for {agent_id}: {e}")
+        return {"balance": None, "positions": None}
+    return {"balance": account["balance"], "positions": account["positions"]}
+
+
 @app.websocket("/ws/{agent_id}")
 async def websocket_endpoint(websocket: WebSocket, agent_id: str, api_key: str = Query(None)):
     """Agent WebSocket 连接 (带鉴权)"""
-    global trade_count, total_volume
-    
     # === 鉴权逻辑 (Auth Logic) ===
     is_authenticated = False
     
@@ -1007,6 +1267,9 @@ async def websocket_endpoint(websocket: WebSocket, agent_id: str, api_key: str =
     # 分配到组 (GroupManager 自动分配代币池)
     group = await group_manager.assign_agent(agent_id)
     engine = group.engine  # 使用该组的 MatchingEngine
+    group_id = group.group_id
+    if ARENA_SHARDS > 0:
+        group_id = (await order_pipeline.assign_agent(agent_id)).group_id  # 账户在所属 worker 上
 
     logger.info(f"🤖 Agent connected: {agent_id} → Group {group.group_id} ({group.token_symbols}) (Total: {len(connected_agents)})")
 
@@ -1014,14 +1277,15 @@ async def websocket_endpoint(websocket: WebSocket, agent_id: str, api_key: str =
     baseline = baseline_manager.get_baseline_for_agent(agent_id)
 
     # 发送欢迎消息 (带组信息 + baseline)
+    account = await account_snapshot(engine, agent_id)
     await websocket.send_json({
         "type": "welcome",
         "agent_id": agent_id,
         "epoch": current_epoch,
-        "group_id": group.group_id,
+        "group_id": group_id,
         # "tokens": [],  # 移除 - agents 可以交易任何代币
-        "balance": engine.get_balance(agent_id),
-        "positions": engine.get_positions(agent_id),
+        "balance": account["balance"],
+        "positions": account["positions"],
         # "prices": {},  # 移除 - 价格按需获取
         "baseline": baseline  # 🧬 最新最优策略
     })
@@ -1029,130 +1293,122 @@ async def websocket_endpoint(websocket: WebSocket, agent_id: str, api_key: str =
     # Price updates are handled by group-level broadcast (see startup)
     # No per-agent feeder subscription needed — scales to 10K+ agents
 
+    async def send(reply: dict, request_id=None):
+        if request_id is not None:
+            reply["id"] = request_id
+        await websocket.send_json(reply)
+
+    async def handle(data: dict, request_id=None):
+        """处理一个请求；回执带上请求的 id (如有)"""
+        msg_type = data.get("type")
+
+        if msg_type == "order":
+            reply, result = await submit_order_leg(agent_id, data, source="ws")
+            await send({"type": "order_result", **reply, **(await account_snapshot(engine, agent_id, result))}, request_id)
+
+        elif msg_type == "orders":
+            # 批量下单：各笔按顺序进入该 Agent 的 FIFO 队列，一帧返回逐笔回执
+            legs = data.get("orders")
+            if not isinstance(legs, list) or not legs or len(legs) > ORDER_BATCH_MAX_LEGS:
+                await send({"type": "orders_result", "success": False, "error": "invalid_batch",
+                            "message": f"orders must be a list of 1-{ORDER_BATCH_MAX_LEGS} orders", "results": []},
+                           request_id)
+                return
+            replies = await asyncio.gather(*(submit_order_leg(agent_id, leg, source="ws") for leg in legs))
+            last = next((result for _, result in reversed(replies) if result is not None), None)
+            await send({
+                "type": "orders_result",
+                "success": all(reply["success"] for reply, _ in replies),
+                "results": [reply for reply, _ in replies],
+                **(await account_snapshot(engine, agent_id, last)),
+            }, request_id)
+
+        elif msg_type == "get_state":
+            try:
+                account = await agent_account(engine, agent_id)
+            except Exception as e:
+                await send({"type": "error", "message": f"State unavailable: {e}"}, request_id)
+                return
+            await send({"type": "state", **account}, request_id)
+
+        elif msg_type == "order_status":
+            # 查询未决订单 (分片超时后回执里的 order_id)
+            status = order_pipeline.order_status(data.get("order_id")) if ARENA_SHARDS > 0 else None
+            if status is None or status["agent_id"] != agent_id:
+                status = {"order_id": data.get("order_id"), "status": "not_found"}
+            await send({"type": "order_status", **status}, request_id)
+
+        elif msg_type == "council_submit":
+            role = MessageRole(data["role"])
+            content = data["content"]
+            msg = await council.submit_message(
+                current_epoch, agent_id, role, content
+            )
+            await send({
+                "type": "council_submitted",
+                "success": msg is not None,
+                "score": msg.score if msg else 0
+            }, request_id)
+            # Broadcast this message to ALL other agents so they can discuss
+            if msg:
+                await broadcast_to_agents({
+                    "type": "council_message",
+                    "epoch": current_epoch,
+                    "agent_id": agent_id,
+                    "role": role.value,
+                    "content": content,
+                    "score": msg.score
+                })
+
+        # 兼容旧的 chat 消息 -> 自动转为 Council Insight
+        elif msg_type == "chat":
+            content = data.get("message", "")
+            if content:
+                # 默认作为 INSIGHT 记录
+                await council.submit_message(
+                    current_epoch, agent_id, MessageRole.INSIGHT, content
+                )
+                # 可以在这里广播给其他 Agent，如果需要群聊功能
+                # await broadcast_to_agents({...})
+
+        elif request_id is not None:
+            await send({"type": "error", "message": f"Unknown message type: {msg_type}"}, request_id)
+
+    # 带 "id" 的请求并发处理 (同一连接上可流水线多笔订单 / 查询)，回执带回同一 id；
+    # 不带 id 的旧客户端仍逐条处理，回执顺序与请求顺序一致
+    inflight = asyncio.Semaphore(WS_MAX_INFLIGHT)
+    pending: set = set()
+
+    async def handle_tagged(data: dict):
+        try:
+            await handle(data, data["id"])
+        except Exception as e:
+            logger.error(f"WebSocket request error for {agent_id}: {e}")
+            try:
+                await send({"type": "error", "message": str(e)}, data["id"])
+            except Exception:
+                pass  # 连接已断开
+        finally:
+            inflight.release()
+
     try:
         while True:
             data = await websocket.receive_json()
-            
-            if data["type"] == "order":
-                symbol = data["symbol"]
-                # Support both uppercase and lowercase side values
-                side_str = data["side"].upper()
-                side = OrderSide.BUY if side_str == "BUY" else OrderSide.SELL
-                amount = float(data["amount"])
-                reason = data.get("reason", []) # 🏷️ Get tags
-                chain = data.get("chain", "unknown")  # 🔗 Get chain
-                contract_address = data.get("contract_address", "")  # 📝 Get contract address
-
-                success, msg, fill_price = await engine.execute_order(
-                    agent_id, symbol, side, amount, reason, chain, contract_address
-                )
-                
-                if success:
-                    trade_count += 1
-                    total_volume += amount
-                    
-                    # 📊 记录到归因分析器
-                    trade_record = {
-                        "agent_id": agent_id,
-                        "symbol": symbol,
-                        "side": side_str,
-                        "amount": amount,
-                        "price": fill_price,
-                        "value": amount if side_str == "BUY" else amount * fill_price,
-                        "reason": reason,
-                        "time": datetime.now().isoformat()
-                    }
-                    
-                    # 如果是 SELL，从 trade_history 获取 trade_pnl
-                    if side_str == "SELL" and engine.trade_history:
-                        last_trade = engine.trade_history[0]
-                        if last_trade.get("agent_id") == agent_id and last_trade.get("symbol") == symbol:
-                            trade_record["trade_pnl"] = last_trade.get("trade_pnl")
-                    
-                    group.attribution.record_trade(trade_record)
-                    
-                    # 🗣️ Council 广播：让其他 Agents 看到这笔交易
-                    council_message = {
-                        "type": "council_trade",
-                        "agent_id": agent_id,
-                        "symbol": symbol,
-                        "side": side_str,
-                        "amount": amount,
-                        "price": fill_price,
-                        "reason": reason,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    
-                    # 广播给同组所有其他 Agents（排除发送者）
-                    await broadcast_to_group(group.group_id, council_message, exclude=agent_id)
-                    
-                    # 📝 记录到 Council Logs（实时交易记录）
-                    reason_str = ", ".join(reason) if isinstance(reason, list) else str(reason)
-                    trade_content = f"💰 {side_str} ${amount:.0f} {symbol} @ ${fill_price:.6f}\n📊 Reason: {reason_str}"
-                    await council.submit_message(
-                        epoch=current_epoch,
-                        agent_id=agent_id,
-                        role=MessageRole.INSIGHT,  # 使用 INSIGHT 角色表示实时交易
-                        content=trade_content
-                    )
-                
-                await websocket.send_json({
-                    "type": "order_result",
-                    "success": success,
-                    "message": msg,
-                    "fill_price": fill_price,
-                    "balance": engine.get_balance(agent_id),
-                    "positions": engine.get_positions(agent_id)
-                })
-            
-            elif data["type"] == "get_state":
-                state = engine.agents.get(agent_id)
-                pnl = engine.calculate_pnl(agent_id) if state else 0
-                await websocket.send_json({
-                    "type": "state",
-                    "balance": engine.get_balance(agent_id),
-                    "positions": engine.get_positions(agent_id),
-                    "pnl": pnl
-                })
-            
-            elif data["type"] == "council_submit":
-                role = MessageRole(data["role"])
-                content = data["content"]
-                msg = await council.submit_message(
-                    current_epoch, agent_id, role, content
-                )
-                await websocket.send_json({
-                    "type": "council_submitted",
-                    "success": msg is not None,
-                    "score": msg.score if msg else 0
-                })
-                # Broadcast this message to ALL other agents so they can discuss
-                if msg:
-                    await broadcast_to_agents({
-                        "type": "council_message",
-                        "epoch": current_epoch,
-                        "agent_id": agent_id,
-                        "role": role.value,
-                        "content": content,
-                        "score": msg.score
-                    })
-            
-            # 兼容旧的 chat 消息 -> 自动转为 Council Insight
-            elif data["type"] == "chat":
-                content = data.get("message", "")
-                if content:
-                    # 默认作为 INSIGHT 记录
-                    await council.submit_message(
-                        current_epoch, agent_id, MessageRole.INSIGHT, content
-                    )
-                    # 可以在这里广播给其他 Agent，如果需要群聊功能
-                    # await broadcast_to_agents({...})
-                
+            if "id" in data:
+                await inflight.acquire()  # 在途请求达到上限时暂停读取 (背压)
+                task = asyncio.create_task(handle_tagged(data))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                continue
+            await handle(data)
+
     except WebSocketDisconnect:
         logger.info(f"🤖 Agent disconnected: {agent_id}")
     except Exception as e:
         logger.error(f"WebSocket error for {agent_id}: {e}")
     finally:
+        for task in list(pending):
+            task.cancel()
         connected_agents.pop(agent_id, None)
 
 
@@ -1254,68 +1510,29 @@ async def api_trade(
         engine = group.engine
         side = OrderSide.BUY if side_str == "BUY" else OrderSide.SELL
 
-        # Execute order
-        success, msg, fill_price = await engine.execute_order(
-            agent_id, symbol, side, amount, reason, chain, contract_address
-        )
+        # Execute order (经由下单管线；归因 / Council 广播 / Council Logs 异步处理)
+        try:
+            result = await order_pipeline.submit(
+                agent_id, symbol, side, amount, reason, chain, contract_address, source="rest"
+            )
+        except OrderQueueFull as e:
+            raise HTTPException(status_code=429, detail={"error": "queue_full", "detail": str(e)})
+        success, msg, fill_price = result.success, result.message, result.fill_price
+
+        if result.pending:
+            # 分片超时：结果未知，凭 order_id 查询 GET /api/orders/{order_id}，不要重试
+            return {"success": None, "status": "pending", "order_id": result.order_id, "message": msg,
+                    "fill_price": 0.0, **(await account_snapshot(engine, agent_id))}
 
         if success:
             trade_count += 1
             total_volume += amount
 
-            # Record to attribution
-            trade_record = {
-                "agent_id": agent_id,
-                "symbol": symbol,
-                "side": side_str,
-                "amount": amount,
-                "price": fill_price,
-                "value": amount if side_str == "BUY" else amount * fill_price,
-                "reason": reason,
-                "time": datetime.now().isoformat(),
-                "chain": chain,
-                "contract_address": contract_address
-            }
-
-            if side_str == "SELL" and engine.trade_history:
-                last_trade = engine.trade_history[0]
-                if last_trade.get("agent_id") == agent_id and last_trade.get("symbol") == symbol:
-                    trade_record["trade_pnl"] = last_trade.get("trade_pnl")
-
-            group.attribution.record_trade(trade_record)
-
-            # Broadcast to council
-            council_message = {
-                "type": "council_trade",
-                "agent_id": agent_id,
-                "symbol": symbol,
-                "side": side_str,
-                "amount": amount,
-                "price": fill_price,
-                "reason": reason,
-                "timestamp": datetime.now().isoformat(),
-                "chain": chain,
-                "contract_address": contract_address
-            }
-            await broadcast_to_group(group.group_id, council_message, exclude=agent_id)
-
-            # Record to Council logs
-            reason_str = ", ".join(reason) if isinstance(reason, list) else str(reason)
-            chain_str = f" on {chain.upper()}" if chain else ""
-            trade_content = f"💰 {side_str} ${amount:.0f} {symbol}{chain_str} @ ${fill_price:.6f}\n📊 Reason: {reason_str}"
-            await council.submit_message(
-                epoch=current_epoch,
-                agent_id=agent_id,
-                role=MessageRole.INSIGHT,
-                content=trade_content
-            )
-
         return {
             "success": success,
             "message": msg,
             "fill_price": fill_price,
-            "balance": engine.get_balance(agent_id),
-            "positions": engine.get_positions(agent_id)
+            **(await account_snapshot(engine, agent_id, result)),
         }
     except HTTPException:
         raise
@@ -1325,6 +1542,54 @@ async def api_trade(
         raise HTTPException(status_code=500, detail={"error": "Internal server error", "detail": str(e)})
 
 
+@app.post("/api/trades/batch")
+async def api_trades_batch(
+    request: Request,
+    api_key: str = Header(None, alias="Authorization")
+):
+    """
+    REST 批量下单：鉴权一次，各笔按顺序进入该 Agent 所在组的 FIFO 队列 (同组微批撮合)，
+    一次返回逐笔回执，调仓 N 个持仓只需一个往返
+
+    Headers:
+        Authorization: Bearer <api_key> or just <api_key>
+
+    Body:
+        {"orders": [{"symbol", "side", "amount", "reason", "chain", "contract_address"}, ...]}
+
+    Returns:
+        {"success": 全部成交, "results": [{"success", "message", "fill_price"[, "error"]}, ...], "balance", "positions"}
+    """
+    if api_key:
+        api_key = api_key.replace("Bearer ", "").strip()
+    if not api_key:
+        raise HTTPException(status_code=401, detail="Missing API key in Authorization header")
+    agent_id = API_KEYS_DB.get(api_key)
+    if not agent_id:
+        raise HTTPException(status_code=403, detail="Invalid API key")
+    agent_last_activity[agent_id] = datetime.now()
+
+    try:
+        body = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    legs = body.get("orders") if isinstance(body, dict) else None
+    if not isinstance(legs, list) or not legs or len(legs) > ORDER_BATCH_MAX_LEGS:
+        raise HTTPException(status_code=400, detail=f"orders must be a list of 1-{ORDER_BATCH_MAX_LEGS} orders")
+
+    group = group_manager.get_group(agent_id)
+    if not group:
+        group = await group_manager.assign_agent(agent_id)
+
+    replies = await asyncio.gather(*(submit_order_leg(agent_id, leg, source="rest") for leg in legs))
+    last = next((result for _, result in reversed(replies) if result is not None), None)
+    return {
+        "success": all(reply["success"] for reply, _ in replies),
+        "results": [reply for reply, _ in replies],
+        **(await account_snapshot(group.engine, agent_id, last)),
+    }
+
+
 @app.get("/api/agent/{agent_id}/status")
 async def api_agent_status(agent_id: str, api_key: str = Header(None, alias="Authorization")):
     """
@@ -1353,21 +1618,44 @@ async def api_agent_status(agent_id: str, api_key: str = Header(None, alias="Aut
     if not group:
         raise HTTPException(status_code=404, detail="Agent not found")
 
-    engine = group.engine
-    balance = engine.get_balance(agent_id)
-    positions = engine.get_positions(agent_id)
-    pnl = engine.calculate_pnl(agent_id)
+    group_id = group.group_id
+    if ARENA_SHARDS > 0:
+        group_id = (await order_pipeline.assign_agent(agent_id)).group_id
+    try:
+        account = await agent_account(group.engine, agent_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Account unavailable: {e}")
 
     return {
         "agent_id": agent_id,
-        "balance": balance,
-        "positions": positions,
-        "pnl": pnl,
-        "group_id": group.group_id,
+        "balance": account["balance"],
+        "positions": account["positions"],
+        "pnl": account["pnl"],
+        "group_id": group_id,
         "epoch": current_epoch
     }
 
 
+@app.get("/api/orders/{order_id}")
+async def api_order_status(order_id: str, api_key: str = Header(None, alias="Authorization")):
+    """
+    查询未决订单的状态 (分片超时后回执里的 order_id)
+
+    Returns:
+        {"order_id", "status": "pending" | "filled" | "rejected" | "unknown", ...}
+    """
+    if api_key:
+        api_key = api_key.replace("Bearer ", "").strip()
+    agent_id = API_KEYS_DB.get(api_key) if api_key else None
+    if not agent_id:
+        raise HTTPException(status_code=401, detail="Missing or invalid API key")
+
+    status = order_pipeline.order_status(order_id) if ARENA_SHARDS > 0 else None
+    if status is None or status["agent_id"] != agent_id:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return status
+
+
 @app.post("/api/council/share")
 async def api_council_share(
     request: Request,
@@ -1563,50 +1851,79 @@ async def get_history():
 
 
 @app.get("/trades")
-async def get_trades():
-    """Get recent trade history"""
-    return list(engine.trade_history)
-
-
-@app.get("/leaderboard")
-async def get_leaderboard():
-    """获取排行榜（包含风险指标和在线状态）"""
-    from arena_server.metrics import calculate_composite_score
+async def get_trades(
+    request: Request,
+    agent_id: Optional[str] = None,
+    symbol: Optional[str] = None,
+    since: Optional[float] = Query(None, description="Unix timestamp (inclusive)"),
+    until: Optional[float] = Query(None, description="Unix timestamp (exclusive)"),
+    limit: Optional[int] = Query(None, ge=1, le=5000),
+):
+    """Get recent trade history (带任一过滤参数时从成交日志深度扫描)"""
+    def build(headers):
+        if agent_id is None and symbol is None and since is None and until is None and limit is None:
+            return list(engine.trade_history)
+        return group_manager.scan_trades(
+            since=since, until=until, agent_id=agent_id, symbol=symbol, limit=limit or 100,
+        )
 
-    rankings = engine.get_leaderboard()
+    return cached_json(request, "/trades", group_manager.trades_version, build)
 
-    # 统计总注册数和在线数
-    total_registered = len(API_KEYS_DB)
 
-    # 判断在线：WebSocket 连接 或 最近 5 分钟内有 REST API 活动
+def online_agent_ids() -> set:
+    """判断在线：WebSocket 连接 或 最近 5 分钟内有 REST API 活动"""
     now = datetime.now()
-    online_agents = set()
-    for agent_id in connected_agents.keys():
-        online_agents.add(agent_id)
+    online_agents = set(connected_agents.keys())
     for agent_id, last_time in agent_last_activity.items():
         if (now - last_time).total_seconds() < 300:  # 5 分钟
             online_agents.add(agent_id)
+    return online_agents
+
+
+def observer_state() -> dict:
+    """观众推送流的当前状态 (排行 + 计数)；风险指标仍由 /leaderboard 提供"""
+    online_agents = online_agent_ids()
+    return {
+        "epoch": current_epoch,
+        "rankings": [
+            (agent_id, pnl_percent, total_value, agent_id in online_agents)
+            for agent_id, pnl_percent, total_value in arena_view().get_leaderboard()
+        ],
+        "stats": {
+            "total_registered": len(API_KEYS_DB),
+            "online_count": len(online_agents),
+            "connected_agents": len(connected_agents),
+            "connected_observers": len(connected_observers),
+            "trade_count": trade_count,
+            "total_volume": round(total_volume, 2),
+        },
+    }
 
-    # 为每个 Agent 计算风险指标
+
+@app.get("/leaderboard")
+async def get_leaderboard(request: Request):
+    """获取排行榜（包含风险指标和在线状态；风险指标读 Epoch 结束时维护的缓存）"""
+    key = (arena_view().version, engine.version, current_epoch, len(API_KEYS_DB), len(connected_agents))
+    return cached_json(request, "/leaderboard", key, build_leaderboard, ttl=RESPONSE_CACHE_LIVE_TTL)
+
+
+def build_leaderboard(headers: dict = None) -> dict:
+    rankings = arena_view().get_leaderboard()
+
+    # 统计总注册数和在线数
+    total_registered = len(API_KEYS_DB)
+    online_agents = online_agent_ids()
+
+    # 为每个 Agent 计算风险指标 (分片模式下由所属 worker 上报)
     enriched_rankings = []
     for i, r in enumerate(rankings):
         agent_id, pnl_percent, total_value = r
-        account = engine.accounts.get(agent_id)
 
         # 检查是否在线（WebSocket 或最近 5 分钟内活跃）
         is_online = agent_id in online_agents
 
-        if account and account.pnl_history and len(account.pnl_history) >= 2:
-            # 计算累计资产价值历史
-            values = [10000.0]  # 初始资金
-            cumulative_value = 10000.0
-            for pnl in account.pnl_history:
-                cumulative_value = cumulative_value * (1 + pnl / 100)
-                values.append(cumulative_value)
-
-            cumulative_return = sum(account.pnl_history)
-            metrics = calculate_composite_score(account.pnl_history, values, cumulative_return)
-        else:
+        metrics = arena_view().leaderboard_risk(agent_id)
+        if metrics is None:
             metrics = {
                 "sharpe_ratio": 0.0,
                 "sortino_ratio": 0.0,
@@ -1643,49 +1960,17 @@ async def get_prices():
 
 
 @app.get("/stats")
-async def get_stats():
+async def get_stats(request: Request):
     """获取系统统计信息（包含风险指标）"""
-    rankings = engine.get_leaderboard()
+    key = (arena_view().version, engine.version, current_epoch, trade_count, council.version)
+    return cached_json(request, "/stats", key, build_stats, ttl=RESPONSE_CACHE_LIVE_TTL)
 
-    # 计算全局风险指标
-    from arena_server.metrics import calculate_composite_score
 
-    all_agents = list(engine.accounts.values())
-    if all_agents:
-        # 收集所有历史 PnL
-        all_pnls = []
-        all_values = [10000.0]
-        cumulative_value = 10000.0
+def build_stats(headers: dict = None) -> dict:
+    rankings = arena_view().get_top(1)
 
-        for account in all_agents:
-            for pnl in account.pnl_history:
-                all_pnls.append(pnl)
-                cumulative_value = cumulative_value * (1 + pnl / 100)
-                all_values.append(cumulative_value)
-
-        if all_pnls:
-            cumulative_return = sum(all_pnls)
-            global_metrics = calculate_composite_score(all_pnls, all_values, cumulative_return)
-        else:
-            global_metrics = {
-                "composite_score": 0.0,
-                "sharpe_ratio": 0.0,
-                "sortino_ratio": 0.0,
-                "max_drawdown": 0.0,
-                "calmar_ratio": 0.0,
-                "win_rate": 0.0,
-                "volatility": 0.0
-            }
-    else:
-        global_metrics = {
-            "composite_score": 0.0,
-            "sharpe_ratio": 0.0,
-            "sortino_ratio": 0.0,
-            "max_drawdown": 0.0,
-            "calmar_ratio": 0.0,
-            "win_rate": 0.0,
-            "volatility": 0.0
-        }
+    # 全局风险指标：Epoch 结束时由各 Agent 的缓存摘要合并得到
+    global_metrics = arena_view().population_risk()
 
     return {
         "epoch": current_epoch,
@@ -1695,7 +1980,16 @@ async def get_stats():
         "total_agents": group_manager.total_agents,
         "trade_count": trade_count,
         "total_volume": total_volume,
-        "groups": group_manager.get_stats(),
+        "groups": arena_view().get_stats(),
+        "price_oracle": price_oracle.stats(),
+        "order_pipeline": order_pipeline.stats(),
+        "sandbox_pool": sandbox_pool.stats(),
+        "council_scoring": council.scoring_stats(),
+        "observer_feed": observer_feed.stats(),
+        "response_cache": response_cache.stats(),
+        "llm": llm_stats(),
+        "persistence": state_persistence.stats(),
+        "state_snapshot": state_manager.stats(),
         "top_agent": rankings[0][0] if rankings else None,
         "top_pnl": rankings[0][1] if rankings else 0,
         "risk_metrics": global_metrics,
@@ -1708,8 +2002,14 @@ async def get_stats():
 
 
 @app.get("/hive-mind")
-async def get_hive_mind_status():
+async def get_hive_mind_status(request: Request):
     """获取蜂巢大脑状态 (每组独立的 Alpha 因子 & 策略补丁)"""
+    # 趋势窗口随时间滑动，与 HiveMind 报告缓存同一有效期
+    key = (current_epoch, tuple((gid, g.size, g.hive_mind.version) for gid, g in group_manager.groups.items()))
+    return cached_json(request, "/hive-mind", key, build_hive_mind, ttl=HIVE_MIND_REPORT_TTL)
+
+
+def build_hive_mind(headers: dict = None) -> dict:
     try:
         group_reports = {}
         for group_id, group in group_manager.groups.items():
@@ -1732,11 +2032,15 @@ async def get_hive_mind_status():
 
 
 @app.get("/groups")
-async def get_groups():
+async def get_groups(request: Request):
     """获取所有竞技小组信息"""
+    return cached_json(request, "/groups", engine.version, build_groups)
+
+
+def build_groups(headers: dict = None) -> dict:
     result = {}
     for gid, group in group_manager.groups.items():
-        rankings = group.engine.get_leaderboard()
+        rankings = group.engine.get_top(10)
         result[gid] = {
             # "tokens": [],  # 移除 - 不限制代币
             "members": list(group.members),
@@ -1744,7 +2048,7 @@ async def get_groups():
             "max_size": group_manager.dynamic_group_size(),
             "leaderboard": [
                 {"agent_id": r[0], "pnl": r[1], "total_value": r[2]}
-                for r in rankings[:10]
+                for r in rankings
             ]
         }
     return {
@@ -1756,63 +2060,53 @@ async def get_groups():
 
 
 @app.get("/council/{epoch}")
-async def get_council_session(epoch: int):
-    session = council.sessions.get(epoch)
-    if not session and council.sessions:
+async def get_council_session(
+    epoch: int,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(COUNCIL_PAGE_SIZE, ge=1, le=1000),
+):
+    if not council.has_session(epoch):
+        epochs = council.epochs()
+        if not epochs:
+            return {
+                "epoch": epoch,
+                "is_open": True,
+                "winner": None,
+                "messages": [],
+                "next_cursor": None,
+                "total": 0,
+            }
         # Fall back to most recent session if requested epoch has no data
-        latest_epoch = max(council.sessions.keys())
-        session = council.sessions[latest_epoch]
-        epoch = latest_epoch
-    if not session:
-        return {
-            "epoch": epoch,
-            "is_open": True,
-            "winner": None,
-            "messages": []
-        }
-    
+        epoch = epochs[-1]
+
+    try:
+        page = council.page(epoch, cursor=cursor, limit=limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
         "epoch": epoch,
-        "is_open": session.is_open,
-        "winner": session.winner_id,
-        "messages": [
-            {
-                "id": m.id,
-                "agent_id": m.agent_id,
-                "role": m.role.value,
-                "content": m.content,
-                "score": m.score,
-                "timestamp": m.timestamp.isoformat()
-            }
-            for m in session.messages
-        ]
+        **council.session_info(epoch),
+        **page,
     }
 
 
 @app.get("/council-logs")
-async def get_council_logs():
-    """获取所有 Council 消息（用于前端显示）"""
-    try:
-        all_messages = []
-
-        # 收集所有 epoch 的消息
-        for epoch, session in sorted(council.sessions.items(), reverse=True):
-            for m in session.messages:
-                all_messages.append({
-                    "id": m.id,
-                    "epoch": epoch,
-                    "agent_id": m.agent_id,
-                    "role": m.role.value,
-                    "content": m.content,
-                    "score": m.score,
-                    "timestamp": m.timestamp.isoformat()
-                })
+async def get_council_logs(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+):
+    """获取最近的 Council 消息 (新 → 旧，用于前端显示)；下一页游标放在 X-Next-Cursor 响应头"""
+    def build(headers):
+        page = council.recent(limit=limit, cursor=cursor)
+        if page["next_cursor"]:
+            headers["X-Next-Cursor"] = page["next_cursor"]
+        return page["messages"]
 
-        # 返回最近 50 条消息
-        return all_messages[:50]
-    except Exception as e:
-        logger.error(f"Council logs error: {e}")
-        return []
+    try:
+        return cached_json(request, "/council-logs", council.version, build)
+    except InvalidCursor as e:  # 构建失败不会写入缓存
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.get("/ascension/{agent_id}")
@@ -1826,9 +2120,14 @@ async def get_ascension_progress(agent_id: str):
 
 
 @app.get("/ascension")
-async def get_all_ascension():
+async def get_all_ascension(request: Request):
     """获取所有 Agent 的升天进度（只显示在线 Agent）"""
-    rankings = engine.get_leaderboard()
+    key = (arena_view().version, current_epoch, len(connected_agents))
+    return cached_json(request, "/ascension", key, build_ascension, ttl=RESPONSE_CACHE_LIVE_TTL)
+
+
+def build_ascension(headers: dict = None) -> dict:
+    rankings = arena_view().get_leaderboard()
     now = datetime.now()
 
     # Filter to only show online agents (WebSocket or REST API activity within 5 minutes)
@@ -2144,12 +2443,12 @@ Or visit: https://www.darwinx.fun
 
 
 @app.get("/baseline")
-async def get_baseline_info():
+async def get_baseline_info(request: Request):
     """
     返回当前 baseline 的详细信息
     供用户查看最新的集体进化状态
     """
-    try:
+    def build(headers):
         baseline = baseline_manager.get_baseline_for_agent("api_user")
 
         return {
@@ -2160,6 +2459,11 @@ async def get_baseline_info():
             "message": baseline.get('message', ''),
             "history": baseline_manager.get_performance_comparison()[-10:]  # 最近 10 个版本
         }
+
+    # 进化产生新版本、回滚改变当前版本，两者都会换键
+    key = (baseline_manager.get_current_version(), len(baseline_manager.baseline_history))
+    try:
+        return cached_json(request, "/baseline", key, build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -2689,6 +2993,7 @@ async def debug_deposit(agent_id: str, amount: float = 1000.0):
     old_balance = account.balance
     account.balance += amount
     account.initial_balance = account.balance  # Reset initial for clean PnL
+    engine.mark_account_dirty(agent_id)
     
     logger.info(f"💰 [DEBUG] Deposited ${amount} to {agent_id}: ${old_balance:.2f} -> ${account.balance:.2f}")
     return {
@@ -2729,7 +3034,7 @@ async def purge_test_agents():
         group.stop_feeder()
 
     # Save cleaned state to Redis
-    save_all_state_to_redis()
+    state_persistence.request_flush()
 
     logger.info(f"🧹 Purged {len(removed)} test agents: {removed}")
     return {
@@ -2759,7 +3064,7 @@ async def remove_agents(agent_ids: List[str] = Body(...)):
     if keys_to_remove:
         save_api_keys(API_KEYS_DB)
 
-    save_all_state_to_redis()
+    state_persistence.request_flush()
 
     logger.info(f"🧹 Removed {len(removed)} agents: {removed}")
     return {
@@ -2779,14 +3084,19 @@ async def reset_arena():
             account.balance = INITIAL_BALANCE
             account.positions.clear()
             reset_agents.append(agent_id)
+        group.engine.mark_account_dirty()
+        if group.engine.lots is not None:
+            group.engine.lots.clear()
         group.engine.trade_history.clear()
+        group.hive_mind.reset()
         group.engine.order_count = 0
+    group_manager.views.clear_trades()  # /trades、简报与观众推送读的是全局成交环形缓冲
 
     trade_count = 0
     total_volume = 0.0
     current_epoch += 1
 
-    save_all_state_to_redis()
+    state_persistence.request_flush()
 
     logger.info(f"🔄 Arena reset! {len(reset_agents)} agents reset to ${INITIAL_BALANCE}")
     return {
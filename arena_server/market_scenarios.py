@@ -0,0 +1,239 @@
+"""
+沙盒回测行情场景 (Market Scenarios)
+替代 BacktestEngine.generate_mock_market_data 的逐 tick / 逐币种 Python 循环
+
+1. 向量化生成：一次生成 rounds × ticks × symbols 的价格 / 成交量 / 流动性数组
+   - 与旧生成器同一模型：每轮随机初始价 + 波动率，每 tick 随机趋势 (-1/0/+1 × 0.1%) + 高斯扰动
+   - 传入 seed 时完全可复现，不同策略可以在同一组路径上比较
+2. 回放夹具 (fixture)：把真实 Arena 价格历史重采样成固定网格，保存为 .npy (float32)
+   + 同名 .json 元数据；加载时 mmap 只读映射，同一进程内按路径缓存，
+   多个沙盒 worker 进程共享操作系统页缓存
+
+numpy 为可选依赖；缺失时 SCENARIOS_AVAILABLE = False，沙盒回退到旧的逐 tick 生成器。
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时沙盒使用旧生成器
+    np = None
+
+SCENARIOS_AVAILABLE = np is not None
+
+# 夹具数组布局: (3, rounds, ticks, symbols)，第一维依次为价格 / 成交量 / 流动性
+FIELDS = ("price", "volume", "liquidity")
+DEFAULT_LIQUIDITY = 1_000_000.0  # 成交记录里没有流动性，回放时使用常数
+TICK_SECONDS = 60
+
+
+@dataclass
+class MarketScenario:
+    """一组回测行情：每个数组形状都是 (rounds, ticks, symbols)"""
+    symbols: List[str]
+    prices: "np.ndarray"
+    volumes: "np.ndarray"
+    liquidities: "np.ndarray"
+    name: str = ""
+    meta: Dict = field(default_factory=dict)
+
+    @property
+    def rounds(self) -> int:
+        return self.prices.shape[0]
+
+    @property
+    def ticks(self) -> int:
+        return self.prices.shape[1]
+
+    def round(self, round_num: int) -> "ScenarioRound":
+        """第 round_num 轮 (轮数不足时循环回放)，供 BacktestEngine.run_backtest 直接逐 tick 读取数组"""
+        return ScenarioRound(self, round_num % self.rounds)
+
+
+class ScenarioRound:
+    """一轮行情；frames() 逐 tick 产出 (tick, 成交用价格, 传给策略的 market_data)，不构造中间的嵌套 dict"""
+
+    def __init__(self, scenario: MarketScenario, index: int):
+        self.scenario = scenario
+        self.index = index
+
+    def __len__(self) -> int:
+        return self.scenario.ticks
+
+    def frames(self):
+        symbols = self.scenario.symbols
+        rows = zip(
+            self.scenario.prices[self.index].tolist(),
+            self.scenario.volumes[self.index].tolist(),
+            self.scenario.liquidities[self.index].tolist(),
+        )
+        for tick, (prices, volumes, liquidities) in enumerate(rows):
+            tick_prices = dict(zip(symbols, prices))
+            yield tick, tick_prices, {
+                'tick': tick,
+                'prices': dict(tick_prices),  # 策略拿到副本，改动不影响成交价
+                'volumes': dict(zip(symbols, volumes)),
+                'liquidities': dict(zip(symbols, liquidities)),
+            }
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Market scenarios require numpy (pip install numpy)")
+
+
+def generate_scenario(
+    symbols: Sequence[str],
+    rounds: int,
+    ticks: int = 100,
+    seed: Optional[int] = None,
+    volatility: Tuple[float, float] = (0.015, 0.025),
+) -> MarketScenario:
+    """向量化生成随机游走行情；seed 相同则路径相同"""
+    _require_numpy()
+    if seed is not None:
+        return _generate_cached(tuple(symbols), rounds, ticks, seed, tuple(volatility))
+    return _generate(tuple(symbols), rounds, ticks, None, tuple(volatility))
+
+
+def _generate(symbols, rounds, ticks, seed, volatility) -> MarketScenario:
+    rng = np.random.default_rng(seed)
+    n = len(symbols)
+    vol = rng.uniform(volatility[0], volatility[1], size=(rounds, 1, 1))
+    base = rng.uniform(0.01, 10.0, size=(rounds, 1, n))
+    trend = rng.integers(-1, 2, size=(rounds, ticks, n)) * 0.001
+    change = rng.normal(trend, vol)
+    prices = base * np.cumprod(1.0 + change, axis=1)
+    volumes = rng.uniform(10000, 100000, size=(rounds, ticks, n))
+    liquidities = rng.uniform(500000, 2000000, size=(rounds, ticks, n))
+    return MarketScenario(
+        symbols=list(symbols), prices=prices, volumes=volumes, liquidities=liquidities,
+        name=f"synthetic-{seed}" if seed is not None else "synthetic",
+        meta={"seed": seed, "volatility": list(volatility)},
+    )
+
+
+@lru_cache(maxsize=8)
+def _generate_cached(symbols, rounds, ticks, seed, volatility) -> MarketScenario:
+    """带 seed 的场景在常驻 worker 里复用 (数组只读，不会被回测修改)"""
+    scenario = _generate(symbols, rounds, ticks, seed, volatility)
+    for array in (scenario.prices, scenario.volumes, scenario.liquidities):
+        array.flags.writeable = False
+    return scenario
+
+
+# ========== 回放夹具 ==========
+
+def resample_series(
+    series: Dict[str, Sequence[Tuple[float, float]]],
+    interval: float = TICK_SECONDS,
+    volumes: Optional[Dict[str, Sequence[Tuple[float, float]]]] = None,
+) -> Tuple[List[str], "np.ndarray", "np.ndarray"]:
+    """
+    把各币种的 (timestamp, price) 序列重采样到同一时间网格 (前值填充)
+
+    网格从所有币种都有价格的时刻开始，到最后一条记录结束。
+    volumes 为 (timestamp, 成交额) 序列，按网格区间求和。
+
+    Returns:
+        (symbols, prices[ticks, symbols], volumes[ticks, symbols])
+    """
+    _require_numpy()
+    symbols = sorted(sym for sym, points in series.items() if points)
+    if not symbols:
+        return [], np.zeros((0, 0)), np.zeros((0, 0))
+    columns = {}
+    for sym in symbols:
+        arr = np.asarray(sorted(series[sym]), dtype=np.float64)
+        columns[sym] = arr
+    start = max(arr[0, 0] for arr in columns.values())
+    end = max(arr[-1, 0] for arr in columns.values())
+    grid = np.arange(start, end + interval, interval)
+
+    prices = np.empty((len(grid), len(symbols)))
+    traded = np.zeros((len(grid), len(symbols)))
+    for i, sym in enumerate(symbols):
+        arr = columns[sym]
+        idx = np.searchsorted(arr[:, 0], grid, side="right") - 1
+        prices[:, i] = arr[idx, 1]
+        if volumes and volumes.get(sym):
+            vol = np.asarray(volumes[sym], dtype=np.float64)
+            bucket = np.clip(((vol[:, 0] - start) // interval).astype(np.int64), 0, len(grid) - 1)
+            traded[:, i] = np.bincount(bucket, weights=vol[:, 1], minlength=len(grid))
+    return symbols, prices, traded
+
+
+def write_fixture(
+    path: str,
+    symbols: Sequence[str],
+    prices: "np.ndarray",
+    ticks_per_round: int = 100,
+    volumes: Optional["np.ndarray"] = None,
+    liquidities: Optional["np.ndarray"] = None,
+    meta: Optional[Dict] = None,
+) -> int:
+    """
+    把 [ticks, symbols] 的连续行情切成若干轮写入夹具 (不足一轮的尾部丢弃)
+
+    Returns:
+        写入的轮数
+    """
+    _require_numpy()
+    rounds = prices.shape[0] // ticks_per_round
+    if rounds == 0:
+        raise ValueError(f"Need at least {ticks_per_round} ticks, got {prices.shape[0]}")
+    usable = rounds * ticks_per_round
+    shape = (rounds, ticks_per_round, len(symbols))
+    if volumes is None:
+        volumes = np.zeros_like(prices)
+    if liquidities is None:
+        liquidities = np.full_like(prices, DEFAULT_LIQUIDITY)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(len(FIELDS),) + shape)
+    for i, column in enumerate((prices, volumes, liquidities)):
+        out[i] = column[:usable].reshape(shape)
+    out.flush()
+    del out
+    os.replace(tmp, path)
+
+    info = dict(meta or {})
+    info.update({"symbols": list(symbols), "fields": list(FIELDS), "rounds": rounds,
+                 "ticks_per_round": ticks_per_round, "created": time.time()})
+    with open(_meta_path(path), "w") as f:
+        json.dump(info, f, indent=2)
+    _fixture_cache.pop(os.path.abspath(path), None)
+    return rounds
+
+
+def _meta_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".json"
+
+
+_fixture_cache: Dict[str, Tuple[float, MarketScenario]] = {}
+
+
+def load_fixture(path: str) -> MarketScenario:
+    """mmap 只读加载夹具；同一进程内按 (路径, mtime) 缓存"""
+    _require_numpy()
+    key = os.path.abspath(path)
+    mtime = os.path.getmtime(key)
+    cached = _fixture_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    data = np.load(key, mmap_mode="r")
+    with open(_meta_path(key)) as f:
+        meta = json.load(f)
+    scenario = MarketScenario(
+        symbols=meta["symbols"], prices=data[0], volumes=data[1], liquidities=data[2],
+        name=os.path.basename(key), meta=meta,
+    )
+    _fixture_cache[key] = (mtime, scenario)
+    return scenario
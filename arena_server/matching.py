@@ -5,17 +5,21 @@
 支持任意币种交易 - Agents 可以交易任何 DexScreener 上的代币
 """
 
-import aiohttp
 import asyncio
+import logging
+import time
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from enum import Enum
-from collections import deque
-from config import INITIAL_BALANCE, SIMULATED_SLIPPAGE
+from config import INITIAL_BALANCE, SIMULATED_SLIPPAGE, ACCOUNT_STORE, PNL_HISTORY_LIMIT, TRADE_HISTORY_HOT_SIZE, POSITION_LOTS
+from price_oracle import PriceOracle, price_oracle
+from price_refresh import PriceRefresher
+from valuation_index import AccountBook, ValuationIndex
+from trade_journal import TradeJournal
+from risk_metrics import EMPTY_METRICS, RiskMetricsCache
 
-# DexScreener API
-DEXSCREENER_BASE_URL = "https://api.dexscreener.com/latest/dex"
+logger = logging.getLogger(__name__)
 
 
 class OrderSide(Enum):
@@ -97,14 +101,60 @@ class AgentAccount:
 class MatchingEngine:
     """模拟撮合引擎"""
 
-    def __init__(self):
-        self.accounts: Dict[str, AgentAccount] = {}
+    def __init__(self, oracle: Optional[PriceOracle] = None, store: str = None,
+                 journal: Optional[TradeJournal] = None, lots: Optional[bool] = None):
+        self.valuation = ValuationIndex(self)  # 增量估值 + 排名
+        self.store = None  # 列式存储后端 (store="columnar" 时启用)
+        if (store or ACCOUNT_STORE) == "columnar":
+            from account_store import ColumnarAccountStore
+            self.store = ColumnarAccountStore()
+            self.accounts: Dict[str, AgentAccount] = AccountBook(
+                self.valuation, adopt=self.store.adopt, release=self.store.release)
+        else:
+            self.accounts: Dict[str, AgentAccount] = AccountBook(self.valuation)
         self.agents = self.accounts  # Alias for compatibility
         self.current_prices: Dict[str, float] = {}
         self.token_metadata: Dict[str, dict] = {}  # Store chain and contract_address
         self.order_count = 0
-        self.trade_history: deque = deque(maxlen=500) # Rolling history for Hive Mind attribution
-        self._http_session: Optional[aiohttp.ClientSession] = None
+        # 成交日志：最近 500 条在内存 (兼容原 deque)，传入持久化 journal 时可按时间/Agent/币种深度扫描
+        self.trade_history: TradeJournal = journal if journal is not None else TradeJournal(hot_size=TRADE_HISTORY_HOT_SIZE)
+        self.oracle = oracle or price_oracle  # 所有组共享同一个价格预言机
+        self.price_snapshot_version = 0  # 最近采纳的 PriceSnapshot 版本
+        self.prices_marked_at: Optional[float] = None
+        self.listener = None  # 账户/价格/成交写入回调 (GroupManager 的跨组合并视图)
+        self.trade_observers: List[Callable[[dict], None]] = []  # 每笔成交写入后调用 (HiveMind 增量归因)
+        self.observer_errors = 0
+        self.risk = RiskMetricsCache()  # 每个账户的风险指标，Epoch 结束追加 pnl_history 时增量更新
+        self.lots = None  # 批次持仓 (lots=True 时启用)：SELL 按 FIFO 平仓，成交记录附逐批次已实现盈亏
+        if POSITION_LOTS if lots is None else lots:
+            from position_lots import LotBook
+            self.lots = LotBook()
+
+    def attach_listener(self, listener):
+        """挂上写入回调，并补发已有的账户与价格 (已有成交由调用方并入)"""
+        self.listener = listener
+        self.accounts.listener = listener
+        for agent_id, account in self.accounts.items():
+            listener.account_added(agent_id, account)
+        listener.prices_updated(self.current_prices)
+
+    def _store_prices(self, prices: Dict[str, float]):
+        """写入价格缓存 (所有价格写入都经过这里，以便同步跨组视图)"""
+        self.current_prices.update(prices)
+        if self.listener is not None:
+            self.listener.prices_updated(prices)
+
+    def record_trade(self, trade: dict, ts: float = None):
+        """追加一条成交记录 (新 → 旧)"""
+        self.trade_history.appendleft(trade, ts=ts)
+        if self.listener is not None:
+            self.listener.trade_recorded(trade)
+        for observer in self.trade_observers:
+            try:
+                observer(trade)
+            except Exception as e:  # 成交已入账，观察者出错不能让下单失败或跳过其余观察者
+                self.observer_errors += 1
+                logger.error(f"Trade observer {getattr(observer, '__qualname__', observer)} failed: {e}")
     
     def get_balance(self, agent_id: str) -> float:
         """获取账户余额"""
@@ -136,60 +186,52 @@ class MatchingEngine:
     
     def update_prices(self, prices: Dict[str, dict]):
         """更新当前价格"""
-        for symbol, data in prices.items():
-            if "priceUsd" in data:
-                self.current_prices[symbol] = data["priceUsd"]
+        self._store_prices({symbol: data["priceUsd"] for symbol, data in prices.items() if "priceUsd" in data})
+        self.valuation.on_prices(prices.keys())
     
     def get_account(self, agent_id: str) -> Optional[AgentAccount]:
         """获取账户"""
         return self.accounts.get(agent_id)
 
-    async def _get_http_session(self) -> aiohttp.ClientSession:
-        """获取或创建共享的 HTTP session"""
-        if self._http_session is None or self._http_session.closed:
-            self._http_session = aiohttp.ClientSession()
-        return self._http_session
+    def mark_account_dirty(self, agent_id: str = None):
+        """账户余额/持仓被外部直接修改后调用，让估值索引重算 (None = 全部)"""
+        if agent_id is None:
+            self.valuation.mark_all_dirty()
+        else:
+            self.valuation.mark_dirty(agent_id)
 
     async def _fetch_price_realtime(self, symbol: str) -> Optional[float]:
-        """实时从 DexScreener 获取价格（支持任意币种）
+        """实时获取价格（支持任意币种）
 
-        尝试通过 symbol 搜索代币，返回流动性最高的交易对价格
+        经由进程共享的 PriceOracle：同一 symbol 的并发查询会合并成一次上游请求，
+        已知合约地址的 symbol 走 DexScreener 批量接口
         """
+        contract_address = self.token_metadata.get(symbol, {}).get("contract_address") or None
         try:
-            url = f"{DEXSCREENER_BASE_URL}/search?q={symbol}"
-            session = await self._get_http_session()
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=15)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    pairs = data.get("pairs", [])
-
-                    if not pairs:
-                        return None
-
-                    # 过滤：只要 baseToken.symbol 匹配的
-                    matching_pairs = [
-                        p for p in pairs
-                        if p.get("baseToken", {}).get("symbol", "").upper() == symbol.upper()
-                    ]
-
-                    if not matching_pairs:
-                        return None
-
-                    # 取流动性最高的交易对
-                    best_pair = max(
-                        matching_pairs,
-                        key=lambda p: float(p.get("liquidity", {}).get("usd", 0) or 0)
-                    )
-
-                    price = float(best_pair.get("priceUsd", 0))
-                    if price > 0:
-                        return price
-
+            return await self.oracle.get_price(symbol, contract_address)
         except Exception as e:
             print(f"Error fetching price for {symbol}: {e}")
-
         return None
 
+    def note_token_metadata(self, symbol: str, chain: str = None, contract_address: str = None):
+        """记录代币的链与合约地址 (用于成交记录与按地址批量查价)"""
+        if chain or contract_address:
+            if symbol not in self.token_metadata:
+                self.token_metadata[symbol] = {}
+            if chain:
+                self.token_metadata[symbol]["chain"] = chain
+            if contract_address:
+                self.token_metadata[symbol]["contract_address"] = contract_address
+
+    async def ensure_prices(self, symbols) -> Dict[str, Optional[float]]:
+        """并发补齐缺失的价格 (撮合批次开始前调用，之后整批成交不再有 await)"""
+        missing = [sym for sym in set(symbols) if sym not in self.current_prices]
+        if missing:
+            fetched = await asyncio.gather(*(self._fetch_price_realtime(sym) for sym in missing))
+            self._store_prices({symbol: price for symbol, price in zip(missing, fetched) if price is not None})
+            self.valuation.on_prices(missing)
+        return {sym: self.current_prices.get(sym) for sym in symbols}
+
     async def execute_order(self, agent_id: str, symbol: str, side: OrderSide, amount_usd: float, reason: List[str] = None, chain: str = None, contract_address: str = None) -> tuple:
         """执行订单 - 支持任意币种
 
@@ -215,13 +257,7 @@ class MatchingEngine:
         current_price = self.current_prices.get(symbol)
 
         # Store chain and contract_address if provided
-        if chain or contract_address:
-            if symbol not in self.token_metadata:
-                self.token_metadata[symbol] = {}
-            if chain:
-                self.token_metadata[symbol]["chain"] = chain
-            if contract_address:
-                self.token_metadata[symbol]["contract_address"] = contract_address
+        self.note_token_metadata(symbol, chain, contract_address)
 
         if current_price is None:
             # 实时从 DexScreener 获取价格
@@ -232,7 +268,8 @@ class MatchingEngine:
                     return (False, f"Cannot fetch price for symbol: {symbol}. Please ensure it exists on DexScreener.", 0.0)
 
                 # 缓存价格
-                self.current_prices[symbol] = current_price
+                self._store_prices({symbol: current_price})
+                self.valuation.on_prices((symbol,))
 
             except Exception as e:
                 return (False, f"Error fetching price for {symbol}: {str(e)}", 0.0)
@@ -257,21 +294,25 @@ class MatchingEngine:
             account.balance -= amount_usd
             
             # 更新持仓
-            if symbol not in account.positions:
+            new_position = symbol not in account.positions
+            if new_position:
                 account.positions[symbol] = Position(symbol=symbol)
             
             pos = account.positions[symbol]
             new_amount = pos.amount + token_amount
             pos.avg_price = ((pos.amount * pos.avg_price) + (token_amount * fill_price)) / new_amount if new_amount > 0 else 0
             pos.amount = new_amount
-            
+            self.valuation.mark_dirty(agent_id)
+            if self.lots is not None:
+                self.lots.open(agent_id, symbol, token_amount, fill_price, time.time(), reason, new_position)
+
             self.order_count += 1
 
             # Get token metadata
             token_meta = self.token_metadata.get(symbol, {})
 
             # Record trade with TAGS + chain + contract_address
-            self.trade_history.appendleft({
+            self.record_trade({
                 "time": datetime.now().isoformat(),
                 "agent_id": agent_id,
                 "side": "BUY",
@@ -302,14 +343,25 @@ class MatchingEngine:
                 # Auto-clean dust position
                 if pos.amount * fill_price < 0.01:
                     del account.positions[symbol]
+                    if self.lots is not None:
+                        self.lots.drop(agent_id, symbol)
+                    self.valuation.mark_dirty(agent_id)
                 return (False, f"Trade value too small: ${sell_value:.6f}", 0.0)
 
+            # 批次模式：按 FIFO 平仓 (在修改持仓前，不足的部分按均价计)
+            realized_lots = None
+            if self.lots is not None:
+                realized_lots = self.lots.close(agent_id, symbol, token_amount, fill_price, pos.avg_price)
+
             pos.amount -= token_amount
             account.balance += sell_value
 
             if pos.amount <= 0 or (pos.amount * fill_price < 0.01):
                 del account.positions[symbol]
-            
+                if self.lots is not None:
+                    self.lots.drop(agent_id, symbol)
+            self.valuation.mark_dirty(agent_id)
+
             self.order_count += 1
 
             # Compute per-trade PnL for this sell
@@ -319,7 +371,7 @@ class MatchingEngine:
             token_meta = self.token_metadata.get(symbol, {})
 
             # Record trade with TAGS + per-trade PnL + chain + contract_address
-            self.trade_history.appendleft({
+            trade = {
                 "time": datetime.now().isoformat(),
                 "agent_id": agent_id,
                 "side": "SELL",
@@ -332,7 +384,10 @@ class MatchingEngine:
                 "entry_price": pos.avg_price,
                 "trade_pnl": round(trade_pnl, 2),
                 "reason": reason or []  # SELL tags: TAKE_PROFIT, STOP_LOSS, etc.
-            })
+            }
+            if realized_lots is not None:
+                trade["lots"] = realized_lots  # 逐批次: amount / entry_price / entry_time / reason / pnl / trade_pnl
+            self.record_trade(trade)
 
             print(f"✅ {agent_id} SELL {token_amount:.4f} {symbol} @ ${fill_price:.4f} PnL:{trade_pnl:+.1f}% Tags:{reason}")
             return (True, f"Sold {token_amount:.4f} {symbol}", fill_price)
@@ -342,51 +397,43 @@ class MatchingEngine:
         """Alias for current_prices (compatibility)"""
         return self.current_prices
 
-    async def refresh_all_position_prices(self):
-        """刷新所有持仓代币的价格（用于准确的 PnL 计算）"""
-        # 收集所有持仓代币
-        all_symbols = set()
-        for account in self.accounts.values():
-            all_symbols.update(account.positions.keys())
-
-        # 批量获取价格
-        for symbol in all_symbols:
-            if symbol not in self.current_prices:
-                try:
-                    price = await self._fetch_price_realtime(symbol)
-                    if price:
-                        self.current_prices[symbol] = price
-                except Exception as e:
-                    logger.error(f"Failed to refresh price for {symbol}: {e}")
+    def adopt_price_snapshot(self, snapshot):
+        """采纳 PriceRefresher 发布的价格快照"""
+        self._store_prices(snapshot.prices)
+        self.valuation.on_prices(snapshot.prices.keys())
+        self.price_snapshot_version = snapshot.version
+        self.prices_marked_at = snapshot.taken_at
 
     async def refresh_all_position_prices(self) -> int:
-        """刷新所有持仓代币的价格（用于准确的 PnL 计算）
+        """刷新本组所有持仓代币的价格（用于准确的 PnL 计算）
+
+        跨组的全量刷新请用 GroupManager.refresh_all_position_prices (跨组去重)
 
         Returns:
             int: 成功更新的代币数量
         """
-        # 收集所有持仓代币
-        symbols = set()
-        for account in self.accounts.values():
-            symbols.update(account.positions.keys())
+        snapshot = await PriceRefresher(self.oracle).refresh([self])
+        return len(snapshot.prices)
 
-        if not symbols:
-            return 0
+    def get_leaderboard(self) -> List[tuple]:
+        """获取排行榜 (使用当前市场价计算，不修改 avg_price)
 
-        updated = 0
-        for symbol in symbols:
-            try:
-                price = await self._fetch_price_realtime(symbol)
-                if price and price > 0:
-                    self.current_prices[symbol] = price
-                    updated += 1
-            except Exception as e:
-                print(f"Failed to refresh price for {symbol}: {e}")
+        由 ValuationIndex 增量维护，只重算自上次查询以来成交或持仓价格变化的账户
+        """
+        return self.valuation.leaderboard()
 
-        return updated
+    def get_top(self, k: int) -> List[tuple]:
+        """排行榜前 k 名"""
+        return self.valuation.top(k)
 
-    def get_leaderboard(self) -> List[tuple]:
-        """获取排行榜 (使用当前市场价计算，不修改 avg_price)"""
+    def get_rank(self, agent_id: str) -> Optional[int]:
+        """组内名次 (1 开始)"""
+        return self.valuation.rank(agent_id)
+
+    def compute_leaderboard(self) -> List[tuple]:
+        """全量重算排行榜 (遍历所有账户与持仓，用于校验/基准对比)"""
+        if self.store is not None:
+            return self.store.leaderboard(self.current_prices)
         rankings = [
             (account.agent_id,
              account.get_pnl_percent(self.current_prices),
@@ -395,7 +442,50 @@ class MatchingEngine:
         ]
         rankings.sort(key=lambda x: x[1], reverse=True)
         return rankings
-    
+
+    @property
+    def version(self) -> int:
+        """排行 / 风险指标的变更计数 (只增不减，响应缓存的失效键)"""
+        return self.valuation.version + self.risk.version
+
+    def record_pnl_snapshot(self):
+        """Epoch 结束：为每个账户追加当前 PnL% 到 pnl_history (最多保留 PNL_HISTORY_LIMIT 条)"""
+        if self.store is not None:
+            self.store.record_pnl(self.current_prices)
+            for agent_id, account in self.accounts.items():
+                history = account.pnl_history
+                if len(history):
+                    self.risk.record(agent_id, history[-1])
+            return
+        for agent_id, account in self.accounts.items():
+            pnl = account.get_pnl_percent(self.current_prices)
+            account.pnl_history.append(pnl)
+            if len(account.pnl_history) > PNL_HISTORY_LIMIT:
+                account.pnl_history = account.pnl_history[-PNL_HISTORY_LIMIT:]
+            self.risk.record(agent_id, pnl)
+
+    def risk_metrics(self, agent_id: str) -> dict:
+        """缓存的风险指标 (O(1))；账户不存在返回全 0"""
+        account = self.accounts.get(agent_id)
+        if account is None:
+            return dict(EMPTY_METRICS)
+        return self.risk.metrics(agent_id, account.pnl_history)
+
+    def pnl_percentiles(self, qs: List[float]) -> List[float]:
+        """全组 PnL% 分位数 (qs 取值 0-100)"""
+        if self.store is not None:
+            return self.store.pnl_percentiles(qs, self.current_prices)
+        values = sorted(a.get_pnl_percent(self.current_prices) for a in self.accounts.values())
+        if not values:
+            return [0.0 for _ in qs]
+        result = []
+        for q in qs:
+            pos = (len(values) - 1) * q / 100
+            lo = int(pos)
+            hi = min(lo + 1, len(values) - 1)
+            result.append(values[lo] + (values[hi] - values[lo]) * (pos - lo))
+        return result
+
     def print_leaderboard(self):
         """打印排行榜"""
         rankings = self.get_leaderboard()
@@ -0,0 +1,133 @@
+"""
+跨组合并视图 (Merged Views)
+GroupManager.accounts / current_prices / trade_history 的增量维护版本
+
+原实现每次访问都遍历所有组重建一个合并 dict / 2000 条的 deque；
+这里改为在写入时 (账户增删、价格更新、成交) 由各组引擎回调同步更新：
+
+  accounts      agent_id → AgentAccount   (与各组 engine.accounts 共享同一对象)
+  prices        symbol → 最新价格           (最后写入者生效，price_sources 记录来源组)
+  recent_trades 全局最近成交环形缓冲 (新 → 旧)
+
+每类视图有单调递增的版本号，读者可据此判断是否需要重新取数；
+snapshot 类接口按版本缓存不可变副本，版本不变时重复读取不再复制。
+"""
+
+import heapq
+from collections import deque
+from types import MappingProxyType
+from typing import Deque, Dict, Iterable, Mapping, Optional, Tuple
+
+
+class MergedViews:
+    """跨组合并索引 (由 GroupManager 持有，各组引擎通过 GroupListener 回调写入)"""
+
+    def __init__(self, trade_ring_size: int = 2000):
+        self.accounts: Dict[str, object] = {}
+        self.account_groups: Dict[str, int] = {}
+        self.prices: Dict[str, float] = {}
+        self.price_sources: Dict[str, int] = {}
+        self.recent_trades: Deque[dict] = deque(maxlen=trade_ring_size)
+        self.versions = {"accounts": 0, "prices": 0, "trades": 0}
+        self._snapshots: Dict[str, Tuple[int, object]] = {}
+        # 只读视图 (O(1)，随底层 dict 变化)
+        self.accounts_view: Mapping[str, object] = MappingProxyType(self.accounts)
+        self.prices_view: Mapping[str, float] = MappingProxyType(self.prices)
+
+    def listener(self, group_id: int) -> "GroupListener":
+        return GroupListener(self, group_id)
+
+    # ---- 写入 (由 GroupListener 调用) ----
+
+    def account_added(self, group_id: int, agent_id: str, account):
+        self.accounts[agent_id] = account
+        self.account_groups[agent_id] = group_id
+        self.versions["accounts"] += 1
+
+    def account_removed(self, group_id: int, agent_id: str):
+        # Agent 换组后旧组再删除账户时，不影响它在新组的账户
+        if self.account_groups.get(agent_id) == group_id:
+            del self.accounts[agent_id]
+            del self.account_groups[agent_id]
+            self.versions["accounts"] += 1
+
+    def prices_updated(self, group_id: int, prices: Mapping[str, float]):
+        if not prices:
+            return
+        self.prices.update(prices)
+        for symbol in prices:
+            self.price_sources[symbol] = group_id
+        self.versions["prices"] += 1
+
+    def trade_recorded(self, group_id: int, trade: dict):
+        self.recent_trades.appendleft(trade)
+        self.versions["trades"] += 1
+
+    def seed_trades(self, trades: Iterable[dict]):
+        """并入已有的成交 (新 → 旧，如从日志恢复的组)，按成交时间与现有环形缓冲归并"""
+        merged = heapq.merge(self.recent_trades, trades, key=lambda t: t.get("time", ""), reverse=True)
+        self.recent_trades = deque(merged, maxlen=self.recent_trades.maxlen)
+        self.versions["trades"] += 1
+
+    def remove_agent(self, agent_id: str):
+        """从最近成交中删除某 Agent 的记录 (管理员删除 Agent 时与各组成交日志一起清理)"""
+        kept = [t for t in self.recent_trades if t.get("agent_id", t.get("agent")) != agent_id]
+        if len(kept) == len(self.recent_trades):
+            return
+        self.recent_trades = deque(kept, maxlen=self.recent_trades.maxlen)
+        self.versions["trades"] += 1
+
+    def clear_trades(self):
+        """清空最近成交 (竞技场重置时与各组的 trade_history 一起清空)"""
+        self.recent_trades.clear()
+        self.versions["trades"] += 1
+
+    # ---- 读取 ----
+
+    def price_source(self, symbol: str) -> Optional[int]:
+        return self.price_sources.get(symbol)
+
+    def _snapshot(self, name: str, build):
+        version = self.versions[name]
+        cached = self._snapshots.get(name)
+        if cached is None or cached[0] != version:
+            cached = self._snapshots[name] = (version, build())
+        return cached[1]
+
+    def trades_snapshot(self) -> Tuple[dict, ...]:
+        """最近成交的不可变快照 (仅在有新成交后重建)"""
+        return self._snapshot("trades", lambda: tuple(self.recent_trades))
+
+    def prices_snapshot(self) -> Mapping[str, float]:
+        """价格的不可变快照 (仅在价格更新后重建)，适合跨 await 持有"""
+        return self._snapshot("prices", lambda: MappingProxyType(dict(self.prices)))
+
+    def stats(self) -> dict:
+        return {
+            "accounts": len(self.accounts),
+            "symbols": len(self.prices),
+            "recent_trades": len(self.recent_trades),
+            "versions": dict(self.versions),
+        }
+
+
+class GroupListener:
+    """绑定组 ID 的回调句柄，挂在 MatchingEngine.listener / AccountBook.listener 上"""
+
+    __slots__ = ("views", "group_id")
+
+    def __init__(self, views: MergedViews, group_id: int):
+        self.views = views
+        self.group_id = group_id
+
+    def account_added(self, agent_id: str, account):
+        self.views.account_added(self.group_id, agent_id, account)
+
+    def account_removed(self, agent_id: str):
+        self.views.account_removed(self.group_id, agent_id)
+
+    def prices_updated(self, prices: Mapping[str, float]):
+        self.views.prices_updated(self.group_id, prices)
+
+    def trade_recorded(self, trade: dict):
+        self.views.trade_recorded(self.group_id, trade)
@@ -203,6 +203,24 @@ def calculate_composite_score(
     win_rate = calculate_win_rate(returns)
     volatility = calculate_volatility(returns)
 
+    return score_metrics(cumulative_return, sharpe, sortino, max_dd, calmar, win_rate, volatility)
+
+
+def score_metrics(
+    cumulative_return: float,
+    sharpe: float,
+    sortino: float,
+    max_dd: float,
+    calmar: float,
+    win_rate: float,
+    volatility: float
+) -> Dict[str, float]:
+    """
+    由各项指标计算综合评分 (calculate_composite_score 与 risk_metrics 的增量缓存共用)
+
+    Returns:
+        包含所有指标的字典
+    """
     # 归一化到 0-100 分
     # 收益率：100% = 100分（更合理的基准）
     normalized_return = min(max(cumulative_return, 0), 100)
@@ -0,0 +1,228 @@
+"""
+观众推送流 (Observer Feed)
+/ws/observer 不再只是心跳：连接后先收到一份带版本号的完整快照，之后是紧凑的增量帧
+
+协议 (服务端 → 观众)：
+    {"type": "snapshot", "version": v, "epoch", "rankings": [[rank, agent_id, pnl_percent, total_value, is_online], ...],
+     "stats": {...}, "fills": [...]}
+    {"type": "delta", "version": v, "epoch", "ranks": [变化的行], "removed": [agent_id], "stats": {变化的字段},
+     "fills": [新成交 (新 → 旧)], "events": [{"kind": "epoch_end" | "epoch_start" | "council", ...}]}
+观众 → 服务端：{"type": "resync"} 重新获取快照 (版本号不连续时)；{"type": "ping"}
+
+一个生产者每 OBSERVER_FEED_TICK 秒计算一次增量 (没有变化则不发)，只序列化一次再扇出给所有观众，
+仪表盘的成本从 O(观众数 × Agent 数) 变成 O(变化数)。每个观众有一个有界发送队列，
+慢观众的队列满了就清空并改发最新快照，不会拖慢其他观众。
+"""
+
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from config import OBSERVER_FEED_TICK, OBSERVER_QUEUE_MAX, OBSERVER_MAX_FILLS
+
+logger = logging.getLogger(__name__)
+
+FILL_FIELDS = ("time", "agent_id", "side", "symbol", "chain", "contract_address",
+               "amount", "price", "value", "trade_pnl", "reason")
+
+
+def _fill_key(trade: dict) -> tuple:
+    return (trade.get("time"), trade.get("agent_id"), trade.get("symbol"), trade.get("side"), trade.get("amount"))
+
+
+class ObserverFeed:
+    """观众状态的版本化快照 + 增量扇出"""
+
+    def __init__(
+        self,
+        get_state: Callable[[], dict],
+        get_trades: Callable[[], list],
+        tick: float = OBSERVER_FEED_TICK,
+        queue_size: int = OBSERVER_QUEUE_MAX,
+        max_fills: int = OBSERVER_MAX_FILLS,
+    ):
+        """
+        Args:
+            get_state: () -> {"epoch", "rankings": [(agent_id, pnl_percent, total_value, is_online)], "stats": dict}
+            get_trades: () -> 最近成交 (新 → 旧)
+        """
+        self.get_state = get_state
+        self.get_trades = get_trades
+        self.tick_interval = tick
+        self.queue_size = queue_size
+        self.version = 0
+        self.epoch = 0
+        self.rankings: Dict[str, list] = {}  # agent_id -> [rank, agent_id, pnl_percent, total_value, is_online]
+        self.summary: dict = {}  # 计数类统计 (在线数 / 成交数 / 观众数 ...)
+        self.fills: deque = deque(maxlen=max_fills)  # 最近成交 (新 → 旧)，快照里带给新观众
+        self.events: List[dict] = []  # 下一帧要带出的事件
+        self.observers: Dict[int, asyncio.Queue] = {}
+        self._last_fill: Optional[tuple] = None
+        self._snapshot_text: Optional[str] = None
+        self._stale = True  # 没有观众时不计算，下一个观众连接时先补一次
+
+        # 度量
+        self.ticks = 0
+        self.deltas = 0
+        self.frames_sent = 0
+        self.resyncs = 0
+        self.bytes_out = 0
+
+    # ========== 生产 ==========
+
+    def publish(self, kind: str, **payload):
+        """登记一个事件 (Epoch 切换 / 议事厅发言)，随下一帧增量发出"""
+        if self.observers:
+            self.events.append({"kind": kind, **payload})
+
+    def _new_fills(self) -> List[dict]:
+        fills = []
+        for trade in self.get_trades():
+            key = _fill_key(trade)
+            if key == self._last_fill or len(fills) >= self.fills.maxlen:
+                break
+            fills.append({k: trade.get(k) for k in FILL_FIELDS})
+        if fills:
+            self._last_fill = _fill_key(fills[0])
+        return fills
+
+    def tick(self) -> Optional[dict]:
+        """计算一次增量并扇出；没有变化返回 None"""
+        self.ticks += 1
+        state = self.get_state()
+        rows = {
+            agent_id: [rank, agent_id, round(pnl, 4), round(value, 2), bool(online)]
+            for rank, (agent_id, pnl, value, online) in enumerate(state["rankings"], 1)
+        }
+        ranks = [row for agent_id, row in rows.items() if self.rankings.get(agent_id) != row]
+        removed = [agent_id for agent_id in self.rankings if agent_id not in rows]
+        stats = {k: v for k, v in state["stats"].items() if self.summary.get(k) != v}
+        fills = self._new_fills()
+        events, self.events = self.events, []
+        epoch_changed = state["epoch"] != self.epoch
+
+        self.rankings = rows
+        self.summary = dict(state["stats"])
+        self.epoch = state["epoch"]
+        self.fills.extendleft(reversed(fills))
+        if not (ranks or removed or stats or fills or events or epoch_changed):
+            return None
+
+        self.version += 1
+        self._snapshot_text = None
+        delta = {"type": "delta", "version": self.version, "epoch": self.epoch}
+        for key, value in (("ranks", ranks), ("removed", removed), ("stats", stats),
+                           ("fills", fills), ("events", events)):
+            if value:
+                delta[key] = value
+        if not self._stale:  # 刚补算的一帧只用于建立基线，观众会收到快照
+            self.deltas += 1
+            self._fan_out(json.dumps(delta))
+        return delta
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "snapshot",
+            "version": self.version,
+            "epoch": self.epoch,
+            "rankings": sorted(self.rankings.values()),
+            "stats": self.summary,
+            "fills": list(self.fills),
+        }
+
+    def snapshot_text(self) -> str:
+        """同一版本的快照只序列化一次"""
+        if self._snapshot_text is None:
+            self._snapshot_text = json.dumps(self.snapshot())
+        return self._snapshot_text
+
+    def _fan_out(self, text: str):
+        for queue in self.observers.values():
+            self._enqueue(queue, text)
+
+    def _enqueue(self, queue: asyncio.Queue, text: str):
+        if queue.full():
+            # 慢观众：丢掉积压的增量，直接补发最新快照
+            while not queue.empty():
+                queue.get_nowait()
+            self.resyncs += 1
+            text = self.snapshot_text()
+        queue.put_nowait(text)
+
+    def _refresh(self):
+        if self._stale:
+            try:
+                self.tick()
+            finally:
+                self._stale = False
+
+    async def run(self):
+        """生产者循环 (lifespan 中启动)"""
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            if not self.observers:
+                self._stale = True
+                self.events.clear()
+                continue
+            try:
+                self._refresh()
+                self.tick()
+            except Exception as e:
+                logger.error(f"Observer feed error: {e}")
+
+    # ========== 观众连接 ==========
+
+    async def serve(self, websocket, welcome: dict):
+        """服务一个已 accept 的观众连接直到断开 (WebSocketDisconnect 由调用方处理)"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        key = id(websocket)
+        self._refresh()
+        self.observers[key] = queue
+        queue.put_nowait(json.dumps(welcome))
+        queue.put_nowait(self.snapshot_text())
+
+        async def writer():
+            while True:
+                text = await queue.get()
+                await websocket.send_text(text)
+                self.frames_sent += 1
+                self.bytes_out += len(text)
+
+        writer_task = asyncio.create_task(writer())
+        receive = None
+        try:
+            while True:
+                if receive is None:
+                    receive = asyncio.ensure_future(websocket.receive_json())
+                done, _ = await asyncio.wait({receive, writer_task}, timeout=30.0,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if writer_task in done:
+                    writer_task.result()  # 发送失败：抛出断开异常
+                if receive not in done:
+                    # 30 秒没有消息，发送心跳检查
+                    self._enqueue(queue, '{"type": "ping"}')
+                    continue
+                data, receive = receive.result(), None
+                if data.get("type") == "ping":
+                    self._enqueue(queue, '{"type": "pong"}')
+                elif data.get("type") == "resync":
+                    self.resyncs += 1
+                    self._enqueue(queue, self.snapshot_text())
+        finally:
+            self.observers.pop(key, None)
+            writer_task.cancel()
+            if receive is not None:
+                receive.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "observers": len(self.observers),
+            "version": self.version,
+            "ticks": self.ticks,
+            "deltas": self.deltas,
+            "frames_sent": self.frames_sent,
+            "resyncs": self.resyncs,
+            "bytes_out": self.bytes_out,
+        }
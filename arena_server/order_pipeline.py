@@ -0,0 +1,340 @@
+"""
+下单管线 (Order Pipeline)
+把"撮合 + 回执"与"成交后处理"解耦，避免一个慢 WebSocket 连接拖慢所有人的下单回执
+
+结构：
+  submit() ──► 每 Agent FIFO 队列 ──► 组执行器 (GroupExecutor)
+                                      │  1. 轮询各 Agent 队列取一个微批 (公平)
+                                      │  2. 并发补齐批内缺失价格
+                                      │  3. 整批依次成交 (中间无 await = 同一价格快照)
+                                      │  4. 立即回执 (resolve future) + 同步记录归因
+                                      ▼
+                               成交后队列 ──► post-trade workers
+                                             (组内广播 / Council 交易播报)
+
+背压：单 Agent 或单组排队数超过上限时 submit() 直接抛出 OrderQueueFull，
+调用方应返回明确错误 (WS: queue_full / REST: 429)，而不是无限堆积。
+归因是组的状态 (HiveMind / 进化依赖它)，在撮合的同一步里记录；成交后队列只承载通知类事件，
+队列满时丢弃的只是广播与播报 (计入 post_trade_dropped)。
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from config import (
+    ORDER_QUEUE_PER_AGENT,
+    ORDER_QUEUE_PER_GROUP,
+    ORDER_BATCH_SIZE,
+    POST_TRADE_QUEUE_LIMIT,
+    POST_TRADE_WORKERS,
+)
+from matching import OrderSide
+
+logger = logging.getLogger(__name__)
+
+
+class OrderQueueFull(Exception):
+    """排队订单超过上限 (背压)"""
+
+    def __init__(self, scope: str, depth: int, limit: int):
+        self.scope = scope  # "agent" / "group"
+        self.depth = depth
+        self.limit = limit
+        super().__init__(f"Order queue full ({scope}: {depth}/{limit}), retry later")
+
+
+@dataclass
+class OrderRequest:
+    agent_id: str
+    symbol: str
+    side: OrderSide
+    amount: float
+    reason: List[str] = field(default_factory=list)
+    chain: Optional[str] = None
+    contract_address: Optional[str] = None
+    source: str = "ws"
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    future: Optional[asyncio.Future] = None
+
+
+@dataclass
+class OrderResult:
+    success: bool
+    message: str
+    fill_price: float
+    trade: Optional[dict] = None  # 对应的 trade_history 记录 (含 SELL 的 trade_pnl)
+    batch_size: int = 1
+    latency_ms: float = 0.0
+    balance: Optional[float] = None  # 分片模式下由 worker 回传 (前端进程没有账户)
+    positions: Optional[dict] = None
+    order_id: Optional[str] = None  # 结果未决时可用于查询的订单号
+    pending: bool = False  # 分片超时 / 断连：订单可能仍在 worker 上成交，结果未知 (不要重试)
+
+
+@dataclass
+class PostTradeEvent:
+    group: object
+    request: OrderRequest
+    result: OrderResult
+
+
+def attribution_record(request: OrderRequest, result: OrderResult) -> dict:
+    """归因分析器的成交记录 (AttributionAnalyzer.record_trade 的格式)"""
+    side_str = request.side.value
+    record = {
+        "agent_id": request.agent_id,
+        "symbol": request.symbol,
+        "side": side_str,
+        "amount": request.amount,
+        "price": result.fill_price,
+        "value": request.amount if side_str == "BUY" else request.amount * result.fill_price,
+        "reason": request.reason,
+        "time": datetime.now().isoformat(),
+        "chain": request.chain if request.chain and request.chain != "unknown" else None,
+        "contract_address": request.contract_address,
+    }
+    # SELL 的 trade_pnl 来自撮合时的 trade_history 记录
+    if side_str == "SELL" and result.trade:
+        record["trade_pnl"] = result.trade.get("trade_pnl")
+    return record
+
+
+class GroupExecutor:
+    """单组执行器：每 Agent 一个 FIFO 队列，轮询取微批撮合"""
+
+    def __init__(self, pipeline: "OrderPipeline", group):
+        self.pipeline = pipeline
+        self.group = group
+        self.queues: Dict[str, Deque[OrderRequest]] = {}
+        self.ready: Deque[str] = deque()  # 有待处理订单的 Agent (轮询顺序)
+        self.depth = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def enqueue(self, request: OrderRequest):
+        queue = self.queues.get(request.agent_id)
+        queued = len(queue) if queue is not None else 0
+        if queued >= self.pipeline.per_agent_limit:
+            raise OrderQueueFull("agent", queued, self.pipeline.per_agent_limit)
+        if self.depth >= self.pipeline.per_group_limit:
+            raise OrderQueueFull("group", self.depth, self.pipeline.per_group_limit)
+        if queue is None:  # 被拒绝的提交不留下空队列
+            queue = self.queues[request.agent_id] = deque()
+        if not queue:
+            self.ready.append(request.agent_id)
+        queue.append(request)
+        self.depth += 1
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _take_batch(self) -> List[OrderRequest]:
+        """每轮每个 Agent 取一单，直到凑满 batch_size (同一 Agent 的订单保持 FIFO)"""
+        batch = []
+        limit = self.pipeline.batch_size
+        while self.ready and len(batch) < limit:
+            agent_id = self.ready.popleft()
+            queue = self.queues[agent_id]
+            batch.append(queue.popleft())
+            if queue:
+                self.ready.append(agent_id)
+            else:
+                del self.queues[agent_id]
+        self.depth -= len(batch)
+        return batch
+
+    async def _run(self):
+        while True:
+            if not self.ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            batch = self._take_batch()
+            if batch:
+                try:
+                    await self._execute(batch)
+                except Exception as e:
+                    logger.error(f"Order batch failed (Group {self.group.group_id}): {e}")
+                    for request in batch:
+                        if not request.future.done():
+                            request.future.set_result(OrderResult(False, f"Internal error: {e}", 0.0))
+
+    async def _execute(self, batch: List[OrderRequest]):
+        engine = self.group.engine
+        for request in batch:
+            engine.note_token_metadata(request.symbol, request.chain, request.contract_address)
+        await engine.ensure_prices([request.symbol for request in batch])
+
+        # 价格已就绪：以下整批成交不会让出事件循环，所有订单看到同一份价格
+        results = []
+        for request in batch:
+            success, message, fill_price = await engine.execute_order(
+                request.agent_id, request.symbol, request.side, request.amount,
+                request.reason, request.chain, request.contract_address,
+            )
+            trade = engine.trade_history[0] if success and engine.trade_history else None
+            results.append(OrderResult(success, message, fill_price, trade, batch_size=len(batch)))
+
+        now = time.perf_counter()
+        for request, result in zip(batch, results):
+            result.latency_ms = (now - request.enqueued_at) * 1000
+            self.pipeline._record_ack(result)
+            if not request.future.done():
+                request.future.set_result(result)
+            if result.success:
+                event = PostTradeEvent(self.group, request, result)
+                self.pipeline._record_attribution(event)
+                self.pipeline._post_trade(event)
+        self.pipeline.batches += 1
+        self.pipeline.batched_orders += len(batch)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+class OrderPipeline:
+    """全局下单管线：按组分发到 GroupExecutor，成交后处理交给独立的 worker"""
+
+    def __init__(
+        self,
+        group_manager,
+        post_trade: Optional[Callable[[PostTradeEvent], Awaitable[None]]] = None,
+        per_agent_limit: int = ORDER_QUEUE_PER_AGENT,
+        per_group_limit: int = ORDER_QUEUE_PER_GROUP,
+        batch_size: int = ORDER_BATCH_SIZE,
+        post_trade_limit: int = POST_TRADE_QUEUE_LIMIT,
+        post_trade_workers: int = POST_TRADE_WORKERS,
+    ):
+        self.group_manager = group_manager
+        self.post_trade_handler = post_trade
+        self.per_agent_limit = per_agent_limit
+        self.per_group_limit = per_group_limit
+        self.batch_size = batch_size
+        self.post_trade_limit = post_trade_limit
+        self.post_trade_workers = post_trade_workers
+
+        self.executors: Dict[int, GroupExecutor] = {}
+        self._post_queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+        # 度量
+        self.ack_latencies: Deque[float] = deque(maxlen=10000)
+        self.submitted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_orders = 0
+        self.post_trade_done = 0
+        self.post_trade_dropped = 0
+        self.post_trade_errors = 0
+        self.attribution_errors = 0
+
+    async def submit(self, agent_id: str, symbol: str, side: OrderSide, amount: float,
+                     reason: List[str] = None, chain: str = None, contract_address: str = None,
+                     source: str = "ws") -> OrderResult:
+        """提交订单并等待回执；队列已满时抛出 OrderQueueFull"""
+        group = self.group_manager.get_group(agent_id)
+        if group is None:
+            group = await self.group_manager.assign_agent(agent_id)
+
+        executor = self.executors.get(group.group_id)
+        if executor is None:
+            executor = self.executors[group.group_id] = GroupExecutor(self, group)
+
+        request = OrderRequest(
+            agent_id=agent_id, symbol=symbol, side=side, amount=amount,
+            reason=reason or [], chain=chain, contract_address=contract_address, source=source,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        try:
+            executor.enqueue(request)
+        except OrderQueueFull:
+            self.rejected += 1
+            raise
+        self.submitted += 1
+        return await request.future
+
+    # ========== 成交后处理 ==========
+
+    def _record_attribution(self, event: PostTradeEvent):
+        """同步记录归因 (不经过可丢弃的成交后队列)；分片前端的 RemoteGroup 没有归因器，由 worker 记录"""
+        attribution = getattr(event.group, "attribution", None)
+        if attribution is None:
+            return
+        try:
+            attribution.record_trade(attribution_record(event.request, event.result))
+        except Exception as e:
+            self.attribution_errors += 1
+            logger.error(f"Attribution error for {event.request.agent_id}: {e}")
+
+    def _post_trade(self, event: PostTradeEvent):
+        """通知类的成交后处理 (广播 / 播报)：队列满时丢弃"""
+        if self.post_trade_handler is None:
+            return
+        if self._post_queue is None:
+            self._post_queue = asyncio.Queue(maxsize=self.post_trade_limit)
+            loop = asyncio.get_running_loop()
+            self._workers = [loop.create_task(self._post_trade_worker())
+                             for _ in range(self.post_trade_workers)]
+        try:
+            self._post_queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.post_trade_dropped += 1
+            logger.warning(f"Post-trade queue full ({self.post_trade_limit}), dropped event for "
+                           f"{event.request.agent_id} ({self.post_trade_dropped} dropped so far)")
+
+    async def _post_trade_worker(self):
+        while True:
+            event = await self._post_queue.get()
+            try:
+                await self.post_trade_handler(event)
+                self.post_trade_done += 1
+            except Exception as e:
+                self.post_trade_errors += 1
+                logger.error(f"Post-trade handler error for {event.request.agent_id}: {e}")
+            finally:
+                self._post_queue.task_done()
+
+    async def drain(self):
+        """等待已排队的成交后处理完成 (测试/关闭时使用)"""
+        if self._post_queue is not None:
+            await self._post_queue.join()
+
+    async def stop(self):
+        for executor in self.executors.values():
+            executor.stop()
+        for task in self._workers:
+            task.cancel()
+
+    # ========== 度量 ==========
+
+    def _record_ack(self, result: OrderResult):
+        self.ack_latencies.append(result.latency_ms)
+
+    @staticmethod
+    def _percentile(values: List[float], q: float) -> float:
+        if not values:
+            return 0.0
+        values = sorted(values)
+        return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+    def stats(self) -> dict:
+        latencies = list(self.ack_latencies)
+        return {
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "queued": sum(e.depth for e in self.executors.values()),
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_orders / self.batches, 2) if self.batches else 0.0,
+            "ack_p50_ms": round(self._percentile(latencies, 50), 2),
+            "ack_p99_ms": round(self._percentile(latencies, 99), 2),
+            "post_trade_pending": self._post_queue.qsize() if self._post_queue else 0,
+            "post_trade_done": self.post_trade_done,
+            "post_trade_dropped": self.post_trade_dropped,
+            "post_trade_errors": self.post_trade_errors,
+            "attribution_errors": self.attribution_errors,
+        }
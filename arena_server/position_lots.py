@@ -0,0 +1,191 @@
+"""
+批次持仓 (FIFO Lots)
+MatchingEngine 的可选模式：每笔 BUY 记成一个批次 (数量 / 入场价 / 入场时间 / 标签)，
+SELL 按先进先出逐批次平仓，输出每个批次的已实现盈亏，HiveMind 据此把 PnL 精确归因到入场标签。
+
+布局：
+- LotQueue：一个 (agent, symbol) 的批次队列，数量 / 价格 / 时间存放在 array('d')，
+  标签存为 LotBook 标签表里的整数 id (array('l'))；队头用下标推进，消费过半时整体压缩
+- LotBook：(agent, symbol) → LotQueue，持仓清空时删除；标签组合在标签表里只存一份
+
+有界：单个队列超过 POSITION_LOTS_MAX 个批次时，最新的两个批次合并 (加权均价，标签取并集)，
+所以频繁加减仓的 Agent 内存和单笔成交开销都不会无限增长。标签表达到 POSITION_LOTS_TAG_TABLE_MAX
+时压缩掉已无批次引用的组合 (重编号)；Agent 被移除 / 竞技场重置时删除对应批次。
+
+启用: DARWIN_POSITION_LOTS=1 (Position.avg_price 照常维护，估值与排行榜不受影响)
+"""
+
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import POSITION_LOTS_MAX, POSITION_LOTS_TAG_TABLE_MAX
+
+EPSILON = 1e-12  # 浮点残量：小于此值的批次视为已平完
+
+
+class LotQueue:
+    """一个持仓的 FIFO 批次队列"""
+
+    __slots__ = ("amounts", "prices", "times", "tags", "head")
+
+    def __init__(self):
+        self.amounts = array("d")
+        self.prices = array("d")
+        self.times = array("d")
+        self.tags = array("l")
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.amounts) - self.head
+
+    @property
+    def total(self) -> float:
+        return sum(self.amounts[self.head:])
+
+    def push(self, amount: float, price: float, ts: float, tag_id: int, merge_tags=None, limit: int = POSITION_LOTS_MAX):
+        """追加一个批次；超过 limit 时与上一个批次合并 (merge_tags(a, b) 返回合并后的标签 id)"""
+        if len(self) >= limit > 1:
+            last = len(self.amounts) - 1
+            held = self.amounts[last]
+            self.prices[last] = (held * self.prices[last] + amount * price) / (held + amount)
+            self.amounts[last] = held + amount
+            if tag_id != self.tags[last] and merge_tags is not None:
+                self.tags[last] = merge_tags(self.tags[last], tag_id)
+            return
+        self.amounts.append(amount)
+        self.prices.append(price)
+        self.times.append(ts)
+        self.tags.append(tag_id)
+
+    def consume(self, amount: float) -> Tuple[List[Tuple[float, float, float, int]], float]:
+        """
+        先进先出平仓 amount
+
+        Returns:
+            ([(数量, 入场价, 入场时间, 标签 id), ...], 批次不足时剩余未匹配的数量)
+        """
+        fills = []
+        remaining = amount
+        while remaining > EPSILON and self.head < len(self.amounts):
+            i = self.head
+            take = min(self.amounts[i], remaining)
+            fills.append((take, self.prices[i], self.times[i], self.tags[i]))
+            remaining -= take
+            self.amounts[i] -= take
+            if self.amounts[i] <= EPSILON:
+                self.head += 1
+        self._compact()
+        return fills, max(remaining, 0.0)
+
+    def _compact(self):
+        if self.head and self.head * 2 >= len(self.amounts):
+            for column in (self.amounts, self.prices, self.times, self.tags):
+                del column[:self.head]
+            self.head = 0
+
+
+class LotBook:
+    """一个引擎内所有持仓的批次"""
+
+    def __init__(self, max_lots: int = POSITION_LOTS_MAX, max_tags: int = POSITION_LOTS_TAG_TABLE_MAX):
+        self.max_lots = max_lots
+        self.max_tags = max_tags
+        self.queues: Dict[Tuple[str, str], LotQueue] = {}
+        self._tag_table: List[Tuple[str, ...]] = [()]
+        self._tag_ids: Dict[Tuple[str, ...], int] = {(): 0}
+        self._compact_at = max_tags
+
+    def __len__(self) -> int:
+        return len(self.queues)
+
+    def _tag_id(self, tags: Sequence[str]) -> int:
+        key = tuple(tags or ())
+        tag_id = self._tag_ids.get(key)
+        if tag_id is None:
+            tag_id = self._tag_ids[key] = len(self._tag_table)
+            self._tag_table.append(key)
+        return tag_id
+
+    def _merge_tags(self, a: int, b: int) -> int:
+        merged = self._tag_table[a] + tuple(t for t in self._tag_table[b] if t not in self._tag_table[a])
+        return self._tag_id(merged)
+
+    def compact_tags(self):
+        """只保留未平仓批次引用的标签组合并重编号 (队头之前已平仓的位置记为无标签)"""
+        live = {0}
+        for queue in self.queues.values():
+            live.update(queue.tags[queue.head:])
+        remap = {old: new for new, old in enumerate(sorted(live))}
+        self._tag_table = [self._tag_table[old] for old in sorted(live)]
+        self._tag_ids = {tags: i for i, tags in enumerate(self._tag_table)}
+        for queue in self.queues.values():
+            queue.tags = array("l", (remap.get(tag_id, 0) for tag_id in queue.tags))
+        # 仍引用的组合很多时放宽阈值，避免每笔 BUY 都压缩
+        self._compact_at = max(self.max_tags, 2 * len(self._tag_table))
+
+    def open(self, agent_id: str, symbol: str, amount: float, price: float, ts: float,
+             tags: Sequence[str], new_position: bool = False):
+        """记录一笔 BUY；new_position=True 表示持仓是新建的，丢弃残留批次 (如管理员清空了持仓)"""
+        key = (agent_id, symbol)
+        if len(self._tag_table) >= self._compact_at:
+            self.compact_tags()  # 在 push 之前压缩：push 过程中的标签 id 不会被重编号
+        queue = self.queues.get(key)
+        if queue is None or new_position:
+            queue = self.queues[key] = LotQueue()
+        queue.push(amount, price, ts, self._tag_id(tags), self._merge_tags, self.max_lots)
+
+    def close(self, agent_id: str, symbol: str, amount: float, exit_price: float,
+              fallback_price: float) -> List[dict]:
+        """
+        记录一笔 SELL，返回逐批次已实现盈亏
+
+        批次不足的部分 (如重启前建立、没有批次记录的持仓) 按 fallback_price (均价) 作为一个无标签批次。
+        """
+        queue = self.queues.get((agent_id, symbol))
+        fills, remaining = queue.consume(amount) if queue is not None else ([], amount)
+        realized = [
+            self._realized(take, entry_price, exit_price, entry_time, self._tag_table[tag_id])
+            for take, entry_price, entry_time, tag_id in fills
+        ]
+        if remaining > EPSILON:
+            realized.append(self._realized(remaining, fallback_price, exit_price, None, ()))
+        return realized
+
+    def drop(self, agent_id: str, symbol: str):
+        """持仓清空时删除批次"""
+        self.queues.pop((agent_id, symbol), None)
+
+    def remove_agent(self, agent_id: str):
+        """Agent 被移除时删除它所有持仓的批次"""
+        for key in [key for key in self.queues if key[0] == agent_id]:
+            del self.queues[key]
+
+    def clear(self):
+        """竞技场重置 (持仓全部清空)：删除所有批次并清空标签表"""
+        self.queues.clear()
+        self._tag_table = [()]
+        self._tag_ids = {(): 0}
+        self._compact_at = self.max_tags
+
+    def lots(self, agent_id: str, symbol: str) -> List[dict]:
+        """未平仓批次 (旧 → 新)"""
+        queue = self.queues.get((agent_id, symbol))
+        if queue is None:
+            return []
+        return [
+            {"amount": queue.amounts[i], "entry_price": queue.prices[i], "entry_time": queue.times[i],
+             "reason": list(self._tag_table[queue.tags[i]])}
+            for i in range(queue.head, len(queue.amounts))
+        ]
+
+    @staticmethod
+    def _realized(amount: float, entry_price: float, exit_price: float,
+                  entry_time: Optional[float], tags: Tuple[str, ...]) -> dict:
+        return {
+            "amount": amount,
+            "entry_price": entry_price,
+            "entry_time": entry_time,
+            "reason": list(tags),
+            "pnl": round(amount * (exit_price - entry_price), 6),
+            "trade_pnl": round((exit_price - entry_price) / entry_price * 100, 2) if entry_price > 0 else 0.0,
+        }
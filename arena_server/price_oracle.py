@@ -0,0 +1,484 @@
+"""
+共享价格预言机 (Price Oracle)
+进程内唯一的实时价格源，所有 Group.engine 通过它获取价格
+
+核心机制：
+1. 请求合并：同一 symbol 的并发查询共享一个 in-flight future (避免惊群)
+2. TTL 缓存 + stale-while-revalidate：刚过期的价格先返回，后台异步刷新
+   上游出错 (超时 / 非 200) 时保留旧价，并在短暂的退避期内不再重试；
+   批量 /tokens 失败后按指数退避，不会退化成逐个 /search
+3. 批量冷查询：已知合约地址的 symbol 通过 /tokens/{a,b,c} 一次查询多个
+4. 可替换后端：DexScreenerBackend (真实 HTTP) / MockDexScreenerBackend (离线基准测试)
+
+首次查询未知地址的 symbol 走 /search，并记住最佳交易对的合约地址，
+之后的刷新都能走批量 /tokens 接口。
+
+合约地址的信任：预言机被所有组共享，订单里带的 contract_address 由 Agent 提供，不能直接采信。
+- 只使用配置的地址 (PRICE_ORACLE_ADDRESSES) 或某 symbol 第一次出现的地址，之后不同的地址被忽略
+- 缓存按 (symbol, 地址) 存放，换了地址不会沿用旧地址的价格
+- 按地址查到的交易对，baseToken.symbol 必须与请求的 symbol 一致，否则视为查不到
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import aiohttp
+
+from config import (
+    DEXSCREENER_BASE_URL,
+    PRICE_ORACLE_TTL,
+    PRICE_ORACLE_STALE_TTL,
+    PRICE_ORACLE_NEGATIVE_TTL,
+    PRICE_ORACLE_BATCH_WINDOW,
+    PRICE_ORACLE_BATCH_SIZE,
+    PRICE_ORACLE_ADDRESSES,
+)
+
+logger = logging.getLogger(__name__)
+
+DEXSCREENER_DEX_URL = f"{DEXSCREENER_BASE_URL}/latest/dex"
+
+
+class UpstreamError(Exception):
+    """上游返回非 200 (限流 / 故障)"""
+
+
+def _liquidity_usd(pair: dict) -> float:
+    try:
+        return float((pair.get("liquidity") or {}).get("usd", 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def select_best_pair(pairs: List[dict], symbol: str = None, address: str = None) -> Optional[dict]:
+    """从 DexScreener 交易对中选出匹配且流动性最高的一个
+
+    指定 address 时按 baseToken.address 匹配；指定 symbol 时 baseToken.symbol 也必须一致
+    """
+    candidates = pairs
+    if address:
+        address = address.lower()
+        candidates = [
+            p for p in candidates
+            if ((p.get("baseToken") or {}).get("address") or "").lower() == address
+        ]
+    if symbol or not address:
+        symbol = (symbol or "").upper()
+        candidates = [
+            p for p in candidates
+            if ((p.get("baseToken") or {}).get("symbol") or "").upper() == symbol
+        ]
+
+    if not candidates:
+        return None
+    return max(candidates, key=_liquidity_usd)
+
+
+def pair_price(pair: Optional[dict]) -> Optional[float]:
+    """交易对的 USD 价格 (无效则返回 None)"""
+    if not pair:
+        return None
+    try:
+        price = float(pair.get("priceUsd", 0) or 0)
+    except (TypeError, ValueError):
+        return None
+    return price if price > 0 else None
+
+
+class DexScreenerBackend:
+    """DexScreener HTTP 后端 (进程内共享一个 aiohttp session)"""
+
+    def __init__(self, base_url: str = DEXSCREENER_DEX_URL, timeout: float = 15.0):
+        self.base_url = base_url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.calls = 0
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def _get_json(self, url: str) -> Optional[dict]:
+        self.calls += 1
+        session = await self._get_session()
+        async with session.get(url, timeout=self.timeout) as resp:
+            if resp.status != 200:
+                raise UpstreamError(f"HTTP {resp.status} from {url.split('?')[0]}")
+            return await resp.json()
+
+    async def search(self, symbol: str) -> Optional[dict]:
+        return await self._get_json(f"{self.base_url}/search?q={symbol}")
+
+    async def tokens(self, addresses: List[str]) -> Optional[dict]:
+        return await self._get_json(f"{self.base_url}/tokens/{','.join(addresses)}")
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+
+class MockDexScreenerBackend:
+    """离线 Mock 后端
+
+    返回与 DexScreener 相同结构的 JSON，并统计上游调用次数，
+    用于在没有网络的环境下对预言机做命中率/调用量基准测试。
+    """
+
+    def __init__(
+        self,
+        prices: Dict[str, float],
+        addresses: Dict[str, str] = None,
+        latency: float = 0.05,
+        volatility: float = 0.0,
+    ):
+        self.prices = dict(prices)
+        self.addresses = addresses or {
+            sym: f"0x{i + 1:040x}" for i, sym in enumerate(sorted(self.prices))
+        }
+        self._by_address = {addr.lower(): sym for sym, addr in self.addresses.items()}
+        self.latency = latency
+        self.volatility = volatility
+        self.calls = 0
+        self.search_calls = 0
+        self.token_calls = 0
+        self.symbols_requested = 0
+        self.failing = False  # 为 True 时模拟上游限流，所有调用抛出 UpstreamError
+
+    async def _call(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.failing:
+            raise UpstreamError("HTTP 429")
+
+    def _pair(self, symbol: str) -> dict:
+        price = self.prices[symbol]
+        if self.volatility:
+            price *= 1 + random.gauss(0, self.volatility)
+        return {
+            "baseToken": {"symbol": symbol, "address": self.addresses[symbol]},
+            "priceUsd": str(price),
+            "liquidity": {"usd": 1_000_000},
+        }
+
+    async def search(self, symbol: str) -> Optional[dict]:
+        self.search_calls += 1
+        self.symbols_requested += 1
+        await self._call()
+        if symbol not in self.prices:
+            return {"pairs": []}
+        return {"pairs": [self._pair(symbol)]}
+
+    async def tokens(self, addresses: List[str]) -> Optional[dict]:
+        self.token_calls += 1
+        self.symbols_requested += len(addresses)
+        await self._call()
+        pairs = []
+        for addr in addresses:
+            symbol = self._by_address.get(addr.lower())
+            if symbol is not None:
+                pairs.append(self._pair(symbol))
+        return {"pairs": pairs}
+
+    async def close(self):
+        pass
+
+
+@dataclass
+class _CacheEntry:
+    price: Optional[float]
+    fetched_at: float
+    retry_at: float = 0.0  # 在此之前不再查询上游 (负缓存 / 出错退避)
+
+
+class PriceOracle:
+    """进程级共享价格缓存 + 请求合并 + 批量查询"""
+
+    def __init__(
+        self,
+        backend=None,
+        ttl: float = PRICE_ORACLE_TTL,
+        stale_ttl: float = PRICE_ORACLE_STALE_TTL,
+        negative_ttl: float = PRICE_ORACLE_NEGATIVE_TTL,
+        batch_window: float = PRICE_ORACLE_BATCH_WINDOW,
+        batch_size: int = PRICE_ORACLE_BATCH_SIZE,
+        addresses: Dict[str, str] = None,
+    ):
+        """
+        Args:
+            addresses: 配置的 symbol -> 合约地址 (可信，不会被 Agent 提供的地址覆盖)
+        """
+        self.backend = backend or DexScreenerBackend()
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+
+        self._cache: Dict[Tuple[str, str], _CacheEntry] = {}  # (symbol, 小写地址 / "") -> 价格
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._configured: Set[str] = set(addresses or ())
+        self._addresses: Dict[str, str] = dict(addresses or {})  # symbol -> 可信合约地址 (配置或首次出现)
+        self._pending_batch: Dict[Tuple[str, str], str] = {}  # key -> address (等待批量查询)
+        self._batch_task: Optional[asyncio.Task] = None
+        self._batch_failures = 0  # 连续失败的批量查询次数
+        self._batch_backoff_until = 0.0
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "upstream_calls": 0,
+            "search_calls": 0,
+            "batch_calls": 0,
+            "batched_symbols": 0,
+            "errors": 0,
+            "backoff_skips": 0,
+            "address_conflicts": 0,
+            "symbol_mismatches": 0,
+        }
+
+    # ========== 公共接口 ==========
+
+    def register_address(self, symbol: str, address: Optional[str]):
+        """记录 symbol 的合约地址，之后的查询可走批量 /tokens 接口
+
+        只接受第一次出现的地址；与已知地址 (配置或首次出现) 不同的地址被忽略
+        """
+        if not symbol or not address:
+            return
+        known = self._addresses.get(symbol)
+        if known is None:
+            self._addresses[symbol] = address
+        elif known.lower() != address.lower():
+            self.counters["address_conflicts"] += 1
+
+    def _key(self, symbol: str) -> Tuple[str, str]:
+        return symbol, (self._addresses.get(symbol) or "").lower()
+
+    def peek(self, symbol: str) -> Optional[float]:
+        """只读缓存 (新鲜或可用的旧价)，不触发查询"""
+        entry = self._cache.get(self._key(symbol))
+        if entry is None or entry.price is None:
+            return None
+        if time.monotonic() - entry.fetched_at < self.ttl + self.stale_ttl:
+            return entry.price
+        return None
+
+    def fresh(self, symbol: str) -> Optional[float]:
+        """只返回 TTL 内的新鲜价格，不触发查询"""
+        entry = self._cache.get(self._key(symbol))
+        if entry is None or entry.price is None:
+            return None
+        if time.monotonic() - entry.fetched_at < self.ttl:
+            return entry.price
+        return None
+
+    def prime(self, prices: Dict[str, float]):
+        """用外部获得的价格预热缓存"""
+        now = time.monotonic()
+        for symbol, price in prices.items():
+            if price and price > 0:
+                self._cache[self._key(symbol)] = _CacheEntry(price=float(price), fetched_at=now)
+
+    async def get_price(self, symbol: str, address: str = None) -> Optional[float]:
+        """获取价格：新鲜缓存直接返回；旧价先返回并后台刷新；否则合并查询上游
+
+        address 仅在该 symbol 还没有可信地址时被记录，价格始终按可信地址查询
+        """
+        self.register_address(symbol, address)
+
+        entry = self._cache.get(self._key(symbol))
+        if entry is not None:
+            now = time.monotonic()
+            age = now - entry.fetched_at
+            if now < entry.retry_at:
+                # 负缓存或出错后的退避期：返回已有的值 (旧价或 None)，不打上游
+                self.counters["hits" if entry.price is None or age < self.ttl else "stale_hits"] += 1
+                return entry.price
+            if entry.price is not None and age < self.ttl:
+                self.counters["hits"] += 1
+                return entry.price
+            if entry.price is not None and age < self.ttl + self.stale_ttl:
+                self.counters["stale_hits"] += 1
+                self._load(symbol)  # stale-while-revalidate
+                return entry.price
+
+        self.counters["misses"] += 1
+        return await asyncio.shield(self._load(symbol))
+
+    async def fetch(self, symbol: str, address: str = None) -> Optional[float]:
+        """强制向上游刷新 (仍与进行中的同 symbol 查询合并；退避期内返回已有的值)"""
+        self.register_address(symbol, address)
+        entry = self._cache.get(self._key(symbol))
+        if entry is not None and time.monotonic() < entry.retry_at:
+            return entry.price
+        return await asyncio.shield(self._load(symbol))
+
+    def stats(self) -> dict:
+        """命中率与上游调用统计"""
+        lookups = self.counters["hits"] + self.counters["stale_hits"] + self.counters["misses"]
+        served = self.counters["hits"] + self.counters["stale_hits"]
+        return {
+            **self.counters,
+            "lookups": lookups,
+            "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+            "cached_symbols": len(self._cache),
+            "known_addresses": len(self._addresses),
+            "inflight": len(self._inflight),
+        }
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await self.backend.close()
+
+    # ========== 内部实现 ==========
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _load(self, symbol: str) -> asyncio.Future:
+        """返回该 symbol (按当前可信地址) 的 in-flight future (已有则复用)"""
+        key = self._key(symbol)
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.counters["coalesced"] += 1
+            return fut
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+
+        address = self._addresses.get(symbol)
+        if address and time.monotonic() < self._batch_backoff_until:
+            # 批量接口刚失败：退避期内不打上游，也不改走逐个 /search
+            self.counters["backoff_skips"] += 1
+            self._fail(key, self._batch_backoff_until)
+        elif address:
+            self._pending_batch[key] = address
+            self._schedule_flush()
+        else:
+            self._spawn(self._run_search(symbol))
+        return fut
+
+    def _resolve(self, key: Tuple[str, str], price: Optional[float]):
+        """上游给出了结果 (price 为 None 表示查不到，负缓存 negative_ttl)"""
+        now = time.monotonic()
+        retry_at = now + self.negative_ttl if price is None else 0.0
+        self._cache[key] = _CacheEntry(price=price, fetched_at=now, retry_at=retry_at)
+        self._settle(key, price)
+
+    def _fail(self, key: Tuple[str, str], retry_at: float):
+        """上游出错：保留已有的价格 (可能是旧价)，retry_at 之前不再查询"""
+        entry = self._cache.get(key)
+        if entry is None:
+            entry = self._cache[key] = _CacheEntry(price=None, fetched_at=time.monotonic())
+        entry.retry_at = retry_at
+        self._settle(key, entry.price)
+
+    def _settle(self, key: Tuple[str, str], price: Optional[float]):
+        fut = self._inflight.pop(key, None)
+        if fut is not None and not fut.done():
+            fut.set_result(price)
+
+    def _schedule_flush(self):
+        if len(self._pending_batch) >= self.batch_size:
+            self._spawn(self._flush())
+        elif self._batch_task is None:
+            self._batch_task = self._spawn(self._flush_after(self.batch_window))
+
+    async def _flush_after(self, delay: float):
+        await asyncio.sleep(delay)
+        self._batch_task = None
+        await self._flush()
+
+    async def _flush(self):
+        pending, self._pending_batch = self._pending_batch, {}
+        if not pending:
+            return
+        items = list(pending.items())
+        chunks = [
+            dict(items[i:i + self.batch_size])
+            for i in range(0, len(items), self.batch_size)
+        ]
+        await asyncio.gather(*(self._run_tokens(chunk) for chunk in chunks))
+
+    async def _run_tokens(self, chunk: Dict[Tuple[str, str], str]):
+        """批量查询 /tokens/{a,b,c}"""
+        self.counters["upstream_calls"] += 1
+        self.counters["batch_calls"] += 1
+        self.counters["batched_symbols"] += len(chunk)
+        try:
+            data = await self.backend.tokens(list(chunk.values()))
+        except Exception as e:
+            # 上游多半在限流：指数退避 (negative_ttl 起，最多 stale_ttl)，期间保留旧价
+            self.counters["errors"] += 1
+            self._batch_failures += 1
+            delay = min(self.negative_ttl * 2 ** (self._batch_failures - 1), self.stale_ttl)
+            self._batch_backoff_until = max(self._batch_backoff_until, time.monotonic() + delay)
+            logger.warning(f"Batch price fetch failed ({len(chunk)} tokens), backing off {delay:.0f}s: {e}")
+            for key in chunk:
+                self._fail(key, self._batch_backoff_until)
+            return
+
+        self._batch_failures = 0
+
+        pairs = (data or {}).get("pairs") or []
+        for key, address in chunk.items():
+            symbol = key[0]
+            price = pair_price(select_best_pair(pairs, symbol=symbol, address=address))
+            if price is not None:
+                self._resolve(key, price)
+                continue
+            if select_best_pair(pairs, address=address) is not None:
+                # 地址对应的代币不是这个 symbol
+                self.counters["symbol_mismatches"] += 1
+                logger.warning(f"Price pair for {symbol} at {address} has a different base symbol")
+            if symbol in self._configured:
+                self._resolve(key, None)
+            else:
+                # 地址无效或已下架 → 退回按 symbol 搜索
+                self._addresses.pop(symbol, None)
+                self._spawn(self._run_search(symbol, key))
+
+    async def _run_search(self, symbol: str, key: Tuple[str, str] = None):
+        """按 symbol 搜索，取流动性最高的匹配交易对
+
+        Args:
+            key: 等待结果的缓存键 (默认 (symbol, ""))；搜到的地址成为可信地址时同时写入该地址的缓存
+        """
+        key = key or (symbol, "")
+        self.counters["upstream_calls"] += 1
+        self.counters["search_calls"] += 1
+        price = None
+        best = None
+        try:
+            data = await self.backend.search(symbol)
+            best = select_best_pair((data or {}).get("pairs") or [], symbol=symbol)
+            price = pair_price(best)
+            if best is not None:
+                self.register_address(symbol, (best.get("baseToken") or {}).get("address"))
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.warning(f"Error fetching price for {symbol}: {e}")
+            self._fail(key, time.monotonic() + self.negative_ttl)
+            return
+        trusted_key = self._key(symbol)
+        if price is not None and trusted_key != key and trusted_key[1] == \
+                ((best.get("baseToken") or {}).get("address") or "").lower():
+            # 搜到的地址就是可信地址：之后按地址的查询直接命中
+            self._cache[trusted_key] = _CacheEntry(price=price, fetched_at=time.monotonic())
+        self._resolve(key, price)
+
+
+# 全局实例
+price_oracle = PriceOracle(addresses=PRICE_ORACLE_ADDRESSES)
@@ -0,0 +1,169 @@
+"""
+持仓价格刷新管线 (Price Refresh Pipeline)
+周期性地为所有组的持仓代币打上最新市场价 (用于 PnL / 排行榜)
+
+流程：
+1. 收集：跨所有组的持仓 symbol 去重 (20 个组持有同一个 meme 只查一次)
+2. 扇出：通过共享 PriceOracle 并发查询，Semaphore 限制同时在途的上游请求；
+   已知合约地址的 symbol 由预言机合并进 /tokens 批量接口
+3. 发布：组装一个带版本号的 PriceSnapshot，在同一个事件循环步内让所有引擎采纳
+   (中间没有 await，任何读者都不会看到新旧混杂的价格)
+4. 度量：记录每轮耗时、覆盖率与快照年龄，在 /stats 中展示 PnL 标记的新鲜度
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from config import PRICE_REFRESH_CONCURRENCY
+from price_oracle import PriceOracle, price_oracle
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PriceSnapshot:
+    """一轮刷新得到的不可变价格快照"""
+    version: int
+    prices: Dict[str, float]
+    taken_at: float  # unix 时间戳
+    requested: int  # 本轮需要标记的 symbol 数
+    duration_ms: float
+
+    @property
+    def coverage(self) -> float:
+        return len(self.prices) / self.requested if self.requested else 1.0
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.taken_at
+
+
+@dataclass
+class RefreshPass:
+    """单轮刷新度量"""
+    version: int
+    symbols: int
+    updated: int
+    failed: int
+    duration_ms: float
+    finished_at: float
+    missing: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "symbols": self.symbols,
+            "updated": self.updated,
+            "failed": self.failed,
+            "coverage": round(self.updated / self.symbols, 4) if self.symbols else 1.0,
+            "duration_ms": round(self.duration_ms, 1),
+            "finished_at": self.finished_at,
+            "missing": self.missing[:20],
+        }
+
+
+class PriceRefresher:
+    """跨组去重 + 有界并发 + 原子快照发布"""
+
+    def __init__(self, oracle: Optional[PriceOracle] = None,
+                 concurrency: int = PRICE_REFRESH_CONCURRENCY, history: int = 60):
+        self.oracle = oracle or price_oracle
+        self.concurrency = max(1, concurrency)
+        self.snapshot: Optional[PriceSnapshot] = None
+        self.passes: deque = deque(maxlen=history)
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def collect_symbols(engines: Iterable) -> Dict[str, Optional[str]]:
+        """收集所有引擎的持仓 symbol → 合约地址 (去重)"""
+        symbols: Dict[str, Optional[str]] = {}
+        for engine in engines:
+            for account in engine.accounts.values():
+                for symbol in account.positions:
+                    if symbols.get(symbol) is None:
+                        meta = engine.token_metadata.get(symbol) or {}
+                        symbols[symbol] = meta.get("contract_address") or None
+        return symbols
+
+    async def refresh(self, engines: List) -> PriceSnapshot:
+        """执行一轮刷新并让所有引擎采纳新快照
+
+        同一时刻只允许一轮刷新在跑；并发调用者会等待并拿到同一轮之后的快照。
+        """
+        async with self._lock:
+            return await self._refresh(engines)
+
+    async def _refresh(self, engines: List) -> PriceSnapshot:
+        start = time.perf_counter()
+        symbols = self.collect_symbols(engines)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def mark(symbol: str, address: Optional[str]) -> Optional[float]:
+            price = self.oracle.fresh(symbol)
+            if price is not None:
+                return price
+            async with semaphore:
+                try:
+                    return await self.oracle.fetch(symbol, address)
+                except Exception as e:
+                    logger.warning(f"Failed to refresh price for {symbol}: {e}")
+                    return None
+
+        items = list(symbols.items())
+        results = await asyncio.gather(*(mark(sym, addr) for sym, addr in items))
+
+        prices: Dict[str, float] = {}
+        missing: List[str] = []
+        for (symbol, _), price in zip(items, results):
+            if price and price > 0:
+                prices[symbol] = price
+            else:
+                missing.append(symbol)
+
+        self._version += 1
+        duration_ms = (time.perf_counter() - start) * 1000
+        snapshot = PriceSnapshot(
+            version=self._version,
+            prices=prices,
+            taken_at=time.time(),
+            requested=len(items),
+            duration_ms=duration_ms,
+        )
+
+        # 原子发布：以下循环内没有 await
+        for engine in engines:
+            engine.adopt_price_snapshot(snapshot)
+        self.snapshot = snapshot
+
+        self.passes.append(RefreshPass(
+            version=snapshot.version,
+            symbols=len(items),
+            updated=len(prices),
+            failed=len(missing),
+            duration_ms=duration_ms,
+            finished_at=snapshot.taken_at,
+            missing=missing,
+        ))
+        return snapshot
+
+    def stats(self) -> dict:
+        """刷新度量：最近一轮 + 滑动窗口平均"""
+        if not self.passes:
+            return {"passes": 0, "snapshot_version": 0, "snapshot_age_seconds": None}
+        last = self.passes[-1]
+        durations = [p.duration_ms for p in self.passes]
+        coverages = [p.updated / p.symbols for p in self.passes if p.symbols]
+        return {
+            "passes": len(self.passes),
+            "snapshot_version": self.snapshot.version if self.snapshot else 0,
+            "snapshot_age_seconds": round(self.snapshot.age_seconds, 1) if self.snapshot else None,
+            "last_pass": last.to_dict(),
+            "avg_duration_ms": round(sum(durations) / len(durations), 1),
+            "max_duration_ms": round(max(durations), 1),
+            "avg_coverage": round(sum(coverages) / len(coverages), 4) if coverages else 1.0,
+        }
@@ -6,6 +6,7 @@ Redis State Manager
 import os
 import json
 import logging
+import time
 from typing import Dict, Any, Optional
 from datetime import datetime
 
@@ -25,19 +26,27 @@ KEY_TOTAL_VOLUME = "darwin:total_volume"  # String: total volume
 KEY_LEADERBOARD = "darwin:leaderboard"  # Sorted Set: agent_id -> pnl
 KEY_IP_LIMITS = "darwin:ip_limits"  # Hash: ip -> count
 KEY_TRADE_HISTORY = "darwin:trade_history"  # String: JSON list of recent trades
-KEY_COUNCIL_SESSIONS = "darwin:council_sessions"  # String: JSON dict of council sessions
+KEY_COUNCIL_SESSIONS = "darwin:council_sessions"  # String: JSON dict of council sessions (旧格式，仅用于加载)
+KEY_COUNCIL = "darwin:council"  # Hash: epoch -> session_json
+KEY_COUNCIL_SCORES = "darwin:council_scores"  # Hash: agent_id -> contribution score
+KEY_SNAPSHOT_AT = "darwin:snapshot_at"  # String: 最近一次全量压缩快照的 unix 时间
 
 
 class RedisStateManager:
     """Redis状态管理器（含断线重连）"""
 
-    def __init__(self):
+    def __init__(self, client=None):
         self.redis = None
         self.enabled = False
+        self._client = client  # 注入的客户端 (压测 / 测试用)
         self._connect()
 
     def _connect(self):
         """连接Redis"""
+        if self._client is not None:
+            self.redis = self._client
+            self.enabled = True
+            return
         try:
             import redis
             self.redis = redis.Redis(
@@ -257,52 +266,135 @@ class RedisStateManager:
             logger.error(f"Redis save_council_sessions error: {e}")
 
     def load_council_sessions(self) -> dict:
-        """Load council sessions"""
+        """Load council sessions (每会话一个 hash 字段；兼容旧的整块 JSON)"""
         if not self.enabled:
             return {}
         try:
+            data = self.redis.hgetall(KEY_COUNCIL)
+            if data:
+                return {epoch: json.loads(raw) for epoch, raw in data.items()}
             data = self.redis.get(KEY_COUNCIL_SESSIONS)
             return json.loads(data) if data else {}
         except Exception as e:
             logger.error(f"Redis load_council_sessions error: {e}")
             return {}
 
+    @staticmethod
+    def _replace_hash(pipe, key: str, mapping: dict) -> int:
+        """写临时 key 再 RENAME：整表替换是原子的，不存在 DELETE 后、HSET 前的空窗"""
+        if not mapping:
+            pipe.delete(key)
+            return 0
+        tmp = f"{key}:compact"
+        pipe.delete(tmp)
+        pipe.hset(tmp, mapping=mapping)
+        pipe.rename(tmp, key)
+        return sum(len(k) + len(v) for k, v in mapping.items())
+
     def save_full_state(self, epoch: int, trade_count: int, total_volume: float,
                         api_keys: dict, agents: dict,
-                        trade_history: list = None, council_sessions: dict = None):
-        """保存完整状态（用于定期备份）"""
-        self._ensure_connection()
-        if not self.enabled:
-            return
+                        trade_history: list = None, council_sessions: dict = None,
+                        council_scores: dict = None) -> int:
+        """保存完整状态（用于定期备份）；返回写入的字节数 (估算)，失败返回 0"""
         try:
-            pipe = self.redis.pipeline()
-            pipe.set(KEY_EPOCH, str(epoch))
-            pipe.set(KEY_TRADE_COUNT, str(trade_count))
-            pipe.set(KEY_TOTAL_VOLUME, str(total_volume))
-
-            # API Keys
-            if api_keys:
-                pipe.delete(KEY_API_KEYS)
-                pipe.hset(KEY_API_KEYS, mapping=api_keys)
-
-            # Agents
-            if agents:
-                agents_json = {aid: json.dumps(data) for aid, data in agents.items()}
-                pipe.delete(KEY_AGENTS)
-                pipe.hset(KEY_AGENTS, mapping=agents_json)
-
-            # Trade History
-            if trade_history is not None:
-                pipe.set(KEY_TRADE_HISTORY, json.dumps(trade_history[:200]))
-
-            # Council Sessions
-            if council_sessions is not None:
-                pipe.set(KEY_COUNCIL_SESSIONS, json.dumps(council_sessions))
-
-            pipe.execute()
-            logger.info(f"💾 Redis state saved (Epoch {epoch}, {len(agents)} agents)")
+            return self.write_full_state(epoch, trade_count, total_volume, api_keys, agents,
+                                         trade_history, council_sessions, council_scores)
         except Exception as e:
             logger.error(f"Redis save_full_state error: {e}")
+            return 0
+
+    def write_full_state(self, epoch: int, trade_count: int, total_volume: float,
+                         api_keys: dict, agents: dict,
+                         trade_history: list = None, council_sessions: dict = None,
+                         council_scores: dict = None) -> int:
+        """全量压缩快照：每张 hash 整表原子替换 (清理已删除的残留字段)；失败时抛出异常
+
+        会阻塞调用线程，事件循环里请经由 StatePersistence (asyncio.to_thread) 调用。
+        """
+        self._ensure_connection()
+        if not self.enabled:
+            return 0
+        written = 0
+        pipe = self.redis.pipeline()
+        pipe.set(KEY_EPOCH, str(epoch))
+        pipe.set(KEY_TRADE_COUNT, str(trade_count))
+        pipe.set(KEY_TOTAL_VOLUME, str(total_volume))
+
+        # API Keys
+        if api_keys:
+            written += self._replace_hash(pipe, KEY_API_KEYS, dict(api_keys))
+
+        # Agents
+        if agents:
+            agents_json = {aid: json.dumps(data) for aid, data in agents.items()}
+            written += self._replace_hash(pipe, KEY_AGENTS, agents_json)
+
+        # Trade History
+        if trade_history is not None:
+            trades_json = json.dumps(trade_history[:200])
+            pipe.set(KEY_TRADE_HISTORY, trades_json)
+            written += len(trades_json)
+
+        # Council Sessions
+        if council_sessions is not None:
+            council_json = {epoch_key: json.dumps(s) for epoch_key, s in council_sessions.items()}
+            written += self._replace_hash(pipe, KEY_COUNCIL, council_json)
+            pipe.delete(KEY_COUNCIL_SESSIONS)
+        if council_scores is not None:
+            scores_json = {aid: json.dumps(score) for aid, score in council_scores.items()}
+            written += self._replace_hash(pipe, KEY_COUNCIL_SCORES, scores_json)
+
+        pipe.set(KEY_SNAPSHOT_AT, str(time.time()))
+        pipe.execute()
+        logger.info(f"💾 Redis state saved (Epoch {epoch}, {len(agents)} agents, {written / 1024:.0f} KB)")
+        return written
+
+    def save_delta(self, epoch: int, trade_count: int, total_volume: float,
+                   agents: dict = None, removed_agents=(), api_keys: dict = None, removed_keys=(),
+                   council_sessions: dict = None, trade_history: list = None,
+                   removed_council=(), council_scores: dict = None) -> int:
+        """增量保存：只写变更的 hash 字段，一次 pipeline 往返；返回写入的字节数 (估算)
+
+        会阻塞调用线程，事件循环里请经由 StatePersistence (asyncio.to_thread) 调用。
+        失败时抛出异常，由调用方把这批变更放回待写队列。
+        """
+        self._ensure_connection()
+        if not self.enabled:
+            return 0
+        written = 0
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(KEY_EPOCH, str(epoch))
+        pipe.set(KEY_TRADE_COUNT, str(trade_count))
+        pipe.set(KEY_TOTAL_VOLUME, str(total_volume))
+
+        if agents:
+            agents_json = {aid: json.dumps(data) for aid, data in agents.items()}
+            pipe.hset(KEY_AGENTS, mapping=agents_json)
+            written += sum(len(k) + len(v) for k, v in agents_json.items())
+        if removed_agents:
+            pipe.hdel(KEY_AGENTS, *removed_agents)
+            pipe.hdel(KEY_COUNCIL_SCORES, *removed_agents)
+        if api_keys:
+            pipe.hset(KEY_API_KEYS, mapping=api_keys)
+            written += sum(len(k) + len(v) for k, v in api_keys.items())
+        if removed_keys:
+            pipe.hdel(KEY_API_KEYS, *removed_keys)
+        if council_sessions:
+            council_json = {epoch_key: json.dumps(s) for epoch_key, s in council_sessions.items()}
+            pipe.hset(KEY_COUNCIL, mapping=council_json)
+            written += sum(len(v) for v in council_json.values())
+        if removed_council:
+            pipe.hdel(KEY_COUNCIL, *(str(e) for e in removed_council))
+        if council_scores:
+            pipe.hset(KEY_COUNCIL_SCORES, mapping={aid: json.dumps(score) for aid, score in council_scores.items()})
+            written += sum(len(aid) + 8 for aid in council_scores)
+        if trade_history is not None:
+            trades_json = json.dumps(trade_history[:200])
+            pipe.set(KEY_TRADE_HISTORY, trades_json)
+            written += len(trades_json)
+
+        pipe.execute()
+        return written
     
     def load_full_state(self) -> Optional[dict]:
         """加载完整状态"""
@@ -310,12 +402,31 @@ class RedisStateManager:
         if not self.enabled:
             return None
         try:
-            epoch = self.get_epoch()
-            tc, tv = self.get_stats()
-            api_keys = self.get_api_keys()
-            agents = self.get_all_agents()
-            trade_history = self.load_trade_history()
-            council_sessions = self.load_council_sessions()
+            # 一次 pipeline 往返读回全部 key
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.get(KEY_EPOCH)
+            pipe.get(KEY_TRADE_COUNT)
+            pipe.get(KEY_TOTAL_VOLUME)
+            pipe.hgetall(KEY_API_KEYS)
+            pipe.hgetall(KEY_AGENTS)
+            pipe.get(KEY_TRADE_HISTORY)
+            pipe.hgetall(KEY_COUNCIL)
+            pipe.hgetall(KEY_COUNCIL_SCORES)
+            (raw_epoch, raw_tc, raw_tv, api_keys, raw_agents, raw_trades,
+             raw_council, raw_scores) = pipe.execute()
+
+            epoch = int(raw_epoch) if raw_epoch else 1
+            tc = int(raw_tc) if raw_tc else 0
+            tv = float(raw_tv) if raw_tv else 0.0
+            api_keys = api_keys or {}
+            agents = {aid: json.loads(data) for aid, data in (raw_agents or {}).items()}
+            trade_history = json.loads(raw_trades) if raw_trades else []
+            if raw_council:
+                council_sessions = {e: json.loads(data) for e, data in raw_council.items()}
+            else:
+                council_sessions = self.load_council_sessions()  # 旧格式
+            # 旧数据没有贡献值聚合：None 表示由会话消息重新累加
+            council_scores = {aid: json.loads(v) for aid, v in raw_scores.items()} if raw_scores else None
 
             if epoch > 1 or api_keys or agents:
                 logger.info(f"📂 Redis state loaded: Epoch {epoch}, {len(agents)} agents, {len(api_keys)} keys, {len(trade_history)} trades, {len(council_sessions)} council sessions")
@@ -327,6 +438,7 @@ class RedisStateManager:
                     "agents": agents,
                     "trade_history": trade_history,
                     "council_sessions": council_sessions,
+                    "council_scores": council_scores,
                 }
             return None
         except Exception as e:
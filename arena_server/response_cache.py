@@ -0,0 +1,153 @@
+"""
+响应缓存 (Response Cache)
+热门只读端点 (/leaderboard /stats /groups /hive-mind /council-logs /trades /baseline /ascension)
+被大量仪表盘和 Agent 轮询，而底层数据只在成交、价格刷新、Epoch 切换时才变化。
+
+每个端点按 (版本键, 查询参数) 缓存序列化好的响应字节：
+- 版本键由调用方给出 (引擎 / 议事厅 / 基线的版本计数等)，键不变即命中，所有客户端共享同一份字节
+- 含墙钟相关字段的端点 (在线状态、运行时计数) 额外设置 ttl，过期后重建
+- ETag 取响应体的哈希；If-None-Match 命中当前有效条目时直接返回 304，不重算不序列化
+- 版本变了但内容没变 (重建后哈希相同) 的条件请求同样返回 304
+
+每个端点记录 hits / misses / not_modified，/stats 中给出命中率。
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from config import RESPONSE_CACHE_VARIANTS
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+def render_json(data: Any) -> bytes:
+    """与 FastAPI 默认 JSONResponse 相同的紧凑编码"""
+    return json.dumps(
+        data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"), default=_json_default,
+    ).encode("utf-8")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 可以是 "*" 或逗号分隔的 (弱) ETag 列表"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):  # 弱比较
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
+class CachedResponse:
+    """一份已序列化的响应"""
+
+    __slots__ = ("key", "body", "etag", "headers", "built_at")
+
+    def __init__(self, key: Hashable, body: bytes, headers: Dict[str, str]):
+        self.key = key
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.headers = headers
+        self.built_at = time.monotonic()
+
+
+class ResponseCache:
+    """按端点划分的版本化响应缓存"""
+
+    def __init__(self, variants: int = RESPONSE_CACHE_VARIANTS, render: Callable[[Any], bytes] = render_json):
+        """
+        Args:
+            variants: 每个端点最多保留的查询参数组合数 (LRU)
+            render: 负载 → 响应体字节
+        """
+        self.variants = variants
+        self.render = render
+        self.entries: Dict[str, OrderedDict] = {}  # endpoint -> {params: CachedResponse}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, endpoint: str, field: str):
+        counters = self.counters.setdefault(endpoint, {"hits": 0, "misses": 0, "not_modified": 0})
+        counters[field] += 1
+
+    def lookup(self, endpoint: str, key: Hashable, params: Hashable = (),
+               ttl: Optional[float] = None) -> Optional[CachedResponse]:
+        """版本键一致且未过期的条目，否则 None"""
+        variants = self.entries.get(endpoint)
+        entry = variants.get(params) if variants is not None else None
+        if entry is None or entry.key != key:
+            return None
+        if ttl is not None and time.monotonic() - entry.built_at >= ttl:
+            return None
+        variants.move_to_end(params)
+        return entry
+
+    def store(self, endpoint: str, key: Hashable, params: Hashable, data: Any,
+              headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        entry = CachedResponse(key, self.render(data), headers or {})
+        variants = self.entries.setdefault(endpoint, OrderedDict())
+        variants[params] = entry
+        variants.move_to_end(params)
+        while len(variants) > self.variants:
+            variants.popitem(last=False)
+        return entry
+
+    def fetch(
+        self,
+        endpoint: str,
+        key: Hashable,
+        build: Callable[[Dict[str, str]], Any],
+        params: Hashable = (),
+        ttl: Optional[float] = None,
+        if_none_match: Optional[str] = None,
+    ) -> Tuple[int, CachedResponse]:
+        """
+        取缓存的响应，失效时调用 build 重建
+
+        Args:
+            build: (headers) -> 负载；需要额外响应头 (如分页游标) 时写入 headers
+            if_none_match: 请求的 If-None-Match 头
+
+        Returns:
+            (状态码 200 / 304, 条目)
+        """
+        entry = self.lookup(endpoint, key, params, ttl)
+        if entry is not None:
+            self._count(endpoint, "hits")
+        else:
+            self._count(endpoint, "misses")
+            headers: Dict[str, str] = {}
+            entry = self.store(endpoint, key, params, build(headers), headers)
+        if etag_matches(if_none_match, entry.etag):
+            self._count(endpoint, "not_modified")
+            return 304, entry
+        return 200, entry
+
+    def invalidate(self, endpoint: Optional[str] = None):
+        """丢弃一个端点 (None = 全部) 的缓存"""
+        if endpoint is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(endpoint, None)
+
+    def stats(self) -> dict:
+        result = {}
+        for endpoint, counters in sorted(self.counters.items()):
+            requests = counters["hits"] + counters["misses"]
+            result[endpoint] = {
+                **counters,
+                "hit_rate": round(counters["hits"] / requests, 4) if requests else 0.0,
+                "cached_variants": len(self.entries.get(endpoint, ())),
+            }
+        return result
@@ -0,0 +1,316 @@
+"""
+风险指标缓存 (Risk Metrics Cache)
+夏普 / 索提诺 / 最大回撤 / 卡尔玛 / 波动率在 Epoch 结束追加 pnl_history 时增量更新，
+/leaderboard、/stats、/ascension 直接读缓存 (每个 Agent O(1))，不再每次请求重算整段历史
+
+增量状态 (RiskSummary)：
+- 收益率与下行收益率各一份 Welford 运行矩 (均值 / 方差 / 胜场)
+- 回撤用对数净值的可结合摘要 (总增长, 最高前缀, 最低前缀, 最大跌幅)：
+  追加一个 Epoch 是 O(1)，两段序列可以按顺序合并 (/stats 的全体汇总)
+- pnl_history 只保留最近 PNL_HISTORY_LIMIT 条：窗口满后淘汰最旧样本时运行矩可以撤销；
+  回撤摘要不能撤销，但可结合，用双栈队列维护滑动窗口的聚合 (均摊 O(1))
+
+全量重算 (重启恢复 / 列式存储) 走 batch_summaries：有 numpy 时整个种群一次矩阵运算。
+"""
+
+import math
+from collections import deque
+from typing import Dict, Iterable, Mapping, Optional, Sequence
+
+from attribution import RunningStats
+from config import PNL_HISTORY_LIMIT
+from metrics import score_metrics
+
+try:
+    import numpy as np
+except ImportError:  # numpy 可选：没有时逐个 Agent 重算
+    np = None
+
+_MIN_GROWTH = 1e-12  # 净值归零 (PnL -100%) 时的下限，避免 log(0)
+
+EMPTY_METRICS = {
+    "composite_score": 0.0,
+    "sharpe_ratio": 0.0,
+    "sortino_ratio": 0.0,
+    "max_drawdown": 0.0,
+    "calmar_ratio": 0.0,
+    "win_rate": 0.0,
+    "volatility": 0.0,
+}
+
+
+def growth_step(pnl: float) -> float:
+    """按 PnL% 复利的一步对数增长"""
+    return math.log(max(1 + pnl / 100, _MIN_GROWTH))
+
+
+class RiskSummary:
+    """一段收益率序列的可增量、可合并摘要"""
+
+    __slots__ = ("returns", "downside", "total", "log_total", "log_max", "log_min", "log_dd")
+
+    def __init__(self):
+        self.returns = RunningStats()
+        self.downside = RunningStats()  # 只含负收益
+        self.total = 0.0  # 累计收益率 (各期 PnL% 之和)
+        # 对数净值 (起点为 0) 的回撤摘要
+        self.log_total = 0.0
+        self.log_max = 0.0
+        self.log_min = 0.0
+        self.log_dd = 0.0
+
+    @property
+    def count(self) -> int:
+        return self.returns.count
+
+    def add(self, pnl: float, step: Optional[float] = None):
+        """
+        追加一期收益
+
+        Args:
+            step: 本期对数净值变化 (默认按 PnL% 复利；AscensionTracker 传实际总资产之比)
+        """
+        self.returns.add(pnl)
+        if pnl < 0:
+            self.downside.add(pnl)
+        self.total += pnl
+        self.log_total += growth_step(pnl) if step is None else step
+        self.log_max = max(self.log_max, self.log_total)
+        self.log_min = min(self.log_min, self.log_total)
+        self.log_dd = max(self.log_dd, self.log_max - self.log_total)
+
+    def remove_moments(self, pnl: float):
+        """撤销最旧一期的运行矩与累计收益 (回撤摘要由调用方重算)"""
+        self.returns.remove(pnl)
+        if pnl < 0:
+            self.downside.remove(pnl)
+        self.total -= pnl
+
+    def set_drawdown(self, agg: tuple):
+        self.log_total, self.log_max, self.log_min, self.log_dd = agg
+
+    def merge(self, other: "RiskSummary"):
+        """把 other 接在本序列之后 (运行矩用并行公式，回撤摘要按顺序拼接)"""
+        self.returns.merge(other.returns)
+        self.downside.merge(other.downside)
+        self.total += other.total
+        self.log_dd = max(self.log_dd, other.log_dd, self.log_max - (self.log_total + other.log_min))
+        self.log_max = max(self.log_max, self.log_total + other.log_max)
+        self.log_min = min(self.log_min, self.log_total + other.log_min)
+        self.log_total += other.log_total
+
+    def to_state(self) -> list:
+        """可序列化的摘要 (分片 worker 上报，前端按顺序 merge)"""
+        return [self.returns.count, self.returns.wins, self.returns.mean, self.returns.m2,
+                self.downside.count, self.downside.wins, self.downside.mean, self.downside.m2,
+                self.total, self.log_total, self.log_max, self.log_min, self.log_dd]
+
+    @classmethod
+    def from_state(cls, state: Sequence[float]) -> "RiskSummary":
+        summary = cls()
+        (summary.returns.count, summary.returns.wins, summary.returns.mean, summary.returns.m2,
+         summary.downside.count, summary.downside.wins, summary.downside.mean, summary.downside.m2,
+         summary.total, summary.log_total, summary.log_max, summary.log_min, summary.log_dd) = state
+        return summary
+
+    def metrics(self) -> Dict[str, float]:
+        """与 metrics.calculate_composite_score 相同口径的指标"""
+        n = self.returns.count
+        if not n:
+            return dict(EMPTY_METRICS)
+        volatility = self.returns.variance ** 0.5 if n > 1 else 0.0
+        sharpe = self.returns.mean / volatility if volatility > 0 else 0.0
+        if n < 2:
+            sortino = 0.0
+        elif not self.downside.count:
+            sortino = 10.0  # 没有负收益，说明策略非常稳定
+        else:
+            downside_std = self.downside.variance ** 0.5 if self.downside.count > 1 else 0.0
+            sortino = self.returns.mean / downside_std if downside_std > 0 else 0.0
+        max_dd = -(1 - math.exp(-self.log_dd)) * 100
+        calmar = self.total / abs(max_dd) if max_dd != 0 else 0.0
+        win_rate = self.returns.wins / n * 100
+        return score_metrics(self.total, sharpe, sortino, max_dd, calmar, win_rate, volatility)
+
+
+_DD_EMPTY = (0.0, 0.0, 0.0, 0.0)
+
+
+def _dd_unit(step: float) -> tuple:
+    """单期的回撤摘要 (总增长, 最高前缀, 最低前缀, 最大跌幅)"""
+    return (step, max(0.0, step), min(0.0, step), max(0.0, -step))
+
+
+def _dd_concat(a: tuple, b: tuple) -> tuple:
+    """两段回撤摘要按顺序拼接 (与 RiskSummary.merge 相同的公式)"""
+    ta, ma, mina, da = a
+    tb, mb, minb, db = b
+    return (ta + tb, max(ma, ta + mb), min(mina, ta + minb), max(da, db, ma - (ta + minb)))
+
+
+def summarize(returns: Iterable[float], steps: Optional[Iterable[float]] = None) -> RiskSummary:
+    summary = RiskSummary()
+    steps = iter(steps) if steps is not None else None
+    for pnl in returns:
+        summary.add(pnl, next(steps) if steps is not None else None)
+    return summary
+
+
+def batch_summaries(histories: Mapping[str, Sequence[float]]) -> Dict[str, RiskSummary]:
+    """整个种群的摘要：有 numpy 时右侧补 NaN 拼成矩阵一次算完，否则逐个累加"""
+    if np is None or not histories:
+        return {agent_id: summarize(history) for agent_id, history in histories.items()}
+    agent_ids = list(histories)
+    width = max(len(h) for h in histories.values())
+    matrix = np.full((len(agent_ids), max(width, 1)), np.nan)
+    for i, agent_id in enumerate(agent_ids):
+        history = histories[agent_id]
+        matrix[i, :len(history)] = list(history)
+
+    valid = ~np.isnan(matrix)
+    counts = valid.sum(axis=1)
+    filled = np.where(valid, matrix, 0.0)
+    sums = filled.sum(axis=1)
+    means = np.divide(sums, counts, out=np.zeros(len(agent_ids)), where=counts > 0)
+    m2 = (np.where(valid, matrix - means[:, None], 0.0) ** 2).sum(axis=1)
+    wins = (filled > 0).sum(axis=1)
+
+    down = valid & (matrix < 0)
+    down_counts = down.sum(axis=1)
+    down_sums = np.where(down, matrix, 0.0).sum(axis=1)
+    down_means = np.divide(down_sums, down_counts, out=np.zeros(len(agent_ids)), where=down_counts > 0)
+    down_m2 = (np.where(down, matrix - down_means[:, None], 0.0) ** 2).sum(axis=1)
+
+    steps = np.where(valid, np.log(np.maximum(1 + filled / 100, _MIN_GROWTH)), 0.0)
+    log_values = np.concatenate([np.zeros((len(agent_ids), 1)), np.cumsum(steps, axis=1)], axis=1)
+    peaks = np.maximum.accumulate(log_values, axis=1)
+    log_dd = (peaks - log_values).max(axis=1)
+
+    result = {}
+    for i, agent_id in enumerate(agent_ids):
+        summary = RiskSummary()
+        summary.returns.count, summary.returns.wins = int(counts[i]), int(wins[i])
+        summary.returns.mean, summary.returns.m2 = float(means[i]), float(m2[i])
+        summary.downside.count, summary.downside.wins = int(down_counts[i]), 0
+        summary.downside.mean, summary.downside.m2 = float(down_means[i]), float(down_m2[i])
+        summary.total = float(sums[i])
+        summary.log_total = float(log_values[i, -1])
+        summary.log_max = float(peaks[i, -1])
+        summary.log_min = float(log_values[i].min())
+        summary.log_dd = float(log_dd[i])
+        result[agent_id] = summary
+    return result
+
+
+class RiskSeries:
+    """一个 Agent 的滑动窗口 (与 pnl_history 同长) + 摘要 + 指标缓存
+
+    回撤摘要用双栈队列维护：新样本压入 back 栈 (累积聚合)；淘汰时从 front 栈弹出，
+    front 为空时把 back 整体倒入并记录后缀聚合。窗口聚合 = front 栈顶聚合 + back 聚合。
+    """
+
+    __slots__ = ("window", "summary", "_front", "_back", "_back_agg", "_metrics")
+
+    def __init__(self, history: Sequence[float] = (), limit: int = PNL_HISTORY_LIMIT,
+                 summary: Optional[RiskSummary] = None):
+        self.window: deque = deque(history, maxlen=limit)
+        self.summary = summary if summary is not None else summarize(self.window)
+        self._front: list = []  # 后缀聚合，栈顶 = front 内全部样本 (旧 → 新) 的聚合
+        self._back: list = [growth_step(pnl) for pnl in self.window]
+        self._back_agg = (self.summary.log_total, self.summary.log_max, self.summary.log_min, self.summary.log_dd)
+        self._metrics: Optional[dict] = None
+
+    def _evict_step(self):
+        if not self._front:
+            agg = _DD_EMPTY
+            for step in reversed(self._back):
+                agg = _dd_concat(_dd_unit(step), agg)
+                self._front.append(agg)
+            self._back, self._back_agg = [], _DD_EMPTY
+        self._front.pop()
+
+    def append(self, pnl: float):
+        full = len(self.window) == self.window.maxlen
+        if full:
+            self.summary.remove_moments(self.window[0])
+            self._evict_step()
+        self.window.append(pnl)
+        step = growth_step(pnl)
+        self._back.append(step)
+        self._back_agg = _dd_concat(self._back_agg, _dd_unit(step))
+        self.summary.add(pnl, step)
+        if full:
+            front = self._front[-1] if self._front else _DD_EMPTY
+            self.summary.set_drawdown(_dd_concat(front, self._back_agg))
+        self._metrics = None
+
+    def matches(self, history: Sequence[float]) -> bool:
+        n = len(history)
+        return n == len(self.window) and (n == 0 or history[n - 1] == self.window[-1])
+
+    def metrics(self) -> dict:
+        if self._metrics is None:
+            self._metrics = self.summary.metrics()
+        return self._metrics
+
+
+class RiskMetricsCache:
+    """每个引擎一份：agent_id → RiskSeries"""
+
+    def __init__(self, limit: int = PNL_HISTORY_LIMIT):
+        self.limit = limit
+        self.series: Dict[str, RiskSeries] = {}
+        self.hits = 0
+        self.rebuilds = 0
+        self.version = 0  # 追加 / 重算 / 删除时加一 (响应缓存的失效键)
+
+    def record(self, agent_id: str, pnl: float):
+        """Epoch 结束：pnl_history 追加一期后调用"""
+        series = self.series.get(agent_id)
+        if series is None:
+            self.series[agent_id] = RiskSeries([pnl], self.limit)
+        else:
+            series.append(pnl)
+        self.version += 1
+
+    def get(self, agent_id: str, history: Sequence[float]) -> RiskSeries:
+        """读取缓存；与账户当前的 pnl_history 对不上 (重启恢复 / 换组 / 重置) 时按历史重建"""
+        series = self.series.get(agent_id)
+        if series is None or not series.matches(history):
+            self.rebuilds += 1
+            series = self.series[agent_id] = RiskSeries(list(history), self.limit)
+        else:
+            self.hits += 1
+        return series
+
+    def metrics(self, agent_id: str, history: Sequence[float]) -> dict:
+        return self.get(agent_id, history).metrics()
+
+    def rebuild(self, histories: Mapping[str, Sequence[float]]):
+        """整个种群重算 (向量化)"""
+        histories = {aid: list(h)[-self.limit:] for aid, h in histories.items()}
+        for agent_id, summary in batch_summaries(histories).items():
+            self.series[agent_id] = RiskSeries(histories[agent_id], self.limit, summary=summary)
+        self.rebuilds += len(histories)
+        self.version += 1
+
+    def discard(self, agent_id: str):
+        self.series.pop(agent_id, None)
+        self.version += 1
+
+    def stats(self) -> dict:
+        return {"agents": len(self.series), "hits": self.hits, "rebuilds": self.rebuilds}
+
+
+def population_summary(summaries: Iterable[RiskSummary]) -> RiskSummary:
+    """各 Agent 序列按顺序拼接后的摘要"""
+    total = RiskSummary()
+    for summary in summaries:
+        total.merge(summary)
+    return total
+
+
+def population_metrics(summaries: Iterable[RiskSummary]) -> dict:
+    """全体汇总 (/stats)：各 Agent 序列按顺序拼接后的指标，与原先逐条拼接重算同口径"""
+    return population_summary(summaries).metrics()
+
@@ -0,0 +1,351 @@
+"""
+策略沙盒进程池 (Sandbox Pool)
+把 POST /agent/strategy 的沙盒验证 (语法 / 安全 / 回测) 移出 Arena 事件循环
+
+结构:
+  submit() ──► 有界任务队列 ──► N 个常驻 worker 进程 (python sandbox_pool.py --worker)
+                                  │ stdin/stdout 逐行 JSON
+                                  │ RLIMIT_AS: 进程级内存上限 (不再限制 Arena 主进程)
+                                  │ RLIMIT_CPU: 每个任务重新设置的 CPU 时间上限
+                                  ▼
+                    墙钟超时 → 杀掉 worker 并重启，任务记为 timeout
+
+任务状态 (SandboxJob.status): queued → running → passed / rejected / timeout / error
+调用方用 get(job_id) 轮询或 await wait(job_id)；on_complete 回调用于验证通过后部署。
+
+worker 用独立的解释器启动 (而不是 multiprocessing)，不会重新导入 main.py。
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config import (
+    SANDBOX_WORKERS, SANDBOX_QUEUE_LIMIT, SANDBOX_JOB_TIMEOUT,
+    SANDBOX_JOB_CPU_SECONDS, SANDBOX_MEMORY_MB, SANDBOX_JOB_HISTORY,
+    SANDBOX_SCENARIO_SEED, SANDBOX_FIXTURE,
+)
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("passed", "rejected", "timeout", "error", "superseded")
+
+
+class SandboxQueueFull(Exception):
+    """排队中的验证任务超过上限 (背压)"""
+
+    def __init__(self, depth: int, limit: int):
+        self.depth = depth
+        self.limit = limit
+        super().__init__(f"Sandbox queue full ({depth}/{limit}), retry later")
+
+
+@dataclass
+class SandboxJob:
+    job_id: str
+    agent_id: str
+    code: str
+    rounds: int
+    seq: int = 0  # 提交顺序 (池内单调递增)，用于丢弃晚于新任务完成的旧任务
+    status: str = "queued"
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    allowed: bool = False
+    message: str = ""
+    result: Optional[dict] = None  # SandboxTestResult.to_dict()
+    worker: Optional[int] = None
+    done: Optional[asyncio.Event] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def to_dict(self, include_log: bool = False) -> dict:
+        result = self.result
+        if result is not None and not include_log:
+            result = {k: v for k, v in result.items() if k != "test_log"}
+        return {
+            "job_id": self.job_id,
+            "agent_id": self.agent_id,
+            "seq": self.seq,
+            "status": self.status,
+            "rounds": self.rounds,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queue_seconds": round((self.started_at or time.time()) - self.submitted_at, 3),
+            "run_seconds": round(self.finished_at - self.started_at, 3) if self.finished_at and self.started_at else None,
+            "allowed": self.allowed,
+            "message": self.message,
+            "test_result": result,
+        }
+
+
+class _WorkerSlot:
+    """一个 worker 进程 + 它的调度协程"""
+
+    def __init__(self, pool: "SandboxPool", slot_id: int):
+        self.pool = pool
+        self.slot_id = slot_id
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.jobs_done = 0
+        self.restarts = 0
+
+    async def _spawn(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--worker",
+            "--memory-mb", str(self.pool.memory_mb),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            limit=16 * 1024 * 1024,  # 回测日志可能较长
+        )
+
+    async def kill(self):
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.kill()
+            await self.proc.wait()
+        self.proc = None
+
+    async def run_job(self, job: SandboxJob) -> dict:
+        if self.proc is None or self.proc.returncode is not None:
+            if self.proc is not None:
+                self.restarts += 1
+            await self._spawn()
+        request = {"code": job.code, "agent_id": job.agent_id, "rounds": job.rounds,
+                   "cpu_seconds": self.pool.cpu_seconds,
+                   "seed": self.pool.seed, "fixture": self.pool.fixture or None}
+        self.proc.stdin.write((json.dumps(request) + "\n").encode())
+        try:
+            await self.proc.stdin.drain()
+            line = await asyncio.wait_for(self.proc.stdout.readline(), self.pool.job_timeout)
+        except asyncio.TimeoutError:
+            await self.kill()
+            self.restarts += 1
+            return {"status": "timeout", "message": f"Sandbox timed out after {self.pool.job_timeout:.0f}s"}
+        except (BrokenPipeError, ConnectionResetError):
+            line = b""
+        if not line:  # worker 被 RLIMIT 或信号杀掉
+            code = await self.proc.wait()
+            self.proc = None
+            return {"status": "error", "message": f"Sandbox worker exited (code {code})"}
+        return json.loads(line)
+
+    async def loop(self):
+        queue = self.pool._queue
+        while True:
+            job = await queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            job.worker = self.slot_id
+            try:
+                reply = await self.run_job(job)
+            except Exception as e:
+                logger.error(f"Sandbox slot {self.slot_id} failed on {job.job_id}: {e}")
+                await self.kill()
+                reply = {"status": "error", "message": f"Sandbox failure: {e}"}
+            self.jobs_done += 1
+            queue.task_done()
+            await self.pool._finish(job, reply)
+
+
+class SandboxPool:
+    """常驻沙盒 worker 进程池"""
+
+    def __init__(
+        self,
+        workers: int = SANDBOX_WORKERS,
+        queue_limit: int = SANDBOX_QUEUE_LIMIT,
+        job_timeout: float = SANDBOX_JOB_TIMEOUT,
+        cpu_seconds: int = SANDBOX_JOB_CPU_SECONDS,
+        memory_mb: int = SANDBOX_MEMORY_MB,
+        history: int = SANDBOX_JOB_HISTORY,
+        seed: Optional[int] = SANDBOX_SCENARIO_SEED,
+        fixture: str = SANDBOX_FIXTURE,
+        on_complete: Optional[Callable[[SandboxJob], Awaitable[None]]] = None,
+    ):
+        self.workers = max(1, workers)
+        self.queue_limit = queue_limit
+        self.job_timeout = job_timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.history = history
+        self.seed = seed  # 回测行情场景 (worker 进程内缓存，所有任务共享同一组路径)
+        self.fixture = fixture
+        self.on_complete = on_complete
+
+        self.jobs: "OrderedDict[str, SandboxJob]" = OrderedDict()
+        self.slots: List[_WorkerSlot] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.last_seq = 0  # 最近一次提交的任务序号
+
+        # 度量
+        self.submitted = 0
+        self.rejected_full = 0
+        self.outcomes: Dict[str, int] = {status: 0 for status in FINISHED}
+        self.run_seconds = 0.0
+
+    async def start(self):
+        """预热 worker 进程 (可选；首次 submit 时也会自动启动调度协程)"""
+        self._ensure_started()
+        await asyncio.gather(*(slot._spawn() for slot in self.slots if slot.proc is None))
+        logger.info(f"🧪 Sandbox pool ready: {self.workers} workers, queue limit {self.queue_limit}")
+
+    def _ensure_started(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_limit)
+        loop = asyncio.get_running_loop()
+        self.slots = [_WorkerSlot(self, i) for i in range(self.workers)]
+        self._tasks = [loop.create_task(slot.loop()) for slot in self.slots]
+
+    def submit(self, agent_id: str, code: str, rounds: int = 10) -> SandboxJob:
+        """提交验证任务并立即返回；队列已满时抛出 SandboxQueueFull"""
+        self._ensure_started()
+        job = SandboxJob(job_id=uuid.uuid4().hex[:12], agent_id=agent_id, code=code, rounds=rounds,
+                         seq=self.last_seq + 1, done=asyncio.Event())
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected_full += 1
+            raise SandboxQueueFull(self._queue.qsize(), self.queue_limit)
+        self.last_seq = job.seq
+        self.submitted += 1
+        self.jobs[job.job_id] = job
+        self._trim_history()
+        return job
+
+    def get(self, job_id: str) -> Optional[SandboxJob]:
+        return self.jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[SandboxJob]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        await asyncio.wait_for(job.done.wait(), timeout)
+        return job
+
+    async def _finish(self, job: SandboxJob, reply: dict):
+        job.status = reply.get("status", "error")
+        job.allowed = bool(reply.get("allowed", False))
+        job.message = reply.get("message", "")
+        job.result = reply.get("result")
+        job.finished_at = time.time()
+        self.outcomes[job.status] = self.outcomes.get(job.status, 0) + 1
+        self.run_seconds += job.finished_at - job.started_at
+        if self.on_complete is not None:
+            try:
+                await self.on_complete(job)
+            except Exception as e:
+                logger.error(f"Sandbox on_complete failed for {job.job_id}: {e}")
+                job.status, job.allowed, job.message = "error", False, f"Deploy failed: {e}"
+        job.code = ""  # 源码不再需要，释放内存
+        job.done.set()
+
+    def _trim_history(self):
+        """只保留最近的已完成任务 (排队 / 运行中的任务不删除)"""
+        excess = len(self.jobs) - self.history
+        if excess <= 0:
+            return
+        for job_id in [jid for jid, job in self.jobs.items() if job.finished][:excess]:
+            del self.jobs[job_id]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*(slot.kill() for slot in self.slots), return_exceptions=True)
+
+    def stats(self) -> dict:
+        finished = sum(self.outcomes.values())
+        return {
+            "workers": self.workers,
+            "alive": sum(1 for s in self.slots if s.proc is not None and s.proc.returncode is None),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": sum(1 for job in self.jobs.values() if job.status == "running"),
+            "submitted": self.submitted,
+            "rejected_queue_full": self.rejected_full,
+            "outcomes": dict(self.outcomes),
+            "avg_run_seconds": round(self.run_seconds / finished, 3) if finished else 0.0,
+            "worker_restarts": sum(s.restarts for s in self.slots),
+        }
+
+
+# ========== Worker 进程 ==========
+
+def _limit_memory(memory_mb: int):
+    import resource
+    limit = memory_mb * 1024 * 1024
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard == resource.RLIM_INFINITY or limit < hard:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _limit_cpu(seconds: int):
+    """本任务可用的 CPU 时间 = 已用时间 + seconds (RLIMIT_CPU 按进程累计)"""
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def worker_main(memory_mb: int):
+    """worker 进程入口：从 stdin 逐行读任务，结果逐行写回 stdout"""
+    import signal
+    from strategy_sandbox import TimeoutException, validate_strategy_before_submission
+
+    out = sys.stdout
+    sys.stdout = sys.stderr  # 策略或沙盒的 print 不能混进结果通道
+
+    def on_cpu_limit(signum, frame):
+        raise TimeoutException("CPU time limit exceeded")
+
+    signal.signal(signal.SIGXCPU, on_cpu_limit)
+    try:
+        _limit_memory(memory_mb)
+    except (ValueError, OSError):
+        pass
+
+    for line in sys.stdin:
+        job = json.loads(line)
+        try:
+            _limit_cpu(job.get("cpu_seconds", SANDBOX_JOB_CPU_SECONDS))
+            allowed, message, result = asyncio.run(
+                validate_strategy_before_submission(job["code"], job["agent_id"], job["rounds"],
+                                                    seed=job.get("seed"), fixture=job.get("fixture"))
+            )
+            reply = {
+                "status": "passed" if allowed else "rejected",
+                "allowed": allowed,
+                "message": message,
+                "result": result.to_dict() if result else None,
+            }
+        except TimeoutException as e:
+            reply = {"status": "timeout", "message": f"Sandbox {e}"}
+        except MemoryError:
+            reply = {"status": "error", "message": "Sandbox memory limit exceeded"}
+        except Exception as e:
+            reply = {"status": "error", "message": f"Sandbox error: {type(e).__name__}: {e}"}
+        out.write(json.dumps(reply, default=str) + "\n")
+        out.flush()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Darwin strategy sandbox worker")
+    parser.add_argument("--worker", action="store_true", required=True)
+    parser.add_argument("--memory-mb", type=int, default=SANDBOX_MEMORY_MB)
+    args = parser.parse_args()
+    worker_main(args.memory_mb)
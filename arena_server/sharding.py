@@ -0,0 +1,791 @@
+"""
+分片竞技场 (Sharded Arena)
+把各组 (engine + hive mind + attribution) 分散到 N 个 worker 进程，突破单进程单核的限制
+
+路由:  agent_id ──(GroupDirectory, 粘性分配)──► group_id ──(一致性哈希环)──► worker
+       worker 增减时只有约 1/N 的组换 worker
+
+结构:
+  前端 main.py 进程                               worker 进程 × N
+  ┌──────────────────────────────┐   Unix socket  ┌──────────────────────────────┐
+  │ ShardRouter (OrderPipeline 兼容)│ ◄────────────► │ ShardWorker                   │
+  │  - GroupDirectory / HashRing  │  长度前缀帧     │  - GroupManager (本 worker 的组) │
+  │  - 成交后处理 (广播 / Council)  │  msgpack/JSON  │  - OrderPipeline (微批撮合+归因) │
+  │  - 汇总的排行榜 / 统计 (缓存)   │                │  - summary / end_epoch         │
+  └──────────────────────────────┘                └──────────────────────────────┘
+
+跨组视图 (全局排行榜、/stats、晋级评比) 来自各 worker 定期上报的 summary 归并；
+Epoch 结算 (组内排名 / 淘汰 / Hive 补丁 / 议事厅简报) 由 end_epoch 从各 worker 取回。
+Agent 的余额 / 持仓只存在于所属 worker，前端通过 get_account 读取；Redis 持久化经
+collect_accounts 从各 worker 拉取，启动时 restore_accounts 按 group → worker 下发恢复。
+
+下单超时或连接中断时订单可能仍会在 worker 上成交：回执标记为未决 (pending) 并带 order_id，
+迟到的回执到达时更新该订单状态并补做成交后处理；客户端用 order_status 查询，而不是重试。
+
+本地运行单个 worker:
+    python arena_server/sharding.py --worker-id 0 --socket /tmp/darwin-shards/worker-0.sock
+"""
+
+import asyncio
+import bisect
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import struct
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import islice
+from typing import Dict, List, Optional, Set
+
+from config import (
+    GROUP_SIZE_THRESHOLDS, GROUP_DEFAULT_SIZE, INITIAL_BALANCE,
+    SHARD_SOCKET_DIR, SHARD_VNODES, SHARD_SUMMARY_INTERVAL, SHARD_RPC_TIMEOUT, SHARD_ORDER_STATUS_LIMIT,
+)
+from matching import OrderSide
+from risk_metrics import RiskSummary
+from order_pipeline import OrderPipeline, OrderQueueFull, OrderRequest, OrderResult, PostTradeEvent
+from trade_journal import trade_timestamp
+
+try:
+    import msgpack
+except ImportError:  # msgpack 可选，缺失时用 JSON 帧
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+FRAME_LEN = struct.Struct("<I")
+
+
+def _encode(message: dict) -> bytes:
+    if msgpack is not None:
+        return msgpack.packb(message, use_bin_type=True, default=str)
+    return json.dumps(message, default=str).encode()
+
+
+def _decode(data: bytes) -> dict:
+    if msgpack is not None:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    return json.loads(data)
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Optional[dict]:
+    try:
+        header = await reader.readexactly(FRAME_LEN.size)
+        (length,) = FRAME_LEN.unpack(header)
+        return _decode(await reader.readexactly(length))
+    except asyncio.IncompleteReadError:
+        return None
+
+
+def _frame(message: dict) -> bytes:
+    payload = _encode(message)
+    return FRAME_LEN.pack(len(payload)) + payload
+
+
+def _rank_key(entry) -> tuple:
+    """与 GroupManager / ValuationIndex 一致：PnL 降序，同分按 agent_id"""
+    return (-entry[1], entry[0])
+
+
+# ========== 路由 ==========
+
+class HashRing:
+    """一致性哈希环 (每个节点 vnodes 个虚拟节点)"""
+
+    def __init__(self, nodes=(), vnodes: int = SHARD_VNODES):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+    def add(self, node):
+        for i in range(self.vnodes):
+            point = self._hash(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node):
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def node_for(self, key: str):
+        if not self._points:
+            raise LookupError("hash ring is empty")
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class GroupDirectory:
+    """前端的 agent → group 分配表 (与 GroupManager.assign_agent 相同的填充策略，但不持有引擎)"""
+
+    def __init__(self):
+        self.agent_to_group: Dict[str, int] = {}
+        self.members: Dict[int, Set[str]] = {}
+        self._next_group_id = 0
+
+    def dynamic_group_size(self) -> int:
+        total = len(self.agent_to_group)
+        for threshold in sorted(GROUP_SIZE_THRESHOLDS.keys()):
+            if total < threshold:
+                return GROUP_SIZE_THRESHOLDS[threshold]
+        return GROUP_DEFAULT_SIZE
+
+    def assign(self, agent_id: str) -> tuple:
+        """返回 (group_id, 是否新分配)"""
+        group_id = self.agent_to_group.get(agent_id)
+        if group_id is not None:
+            return group_id, False
+        max_size = self.dynamic_group_size()
+        for gid, members in self.members.items():
+            if len(members) < max_size:
+                group_id = gid
+                break
+        else:
+            group_id = self._next_group_id
+            self._next_group_id += 1
+        self.agent_to_group[agent_id] = group_id
+        self.members.setdefault(group_id, set()).add(agent_id)
+        return group_id, True
+
+    def place(self, agent_id: str, group_id: int):
+        """按持久化状态里的 group_id 放回 (恢复用)；之后新建的组编号接在其后"""
+        self.remove(agent_id)
+        self.agent_to_group[agent_id] = group_id
+        self.members.setdefault(group_id, set()).add(agent_id)
+        self._next_group_id = max(self._next_group_id, group_id + 1)
+
+    def remove(self, agent_id: str):
+        group_id = self.agent_to_group.pop(agent_id, None)
+        if group_id is not None:
+            self.members[group_id].discard(agent_id)
+
+
+# ========== Worker 进程 ==========
+
+class ShardWorker:
+    """持有部分组的 worker：在 Unix socket 上提供撮合 / 汇总 RPC"""
+
+    def __init__(self, worker_id: int, socket_path: str, journal_dir: Optional[str] = None):
+        from group_manager import GroupManager
+
+        self.worker_id = worker_id
+        self.socket_path = socket_path
+        self.group_manager = GroupManager(journal_dir=journal_dir)
+        self.pipeline = OrderPipeline(self.group_manager)  # 归因由管线同步记录；广播 / Council 由前端处理
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stopped = asyncio.Event()
+
+    # ---- RPC 处理 ----
+
+    async def op_ping(self):
+        return {"worker_id": self.worker_id, "pid": os.getpid()}
+
+    async def op_register(self, agent_id: str, group_id: int):
+        self.group_manager.place_agent(agent_id, group_id)
+        return True
+
+    async def op_order(self, agent_id, group_id, symbol, side, amount, reason=None, chain=None, contract_address=None):
+        self.group_manager.place_agent(agent_id, group_id)
+        try:
+            result = await self.pipeline.submit(agent_id, symbol, OrderSide(side), amount, reason, chain,
+                                                contract_address, source="shard")
+        except OrderQueueFull as e:
+            return {"queue_full": [e.scope, e.depth, e.limit]}
+        return {
+            "success": result.success,
+            "message": result.message,
+            "fill_price": result.fill_price,
+            "trade": result.trade,
+            "batch_size": result.batch_size,
+            "latency_ms": result.latency_ms,
+            "balance": self.group_manager.get_balance(agent_id),
+            "positions": self.group_manager.get_positions(agent_id),
+        }
+
+    async def op_remove(self, agent_id: str):
+        gm = self.group_manager
+        gm.remove_agent_trades(agent_id)
+        return gm.remove_agent(agent_id)
+
+    async def op_restore(self, agents: dict, trades: list = ()):
+        """
+        从持久化状态恢复本 worker 的账户 (与 main.py 单进程恢复相同)；恢复产生的脏标记一并清掉
+
+        agents: {agent_id: {balance, positions, group_id}}；trades: 新 → 旧，成交日志已恢复时跳过
+        """
+        gm = self.group_manager
+        for agent_id, data in agents.items():
+            gm.place_agent(agent_id, data["group_id"])
+            gm.restore_agent(agent_id, data["balance"], data["positions"], data["group_id"])
+        if not any(len(g.engine.trade_history) for g in gm.groups.values()):
+            for trade in reversed(trades):  # reversed because appendleft
+                group = gm.get_group(trade.get("agent_id", trade.get("agent")))
+                if group:
+                    group.engine.record_trade(trade, ts=trade_timestamp(trade))
+        gm.rebuild_risk()
+        gm.collect_account_changes()
+        return len(agents)
+
+    async def op_accounts(self, full: bool = False, order_count: Optional[int] = None):
+        """
+        持久化用的账户数据 (格式同 StatePersistence._local_accounts)
+
+        full=False 时只含上次拉取以来变过的账户；成交数与 order_count 相同时不带 trade_history
+        """
+        gm = self.group_manager
+        agents = gm.collect_account_changes()
+        if full:
+            agents = gm.get_all_accounts_data()
+        count = gm.order_count
+        return {
+            "agents": agents,
+            "current": [aid for group in gm.groups.values() for aid in group.engine.accounts],
+            "order_count": count,
+            "trade_history": list(islice(gm.trade_history, 200)) if full or count != order_count else None,
+        }
+
+    async def op_account(self, agent_id):
+        group = self.group_manager.get_group(agent_id)
+        if group is None:
+            return None
+        return {"balance": self.group_manager.get_balance(agent_id),
+                "positions": self.group_manager.get_positions(agent_id),
+                "pnl": group.engine.calculate_pnl(agent_id)}
+
+    async def op_update_prices(self, prices):
+        self.group_manager.update_prices(prices)
+        return True
+
+    async def op_summary(self, risk_version: Optional[int] = None):
+        """
+        汇总 (排行 / 统计)；风险指标只在 Epoch 结算等变更后 (risk_version 与前端已有的不同) 才附带
+
+        risk: {"version", "agents": {agent_id: 排行榜风险列}, "population": RiskSummary.to_state()}
+        """
+        gm = self.group_manager
+        summary = {
+            "worker_id": self.worker_id,
+            "agents": gm.total_agents,
+            "order_count": gm.order_count,
+            "leaderboard": gm.get_leaderboard(),
+            "groups": {
+                gid: {"members": group.size, "trades": group.engine.order_count}
+                for gid, group in gm.groups.items()
+            },
+            "pipeline": self.pipeline.stats(),
+            "taken_at": time.time(),
+        }
+        version = gm.risk_version
+        if version != risk_version:
+            agents = {}
+            for agent_id in gm.agent_to_group:
+                metrics = gm.leaderboard_risk(agent_id)
+                if metrics is not None:
+                    agents[agent_id] = metrics
+            summary["risk"] = {"version": version, "agents": agents,
+                               "population": gm.population_summary().to_state()}
+        return summary
+
+    async def op_end_epoch(self):
+        """记录 PnL 历史 (风险指标用)，返回本 worker 的排名与各组结算数据"""
+        leaderboard, reports = self.group_manager.end_epoch()
+        return {"leaderboard": leaderboard, "groups": reports}
+
+    async def op_shutdown(self):
+        self._stopped.set()
+        return True
+
+    # ---- 服务 ----
+
+    async def _handle(self, message: dict, writer: asyncio.StreamWriter, lock: asyncio.Lock):
+        handler = getattr(self, f"op_{message.get('op')}", None)
+        try:
+            if handler is None:
+                raise ValueError(f"unknown op {message.get('op')!r}")
+            response = {"id": message["id"], "result": await handler(**message.get("args", {}))}
+        except Exception as e:
+            response = {"id": message["id"], "error": f"{type(e).__name__}: {e}"}
+        async with lock:
+            writer.write(_frame(response))
+            await writer.drain()
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                message = await _read_frame(reader)
+                if message is None:
+                    break
+                task = asyncio.ensure_future(self._handle(message, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.CancelledError, ConnectionError):
+            pass  # worker 关闭 / 前端断开
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._serve_client, path=self.socket_path)
+        logger.info(f"🧩 Shard worker {self.worker_id} (pid {os.getpid()}) listening on {self.socket_path}")
+        await self._stopped.wait()
+        self._server.close()
+        await self.pipeline.stop()
+        for group in self.group_manager.groups.values():
+            group.engine.trade_history.close()
+
+
+def run_worker(worker_id: int, socket_path: str, journal_dir: Optional[str] = None):
+    """worker 进程入口"""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [shard-{worker_id}] %(message)s")
+    asyncio.run(ShardWorker(worker_id, socket_path, journal_dir).serve())
+
+
+# ========== 前端 ==========
+
+class ShardClient:
+    """到单个 worker 的多路复用 RPC 连接"""
+
+    def __init__(self, worker_id: int, socket_path: str, timeout: float = SHARD_RPC_TIMEOUT):
+        self.worker_id = worker_id
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def connect(self, deadline: float):
+        while True:
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.05)
+        self._reader_task = asyncio.get_running_loop().create_task(self._read_loop())
+
+    async def _read_loop(self):
+        while True:
+            message = await _read_frame(self._reader)
+            if message is None:
+                break
+            future = self._pending.pop(message["id"], None)
+            if future is None or future.done():
+                continue
+            if "error" in message:
+                future.set_exception(RuntimeError(f"shard {self.worker_id}: {message['error']}"))
+            else:
+                future.set_result(message.get("result"))
+        error = ConnectionError(f"shard {self.worker_id} disconnected")
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    def _send(self, op: str, args: dict) -> tuple:
+        if self._writer is None:
+            raise ConnectionError(f"shard {self.worker_id} not connected")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(_frame({"id": request_id, "op": op, "args": args}))
+        return request_id, future
+
+    def send(self, op: str, **args) -> asyncio.Future:
+        """发出请求，返回回执的 future (不设超时；回执到达或连接断开时完成)"""
+        return self._send(op, args)[1]
+
+    async def call(self, op: str, **args):
+        request_id, future = self._send(op, args)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+
+
+@dataclass
+class RemoteGroup:
+    """成交后处理拿到的组句柄：归因已在 worker 内记录，这里只需要 group_id 做广播"""
+    group_id: int
+    worker_id: int
+    attribution: object = None
+
+
+class ShardRouter(OrderPipeline):
+    """前端下单入口 (submit 与 OrderPipeline 相同)：按 agent → group → worker 转发到 worker 进程"""
+
+    def __init__(self, num_workers: int, post_trade=None, socket_dir: str = SHARD_SOCKET_DIR,
+                 journal_dir: Optional[str] = None, summary_interval: float = SHARD_SUMMARY_INTERVAL, **kwargs):
+        super().__init__(group_manager=None, post_trade=post_trade, **kwargs)
+        self.num_workers = num_workers
+        self.socket_dir = socket_dir
+        self.journal_dir = journal_dir
+        self.summary_interval = summary_interval
+        self.directory = GroupDirectory()
+        self.ring = HashRing(range(num_workers))
+        self.clients: Dict[int, ShardClient] = {}
+        self.processes: List[multiprocessing.Process] = []
+        self.summaries: Dict[int, dict] = {}
+        self.risk: Dict[int, dict] = {}  # worker_id -> 最近一次上报的风险指标
+        self._trade_heads: Dict[int, tuple] = {}  # worker_id -> (成交数, 最近 200 条成交) 持久化用
+        self._leaderboard: List[tuple] = []
+        self.version = 0  # 每次汇总刷新加一 (响应缓存的失效键)
+        self._summary_task: Optional[asyncio.Task] = None
+        self.forward_errors = 0
+        self.orders: "OrderedDict[str, dict]" = OrderedDict()  # 未决订单 order_id -> 状态
+        self._order_ids = itertools.count(1)
+        self.unresolved = 0  # 超时 / 断连而结果未决的订单数
+
+    def worker_for_group(self, group_id: int) -> int:
+        return self.ring.node_for(f"group:{group_id}")
+
+    def group_members(self, group_id: int) -> Set[str]:
+        return self.directory.members.get(group_id, set())
+
+    def worker_for_agent(self, agent_id: str) -> Optional[int]:
+        group_id = self.directory.agent_to_group.get(agent_id)
+        return None if group_id is None else self.worker_for_group(group_id)
+
+    # ---- 生命周期 ----
+
+    async def start(self, boot_timeout: float = 30.0):
+        os.makedirs(self.socket_dir, exist_ok=True)
+        ctx = multiprocessing.get_context("spawn")
+        for worker_id in range(self.num_workers):
+            socket_path = os.path.join(self.socket_dir, f"worker-{worker_id}.sock")
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            journal_dir = os.path.join(self.journal_dir, f"shard_{worker_id}") if self.journal_dir else None
+            process = ctx.Process(target=run_worker, args=(worker_id, socket_path, journal_dir),
+                                  name=f"darwin-shard-{worker_id}", daemon=True)
+            process.start()
+            self.processes.append(process)
+            self.clients[worker_id] = ShardClient(worker_id, socket_path)
+        deadline = time.monotonic() + boot_timeout
+        await asyncio.gather(*(client.connect(deadline) for client in self.clients.values()))
+        pids = await asyncio.gather(*(client.call("ping") for client in self.clients.values()))
+        logger.info(f"🧩 Sharded arena: {self.num_workers} workers ({', '.join(str(p['pid']) for p in pids)})")
+        self._summary_task = asyncio.get_running_loop().create_task(self._summary_loop())
+
+    async def stop(self):
+        if self._summary_task is not None:
+            self._summary_task.cancel()
+        await super().stop()
+        for client in self.clients.values():
+            try:
+                await client.call("shutdown")
+            except Exception:
+                pass
+            await client.close()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.clients.clear()
+        self.processes.clear()
+
+    # ---- 下单 ----
+
+    async def assign_agent(self, agent_id: str) -> RemoteGroup:
+        group_id, new = self.directory.assign(agent_id)
+        worker_id = self.worker_for_group(group_id)
+        if new:
+            await self.clients[worker_id].call("register", agent_id=agent_id, group_id=group_id)
+        return RemoteGroup(group_id, worker_id)
+
+    async def remove_agent(self, agent_id: str) -> bool:
+        """从所属 worker 删除账户与成交记录 (管理员删除 Agent)"""
+        worker_id = self.worker_for_agent(agent_id)
+        if worker_id is None:
+            return False
+        await self.clients[worker_id].call("remove", agent_id=agent_id)
+        self.directory.remove(agent_id)
+        return True
+
+    async def submit(self, agent_id: str, symbol: str, side: OrderSide, amount: float,
+                     reason: List[str] = None, chain: str = None, contract_address: str = None,
+                     source: str = "ws") -> OrderResult:
+        """转发到所属 worker；worker 队列已满时抛出 OrderQueueFull"""
+        group_id, _ = self.directory.assign(agent_id)
+        worker_id = self.worker_for_group(group_id)
+        request = OrderRequest(agent_id=agent_id, symbol=symbol, side=side, amount=amount,
+                               reason=reason or [], chain=chain, contract_address=contract_address, source=source)
+        client = self.clients[worker_id]
+        try:
+            future = client.send(
+                "order", agent_id=agent_id, group_id=group_id, symbol=symbol, side=side.value, amount=amount,
+                reason=request.reason, chain=chain, contract_address=contract_address,
+            )
+        except ConnectionError as e:
+            # 请求没有发出，一定没有执行
+            self.forward_errors += 1
+            logger.error(f"Order forward to shard {worker_id} failed for {agent_id}: {e}")
+            return OrderResult(False, f"Shard unavailable: {e}", 0.0)
+        try:
+            reply = await asyncio.wait_for(asyncio.shield(future), client.timeout)
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            # 请求已发出：worker 可能仍会成交，不能当作失败 (客户端重试会重复下单)
+            self.forward_errors += 1
+            order_id = self._track_unresolved(future, request, group_id, worker_id)
+            logger.warning(f"Order {order_id} for {agent_id} unresolved on shard {worker_id}: {type(e).__name__} {e}")
+            return OrderResult(False, f"Order pending on shard {worker_id}; query order_status with {order_id}",
+                               0.0, order_id=order_id, pending=True)
+        except RuntimeError as e:
+            # worker 明确返回了错误
+            self.forward_errors += 1
+            logger.error(f"Order forward to shard {worker_id} failed for {agent_id}: {e}")
+            return OrderResult(False, f"Shard error: {e}", 0.0)
+
+        if "queue_full" in reply:
+            self.rejected += 1
+            raise OrderQueueFull(*reply["queue_full"])
+
+        self.submitted += 1
+        result = self._result_from_reply(reply, request)
+        self._record_ack(result)
+        if result.success:
+            self._post_trade(PostTradeEvent(RemoteGroup(group_id, worker_id), request, result))
+        return result
+
+    @staticmethod
+    def _result_from_reply(reply: dict, request: OrderRequest) -> OrderResult:
+        return OrderResult(
+            reply["success"], reply["message"], reply["fill_price"], reply.get("trade"),
+            batch_size=reply.get("batch_size", 1),
+            latency_ms=(time.perf_counter() - request.enqueued_at) * 1000,
+            balance=reply.get("balance"), positions=reply.get("positions"),
+        )
+
+    def _track_unresolved(self, future: asyncio.Future, request: OrderRequest, group_id: int, worker_id: int) -> str:
+        """登记未决订单；迟到的回执到达 (或连接断开) 时更新状态"""
+        order_id = f"shard{worker_id}-{next(self._order_ids)}"
+        self.unresolved += 1
+        self.orders[order_id] = {
+            "order_id": order_id, "agent_id": request.agent_id, "status": "pending",
+            "symbol": request.symbol, "side": request.side.value, "amount": request.amount,
+        }
+        while len(self.orders) > SHARD_ORDER_STATUS_LIMIT:
+            self.orders.popitem(last=False)
+        future.add_done_callback(lambda f: self._settle_unresolved(order_id, f, request, group_id, worker_id))
+        return order_id
+
+    def _settle_unresolved(self, order_id: str, future: asyncio.Future, request: OrderRequest,
+                           group_id: int, worker_id: int):
+        if future.cancelled() or future.exception() is not None:
+            # 连接断开：worker 是否执行无从得知
+            error = "cancelled" if future.cancelled() else str(future.exception())
+            update = {"status": "unknown", "message": error}
+        else:
+            reply = future.result()
+            if "queue_full" in reply:
+                update = {"status": "rejected", "message": str(OrderQueueFull(*reply["queue_full"]))}
+            else:
+                result = self._result_from_reply(reply, request)
+                update = {"status": "filled" if result.success else "rejected", "message": result.message,
+                          "fill_price": result.fill_price, "balance": result.balance, "positions": result.positions}
+                if result.success:
+                    # 成交确实发生了：补做广播 / Council 等成交后处理
+                    self._post_trade(PostTradeEvent(RemoteGroup(group_id, worker_id), request, result))
+        status = self.orders.get(order_id)
+        if status is not None:
+            status.update(update)
+
+    def order_status(self, order_id: str) -> Optional[dict]:
+        """未决订单的当前状态 (pending / filled / rejected / unknown)；不存在或已淘汰返回 None"""
+        status = self.orders.get(order_id)
+        return dict(status) if status is not None else None
+
+    async def get_account(self, agent_id: str) -> Optional[dict]:
+        worker_id = self.worker_for_agent(agent_id)
+        if worker_id is None:
+            return None
+        return await self.clients[worker_id].call("account", agent_id=agent_id)
+
+    async def update_prices(self, prices: Dict[str, dict]):
+        await asyncio.gather(*(c.call("update_prices", prices=prices) for c in self.clients.values()),
+                             return_exceptions=True)
+
+    # ---- 持久化 ----
+
+    async def restore_accounts(self, agents: Dict[str, dict], trades: List[dict] = ()) -> int:
+        """
+        启动时恢复持久化的账户 (与 GroupManager.get_all_accounts_data 同格式)
+
+        按保存的 group_id 放回 GroupDirectory，再按 group → worker 分批下发；成交记录随所属 Agent 一起下发
+        """
+        batches = {worker_id: {"agents": {}, "trades": []} for worker_id in self.clients}
+        for agent_id, data in agents.items():
+            group_id = data.get("group_id")
+            if group_id is None:
+                group_id, _ = self.directory.assign(agent_id)
+            else:
+                group_id = int(group_id)
+                self.directory.place(agent_id, group_id)
+            batches[self.worker_for_group(group_id)]["agents"][agent_id] = {
+                "balance": data.get("balance", INITIAL_BALANCE),
+                "positions": data.get("positions", {}),
+                "group_id": group_id,
+            }
+        for trade in trades:
+            worker_id = self.worker_for_agent(trade.get("agent_id", trade.get("agent")))
+            if worker_id is not None:
+                batches[worker_id]["trades"].append(trade)
+        await asyncio.gather(*(
+            self.clients[worker_id].call("restore", **batch)
+            for worker_id, batch in batches.items() if batch["agents"]
+        ))
+        await self.refresh_summaries()
+        return len(agents)
+
+    async def collect_accounts(self, full: bool = False, order_count: Optional[int] = None) -> dict:
+        """
+        从各 worker 拉取持久化用的账户数据，归并成 StatePersistence 的收集格式
+
+        trade_history 是各 worker 最近成交按时间的归并；总成交数等于 order_count 时为 None
+        """
+        workers = list(self.clients)
+        replies = await asyncio.gather(*(
+            self.clients[worker_id].call("accounts", full=full,
+                                         order_count=self._trade_heads.get(worker_id, (None,))[0])
+            for worker_id in workers
+        ))
+        agents, current = {}, []
+        for worker_id, reply in zip(workers, replies):
+            agents.update(reply["agents"])
+            current.extend(reply["current"])
+            if reply["trade_history"] is not None:
+                self._trade_heads[worker_id] = (reply["order_count"], reply["trade_history"])
+        total = sum(reply["order_count"] for reply in replies)
+        trade_history = None
+        if full or total != order_count:
+            heads = (trades for _, trades in self._trade_heads.values())
+            merged = heapq.merge(*heads, key=lambda t: t.get("time", ""), reverse=True)
+            trade_history = list(islice(merged, 200))
+        return {"agents": agents, "current": current, "order_count": total, "trade_history": trade_history}
+
+    # ---- 跨组视图 ----
+
+    async def refresh_summaries(self):
+        replies = await asyncio.gather(
+            *(c.call("summary", risk_version=self.risk.get(wid, {}).get("version")) for wid, c in self.clients.items()),
+            return_exceptions=True,
+        )
+        for worker_id, reply in zip(list(self.clients), replies):
+            if isinstance(reply, Exception):
+                logger.warning(f"Shard {worker_id} summary failed: {reply}")
+                continue
+            risk = reply.pop("risk", None)
+            if risk is not None:
+                self.risk[worker_id] = risk
+            self.summaries[worker_id] = reply
+        self._leaderboard = self._merge([s["leaderboard"] for s in self.summaries.values()])
+        self.version += 1
+
+    async def _summary_loop(self):
+        while True:
+            try:
+                await self.refresh_summaries()
+            except Exception as e:
+                logger.error(f"Shard summary loop error: {e}")
+            await asyncio.sleep(self.summary_interval)
+
+    @staticmethod
+    def _merge(boards: List[list]) -> List[tuple]:
+        return [tuple(entry) for entry in heapq.merge(*boards, key=_rank_key)]
+
+    def get_leaderboard(self) -> List[tuple]:
+        """全局排行榜 (各 worker 最近一次 summary 的归并，最多滞后 summary_interval 秒)"""
+        return list(self._leaderboard)
+
+    def get_top(self, k: int) -> List[tuple]:
+        return self._leaderboard[:k]
+
+    def get_rank(self, agent_id: str) -> Optional[int]:
+        for i, entry in enumerate(self._leaderboard):
+            if entry[0] == agent_id:
+                return i + 1
+        return None
+
+    def leaderboard_risk(self, agent_id: str) -> Optional[dict]:
+        """所属 worker 上报的排行榜风险列 (与 GroupManager.leaderboard_risk 相同)"""
+        worker_id = self.worker_for_agent(agent_id)
+        if worker_id is None:
+            return None
+        return self.risk.get(worker_id, {}).get("agents", {}).get(agent_id)
+
+    def population_risk(self) -> dict:
+        """全体风险指标：各 worker 的拼接摘要按 worker 顺序合并"""
+        total = RiskSummary()
+        for worker_id in sorted(self.risk):
+            total.merge(RiskSummary.from_state(self.risk[worker_id]["population"]))
+        return total.metrics()
+
+    async def end_epoch(self) -> tuple:
+        """
+        各 worker 结算自己的组 (与 GroupManager.end_epoch 相同)
+
+        Returns:
+            (归并后的全局排名 (供晋级评比), {group_id: epoch_report} (组内淘汰 / 进化 / 议事厅简报))
+        """
+        replies = await asyncio.gather(*(c.call("end_epoch") for c in self.clients.values()))
+        self._leaderboard = self._merge([reply["leaderboard"] for reply in replies])
+        self.version += 1
+        reports = {int(gid): report for reply in replies for gid, report in reply["groups"].items()}
+        return list(self._leaderboard), reports
+
+    def get_stats(self) -> dict:
+        groups = {}
+        for summary in self.summaries.values():
+            for gid, info in summary["groups"].items():
+                groups[int(gid)] = {**info, "worker": summary["worker_id"]}
+        return {
+            "total_agents": len(self.directory.agent_to_group),
+            "total_groups": len(self.directory.members),
+            "current_group_size": self.directory.dynamic_group_size(),
+            "workers": {
+                wid: {"agents": s["agents"], "orders": s["order_count"], "pipeline": s["pipeline"],
+                      "age_seconds": round(time.time() - s["taken_at"], 2)}
+                for wid, s in self.summaries.items()
+            },
+            "groups": groups,
+        }
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update({"workers": self.num_workers, "forward_errors": self.forward_errors,
+                      "unresolved_orders": self.unresolved})
+        return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a single Darwin arena shard worker")
+    parser.add_argument("--worker-id", type=int, required=True)
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--journal-dir", default=None)
+    args = parser.parse_args()
+    run_worker(args.worker_id, args.socket, args.journal_dir)
@@ -7,10 +7,13 @@ import logging
 import os
 import json
 import asyncio
+import time
 from datetime import datetime
 from typing import Dict, Any
 
 from tournament import TournamentManager
+from config import PERSIST_FLUSH_INTERVAL
+from state_snapshot import SnapshotReader, pack_section, write_snapshot
 
 # 配置日志
 logging.basicConfig(
@@ -23,6 +26,15 @@ logger = logging.getLogger(__name__)
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
 STATE_FILE = os.path.join(DATA_DIR, "arena_state.json")
 SEED_FILE = os.path.join(DATA_DIR, "seed_state.json")  # Fallback seed for fresh deployments
+SNAPSHOT_FILE = os.path.join(DATA_DIR, "arena_state.bin")  # 分段压缩的二进制存档 (见 state_snapshot.py)
+AGENT_CHUNK = 1000  # 每个账户段的账户数
+
+# AscensionTracker 需要持久化的字段 (不存在的字段跳过)
+ASCENSION_FIELDS = (
+    "l1_consecutive_wins", "l1_consecutive_positive", "l1_total_returns", "l2_qualified",
+    "l2_consecutive_wins", "l2_total_returns", "ascended",
+)
+ASCENSION_SETS = ("l2_qualified", "ascended")
 
 class StateManager:
     def __init__(self, engine, council, ascension_tracker):
@@ -32,76 +44,142 @@ class StateManager:
         
         # 确保数据目录存在
         os.makedirs(DATA_DIR, exist_ok=True)
-        
+
+        self._save_lock = None  # asyncio.Lock (首次异步保存时创建)
+        self._session_cache: Dict[int, tuple] = {}  # epoch -> (签名, 压缩字节, 原始长度)
+        self.saves = 0
+        self.save_failures = 0
+        self.last_save: dict = {}
+
+    # ========== 保存 ==========
+
+    def capture(self, current_epoch: int) -> dict:
+        """在事件循环上抓取状态快照 (只复制标量与容器引用，不做编码)
+
+        持仓会被成交原地修改，这里拷贝成元组；议事厅消息追加后不再修改，只浅拷贝列表，
+        消息字段在工作线程里读取。
+        """
+        group_of = getattr(self.engine, "agent_to_group", {})
+        accounts = [
+            (aid, acc.balance, [(sym, pos.amount, pos.avg_price) for sym, pos in acc.positions.items()],
+             group_of.get(aid))
+            for aid, acc in self.engine.accounts.items()
+        ]
+        sessions = [
+            (epoch, session.is_open, session.winner_id, session.revision, session.messages, list(session.messages))
+            for epoch, session in self.council.sessions.items()
+        ]
+        ascension = {}
+        for name in ASCENSION_FIELDS:
+            value = getattr(self.ascension_tracker, name, None)
+            if value is not None:
+                ascension[name] = list(value) if isinstance(value, set) else dict(value)
+        return {
+            "meta": {"timestamp": datetime.now().isoformat(), "current_epoch": current_epoch},
+            "accounts": accounts,
+            "sessions": sessions,
+            "council_scores": dict(self.council.contribution_scores),
+            "ascension": ascension,
+        }
+
+    def _write_snapshot(self, captured: dict) -> dict:
+        """编码 + 压缩 + fsync (可在工作线程中执行)，返回本次保存的度量"""
+        sections = [("meta", *pack_section(captured["meta"]))]
+
+        accounts = captured["accounts"]
+        for i in range(0, len(accounts), AGENT_CHUNK):
+            chunk = [[aid, balance, [list(p) for p in positions], gid]
+                     for aid, balance, positions, gid in accounts[i:i + AGENT_CHUNK]]
+            sections.append((f"agents.{i // AGENT_CHUNK}", *pack_section(chunk)))
+
+        # 议事厅：每个会话一段，会话未变化 (同一消息列表、条数、状态与修改计数相同) 时复用上次的压缩字节
+        reused = 0
+        cache = {}
+        for epoch, is_open, winner_id, revision, messages_ref, messages in captured["sessions"]:
+            signature = (id(messages_ref), len(messages), is_open, winner_id, revision)
+            cached = self._session_cache.get(epoch)
+            if cached is not None and cached[0] == signature:
+                blob, raw_len = cached[1], cached[2]
+                reused += 1
+            else:
+                blob, raw_len = pack_section({
+                    "epoch": epoch,
+                    "is_open": is_open,
+                    "winner_id": winner_id,
+                    "messages": [
+                        [m.id, m.agent_id, m.role.value, m.content, m.timestamp.isoformat(), m.score]
+                        for m in messages
+                    ],
+                })
+            cache[epoch] = (signature, blob, raw_len)
+            sections.append((f"council.{epoch}", blob, raw_len))
+        self._session_cache = cache
+
+        sections.append(("council_scores", *pack_section(captured["council_scores"])))
+        sections.append(("ascension", *pack_section(captured["ascension"])))
+
+        size = write_snapshot(SNAPSHOT_FILE, sections)
+        return {
+            "bytes": size,
+            "raw_bytes": sum(raw_len for _, _, raw_len in sections),
+            "sections": len(sections),
+            "agents": len(accounts),
+            "reused_sessions": reused,
+        }
+
+    def _record_save(self, current_epoch: int, capture_ms: float, write_ms: float, metrics: dict):
+        self.saves += 1
+        self.last_save = {"epoch": current_epoch, "capture_ms": round(capture_ms, 3),
+                          "write_ms": round(write_ms, 3), **metrics}
+        logger.info(f"💾 State saved (Epoch {current_epoch}, {metrics['bytes'] / 1024:.0f} KB, "
+                    f"capture {capture_ms:.1f}ms / write {write_ms:.1f}ms)")
+
     def save_state(self, current_epoch: int):
-        """保存当前状态到磁盘"""
+        """保存当前状态到磁盘 (同步版本，关闭时使用；运行中请用 save_state_async)"""
         try:
-            # 序列化 Council Sessions
-            sessions_data = {}
-            for epoch, session in self.council.sessions.items():
-                sessions_data[str(epoch)] = {
-                    "epoch": session.epoch,
-                    "is_open": session.is_open,
-                    "winner_id": session.winner_id,
-                    "messages": [
-                        {
-                            "id": m.id,
-                            "agent_id": m.agent_id,
-                            "role": m.role.value,
-                            "content": m.content,
-                            "timestamp": m.timestamp.isoformat(),
-                            "score": m.score
-                        } for m in session.messages
-                    ]
-                }
-
-            # 序列化 Ascension Tracker
-            ascension_data = {
-                "l1_consecutive_wins": self.ascension_tracker.l1_consecutive_wins,
-                "l1_total_returns": self.ascension_tracker.l1_total_returns,
-                "l2_qualified": list(self.ascension_tracker.l2_qualified),
-                "l2_consecutive_wins": self.ascension_tracker.l2_consecutive_wins,
-                "l2_total_returns": self.ascension_tracker.l2_total_returns,
-                "ascended": list(self.ascension_tracker.ascended)
-            }
-
-            # Serialize agents accounts properly
-            agents_serialized = {}
-            for aid, acc in self.engine.accounts.items():
-                agents_serialized[aid] = {
-                    "balance": acc.balance,
-                    "positions": {
-                        sym: {
-                            "amount": pos.amount,
-                            "avg_price": pos.avg_price
-                        } for sym, pos in acc.positions.items()
-                    }
-                }
-
-            state = {
-                "timestamp": datetime.now().isoformat(),
-                "current_epoch": current_epoch,
-                "agents": agents_serialized,
-                "council_sessions": sessions_data,
-                "council_scores": self.council.contribution_scores,
-                "ascension": ascension_data
-            }
-            
-            # 写入临时文件再重命名，防止写入中断导致文件损坏
-            temp_file = STATE_FILE + ".tmp"
-            with open(temp_file, "w") as f:
-                json.dump(state, f, indent=2)
-            
-            os.replace(temp_file, STATE_FILE)
-            logger.info(f"💾 State saved (Epoch {current_epoch})")
+            start = time.perf_counter()
+            captured = self.capture(current_epoch)
+            captured_at = time.perf_counter()
+            metrics = self._write_snapshot(captured)
+            self._record_save(current_epoch, (captured_at - start) * 1000,
+                              (time.perf_counter() - captured_at) * 1000, metrics)
             return True
-            
         except Exception as e:
+            self.save_failures += 1
             logger.error(f"Failed to save state: {e}")
             return False
 
+    async def save_state_async(self, current_epoch: int):
+        """保存当前状态到磁盘：事件循环上只做抓取，编码/压缩/fsync 在工作线程中执行"""
+        if self._save_lock is None:
+            self._save_lock = asyncio.Lock()
+        async with self._save_lock:
+            try:
+                start = time.perf_counter()
+                captured = self.capture(current_epoch)
+                captured_at = time.perf_counter()
+                metrics = await asyncio.to_thread(self._write_snapshot, captured)
+                self._record_save(current_epoch, (captured_at - start) * 1000,
+                                  (time.perf_counter() - captured_at) * 1000, metrics)
+                return True
+            except Exception as e:
+                self.save_failures += 1
+                logger.error(f"Failed to save state: {e}")
+                return False
+
+    def stats(self) -> dict:
+        return {"saves": self.saves, "failures": self.save_failures, "last_save": self.last_save}
+
+    # ========== 加载 ==========
+
     def load_state(self) -> Dict[str, Any]:
-        """从磁盘加载状态"""
+        """从磁盘加载状态 (优先二进制快照，兼容旧的 JSON 存档 / 种子文件)"""
+        if SnapshotReader.is_snapshot(SNAPSHOT_FILE):
+            try:
+                return self._load_snapshot(SNAPSHOT_FILE)
+            except Exception as e:
+                logger.error(f"Failed to load snapshot {SNAPSHOT_FILE}: {e}, falling back to JSON state")
+
         state_file_to_load = STATE_FILE
         
         if not os.path.exists(STATE_FILE):
@@ -116,73 +194,22 @@ class StateManager:
         try:
             with open(state_file_to_load, "r") as f:
                 state = json.load(f)
-            
-            # 恢复 Matching Engine 状态
-            from matching import AgentAccount, Position
-            agents_data = state.get("agents", {})
-            self.engine.accounts = {}
-            for aid, adata in agents_data.items():
-                acc = AgentAccount(agent_id=aid)
-                acc.balance = adata.get("balance", 1000.0)
-                # positions
-                for sym, pdata in adata.get("positions", {}).items():
-                    acc.positions[sym] = Position(
-                        symbol=sym,
-                        amount=pdata.get("amount", 0.0),
-                        avg_price=pdata.get("avg_price", 0.0)
-                    )
-                self.engine.accounts[aid] = acc
-            self.engine.agents = self.engine.accounts
-            
-            # 恢复 Council 状态
-            from council import CouncilSession, CouncilMessage, MessageRole
-            
-            sessions_data = state.get("council_sessions", {})
+
+            self._reset_accounts()
+            for aid, adata in state.get("agents", {}).items():
+                self._restore_account(aid, adata.get("balance", 1000.0), adata.get("positions", {}),
+                                      adata.get("group_id"))
+
             self.council.sessions = {}
-            
-            for epoch_str, s_data in sessions_data.items():
-                epoch = int(epoch_str)
-                messages = []
-                for m_data in s_data.get("messages", []):
-                    try:
-                        messages.append(CouncilMessage(
-                            id=m_data["id"],
-                            agent_id=m_data["agent_id"],
-                            role=MessageRole(m_data["role"]),
-                            content=m_data["content"],
-                            timestamp=datetime.fromisoformat(m_data["timestamp"]),
-                            score=m_data["score"],
-                            epoch=epoch
-                        ))
-                    except Exception as e:
-                        logger.warning(f"Skipping malformed message: {e}")
-                
-                self.council.sessions[epoch] = CouncilSession(
-                    epoch=epoch,
-                    is_open=s_data.get("is_open", False),
-                    winner_id=s_data.get("winner_id"),
-                    messages=messages
-                )
-            
+            for epoch_str, s_data in state.get("council_sessions", {}).items():
+                messages = [
+                    [m.get("id"), m.get("agent_id"), m.get("role"), m.get("content"), m.get("timestamp"), m.get("score")]
+                    for m in s_data.get("messages", [])
+                ]
+                self._restore_session(int(epoch_str), s_data.get("is_open", False), s_data.get("winner_id"), messages)
+
             self.council.contribution_scores = state.get("council_scores", {})
-            
-            # 恢复 Ascension Tracker
-            ascension_data = state.get("ascension", {})
-            
-            # 兼容旧数据: 如果是旧版存档，迁移到 L1
-            if "consecutive_wins" in ascension_data:
-                logger.info("⚠️ Migrating legacy Ascension state to L1...")
-                self.ascension_tracker.l1_consecutive_wins = ascension_data.get("consecutive_wins", {})
-                self.ascension_tracker.l1_total_returns = ascension_data.get("total_returns", {})
-            else:
-                # 正常加载新版数据
-                self.ascension_tracker.l1_consecutive_wins = ascension_data.get("l1_consecutive_wins", {})
-                self.ascension_tracker.l1_total_returns = ascension_data.get("l1_total_returns", {})
-                self.ascension_tracker.l2_qualified = set(ascension_data.get("l2_qualified", []))
-                self.ascension_tracker.l2_consecutive_wins = ascension_data.get("l2_consecutive_wins", {})
-                self.ascension_tracker.l2_total_returns = ascension_data.get("l2_total_returns", {})
-                
-            self.ascension_tracker.ascended = set(ascension_data.get("ascended", []))
+            self._restore_ascension(state.get("ascension", {}))
             
             logger.info(f"📂 State loaded: Epoch {state.get('current_epoch', 0)}")
             return state
@@ -191,17 +218,102 @@ class StateManager:
             logger.error(f"Failed to load state: {e}")
             return None
 
+    def _load_snapshot(self, path: str) -> Dict[str, Any]:
+        """逐段恢复：账户按块、议事厅按会话解码，不一次性把整个存档读进内存"""
+        with SnapshotReader(path) as reader:
+            meta = reader.read("meta", {})
+
+            self._reset_accounts()
+            for _, chunk in reader.iter_sections("agents."):
+                for aid, balance, positions, group_id in chunk:
+                    self._restore_account(
+                        aid, balance,
+                        {sym: {"amount": amount, "avg_price": avg} for sym, amount, avg in positions},
+                        group_id,
+                    )
+
+            self.council.sessions = {}
+            for _, s_data in reader.iter_sections("council."):
+                self._restore_session(s_data["epoch"], s_data.get("is_open", False),
+                                      s_data.get("winner_id"), s_data.get("messages", []))
+
+            self.council.contribution_scores = reader.read("council_scores", {})
+            self._restore_ascension(reader.read("ascension", {}))
+
+        logger.info(f"📂 State loaded from snapshot: Epoch {meta.get('current_epoch', 0)} ({reader.size() or 0} bytes)")
+        return meta
+
+    def _reset_accounts(self):
+        if not hasattr(self.engine, "restore_agent"):  # 单个 MatchingEngine
+            self.engine.accounts.clear()
+
+    def _restore_account(self, aid: str, balance: float, positions: dict, group_id=None):
+        if hasattr(self.engine, "restore_agent"):  # GroupManager：按原分组恢复
+            self.engine.restore_agent(aid, balance, positions, group_id)
+            return
+        from matching import AgentAccount, Position
+        acc = AgentAccount(agent_id=aid)
+        acc.balance = balance
+        for sym, pdata in positions.items():
+            acc.positions[sym] = Position(
+                symbol=sym,
+                amount=pdata.get("amount", 0.0),
+                avg_price=pdata.get("avg_price", 0.0)
+            )
+        self.engine.accounts[aid] = acc
+
+    def _restore_session(self, epoch: int, is_open: bool, winner_id, messages: list):
+        from council import CouncilSession, CouncilMessage, MessageRole
+        restored = []
+        for msg_id, agent_id, role, content, timestamp, score in messages:
+            try:
+                restored.append(CouncilMessage(
+                    id=msg_id,
+                    agent_id=agent_id,
+                    role=MessageRole(role),
+                    content=content,
+                    timestamp=datetime.fromisoformat(timestamp),
+                    score=score,
+                    epoch=epoch
+                ))
+            except Exception as e:
+                logger.warning(f"Skipping malformed message: {e}")
+        self.council.sessions[epoch] = CouncilSession(
+            epoch=epoch,
+            is_open=is_open,
+            winner_id=winner_id,
+            messages=restored
+        )
+
+    def _restore_ascension(self, ascension_data: dict):
+        # 兼容旧数据: 如果是旧版存档，迁移到 L1
+        if "consecutive_wins" in ascension_data:
+            logger.info("⚠️ Migrating legacy Ascension state to L1...")
+            self.ascension_tracker.l1_consecutive_wins = ascension_data.get("consecutive_wins", {})
+            self.ascension_tracker.l1_total_returns = ascension_data.get("total_returns", {})
+            self.ascension_tracker.ascended = set(ascension_data.get("ascended", []))
+        else:
+            # 正常加载新版数据
+            for name in ASCENSION_FIELDS:
+                value = ascension_data.get(name)
+                if name in ASCENSION_SETS:
+                    setattr(self.ascension_tracker, name, set(value or []))
+                else:
+                    setattr(self.ascension_tracker, name, value or {})
+
     async def auto_save_loop(self, get_epoch_func, redis_save_func=None):
         """定期自动保存任务（本地 + Redis）"""
         while True:
             try:
-                await asyncio.sleep(60)  # 每分钟保存一次
+                await asyncio.sleep(PERSIST_FLUSH_INTERVAL)  # 每分钟保存一次
                 current_epoch = get_epoch_func()
-                self.save_state(current_epoch)
-                # 同步保存到 Redis
+                await self.save_state_async(current_epoch)
+                # 保存到 Redis (可以是协程函数，如 StatePersistence.flush)
                 if redis_save_func:
                     try:
-                        redis_save_func()
+                        result = redis_save_func()
+                        if asyncio.iscoroutine(result):
+                            await result
                     except Exception as e:
                         logger.warning(f"Redis auto-save failed (will retry next cycle): {e}")
             except asyncio.CancelledError:
@@ -0,0 +1,343 @@
+"""
+Redis 增量持久化 (State Persistence)
+替代每分钟 DELETE + 全量重写 darwin:agents / darwin:api_keys / 议事厅 JSON 的做法
+
+流程：
+  事件循环 (同步、只做 O(变更数) 的工作):
+    1. 收集变更: 账户 (ValuationIndex.changed)、API Key (TrackedDict)、议事厅会话 (Council.dirty_sessions)
+    2. 序列化成普通 dict (之后不再引用活对象)
+  工作线程 (asyncio.to_thread):
+    3. JSON 编码 + 一次 pipeline 往返 (HSET 变更字段 / HDEL 删除字段)
+
+每 PERSIST_SNAPSHOT_INTERVAL 做一次全量压缩快照：每张 hash 写临时 key 后 RENAME 原子替换，
+顺带清理增量路径遗漏的残留字段。Redis 写入失败时这批变更会并入下一次保存，不会丢失。
+
+分片模式 (shards=ShardRouter)：账户与成交只存在于 worker 进程，收集前先经 RPC 拉取
+(ShardRouter.collect_accounts)，恢复时由 ShardRouter.restore_accounts 下发到各 worker。
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from config import PERSIST_FLUSH_DEBOUNCE, PERSIST_SNAPSHOT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class TrackedDict(dict):
+    """记录增删过哪些 key 的 dict (API_KEYS_DB 用它做增量保存)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.changed: Set = set()
+        self.removed: Set = set()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.changed.add(key)
+        self.removed.discard(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.changed.discard(key)
+        self.removed.add(key)
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super().pop(key, *default)
+        value = super().pop(key)
+        self.changed.discard(key)
+        self.removed.add(key)
+        return value
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.changed.discard(key)
+        self.removed.add(key)
+        return key, value
+
+    def setdefault(self, key, value=None):
+        if key not in self:
+            self[key] = value
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        for key in list(self):
+            del self[key]
+
+    def drain(self) -> Tuple[dict, Set]:
+        """取出并清空变更: (新增/修改的 {key: value}, 删除的 key 集合)"""
+        upserts = {key: self[key] for key in self.changed if key in self}
+        removed = self.removed
+        self.changed, self.removed = set(), set()
+        return upserts, removed
+
+    def mark_clean(self):
+        self.changed.clear()
+        self.removed.clear()
+
+
+@dataclass
+class StateDelta:
+    """一次增量保存的内容 (全部是已序列化的普通 dict)"""
+    agents: Dict[str, dict] = field(default_factory=dict)
+    removed_agents: Set[str] = field(default_factory=set)
+    api_keys: Dict[str, str] = field(default_factory=dict)
+    removed_keys: Set[str] = field(default_factory=set)
+    council_sessions: Dict[str, dict] = field(default_factory=dict)
+    removed_council: Set[int] = field(default_factory=set)  # 已溢出到归档的会话
+    council_scores: Dict[str, float] = field(default_factory=dict)
+    trade_history: Optional[list] = None
+
+    @property
+    def empty(self) -> bool:
+        return not (self.agents or self.removed_agents or self.api_keys or self.removed_keys
+                    or self.council_sessions or self.removed_council or self.council_scores
+                    or self.trade_history is not None)
+
+    def merge_into(self, newer: "StateDelta") -> "StateDelta":
+        """把保存失败的旧变更并入新变更 (新值优先)"""
+        agents = {**self.agents, **newer.agents}
+        api_keys = {**self.api_keys, **newer.api_keys}
+        council_sessions = {**self.council_sessions, **newer.council_sessions}
+        return StateDelta(
+            agents=agents,
+            removed_agents=(self.removed_agents | newer.removed_agents) - agents.keys(),
+            api_keys=api_keys,
+            removed_keys=(self.removed_keys | newer.removed_keys) - api_keys.keys(),
+            council_sessions=council_sessions,
+            removed_council=(self.removed_council | newer.removed_council) - {int(e) for e in council_sessions},
+            council_scores={**self.council_scores, **newer.council_scores},
+            trade_history=newer.trade_history if newer.trade_history is not None else self.trade_history,
+        )
+
+
+class StatePersistence:
+    """脏数据追踪 + 线程中执行的 pipeline 写入"""
+
+    def __init__(
+        self,
+        redis_state,
+        group_manager,
+        council,
+        api_keys: TrackedDict,
+        get_meta: Callable[[], Tuple[int, int, float]],
+        snapshot_interval: float = PERSIST_SNAPSHOT_INTERVAL,
+        debounce: float = PERSIST_FLUSH_DEBOUNCE,
+        shards=None,
+    ):
+        self.redis_state = redis_state
+        self.group_manager = group_manager
+        self.council = council
+        self.api_keys = api_keys
+        self.get_meta = get_meta  # () -> (epoch, trade_count, total_volume)
+        self.snapshot_interval = snapshot_interval
+        self.debounce = debounce
+        self.shards = shards  # 分片模式下账户的来源 (ShardRouter)
+
+        self._known_agents: Set[str] = set()  # Redis 中已有的账户 (用于推算删除)
+        self._retry: Optional[StateDelta] = None
+        self._snapshot_due = True  # 未从 Redis 恢复时，第一次保存写全量
+        self._last_snapshot = 0.0
+        self._last_order_count = -1
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # 度量
+        self.flushes = 0
+        self.snapshots = 0
+        self.skipped = 0
+        self.errors = 0
+        self.bytes_written = 0
+        self.last_flush: dict = {}
+
+    def _current_agents(self) -> Set[str]:
+        current = set()
+        for group in self.group_manager.groups.values():
+            current.update(group.engine.accounts.keys())
+        return current
+
+    def mark_clean(self):
+        """从 Redis 恢复完状态后调用：当前内存状态与 Redis 一致，丢弃恢复过程产生的脏标记"""
+        for group in self.group_manager.groups.values():
+            group.engine.valuation.drain_changed()
+        self.council.dirty_sessions.clear()
+        self.council.drain_dirty_scores()
+        self.council.drain_spilled()
+        self.api_keys.mark_clean()
+        self._known_agents = self._current_agents()
+        self._last_order_count = self.group_manager.order_count
+        self._snapshot_due = False
+        self._last_snapshot = time.monotonic()
+
+    # ========== 收集 (事件循环内) ==========
+
+    def _local_accounts(self, full: bool = False) -> dict:
+        """本进程组引擎中的账户：{agents, current, order_count, trade_history (未变时为 None)}"""
+        gm = self.group_manager
+        agents = gm.collect_account_changes()
+        if full:
+            agents = gm.get_all_accounts_data()
+        order_count = gm.order_count
+        changed = full or order_count != self._last_order_count
+        return {
+            "agents": agents,
+            "current": self._current_agents(),
+            "order_count": order_count,
+            "trade_history": list(gm.trade_history)[:200] if changed else None,
+        }
+
+    async def _pull_accounts(self, full: bool) -> Optional[dict]:
+        """分片模式下经 RPC 从各 worker 拉取账户 (格式同 _local_accounts)"""
+        if self.shards is None:
+            return None
+        return await self.shards.collect_accounts(full=full, order_count=self._last_order_count)
+
+    def collect(self, accounts: Optional[dict] = None) -> StateDelta:
+        if accounts is None:
+            accounts = self._local_accounts()
+        current = set(accounts["current"])
+        removed_agents = self._known_agents - current
+        self._known_agents = current
+        api_keys, removed_keys = self.api_keys.drain()
+
+        trade_history = None
+        if accounts["order_count"] != self._last_order_count:
+            trade_history = accounts["trade_history"]
+            self._last_order_count = accounts["order_count"]
+
+        delta = StateDelta(
+            agents=accounts["agents"],
+            removed_agents=removed_agents,
+            api_keys=api_keys,
+            removed_keys=removed_keys,
+            council_sessions=self.council.drain_dirty_sessions(),
+            removed_council=self.council.drain_spilled(),
+            council_scores=self.council.drain_dirty_scores(),
+            trade_history=trade_history,
+        )
+        if self._retry is not None:
+            delta = self._retry.merge_into(delta)
+            self._retry = None
+        return delta
+
+    def _collect_full(self, accounts: Optional[dict] = None) -> dict:
+        # 全量快照覆盖所有脏数据，一并清空增量标记
+        if accounts is None:
+            accounts = self._local_accounts(full=True)
+        self.collect(accounts)
+        self._retry = None
+        return {
+            "agents": accounts["agents"],
+            "api_keys": dict(self.api_keys),
+            "council_sessions": self.council.serialize_sessions(),
+            "council_scores": dict(self.council.contribution_scores),
+            "trade_history": accounts["trade_history"],
+        }
+
+    # ========== 保存 ==========
+
+    def snapshot_due(self) -> bool:
+        return self._snapshot_due or time.monotonic() - self._last_snapshot >= self.snapshot_interval
+
+    async def flush(self, snapshot: bool = None) -> dict:
+        """保存一次：到期 (或 snapshot=True) 时写全量快照，否则只写增量"""
+        async with self._lock:
+            if snapshot is None:
+                snapshot = self.snapshot_due()
+            try:
+                accounts = await self._pull_accounts(full=snapshot)
+            except Exception as e:
+                self.errors += 1
+                self._snapshot_due = True  # 部分 worker 可能已清掉变更标记：下次写全量
+                logger.warning(f"Shard account pull failed (will retry next cycle): {e}")
+                return {}
+            epoch, trade_count, total_volume = self.get_meta()
+            start = time.perf_counter()
+
+            if snapshot:
+                full = self._collect_full(accounts)
+                loop_ms = (time.perf_counter() - start) * 1000
+                try:
+                    written = await asyncio.to_thread(
+                        self.redis_state.write_full_state, epoch, trade_count, total_volume,
+                        full["api_keys"], full["agents"], full["trade_history"], full["council_sessions"],
+                        full["council_scores"],
+                    )
+                except Exception as e:
+                    self.errors += 1
+                    self._snapshot_due = True  # 下次仍写全量，覆盖这次丢掉的增量标记
+                    logger.warning(f"Redis snapshot failed (will retry next cycle): {e}")
+                    return {}
+                self._snapshot_due = False
+                self._last_snapshot = time.monotonic()
+                self.snapshots += 1
+                result = {"kind": "snapshot", "agents": len(full["agents"])}
+            else:
+                delta = self.collect(accounts)
+                loop_ms = (time.perf_counter() - start) * 1000
+                if delta.empty and self.last_flush.get("meta") == (epoch, trade_count, total_volume):
+                    self.skipped += 1
+                    return {}
+                try:
+                    written = await asyncio.to_thread(
+                        self.redis_state.save_delta, epoch, trade_count, total_volume,
+                        delta.agents, delta.removed_agents, delta.api_keys, delta.removed_keys,
+                        delta.council_sessions, delta.trade_history,
+                        delta.removed_council, delta.council_scores,
+                    )
+                except Exception as e:
+                    self.errors += 1
+                    self._retry = delta
+                    logger.warning(f"Redis delta save failed (will retry next cycle): {e}")
+                    return {}
+                result = {
+                    "kind": "delta",
+                    "agents": len(delta.agents),
+                    "removed_agents": len(delta.removed_agents),
+                    "api_keys": len(delta.api_keys) + len(delta.removed_keys),
+                    "council_sessions": len(delta.council_sessions),
+                }
+
+            self.flushes += 1
+            self.bytes_written += written
+            result.update({
+                "bytes": written,
+                "loop_ms": round(loop_ms, 3),
+                "total_ms": round((time.perf_counter() - start) * 1000, 3),
+                "meta": (epoch, trade_count, total_volume),
+            })
+            self.last_flush = result
+            return result
+
+    def request_flush(self):
+        """事件触发的保存 (注册、删除 Agent、Epoch 结束等)：短暂合并后在后台执行，不阻塞调用方"""
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        self._flush_task = asyncio.get_running_loop().create_task(self._debounced_flush())
+
+    async def _debounced_flush(self):
+        await asyncio.sleep(self.debounce)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Redis flush error: {e}")
+
+    def stats(self) -> dict:
+        last = {k: v for k, v in self.last_flush.items() if k != "meta"}
+        return {
+            "flushes": self.flushes,
+            "snapshots": self.snapshots,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "bytes_written": self.bytes_written,
+            "tracked_agents": len(self._known_agents),
+            "last_flush": last,
+        }
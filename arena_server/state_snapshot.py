@@ -0,0 +1,146 @@
+"""
+状态快照文件 (State Snapshot)
+StateManager 的紧凑二进制存档格式，替代 indent=2 的 arena_state.json
+
+文件布局:
+    b"DSS1" + 编码标记 (b"M" = msgpack, b"J" = JSON 兜底)
+    <I> 段表长度 + 段表 (编码后的 [[name, offset, length, raw_length], ...])
+    各段数据 (每段单独编码 + zlib 压缩)
+
+分段让读取可以按需进行：只解码需要的段 (如 meta)，账户按块 (agents.0, agents.1 ...) 逐块恢复，
+议事厅每个会话一段 (council.<epoch>)，未变化的会话在下次保存时直接复用已压缩的字节。
+"""
+
+import json
+import os
+import struct
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # msgpack 可选，缺失时用 JSON 编码
+    msgpack = None
+
+MAGIC = b"DSS1"
+TABLE_LEN = struct.Struct("<I")
+HEADER_SIZE = len(MAGIC) + 1 + TABLE_LEN.size
+DEFAULT_CODEC = b"M" if msgpack is not None else b"J"
+
+
+def encode(value, codec: bytes = DEFAULT_CODEC) -> bytes:
+    if codec == b"M":
+        return msgpack.packb(value, use_bin_type=True)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def decode(data: bytes, codec: bytes):
+    if codec == b"M":
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    return json.loads(data)
+
+
+def pack_section(value, codec: bytes = DEFAULT_CODEC, level: int = 1) -> Tuple[bytes, int]:
+    """编码 + 压缩一个段，返回 (压缩后字节, 原始长度)"""
+    raw = encode(value, codec)
+    return zlib.compress(raw, level), len(raw)
+
+
+def write_snapshot(path: str, sections: List[Tuple[str, bytes, int]], codec: bytes = DEFAULT_CODEC) -> int:
+    """写入快照：临时文件 + fsync + 原子替换；sections 为 [(name, 压缩字节, 原始长度)]，返回文件大小"""
+    # 段表里的 offset 依赖段表自身长度：先用占位 offset 估算长度，再定稿
+    table = [[name, 0, len(blob), raw_len] for name, blob, raw_len in sections]
+    table_bytes = encode(table, codec)
+    while True:
+        offset = HEADER_SIZE + len(table_bytes)
+        for entry, (_, blob, _) in zip(table, sections):
+            entry[1] = offset
+            offset += len(blob)
+        encoded = encode(table, codec)
+        if len(encoded) == len(table_bytes):
+            table_bytes = encoded
+            break
+        table_bytes = encoded
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + codec + TABLE_LEN.pack(len(table_bytes)) + table_bytes)
+        for _, blob, _ in sections:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(tmp, path)
+    try:  # 目录项也落盘，保证 rename 在掉电后可见
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+    return size
+
+
+class SnapshotReader:
+    """按需读取快照中的段 (只读段表，段内容在首次访问时解压解码)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        header = self._f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or header[:4] != MAGIC:
+            self._f.close()
+            raise ValueError(f"{path} is not a state snapshot")
+        self.codec = header[4:5]
+        (table_len,) = TABLE_LEN.unpack(header[5:])
+        table = decode(self._f.read(table_len), self.codec)
+        self.table: Dict[str, Tuple[int, int, int]] = {name: (off, length, raw) for name, off, length, raw in table}
+        self._cache: Dict[str, object] = {}
+
+    @staticmethod
+    def is_snapshot(path: str) -> bool:
+        try:
+            with open(path, "rb") as f:
+                return f.read(4) == MAGIC
+        except OSError:
+            return False
+
+    def names(self, prefix: str = "") -> List[str]:
+        return [name for name in self.table if name.startswith(prefix)]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.table
+
+    def raw(self, name: str) -> bytes:
+        """段的压缩字节 (不解码)"""
+        offset, length, _ = self.table[name]
+        self._f.seek(offset)
+        return self._f.read(length)
+
+    def read(self, name: str, default=None):
+        if name not in self.table:
+            return default
+        if name not in self._cache:
+            self._cache[name] = decode(zlib.decompress(self.raw(name)), self.codec)
+        return self._cache[name]
+
+    def iter_sections(self, prefix: str) -> Iterator[Tuple[str, object]]:
+        """逐段解码 (不缓存)，用于大段的增量恢复"""
+        for name in self.names(prefix):
+            yield name, decode(zlib.decompress(self.raw(name)), self.codec)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self) -> "SnapshotReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def size(self) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return None
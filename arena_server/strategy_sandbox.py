@@ -12,12 +12,15 @@
 """
 
 import ast
+import os
 import sys
 import io
 import time
 import traceback
 import resource
 import signal
+import threading
+from types import CodeType
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass, field
 from datetime import datetime
@@ -25,6 +28,11 @@ from collections import deque
 import copy
 import random
 
+try:
+    from arena_server.market_scenarios import SCENARIOS_AVAILABLE, MarketScenario, generate_scenario, load_fixture
+except ImportError:  # 在 arena_server 目录内运行 (沙盒 worker / 裸模块名导入)
+    from market_scenarios import SCENARIOS_AVAILABLE, MarketScenario, generate_scenario, load_fixture
+
 
 @dataclass
 class SandboxTestResult:
@@ -193,15 +201,170 @@ def timeout_handler(signum, frame):
     raise TimeoutException("Execution timeout")
 
 
+def _address_space_bytes() -> int:
+    """当前进程的虚拟地址空间大小 (仅 Linux 可读，其他平台返回 0)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _signals_available() -> bool:
+    """SIGALRM / 定时器只能在 Unix 主线程里安装"""
+    return sys.platform != 'win32' and threading.current_thread() is threading.main_thread()
+
+
+class StrategySession:
+    """常驻策略实例 - 代码只编译、执行一次，MyStrategy 实例在整轮回测中保留状态
+
+    每个 tick 只重新设置 CPU 计时器 (ITIMER_PROF，按进程 CPU 时间计)，不再重新 exec、
+    重新实例化或重设 RLIMIT_AS；内存限制在 open() 时设置一次，close() 时恢复。
+
+    用法:
+        with executor.load_strategy(code) as session:
+            if session.error: ...
+            success, orders, error = session.on_tick(market_data)
+    """
+
+    def __init__(self, executor: "SandboxExecutor", code: str,
+                 agent_state: Optional[Dict[str, Any]] = None, tick_cpu_budget: Optional[float] = None):
+        self.executor = executor
+        self.code = code
+        self.agent_state = agent_state or {}
+        self.tick_cpu_budget = tick_cpu_budget or executor.MAX_TICK_CPU_SECONDS
+        self.strategy = None
+        self.error: Optional[str] = None
+        self.ticks = 0
+        self._signals = _signals_available()
+        self._old_handlers = {}
+        self._old_rlimit = None
+
+    def open(self) -> Optional[str]:
+        """编译 + 实例化策略；失败时返回错误信息 (同时记录在 self.error)"""
+        if self._signals:
+            self._old_rlimit = self.executor._apply_memory_limit()
+            for signum in (signal.SIGALRM, signal.SIGPROF):
+                self._old_handlers[signum] = signal.signal(signum, timeout_handler)
+            signal.alarm(self.executor.MAX_EXECUTION_TIME)  # 模块顶层代码 + __init__ 的时间上限
+        try:
+            namespace = dict(self.executor.restricted_globals)
+            exec(self.executor.compile_strategy(self.code), namespace)
+            if 'MyStrategy' not in namespace:
+                self.error = "MyStrategy class not found"
+                return self.error
+            self.strategy = namespace['MyStrategy']()
+            for key, value in self.agent_state.items():
+                if hasattr(self.strategy, key):
+                    setattr(self.strategy, key, value)
+        except TimeoutException:
+            self.error = "Execution timeout - possible infinite loop"
+        except MemoryError:
+            self.error = "Memory limit exceeded"
+        except Exception as e:
+            self.error = f"Runtime error: {str(e)}\n{traceback.format_exc()}"
+        finally:
+            if self._signals:
+                signal.alarm(0)
+        return self.error
+
+    def on_tick(self, market_data: Dict[str, Any]) -> Tuple[bool, Optional[List[Dict]], Optional[str]]:
+        """调用一次 on_tick (受每 tick CPU 预算约束)
+
+        Returns:
+            (success, orders, error_message)
+        """
+        if self.strategy is None:
+            return False, None, self.error or "Strategy not loaded"
+        self.ticks += 1
+        try:
+            if self._signals:
+                signal.setitimer(signal.ITIMER_PROF, self.tick_cpu_budget)
+            orders = self.strategy.on_tick(market_data)
+            return True, orders, None
+        except TimeoutException:
+            return False, None, (f"Execution timeout - possible infinite loop "
+                                 f"(tick CPU budget {self.tick_cpu_budget:.2f}s exceeded)")
+        except MemoryError:
+            return False, None, "Memory limit exceeded"
+        except Exception as e:
+            return False, None, f"Runtime error: {str(e)}\n{traceback.format_exc()}"
+        finally:
+            if self._signals:
+                signal.setitimer(signal.ITIMER_PROF, 0)
+
+    def close(self):
+        if self._signals:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            for signum, handler in self._old_handlers.items():
+                signal.signal(signum, handler if handler is not None else signal.SIG_DFL)
+            self._old_handlers.clear()
+            self.executor._restore_memory_limit(self._old_rlimit)
+            self._old_rlimit = None
+        self.strategy = None
+
+    def __enter__(self) -> "StrategySession":
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 class SandboxExecutor:
     """沙盒执行器 - 隔离执行策略代码"""
 
     # 资源限制
     MAX_EXECUTION_TIME = 5  # 每轮最大执行时间（秒）
-    MAX_MEMORY_MB = 100  # 最大内存使用（MB）
+    MAX_MEMORY_MB = 100  # 最大内存使用（MB，在当前进程地址空间之上额外允许的量）
+    MAX_TICK_CPU_SECONDS = 0.5  # 常驻实例模式下每个 tick 的 CPU 预算（秒）
+    CODE_CACHE_SIZE = 64  # 编译结果缓存条数
 
     def __init__(self):
         self.restricted_globals = self._create_restricted_globals()
+        self._code_cache: Dict[str, CodeType] = {}
+        self.compile_count = 0
+
+    def compile_strategy(self, code: str) -> CodeType:
+        """编译策略代码 (按源码缓存，同一份代码只编译一次)"""
+        compiled = self._code_cache.get(code)
+        if compiled is None:
+            compiled = compile(code, "<strategy>", "exec")
+            self.compile_count += 1
+            if len(self._code_cache) >= self.CODE_CACHE_SIZE:
+                self._code_cache.pop(next(iter(self._code_cache)))
+            self._code_cache[code] = compiled
+        return compiled
+
+    def load_strategy(self, code: str, agent_state: Optional[Dict[str, Any]] = None,
+                      tick_cpu_budget: Optional[float] = None) -> StrategySession:
+        """创建常驻策略实例 (配合 with 使用，进入时编译并实例化)"""
+        return StrategySession(self, code, agent_state, tick_cpu_budget)
+
+    def _apply_memory_limit(self) -> Optional[Tuple[int, int]]:
+        """设置 RLIMIT_AS，返回原限制 (无法设置时返回 None)"""
+        try:
+            soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+            # RLIMIT_AS 限制整个进程的地址空间；已加载的 numpy 等库本身就占 ~100MB，
+            # 因此按 "当前地址空间 + 预算" 设置，而不是绝对值
+            new_limit = _address_space_bytes() + self.MAX_MEMORY_MB * 1024 * 1024
+            if soft != resource.RLIM_INFINITY:
+                new_limit = min(new_limit, soft)
+            if hard == resource.RLIM_INFINITY or new_limit < hard:
+                resource.setrlimit(resource.RLIMIT_AS, (new_limit, hard))
+                return soft, hard
+        except (ValueError, OSError):
+            pass
+        return None
+
+    @staticmethod
+    def _restore_memory_limit(limit: Optional[Tuple[int, int]]):
+        if limit is None:
+            return
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, limit)
+        except (ValueError, OSError):
+            pass
 
     def _create_restricted_globals(self) -> Dict[str, Any]:
         """创建受限的全局命名空间"""
@@ -256,23 +419,11 @@ class SandboxExecutor:
         Returns:
             (success, orders, error_message)
         """
+        memory_limit = None
         try:
-            # 设置资源限制（仅在 Unix 系统，且谨慎处理）
+            # 设置资源限制（仅在 Unix 系统，且谨慎处理；结束时恢复，避免影响后续回测数据生成）
             if sys.platform != 'win32':
-                try:
-                    # 获取当前限制
-                    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
-
-                    # 只在当前限制允许的情况下设置新限制
-                    new_limit = self.MAX_MEMORY_MB * 1024 * 1024
-                    if hard == resource.RLIM_INFINITY or new_limit < hard:
-                        resource.setrlimit(
-                            resource.RLIMIT_AS,
-                            (new_limit, hard)
-                        )
-                except (ValueError, OSError) as e:
-                    # 如果无法设置内存限制，继续执行（记录警告）
-                    pass
+                memory_limit = self._apply_memory_limit()
 
                 # 设置超时
                 signal.signal(signal.SIGALRM, timeout_handler)
@@ -281,8 +432,8 @@ class SandboxExecutor:
             # 创建隔离的命名空间（不使用 deepcopy，直接复制引用）
             namespace = dict(self.restricted_globals)
 
-            # 执行策略代码
-            exec(code, namespace)
+            # 执行策略代码 (编译结果按源码缓存)
+            exec(self.compile_strategy(code), namespace)
 
             # 实例化策略
             if 'MyStrategy' not in namespace:
@@ -316,14 +467,31 @@ class SandboxExecutor:
             # 重置资源限制
             if sys.platform != 'win32':
                 signal.alarm(0)
+                self._restore_memory_limit(memory_limit)
+
+
+def _history_frames(market_history: List[Dict[str, Any]]):
+    """generate_mock_market_data 格式 → (tick, 成交用价格, 传给策略的 market_data)"""
+    for tick_data in market_history:
+        prices = tick_data['prices']
+        # 构建 market_data 格式（与真实环境一致）
+        market_data = {
+            'tick': tick_data['tick'],
+            'prices': {sym: data['price'] for sym, data in prices.items()},
+            'volumes': {sym: data['volume'] for sym, data in prices.items()},
+            'liquidities': {sym: data['liquidity'] for sym, data in prices.items()},
+        }
+        yield tick_data['tick'], {sym: data['price'] for sym, data in prices.items()}, market_data
 
 
 class BacktestEngine:
     """回测引擎 - 使用历史数据测试策略"""
 
-    def __init__(self, initial_balance: float = 10000.0):
+    def __init__(self, initial_balance: float = 10000.0, persistent: bool = True):
         self.initial_balance = initial_balance
         self.executor = SandboxExecutor()
+        # persistent=True: 每轮一个常驻策略实例 (状态跨 tick 保留)；False: 旧模式，每 tick 重新 exec + 实例化
+        self.persistent = persistent
 
     def generate_mock_market_data(
         self,
@@ -382,67 +550,74 @@ class BacktestEngine:
 
         start_time = time.time()
 
-        for tick_data in market_history:
-            tick = tick_data['tick']
-            prices = tick_data['prices']
-
-            # 构建 market_data 格式（与真实环境一致）
-            market_data = {
-                'tick': tick,
-                'prices': {sym: data['price'] for sym, data in prices.items()},
-                'volumes': {sym: data['volume'] for sym, data in prices.items()},
-                'liquidities': {sym: data['liquidity'] for sym, data in prices.items()},
-            }
-
-            # 执行策略
-            success, orders, error = self.executor.execute_strategy(
-                code, market_data, agent_state
-            )
-
-            if not success:
-                logs.append(f"Tick {tick}: Execution failed - {error}")
+        # 常驻模式：整轮只编译、实例化一次
+        session = None
+        if self.persistent:
+            session = self.executor.load_strategy(code, agent_state)
+            error = session.open()
+            if error:
+                session.close()
+                logs.append(f"Tick 0: Execution failed - {error}")
                 return False, {}, logs
 
-            # 处理订单
-            if orders:
-                for order in orders:
-                    symbol = order.get('symbol')
-                    side = order.get('side', '').upper()
-                    amount = order.get('amount', 0)
-
-                    if symbol not in prices:
-                        continue
-
-                    price = prices[symbol]['price']
-
-                    if side == 'BUY':
-                        cost = amount * price
-                        if cost <= balance:
-                            # 更新平均成本
-                            total_amount = positions[symbol] + amount
-                            if total_amount > 0:
-                                avg_prices[symbol] = (
-                                    (positions[symbol] * avg_prices[symbol] + cost) / total_amount
-                                )
-                            positions[symbol] += amount
-                            balance -= cost
-                            logs.append(f"Tick {tick}: BUY {amount:.2f} {symbol} @ {price:.6f}")
-
-                    elif side == 'SELL':
-                        if amount <= positions[symbol]:
-                            revenue = amount * price
-                            positions[symbol] -= amount
-                            balance += revenue
-                            logs.append(f"Tick {tick}: SELL {amount:.2f} {symbol} @ {price:.6f}")
-
-            # 计算当前总资产
-            total_value = balance
-            for sym, pos_amount in positions.items():
-                if pos_amount > 0 and sym in prices:
-                    total_value += pos_amount * prices[sym]['price']
-
-            pnl = total_value - self.initial_balance
-            pnl_history.append(pnl)
+        frames = market_history.frames() if hasattr(market_history, 'frames') else _history_frames(market_history)
+        try:
+            for tick, prices, market_data in frames:
+                # 执行策略
+                if session is not None:
+                    success, orders, error = session.on_tick(market_data)
+                else:
+                    success, orders, error = self.executor.execute_strategy(
+                        code, market_data, agent_state
+                    )
+
+                if not success:
+                    logs.append(f"Tick {tick}: Execution failed - {error}")
+                    return False, {}, logs
+
+                # 处理订单
+                if orders:
+                    for order in orders:
+                        symbol = order.get('symbol')
+                        side = order.get('side', '').upper()
+                        amount = order.get('amount', 0)
+
+                        if symbol not in prices:
+                            continue
+
+                        price = prices[symbol]
+
+                        if side == 'BUY':
+                            cost = amount * price
+                            if cost <= balance:
+                                # 更新平均成本
+                                total_amount = positions[symbol] + amount
+                                if total_amount > 0:
+                                    avg_prices[symbol] = (
+                                        (positions[symbol] * avg_prices[symbol] + cost) / total_amount
+                                    )
+                                positions[symbol] += amount
+                                balance -= cost
+                                logs.append(f"Tick {tick}: BUY {amount:.2f} {symbol} @ {price:.6f}")
+
+                        elif side == 'SELL':
+                            if amount <= positions[symbol]:
+                                revenue = amount * price
+                                positions[symbol] -= amount
+                                balance += revenue
+                                logs.append(f"Tick {tick}: SELL {amount:.2f} {symbol} @ {price:.6f}")
+
+                # 计算当前总资产
+                total_value = balance
+                for sym, pos_amount in positions.items():
+                    if pos_amount > 0 and sym in prices:
+                        total_value += pos_amount * prices[sym]
+
+                pnl = total_value - self.initial_balance
+                pnl_history.append(pnl)
+        finally:
+            if session is not None:
+                session.close()
 
         execution_time = time.time() - start_time
 
@@ -485,11 +660,25 @@ class StrategySandbox:
         backtest_rounds: int = 15,
         ticks_per_round: int = 100,
         symbols: List[str] = None,
+        persistent: bool = True,
+        seed: Optional[int] = None,
+        fixture: Optional[str] = None,
     ):
         self.backtest_rounds = backtest_rounds
         self.ticks_per_round = ticks_per_round
         self.symbols = symbols or ['VIRTUAL', 'BRETT', 'DEGEN']
-        self.backtest_engine = BacktestEngine()
+        self.backtest_engine = BacktestEngine(persistent=persistent)
+        # seed: 固定随机场景 (相同 seed → 相同行情路径)；fixture: 回放真实价格历史 (优先)
+        self.seed = seed
+        self.fixture = fixture
+
+    def build_scenario(self) -> Optional[MarketScenario]:
+        """一次性准备全部回测轮的行情；没有 numpy 时返回 None (逐轮使用旧生成器)"""
+        if not SCENARIOS_AVAILABLE:
+            return None
+        if self.fixture and os.path.exists(self.fixture):
+            return load_fixture(self.fixture)
+        return generate_scenario(self.symbols, self.backtest_rounds, self.ticks_per_round, seed=self.seed)
 
     async def test_strategy(self, code: str, agent_id: str = "test") -> SandboxTestResult:
         """
@@ -551,19 +740,27 @@ class StrategySandbox:
         all_pnls = []
         all_logs = []
 
+        scenario = self.build_scenario()
+        symbols = scenario.symbols if scenario is not None else self.symbols
+        if scenario is not None:
+            result.test_log.append(f"  Scenario: {scenario.name} ({scenario.rounds} rounds × {scenario.ticks} ticks)")
+
         for round_num in range(self.backtest_rounds):
             result.test_log.append(f"\n  Round {round_num + 1}/{self.backtest_rounds}")
 
             # 生成市场数据
-            market_history = self.backtest_engine.generate_mock_market_data(
-                self.symbols,
-                self.ticks_per_round,
-                volatility=random.uniform(0.015, 0.025),
-            )
+            if scenario is not None:
+                market_history = scenario.round(round_num)
+            else:
+                market_history = self.backtest_engine.generate_mock_market_data(
+                    self.symbols,
+                    self.ticks_per_round,
+                    volatility=random.uniform(0.015, 0.025),
+                )
 
             # 运行回测
             success, backtest_results, logs = self.backtest_engine.run_backtest(
-                code, market_history, self.symbols
+                code, market_history, symbols
             )
 
             if not success:
@@ -611,6 +808,9 @@ async def test_strategy_code(
     code: str,
     agent_id: str = "test",
     backtest_rounds: int = 15,
+    persistent: bool = True,
+    seed: Optional[int] = None,
+    fixture: Optional[str] = None,
 ) -> SandboxTestResult:
     """
     测试策略代码（便捷函数）
@@ -619,11 +819,15 @@ async def test_strategy_code(
         code: 策略代码
         agent_id: Agent ID
         backtest_rounds: 回测轮数
+        persistent: 每轮使用常驻策略实例 (False = 旧模式，每 tick 重新 exec)
+        seed: 行情场景随机种子 (None = 每次随机)
+        fixture: 回放夹具路径 (见 market_scenarios.py)
 
     Returns:
         SandboxTestResult
     """
-    sandbox = StrategySandbox(backtest_rounds=backtest_rounds)
+    sandbox = StrategySandbox(backtest_rounds=backtest_rounds, persistent=persistent,
+                              seed=seed, fixture=fixture)
     return await sandbox.test_strategy(code, agent_id)
 
 
@@ -631,6 +835,8 @@ async def validate_strategy_before_submission(
     code: str,
     agent_id: str,
     min_backtest_rounds: int = 10,
+    seed: Optional[int] = None,
+    fixture: Optional[str] = None,
 ) -> Tuple[bool, str, Optional[SandboxTestResult]]:
     """
     提交前验证策略（集成到进化流程）
@@ -638,7 +844,7 @@ async def validate_strategy_before_submission(
     Returns:
         (allowed, message, test_result)
     """
-    result = await test_strategy_code(code, agent_id, min_backtest_rounds)
+    result = await test_strategy_code(code, agent_id, min_backtest_rounds, seed=seed, fixture=fixture)
 
     if not result.passed:
         message = f"❌ Strategy validation failed: {result.error_type}\n{result.error_message}"
@@ -0,0 +1,368 @@
+"""
+成交日志 (Trade Journal)
+只追加、分段滚动的持久化成交记录，替代 MatchingEngine 里 500 条上限的 trade_history deque
+
+设计：
+1. 段文件：journal_dir/trades-000001.seg ...，写满 segment_bytes 后滚动到新段
+   文件头: b"DTJ1" + 编码标记 (b"M" = msgpack, b"J" = JSON 兜底)
+   记录:   <IdHH> 头 (payload 长度, unix 时间戳, agent 长度, symbol 长度)
+           + agent + symbol + payload
+   agent / symbol 放在记录头里，按 Agent / 币种扫描时无需解码 payload
+2. 段索引：每段在内存里只记 (最早/最晚时间戳, 记录数, 出现过的 agent/symbol 集合)，
+   扫描时整段跳过不相关的段；段内通过 mmap 只读访问
+3. 热缓存：最近 hot_size 条保存在内存环形缓冲 (新 → 旧)，兼容原 deque 的读取方式
+   (迭代、[0]、len、appendleft、clear)
+
+journal_dir 为 None 时退化为纯内存环形缓冲 (与旧行为一致)。
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, Iterator, List, Optional, Set
+
+try:
+    import msgpack
+except ImportError:  # msgpack 可选，缺失时用 JSON 编码 payload
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DTJ1"
+FILE_HEADER_SIZE = len(MAGIC) + 1
+RECORD_HEADER = struct.Struct("<IdHH")
+SEGMENT_PATTERN = "trades-{:06d}.seg"
+PURGED_FILE = "purged.json"
+
+
+def _encode(codec: bytes, record: dict) -> bytes:
+    if codec == b"M":
+        return msgpack.packb(record, use_bin_type=True, default=str)
+    return json.dumps(record, separators=(",", ":"), default=str).encode()
+
+
+def trade_timestamp(trade: dict) -> float:
+    """成交记录的 unix 时间戳 (取自 ISO 格式的 "time" 字段，缺失时为当前时间)"""
+    try:
+        return datetime.fromisoformat(trade["time"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+def _decode(codec: bytes, payload: bytes) -> dict:
+    if codec == b"M":
+        return msgpack.unpackb(payload, raw=False)
+    return json.loads(payload)
+
+
+@dataclass
+class Segment:
+    """一个段文件的内存索引"""
+    seq: int
+    path: str
+    codec: bytes
+    size: int = FILE_HEADER_SIZE
+    count: int = 0
+    min_ts: float = float("inf")
+    max_ts: float = float("-inf")
+    agents: Set[str] = field(default_factory=set)
+    symbols: Set[str] = field(default_factory=set)
+
+    def note(self, ts: float, agent_id: str, symbol: str, length: int):
+        self.count += 1
+        self.size += length
+        self.min_ts = min(self.min_ts, ts)
+        self.max_ts = max(self.max_ts, ts)
+        self.agents.add(agent_id)
+        self.symbols.add(symbol)
+
+
+class TradeJournal:
+    """只追加成交日志 + 内存热缓存 (兼容 deque 的读取接口)"""
+
+    def __init__(self, journal_dir: Optional[str] = None, hot_size: int = 500,
+                 segment_bytes: int = 8 * 1024 * 1024, max_segments: Optional[int] = None):
+        self.journal_dir = journal_dir
+        self.hot_size = hot_size
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.codec = b"M" if msgpack is not None else b"J"
+
+        self._hot: Deque[dict] = deque(maxlen=hot_size)
+        self._hot_ts: Deque[float] = deque(maxlen=hot_size)  # 与 _hot 一一对应的时间戳
+        self.segments: List[Segment] = []
+        self.purged: Dict[str, float] = {}  # agent_id -> 删除时间 (之前的成交不再返回)
+        self._fh = None
+        self.records = 0
+
+        if journal_dir:
+            os.makedirs(journal_dir, exist_ok=True)
+            self._load_purged()
+            self._open_existing()
+
+    # ========== deque 兼容接口 ==========
+
+    @property
+    def maxlen(self) -> int:
+        return self.hot_size
+
+    def appendleft(self, trade: dict, ts: float = None):
+        """追加一条成交 (新记录在前，与原 trade_history.appendleft 一致)"""
+        self.append(trade, ts)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self._hot)
+
+    def __len__(self) -> int:
+        return len(self._hot)
+
+    def __getitem__(self, index):
+        return self._hot[index]
+
+    def __bool__(self) -> bool:
+        return bool(self._hot)
+
+    def clear(self):
+        """清空全部成交 (热缓存 + 段文件)"""
+        self._hot.clear()
+        self._hot_ts.clear()
+        self.close()
+        for segment in self.segments:
+            try:
+                os.remove(segment.path)
+            except OSError:
+                pass
+        self.segments.clear()
+        self.records = 0
+
+    # ========== 写入 ==========
+
+    def append(self, trade: dict, ts: float = None):
+        ts = time.time() if ts is None else ts
+        self._hot.appendleft(trade)
+        self._hot_ts.appendleft(ts)
+        self.records += 1
+        if not self.journal_dir:
+            return
+
+        agent_id = str(trade.get("agent_id", trade.get("agent", "")))
+        symbol = str(trade.get("symbol", ""))
+        agent_b = agent_id.encode()
+        symbol_b = symbol.encode()
+        payload = _encode(self.codec, trade)
+        data = RECORD_HEADER.pack(len(payload), ts, len(agent_b), len(symbol_b)) + agent_b + symbol_b + payload
+
+        segment = self._active_segment(len(data))
+        self._fh.write(data)
+        self._fh.flush()
+        segment.note(ts, agent_id, symbol, len(data))
+
+    def _active_segment(self, incoming: int) -> Segment:
+        segment = self.segments[-1] if self.segments else None
+        if segment is None or (segment.count and segment.size + incoming > self.segment_bytes):
+            segment = self._new_segment()
+        elif self._fh is None:
+            self._fh = open(segment.path, "ab")
+        return segment
+
+    def _new_segment(self) -> Segment:
+        self.close()
+        seq = self.segments[-1].seq + 1 if self.segments else 1
+        path = os.path.join(self.journal_dir, SEGMENT_PATTERN.format(seq))
+        self._fh = open(path, "wb")
+        self._fh.write(MAGIC + self.codec)
+        self._fh.flush()
+        segment = Segment(seq=seq, path=path, codec=self.codec)
+        self.segments.append(segment)
+        self._enforce_retention()
+        return segment
+
+    def _enforce_retention(self):
+        if not self.max_segments:
+            return
+        while len(self.segments) > self.max_segments:
+            old = self.segments.pop(0)
+            self.records -= old.count
+            try:
+                os.remove(old.path)
+            except OSError:
+                pass
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    # ========== 删除 Agent ==========
+
+    def remove_agent(self, agent_id: str):
+        """逻辑删除某 Agent 的全部成交 (段文件只追加，扫描时过滤；同名 Agent 之后的新成交不受影响)"""
+        self.purged[agent_id] = time.time()
+        kept = [(t, ts) for t, ts in zip(self._hot, self._hot_ts) if t.get("agent_id", t.get("agent")) != agent_id]
+        self._hot.clear()
+        self._hot_ts.clear()
+        self._hot.extend(t for t, _ in kept)
+        self._hot_ts.extend(ts for _, ts in kept)
+        if self.journal_dir:
+            with open(os.path.join(self.journal_dir, PURGED_FILE), "w") as f:
+                json.dump(self.purged, f)
+
+    def _load_purged(self):
+        path = os.path.join(self.journal_dir, PURGED_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.purged = {k: float(v) for k, v in json.load(f).items()}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read {path}: {e}")
+
+    # ========== 读取 ==========
+
+    def _open_existing(self):
+        """启动时重建段索引，并用最新的记录填充热缓存"""
+        names = sorted(n for n in os.listdir(self.journal_dir) if n.startswith("trades-") and n.endswith(".seg"))
+        for name in names:
+            path = os.path.join(self.journal_dir, name)
+            try:
+                seq = int(name[len("trades-"):-len(".seg")])
+                segment = self._index_segment(seq, path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable journal segment {path}: {e}")
+                continue
+            if segment is not None:
+                self.segments.append(segment)
+                self.records += segment.count
+
+        for ts, trade in self._scan_segments(None, None, None, None, self.hot_size, True):
+            self._hot.append(trade)
+            self._hot_ts.append(ts)
+        if self.segments:
+            logger.info(f"📒 Trade journal {self.journal_dir}: {self.records} trades in {len(self.segments)} segments")
+
+    def _index_segment(self, seq: int, path: str) -> Optional[Segment]:
+        with open(path, "rb") as f:
+            header = f.read(FILE_HEADER_SIZE)
+        if len(header) < FILE_HEADER_SIZE or header[:4] != MAGIC:
+            raise ValueError("bad segment header")
+        segment = Segment(seq=seq, path=path, codec=header[4:5])
+        end = FILE_HEADER_SIZE
+        for offset, length, ts, agent_id, symbol in self._iter_headers(segment):
+            segment.note(ts, agent_id, symbol, length)
+            end = offset + length
+        # 截断尾部不完整的记录 (写入中途崩溃)
+        if end < os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(end)
+        return segment
+
+    def _iter_headers(self, segment: Segment):
+        """逐条解析记录头: (offset, 记录总长, ts, agent_id, symbol)"""
+        size = os.path.getsize(segment.path)
+        if size <= FILE_HEADER_SIZE:
+            return
+        with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offset = FILE_HEADER_SIZE
+            hsize = RECORD_HEADER.size
+            while offset + hsize <= size:
+                plen, ts, alen, slen = RECORD_HEADER.unpack_from(mm, offset)
+                length = hsize + alen + slen + plen
+                if offset + length > size:
+                    break
+                start = offset + hsize
+                agent_id = mm[start:start + alen].decode()
+                symbol = mm[start + alen:start + alen + slen].decode()
+                yield offset, length, ts, agent_id, symbol
+                offset += length
+
+    def _read_segment(self, segment: Segment, since, until, agent_id, symbol, newest_first):
+        matches = []
+        purged = self.purged
+        size = os.path.getsize(segment.path)
+        if size <= FILE_HEADER_SIZE:
+            return
+        with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offset = FILE_HEADER_SIZE
+            hsize = RECORD_HEADER.size
+            while offset + hsize <= size:
+                plen, ts, alen, slen = RECORD_HEADER.unpack_from(mm, offset)
+                length = hsize + alen + slen + plen
+                if offset + length > size:
+                    break
+                if (since is None or ts >= since) and (until is None or ts < until):
+                    start = offset + hsize
+                    rec_agent = mm[start:start + alen].decode()
+                    if (agent_id is None or rec_agent == agent_id) and ts > purged.get(rec_agent, -1.0):
+                        if symbol is None or mm[start + alen:start + alen + slen].decode() == symbol:
+                            matches.append((ts, start + alen + slen, plen))
+                offset += length
+            if newest_first:
+                matches.reverse()
+            for ts, start, plen in matches:
+                trade = _decode(segment.codec, mm[start:start + plen])
+                yield ts, trade
+
+    def scan(self, since: float = None, until: float = None, agent_id: str = None,
+             symbol: str = None, limit: int = None, newest_first: bool = True) -> Iterator[dict]:
+        """按时间 / Agent / 币种扫描成交 (since/until 为 unix 时间戳, until 不含)"""
+        if not self.journal_dir:
+            yield from self._scan_hot(since, until, agent_id, symbol, limit, newest_first)
+            return
+        for _, trade in self._scan_segments(since, until, agent_id, symbol, limit, newest_first):
+            yield trade
+
+    def _scan_segments(self, since, until, agent_id, symbol, limit, newest_first) -> Iterator[tuple]:
+        """扫描段文件，产出 (时间戳, 成交)"""
+        if self._fh is not None:
+            self._fh.flush()
+
+        segments = self.segments[::-1] if newest_first else self.segments
+        emitted = 0
+        for segment in segments:
+            if not segment.count:
+                continue
+            if since is not None and segment.max_ts < since:
+                continue
+            if until is not None and segment.min_ts >= until:
+                continue
+            if agent_id is not None and agent_id not in segment.agents:
+                continue
+            if symbol is not None and symbol not in segment.symbols:
+                continue
+            for record in self._read_segment(segment, since, until, agent_id, symbol, newest_first):
+                yield record
+                emitted += 1
+                if limit is not None and emitted >= limit:
+                    return
+
+    def _scan_hot(self, since, until, agent_id, symbol, limit, newest_first):
+        records = zip(self._hot, self._hot_ts)
+        if not newest_first:
+            records = reversed(list(records))
+        emitted = 0
+        for trade, ts in records:
+            if (since is not None and ts < since) or (until is not None and ts >= until):
+                continue
+            if agent_id is not None and trade.get("agent_id", trade.get("agent")) != agent_id:
+                continue
+            if symbol is not None and trade.get("symbol") != symbol:
+                continue
+            yield trade
+            emitted += 1
+            if limit is not None and emitted >= limit:
+                return
+
+    def stats(self) -> dict:
+        return {
+            "records": self.records,
+            "hot": len(self._hot),
+            "segments": len(self.segments),
+            "bytes": sum(s.size for s in self.segments),
+            "codec": "msgpack" if self.codec == b"M" else "json",
+            "durable": bool(self.journal_dir),
+        }
@@ -0,0 +1,324 @@
+"""
+增量估值索引 (Valuation Index)
+让排行榜查询不再每次遍历所有账户、所有持仓并重新排序
+
+核心结构：
+1. symbol → holders 反向索引：某个币价格变化时只重估持有它的账户
+2. 每账户缓存的总资产 / PnL%：只在成交、持仓币种价格变化或被显式标脏时重算
+3. RankedList：分桶有序表 (order-statistics)，top-k 与名次查询 O(log n + n/B)
+
+所有更新都是"标脏 + 查询时惰性结算"：两次排行榜查询之间的多次价格更新只重算一次。
+直接修改账户余额/持仓的代码 (debug 充值、重置等) 需调用 engine.mark_account_dirty()。
+"""
+
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class RankedList:
+    """分桶有序列表 (类似 sortedcontainers.SortedList 的最小实现)
+
+    元素为可比较的 tuple；每个桶最多 2 * load 个元素，超过则对半分裂。
+    """
+
+    def __init__(self, load: int = 512):
+        self._load = load
+        self._lists: List[list] = []
+        self._maxes: List = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator:
+        for sub in self._lists:
+            yield from sub
+
+    def clear(self):
+        self._lists.clear()
+        self._maxes.clear()
+        self._len = 0
+
+    def reset(self, values: list):
+        """用已排序的元素整体重建"""
+        load = self._load
+        self._lists = [values[i:i + load] for i in range(0, len(values), load)]
+        self._maxes = [sub[-1] for sub in self._lists]
+        self._len = len(values)
+
+    def add(self, value):
+        if not self._lists:
+            self._lists.append([value])
+            self._maxes.append(value)
+        else:
+            pos = bisect_left(self._maxes, value)
+            if pos == len(self._maxes):
+                pos -= 1
+                self._lists[pos].append(value)
+                self._maxes[pos] = value
+            else:
+                insort(self._lists[pos], value)
+            self._split(pos)
+        self._len += 1
+
+    def remove(self, value):
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            raise ValueError(f"{value!r} not in list")
+        sub = self._lists[pos]
+        idx = bisect_left(sub, value)
+        if idx == len(sub) or sub[idx] != value:
+            raise ValueError(f"{value!r} not in list")
+        del sub[idx]
+        self._len -= 1
+        if not sub:
+            del self._lists[pos]
+            del self._maxes[pos]
+        else:
+            self._maxes[pos] = sub[-1]
+
+    def _split(self, pos: int):
+        sub = self._lists[pos]
+        if len(sub) > self._load * 2:
+            half = sub[self._load:]
+            del sub[self._load:]
+            self._maxes[pos] = sub[-1]
+            self._lists.insert(pos + 1, half)
+            self._maxes.insert(pos + 1, half[-1])
+
+    def bisect_left(self, value) -> int:
+        """小于 value 的元素个数"""
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            return self._len
+        return sum(len(sub) for sub in self._lists[:pos]) + bisect_left(self._lists[pos], value)
+
+    def head(self, k: int) -> list:
+        """前 k 个元素"""
+        result = []
+        for sub in self._lists:
+            if len(result) >= k:
+                break
+            result.extend(sub[:k - len(result)])
+        return result
+
+
+class ValuationIndex:
+    """MatchingEngine 的增量估值 + 排名索引
+
+    排名键为 (-pnl_percent, agent_id)：PnL 降序，同分按 agent_id 保证顺序稳定。
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.holders: Dict[str, Set[str]] = {}  # symbol -> {agent_id}
+        self._held: Dict[str, Tuple[str, ...]] = {}  # agent_id -> 已登记的持仓 symbols
+        self._entries: Dict[str, Tuple[float, float]] = {}  # agent_id -> (pnl_pct, total_value)
+        self._ranked = RankedList()
+        self._dirty: Set[str] = set()
+        self.changed: Set[str] = set()  # 余额/持仓变过、尚未持久化的账户 (价格变化不算)
+        self.recomputes = 0
+        self.version = 0  # 任何可能改变排行的标脏都加一 (响应缓存的失效键)
+
+    # ========== 标脏 ==========
+
+    def mark_dirty(self, agent_id: str):
+        self._dirty.add(agent_id)
+        self.changed.add(agent_id)
+        self.version += 1
+
+    def mark_all_dirty(self):
+        self._dirty.update(self.engine.accounts.keys())
+        self._dirty.update(self._entries.keys())
+        self.changed.update(self.engine.accounts.keys())
+        self.version += 1
+
+    def drain_changed(self) -> Set[str]:
+        """取出并清空待持久化的账户集合 (见 state_persistence.py)"""
+        changed, self.changed = self.changed, set()
+        return changed
+
+    def on_prices(self, symbols: Iterable[str]):
+        """价格变化 → 只标记持有这些币的账户"""
+        for symbol in symbols:
+            holders = self.holders.get(symbol)
+            if holders:
+                self._dirty.update(holders)
+                self.version += 1
+
+    def discard(self, agent_id: str):
+        """账户被删除"""
+        self._dirty.discard(agent_id)
+        self.version += 1
+        entry = self._entries.pop(agent_id, None)
+        if entry is not None:
+            self._ranked.remove((-entry[0], agent_id))
+        for symbol in self._held.pop(agent_id, ()):
+            holders = self.holders.get(symbol)
+            if holders is not None:
+                holders.discard(agent_id)
+                if not holders:
+                    del self.holders[symbol]
+
+    def clear(self):
+        self.holders.clear()
+        self._held.clear()
+        self._entries.clear()
+        self._ranked.clear()
+        self._dirty.clear()
+        self.version += 1
+
+    # ========== 结算 ==========
+
+    def _flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        accounts = self.engine.accounts
+        prices = self.engine.current_prices
+        entries = self._entries
+        # 脏账户占比较高时 (例如全量价格刷新后)，逐个 remove/add 不如整体重排：
+        # 旧顺序近乎有序，timsort 重排只需线性时间
+        bulk = len(dirty) * 8 > len(entries)
+        changed = {}  # agent_id -> 新排名键 (仅 bulk 模式)
+        for agent_id in dirty:
+            account = accounts.get(agent_id)
+            if account is None:
+                self.discard(agent_id)
+                continue
+            self._reindex_holdings(agent_id, account)
+            total_value = account.get_total_value(prices)
+            pnl_pct = (total_value - account.initial_balance) / account.initial_balance * 100
+            self.recomputes += 1
+            old = entries.get(agent_id)
+            entries[agent_id] = (pnl_pct, total_value)
+            if bulk:
+                if old is None or old[0] != pnl_pct:
+                    changed[agent_id] = (-pnl_pct, agent_id)
+            elif old is None:
+                self._ranked.add((-pnl_pct, agent_id))
+            elif old[0] != pnl_pct:
+                self._ranked.remove((-old[0], agent_id))
+                self._ranked.add((-pnl_pct, agent_id))
+        if bulk and changed:
+            keys = [key for key in self._ranked if key[1] not in changed]
+            keys.extend(changed.values())
+            keys.sort()
+            self._ranked.reset(keys)
+
+    def _reindex_holdings(self, agent_id: str, account):
+        held = tuple(account.positions.keys())
+        old = self._held.get(agent_id, ())
+        if held == old:
+            return
+        for symbol in set(old) - set(held):
+            holders = self.holders.get(symbol)
+            if holders is not None:
+                holders.discard(agent_id)
+                if not holders:
+                    del self.holders[symbol]
+        for symbol in held:
+            self.holders.setdefault(symbol, set()).add(agent_id)
+        self._held[agent_id] = held
+
+    def rebuild(self):
+        """全量重建 (加载状态或大批量直接修改之后)"""
+        self.clear()
+        self._dirty.update(self.engine.accounts.keys())
+        self._flush()
+
+    # ========== 查询 ==========
+
+    def __len__(self) -> int:
+        self._flush()
+        return len(self._ranked)
+
+    def leaderboard(self) -> List[tuple]:
+        """完整排行 [(agent_id, pnl_percent, total_value), ...]，已按 PnL 降序"""
+        self._flush()
+        entries = self._entries
+        return [(aid, *entries[aid]) for _, aid in self._ranked]
+
+    def top(self, k: int) -> List[tuple]:
+        self._flush()
+        entries = self._entries
+        return [(aid, *entries[aid]) for _, aid in self._ranked.head(k)]
+
+    def rank(self, agent_id: str) -> Optional[int]:
+        """名次 (1 开始)；不存在返回 None"""
+        self._flush()
+        entry = self._entries.get(agent_id)
+        if entry is None:
+            return None
+        return self._ranked.bisect_left((-entry[0], agent_id)) + 1
+
+    def count_before(self, pnl_percent: float, agent_id: str) -> int:
+        """排名键严格位于 (pnl_percent, agent_id) 之前的账户数 (跨组合并名次用)"""
+        self._flush()
+        return self._ranked.bisect_left((-pnl_percent, agent_id))
+
+    def entry(self, agent_id: str) -> Optional[Tuple[float, float]]:
+        """(pnl_percent, total_value)"""
+        self._flush()
+        return self._entries.get(agent_id)
+
+
+class AccountBook(dict):
+    """MatchingEngine.accounts 容器：增删账户时自动同步 ValuationIndex
+
+    adopt / release 为可选的存储后端钩子 (见 account_store.ColumnarAccountStore)：
+    写入时把账户转存为后端视图，删除时释放后端占用。
+    listener 为可选的增删回调 (见 merged_views.GroupListener)，用于维护跨组账户索引。
+    """
+
+    def __init__(self, index: ValuationIndex, *args, adopt=None, release=None, **kwargs):
+        super().__init__()
+        self._index = index
+        self._adopt = adopt
+        self._release = release
+        self.listener = None
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, agent_id, account):
+        if self._adopt is not None:
+            account = self._adopt(agent_id, account)
+        super().__setitem__(agent_id, account)
+        self._index.mark_dirty(agent_id)
+        if self.listener is not None:
+            self.listener.account_added(agent_id, account)
+
+    def __delitem__(self, agent_id):
+        super().__delitem__(agent_id)
+        self._forget(agent_id)
+
+    def _forget(self, agent_id):
+        self._index.discard(agent_id)
+        if self._release is not None:
+            self._release(agent_id)
+        if self.listener is not None:
+            self.listener.account_removed(agent_id)
+
+    def pop(self, agent_id, *default):
+        if agent_id not in self:
+            return super().pop(agent_id, *default)
+        account = super().pop(agent_id)
+        self._forget(agent_id)
+        return account
+
+    def popitem(self):
+        agent_id, account = super().popitem()
+        self._forget(agent_id)
+        return agent_id, account
+
+    def setdefault(self, agent_id, account=None):
+        if agent_id not in self:
+            self[agent_id] = account
+        return self[agent_id]
+
+    def update(self, *args, **kwargs):
+        for agent_id, account in dict(*args, **kwargs).items():
+            self[agent_id] = account
+
+    def clear(self):
+        for agent_id in list(self):
+            del self[agent_id]
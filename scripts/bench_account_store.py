@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+账户存储后端基准测试
+对比：dict 后端 (每账户一个 dataclass) vs. columnar 后端 (NumPy 列数组)
+
+指标：内存占用 (tracemalloc)、整组估值、PnL 分位数、Epoch 结束 pnl_history 追加
+
+用法:
+    python scripts/bench_account_store.py --sizes 10000 50000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "arena_server"))
+
+from matching import MatchingEngine, Position
+
+
+def build(store: str, n_accounts: int, args):
+    rng = random.Random(args.seed)
+    symbols = [f"MEME{i}" for i in range(args.symbols)]
+    tracemalloc.start()
+    engine = MatchingEngine(store=store)
+    prices = {sym: rng.uniform(0.1, 10) for sym in symbols}
+    for i in range(n_accounts):
+        account = engine.register_agent(f"Agent_{i:06d}")
+        for sym in rng.sample(symbols, args.positions):
+            account.positions[sym] = Position(symbol=sym, amount=rng.uniform(1, 50), avg_price=prices[sym])
+        for _ in range(args.history):
+            account.pnl_history.append(rng.uniform(-10, 10))
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    engine.current_prices.update(prices)
+    return engine, memory
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dict vs columnar account store")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--positions", type=int, default=5)
+    parser.add_argument("--history", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'store':<10}{'accounts':>10}{'mem(MB)':>10}{'value(ms)':>11}{'pctl(ms)':>10}{'epoch(ms)':>11}")
+    for n in args.sizes:
+        for store in ("dict", "columnar"):
+            engine, memory = build(store, n, args)
+            value_ms = timed(engine.compute_leaderboard, args.repeat)
+            pctl_ms = timed(lambda: engine.pnl_percentiles([10, 50, 90]), args.repeat)
+            epoch_ms = timed(engine.record_pnl_snapshot, args.repeat)
+            print(f"{store:<10}{n:>10}{memory / 1e6:>10.1f}{value_ms:>11.2f}{pctl_ms:>10.2f}{epoch_ms:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
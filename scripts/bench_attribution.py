@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+归因分析器基准测试
+对比每笔 SELL 的统计更新开销与复盘开销：
+  list    旧行为：每个标签保存全部交易，每笔 SELL 对整个列表重算 sum；
+          复盘时遍历每个标签的 pending 列表，逐个 list.remove (只移除，不计入统计)
+  stream  AttributionAnalyzer：Welford 运行统计 + 时间桶滚动窗口；待复盘 BUY 按到期时间出堆
+
+用法:
+    python scripts/bench_attribution.py --sizes 10000 50000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "arena_server"))
+
+from attribution import AttributionAnalyzer
+
+TAGS = ["MOMENTUM", "BREAKOUT", "TAKE_PROFIT", "STOP_LOSS", "RSI_OVERSOLD", "VOL_SPIKE"]
+
+
+def list_record(book: dict, tag: str, pnl: float):
+    """旧 TagPerformance.update_stats 的核心：追加后全量重算"""
+    trades = book.setdefault(tag, [])
+    trades.append({"pnl_pct": pnl, "exit_time": time.time()})
+    total = len(trades)
+    wins = sum(1 for t in trades if t["pnl_pct"] > 0)
+    avg = sum(t["pnl_pct"] for t in trades) / total
+    return wins / total, avg
+
+
+def list_review(pending: dict, now: float, interval: float):
+    """旧 review_pending_trades：逐个 list.remove"""
+    for items in pending.values():
+        for trade in list(items):
+            if now - trade["entry_time"] >= interval:
+                items.remove(trade)
+
+
+def run(n: int, rng: random.Random) -> dict:
+    start = datetime.now() - timedelta(seconds=n)
+    trades = []
+    for i in range(n):
+        when = (start + timedelta(seconds=i)).isoformat()
+        tag = rng.choice(TAGS)
+        if i % 2:
+            trades.append({"agent_id": "A", "symbol": "PEPE", "side": "SELL", "amount": 1, "price": 1.0,
+                           "value": 1.0, "reason": [tag], "time": when, "trade_pnl": rng.gauss(0.5, 5)})
+        else:
+            trades.append({"agent_id": "A", "symbol": "PEPE", "side": "BUY", "amount": 1, "price": 1.0,
+                           "value": 1.0, "reason": [tag], "time": when})
+
+    tracemalloc.start()
+    book, pending = {}, {}
+    t0 = time.perf_counter()
+    for i, t in enumerate(trades):
+        if t["side"] == "SELL":
+            list_record(book, t["reason"][0], t["trade_pnl"])
+        else:
+            pending.setdefault(t["reason"][0], []).append({"entry_time": i, "symbol": t["symbol"]})
+    list_ingest = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    list_review(pending, n, n / 2)
+    list_review_s = time.perf_counter() - t0
+    list_mem = tracemalloc.get_traced_memory()[0]
+    del book, pending
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    analyzer = AttributionAnalyzer(review_interval=n / 2, pending_limit=n)
+    t0 = time.perf_counter()
+    analyzer.backfill(trades)
+    stream_ingest = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # 不计入摘要打印
+        analyzer.review_pending_trades({"PEPE": 1.0}, now=start.timestamp() + n)
+    stream_review_s = time.perf_counter() - t0
+    stream_mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return {
+        "trades": n,
+        "list_us": list_ingest / n * 1e6, "stream_us": stream_ingest / n * 1e6,
+        "list_review_ms": list_review_s * 1000, "stream_review_ms": stream_review_s * 1000,
+        "list_kb": list_mem / 1024, "stream_kb": stream_mem / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming attribution stats vs per-tag trade lists")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'trades':>8}{'list(us/t)':>12}{'stream(us/t)':>14}{'list review(ms)':>17}"
+          f"{'stream review(ms)':>19}{'list(KB)':>10}{'stream(KB)':>12}")
+    for n in args.sizes:
+        r = run(n, random.Random(args.seed))
+        print(f"{r['trades']:>8}{r['list_us']:>12.2f}{r['stream_us']:>14.2f}{r['list_review_ms']:>17.1f}"
+              f"{r['stream_review_ms']:>19.1f}{r['list_kb']:>10.0f}{r['stream_kb']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Hive Mind 归因基准测试
+对比 analyze_alpha 的单次调用开销：
+  rescan       旧行为：每次调用清空统计，重建 BUY 索引并重新处理回看窗口内的每笔 SELL
+  incremental  HiveMind：成交写入时 O(1) 更新聚合，调用时只从聚合结果重建报告
+  cached       两次调用之间没有新成交 (hive_mind_loop / 多个接口在同一分钟内读取)
+
+每次调用前追加 --churn 笔新成交 (模拟 60 秒的 hive_mind_loop 间隔)，回看窗口 = 成交总数。
+
+用法:
+    python scripts/bench_hive_mind.py --sizes 10000 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "arena_server"))
+
+from hive_mind import HiveMind
+from trade_journal import TradeJournal
+
+ENTRY_TAGS = ["MOMENTUM", "BREAKOUT", "DIP_BUY", "RSI_OVERSOLD", "VOLUME_SPIKE", "MEAN_REVERSION", "WHALE", "NEWS"]
+EXIT_TAGS = ["TAKE_PROFIT", "STOP_LOSS", "TRAILING_STOP", "TIME_DECAY"]
+
+
+def make_trades(n: int, rng: random.Random, agents: int = 200, symbols: int = 50):
+    """交替的 BUY / SELL 成交 (旧 → 新)"""
+    start = datetime.now() - timedelta(seconds=n)
+    trades = []
+    for i in range(n):
+        agent, symbol = f"Agent_{rng.randrange(agents)}", f"MEME{rng.randrange(symbols)}"
+        stamp = (start + timedelta(seconds=i)).isoformat()
+        if i % 2 == 0:
+            trades.append({"time": stamp, "agent_id": agent, "symbol": symbol, "side": "BUY",
+                           "reason": rng.sample(ENTRY_TAGS, rng.randint(1, 3)), "trade_pnl": None})
+        else:
+            trades.append({"time": stamp, "agent_id": agent, "symbol": symbol, "side": "SELL",
+                           "reason": [rng.choice(EXIT_TAGS)], "trade_pnl": round(rng.gauss(0.5, 5), 2)})
+    return trades
+
+
+def rescan(trades_newest_first):
+    """旧 analyze_alpha 的聚合部分 (报告构建两边相同，不计入)"""
+    tag_stats = defaultdict(lambda: {"wins": 0, "losses": 0, "total_pnl": 0.0, "trades": 0})
+    tag_by_token = defaultdict(lambda: defaultdict(lambda: {"wins": 0, "losses": 0, "total_pnl": 0.0, "trades": 0}))
+    tag_combos = defaultdict(lambda: {"wins": 0, "losses": 0, "total_pnl": 0.0, "trades": 0})
+    tag_history = defaultdict(list)
+    buy_index = defaultdict(list)
+    for t in trades_newest_first:
+        if t.get("side") == "BUY":
+            buy_index[(t.get("agent_id"), t["symbol"])].append(t)
+    for t in trades_newest_first:
+        if t.get("side") != "SELL" or t.get("trade_pnl") is None:
+            continue
+        pnl, symbol = t["trade_pnl"], t["symbol"]
+        is_win = pnl > 0
+        buys = buy_index.get((t.get("agent_id"), symbol))
+        entry_tags = buys[-1].get("reason", []) if buys else []
+        for tag in entry_tags:
+            for stats in (tag_stats[tag], tag_by_token[tag][symbol]):
+                stats["trades"] += 1
+                stats["total_pnl"] += pnl
+                stats["wins" if is_win else "losses"] += 1
+            tag_history[tag].append({"pnl": pnl, "timestamp": 0, "is_win": is_win})
+            if len(tag_history[tag]) > 20:
+                tag_history[tag].pop(0)
+        if len(entry_tags) >= 2:
+            stats = tag_combos["+".join(sorted(entry_tags))]
+            stats["trades"] += 1
+            stats["total_pnl"] += pnl
+            stats["wins" if is_win else "losses"] += 1
+        for tag in t.get("reason", []):
+            for stats in (tag_stats[tag], tag_by_token[tag][symbol]):
+                stats["trades"] += 1
+                stats["total_pnl"] += pnl
+                stats["wins" if is_win else "losses"] += 1
+    return tag_stats
+
+
+def run(n: int, args) -> dict:
+    rng = random.Random(args.seed)
+    trades = make_trades(n + args.calls * args.churn, rng)
+    history, pending = trades[:n], trades[n:]
+
+    # 旧行为：窗口 = 最近 n 笔，每次调用全量重扫
+    window = list(reversed(history))
+    full = 0.0
+    for call in range(args.calls):
+        new = pending[call * args.churn:(call + 1) * args.churn]
+        window = (list(reversed(new)) + window)[:n]
+        t0 = time.perf_counter()
+        rescan(window)
+        full += time.perf_counter() - t0
+
+    engine = SimpleNamespace(trade_history=TradeJournal(hot_size=0), trade_observers=[])
+    hive = HiveMind(engine, lookback=n)
+    t0 = time.perf_counter()
+    hive.backfill(history)
+    backfill = time.perf_counter() - t0
+
+    ingest = incremental = cached = 0.0
+    for call in range(args.calls):
+        t0 = time.perf_counter()
+        for trade in pending[call * args.churn:(call + 1) * args.churn]:
+            hive.record_trade(trade)
+        ingest += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        hive.analyze_alpha()
+        incremental += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        hive.analyze_alpha()
+        cached += time.perf_counter() - t0
+
+    return {
+        "trades": n,
+        "rescan_ms": full / args.calls * 1000,
+        "incremental_ms": incremental / args.calls * 1000,
+        "cached_us": cached / args.calls * 1e6,
+        "per_trade_us": (ingest + backfill) / (n + args.calls * args.churn) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark incremental Hive Mind attribution vs full rescan")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--churn", type=int, default=100, help="两次调用之间的新成交数")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'trades':>10}{'rescan(ms)':>13}{'incr(ms)':>11}{'cached(us)':>12}{'record(us/trade)':>18}{'speedup':>10}")
+    for n in args.sizes:
+        r = run(n, args)
+        speedup = r["rescan_ms"] / r["incremental_ms"] if r["incremental_ms"] else float("inf")
+        print(f"{r['trades']:>10}{r['rescan_ms']:>13.2f}{r['incremental_ms']:>11.3f}{r['cached_us']:>12.1f}"
+              f"{r['per_trade_us']:>18.2f}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
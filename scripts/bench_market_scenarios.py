@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+沙盒回测行情生成基准测试
+对比一次完整验证 (rounds 轮 × ticks 个 tick) 的行情准备耗时：
+  legacy     BacktestEngine.generate_mock_market_data，逐 tick / 逐币种 random.gauss，
+             再由 run_backtest 从嵌套 dict 转成 market_data
+  vectorized market_scenarios.generate_scenario 一次生成全部数组，run_backtest 直接逐 tick 读取
+  fixture    mmap 夹具回放 (首次加载后按路径缓存)
+不执行策略，只测量行情准备 + 逐 tick 构造 market_data 的开销。
+
+用法:
+    python scripts/bench_market_scenarios.py --rounds 15 --ticks 100 --symbols 3
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "arena_server"))
+
+from market_scenarios import generate_scenario, load_fixture, write_fixture
+from strategy_sandbox import BacktestEngine, _history_frames
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(args):
+    symbols = [f"SYM{i}" for i in range(args.symbols)]
+    engine = BacktestEngine()
+
+    def legacy():
+        for _ in range(args.rounds):
+            history = engine.generate_mock_market_data(symbols, args.ticks, volatility=random.uniform(0.015, 0.025))
+            for _ in _history_frames(history):
+                pass
+
+    def vectorized():
+        scenario = generate_scenario(symbols, args.rounds, args.ticks)
+        for r in range(args.rounds):
+            for _ in scenario.round(r).frames():
+                pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.npy")
+        source = generate_scenario(symbols, 1, args.rounds * args.ticks, seed=args.seed)
+        write_fixture(path, symbols, source.prices[0], args.ticks, volumes=source.volumes[0])
+
+        def fixture():
+            scenario = load_fixture(path)
+            for r in range(args.rounds):
+                for _ in scenario.round(r).frames():
+                    pass
+
+        print(f"rounds={args.rounds} ticks={args.ticks} symbols={args.symbols} repeat={args.repeat}")
+        print(f"{'generator':>12}{'ms/validation':>16}{'speedup':>10}")
+        base = timed(legacy, args.repeat)
+        print(f"{'legacy':>12}{base:>16.2f}{1.0:>9.1f}x")
+        for name, fn in (("vectorized", vectorized), ("fixture", fixture)):
+            ms = timed(fn, args.repeat)
+            print(f"{name:>12}{ms:>16.2f}{base / max(ms, 1e-9):>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sandbox market data generation")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--symbols", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
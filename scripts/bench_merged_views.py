@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+跨组合并视图基准测试
+对比：每次访问遍历所有组重建合并 dict / deque (旧 GroupManager 属性)
+     vs. MergedViews 增量维护 + 版本化快照
+
+测量 accounts / current_prices / trade_history 的单次访问耗时。
+两个场景：
+- read:  两次访问之间没有写入 (dashboard 轮询、同一请求内多次访问)
+- write: 每次访问前都有一笔成交 + 一次价格更新 (最坏情况：快照每次都要重建)
+
+用法:
+    python scripts/bench_merged_views.py --groups 100 --per-group 50
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+from collections import deque
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "arena_server"))
+
+import group_manager as gm_module
+from group_manager import GroupManager
+from matching import OrderSide
+
+
+def legacy_accounts(gm):
+    merged = {}
+    for group in gm.groups.values():
+        merged.update(group.engine.accounts)
+    return merged
+
+
+def legacy_prices(gm):
+    merged = {}
+    for group in gm.groups.values():
+        merged.update(group.engine.current_prices)
+    return merged
+
+
+def legacy_trades(gm):
+    merged = deque(maxlen=2000)
+    for group in gm.groups.values():
+        merged.extend(group.engine.trade_history)
+    return merged
+
+
+async def build(args) -> GroupManager:
+    rng = random.Random(args.seed)
+    gm_module.GROUP_SIZE_THRESHOLDS = {}
+    gm_module.GROUP_DEFAULT_SIZE = args.per_group
+    gm = GroupManager()
+    for i in range(args.groups * args.per_group):
+        gm.register_agent(f"Agent_{i:06d}")
+    symbols = [f"MEME{i}" for i in range(args.symbols)]
+    gm.update_prices({sym: {"priceUsd": rng.uniform(0.1, 10)} for sym in symbols})
+    with contextlib.redirect_stdout(io.StringIO()):
+        for agent_id in rng.sample(list(gm.agent_to_group), min(len(gm.agent_to_group), args.trades)):
+            await gm.get_group(agent_id).engine.execute_order(agent_id, rng.choice(symbols), OrderSide.BUY, 10)
+    return gm
+
+
+def timed(fn, n: int, before=None) -> float:
+    total = 0.0
+    for _ in range(n):
+        if before is not None:
+            before()
+        t0 = time.perf_counter()
+        fn()
+        total += time.perf_counter() - t0
+    return total / n * 1e6
+
+
+def main(args):
+    import asyncio
+    gm = asyncio.run(build(args))
+    rng = random.Random(args.seed)
+    groups = list(gm.groups.values())
+    agents = list(gm.agent_to_group)
+
+    def write():
+        group = rng.choice(groups)
+        group.engine.update_prices({f"MEME{rng.randrange(args.symbols)}": {"priceUsd": rng.uniform(0.1, 10)}})
+        agent_id = rng.choice(agents)
+        gm.get_group(agent_id).engine.record_trade({"time": "", "agent_id": agent_id, "symbol": "MEME0"})
+
+    cases = [
+        ("accounts", lambda: legacy_accounts(gm), lambda: gm.accounts),
+        ("current_prices", lambda: legacy_prices(gm), lambda: gm.current_prices),
+        ("trade_history", lambda: legacy_trades(gm), lambda: gm.trade_history),
+    ]
+    print(f"groups={len(gm.groups)} agents={len(agents)} symbols={args.symbols} "
+          f"trades/group={len(groups[0].engine.trade_history)} iterations={args.iterations}")
+    print(f"{'view':>16}{'scenario':>10}{'legacy(us)':>14}{'merged(us)':>14}{'speedup':>10}")
+    for name, legacy, merged in cases:
+        for scenario, before in (("read", None), ("write", write)):
+            old = timed(legacy, args.iterations, before)
+            new = timed(merged, args.iterations, before)
+            print(f"{name:>16}{scenario:>10}{old:>14.1f}{new:>14.2f}{old / max(new, 1e-9):>9.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark GroupManager merged views")
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--per-group", type=int, default=50)
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--trades", type=int, default=20000, help="初始成交数 (每 Agent 最多一笔)")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+价格预言机基准测试 (离线)
+对比：每组各自查询 (旧行为) vs. 共享 PriceOracle
+
+使用 MockDexScreenerBackend 模拟上游延迟，统计上游调用次数、命中率与耗时。
+
+用法:
+    python scripts/bench_price_oracle.py --groups 20 --symbols 50 --rounds 5
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "arena_server"))
+
+from price_oracle import PriceOracle, MockDexScreenerBackend
+
+
+async def naive_per_group(backend, groups: int, workload: list) -> float:
+    """旧行为：每组每个 symbol 各打一次 /search"""
+    start = time.perf_counter()
+    for batch in workload:
+        await asyncio.gather(*(
+            backend.search(symbol)
+            for _ in range(groups)
+            for symbol in batch
+        ))
+    return time.perf_counter() - start
+
+
+async def shared_oracle(oracle: PriceOracle, groups: int, workload: list) -> float:
+    start = time.perf_counter()
+    for batch in workload:
+        await asyncio.gather(*(
+            oracle.get_price(symbol)
+            for _ in range(groups)
+            for symbol in batch
+        ))
+    return time.perf_counter() - start
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    prices = {f"MEME{i}": rng.uniform(0.0001, 10) for i in range(args.symbols)}
+    symbols = sorted(prices)
+    # 每轮各组交易同一批热门 symbol (与实盘一致：大家追同一个 meme)
+    workload = [rng.sample(symbols, min(args.per_round, len(symbols))) for _ in range(args.rounds)]
+
+    naive_backend = MockDexScreenerBackend(prices, latency=args.latency)
+    naive_time = await naive_per_group(naive_backend, args.groups, workload)
+
+    oracle_backend = MockDexScreenerBackend(prices, latency=args.latency)
+    oracle = PriceOracle(backend=oracle_backend, ttl=args.ttl)
+    oracle_time = await shared_oracle(oracle, args.groups, workload)
+    stats = oracle.stats()
+
+    print(f"groups={args.groups} symbols={args.symbols} rounds={args.rounds} per_round={args.per_round}")
+    print(f"{'mode':<16}{'upstream':>10}{'hit_rate':>10}{'time(s)':>10}")
+    print(f"{'per-group':<16}{naive_backend.calls:>10}{0.0:>10.2%}{naive_time:>10.3f}")
+    print(f"{'shared-oracle':<16}{oracle_backend.calls:>10}{stats['hit_rate']:>10.2%}{oracle_time:>10.3f}")
+    print(f"coalesced={stats['coalesced']} search_calls={stats['search_calls']} "
+          f"batch_calls={stats['batch_calls']} batched_symbols={stats['batched_symbols']}")
+    await oracle.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark shared price oracle vs per-group fetching")
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--per-round", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--ttl", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
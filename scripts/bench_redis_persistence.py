@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Redis 持久化压测 (离线，内存版 Redis 模拟往返延迟与带宽)
+对比：旧路径 (每次 DELETE + 全量 HSET，事件循环内同步执行)
+     vs. StatePersistence 增量保存 (只写变更字段，编码与写入在线程里)
+
+每轮模拟 --active 比例的 Agent 成交后保存一次，统计：
+  loop_ms  事件循环被占用的时间 (旧路径 = 整个保存过程)
+  total_ms 一次保存的总耗时
+  bytes    写入 Redis 的字节数
+
+用法:
+    python scripts/bench_redis_persistence.py --agents 1000 10000 --active 0.02
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "arena_server"))
+
+from council import Council
+from group_manager import GroupManager
+from matching import OrderSide
+from redis_state import RedisStateManager
+from state_persistence import StatePersistence, TrackedDict
+
+
+class SimulatedRedis:
+    """内存 Redis：每次 pipeline 往返 sleep(rtt + 字节数 / 带宽)，记录写入字节数"""
+
+    def __init__(self, rtt: float, bandwidth: float):
+        self.rtt = rtt
+        self.bandwidth = bandwidth
+        self.data = {}
+        self.bytes = 0
+
+    def ping(self):
+        time.sleep(self.rtt)
+        return True
+
+    def pipeline(self, transaction=True):
+        return SimulatedPipeline(self)
+
+    def set(self, key, value):
+        self.bytes += len(key) + len(value)
+        self.data[key] = value
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def rename(self, src, dst):
+        self.data[dst] = self.data.pop(src)
+
+    def hset(self, key, mapping):
+        self.bytes += sum(len(k) + len(v) for k, v in mapping.items())
+        self.data.setdefault(key, {}).update(mapping)
+
+    def hdel(self, key, *fields):
+        for f in fields:
+            self.data.get(key, {}).pop(f, None)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+
+class SimulatedPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.ops.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        before = self.redis.bytes
+        results = [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.ops]
+        time.sleep(self.redis.rtt + (self.redis.bytes - before) / self.redis.bandwidth)
+        return results
+
+
+def build(n_agents: int, symbols: list):
+    gm = GroupManager()
+    for i in range(n_agents):
+        gm.register_agent(f"Agent_{i:05d}")
+    gm.update_prices({sym: {"priceUsd": 1.0 + i} for i, sym in enumerate(symbols)})
+    keys = TrackedDict({f"dk_{i:032x}": f"Agent_{i:05d}" for i in range(n_agents)})
+    return gm, keys
+
+
+async def trade_round(gm: GroupManager, rng: random.Random, active: float, symbols: list):
+    agents = list(gm.agent_to_group)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for agent_id in rng.sample(agents, max(1, int(len(agents) * active))):
+            engine = gm.get_group(agent_id).engine
+            await engine.execute_order(agent_id, rng.choice(symbols), OrderSide.BUY, rng.uniform(1, 10))
+
+
+async def bench(n_agents: int, args) -> list:
+    symbols = [f"MEME{i}" for i in range(50)]
+    rows = []
+    for mode in ("full", "delta"):
+        gm, keys = build(n_agents, symbols)
+        rng = random.Random(args.seed)
+        fake = SimulatedRedis(args.rtt_ms / 1000, args.bandwidth_mbps * 1024 * 1024 / 8)
+        redis_state = RedisStateManager(client=fake)
+        council = Council()
+        persistence = StatePersistence(redis_state, gm, council, keys, get_meta=lambda: (1, 0, 0.0),
+                                       snapshot_interval=float("inf"))
+        await persistence.flush(snapshot=True)  # 初始全量 (两种模式相同)
+
+        loop_ms, total_ms, written = [], [], []
+        for _ in range(args.rounds):
+            await trade_round(gm, rng, args.active, symbols)
+            fake.bytes = 0
+            start = time.perf_counter()
+            if mode == "full":
+                # 旧路径：在事件循环里同步序列化并全量重写
+                redis_state.save_full_state(
+                    1, 0, 0.0, dict(keys), gm.get_all_accounts_data(),
+                    trade_history=list(gm.trade_history), council_sessions=council.serialize_sessions(),
+                )
+                elapsed = (time.perf_counter() - start) * 1000
+                loop_ms.append(elapsed)
+                total_ms.append(elapsed)
+            else:
+                result = await persistence.flush()
+                loop_ms.append(result.get("loop_ms", 0.0))
+                total_ms.append((time.perf_counter() - start) * 1000)
+            written.append(fake.bytes)
+
+        rows.append({
+            "agents": n_agents,
+            "mode": mode,
+            "loop_ms": statistics.median(loop_ms),
+            "total_ms": statistics.median(total_ms),
+            "kb": statistics.median(written) / 1024,
+        })
+    return rows
+
+
+async def main(args):
+    import logging
+    logging.disable(logging.INFO)
+    print(f"active={args.active:.1%}/round rounds={args.rounds} rtt={args.rtt_ms}ms bandwidth={args.bandwidth_mbps}Mbps")
+    print(f"{'agents':>8}{'mode':>8}{'loop(ms)':>12}{'total(ms)':>12}{'KB/save':>12}")
+    for n in args.agents:
+        for r in await bench(n, args):
+            print(f"{r['agents']:>8}{r['mode']:>8}{r['loop_ms']:>12.2f}{r['total_ms']:>12.2f}{r['kb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Redis state persistence")
+    parser.add_argument("--agents", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--active", type=float, default=0.02, help="每轮有成交的 Agent 比例")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--rtt-ms", type=float, default=1.0)
+    parser.add_argument("--bandwidth-mbps", type=float, default=100.0)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+风险指标基准测试
+对比 /leaderboard 为每个 Agent 取风险指标的开销：
+  full    旧行为：每次请求由 pnl_history 重建复利净值序列，调用 calculate_composite_score
+  cached  RiskMetricsCache：Epoch 结束时增量更新，请求时直接读缓存
+另给出 Epoch 结束时增量更新全体的耗时 (多个 Epoch 的均值；回撤窗口的双栈倒栈是均摊开销)，以及重启后批量重算 (有 numpy 时向量化) 的耗时。
+
+用法:
+    python scripts/bench_risk_metrics.py --agents 1000 5000 --history 100
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "arena_server"))
+
+from metrics import calculate_composite_score
+from risk_metrics import RiskMetricsCache, np
+
+
+def full_metrics(history):
+    values = [10000.0]
+    for pnl in history:
+        values.append(values[-1] * (1 + pnl / 100))
+    return calculate_composite_score(history, values, sum(history))
+
+
+def run(agents: int, history: int, epochs: int, rng: random.Random) -> dict:
+    histories = {f"A{i}": [rng.gauss(0.3, 5.0) for _ in range(history)] for i in range(agents)}
+
+    t0 = time.perf_counter()
+    for h in histories.values():
+        full_metrics(h)
+    full_s = time.perf_counter() - t0
+
+    cache = RiskMetricsCache(limit=history)
+    t0 = time.perf_counter()
+    cache.rebuild(histories)
+    rebuild_s = time.perf_counter() - t0
+
+    epoch_s = 0.0
+    for _ in range(epochs):
+        pnls = [rng.gauss(0.3, 5.0) for _ in histories]
+        t0 = time.perf_counter()
+        for (agent_id, h), pnl in zip(histories.items(), pnls):
+            h.append(pnl)
+            del h[0]
+            cache.record(agent_id, pnl)
+        epoch_s += (time.perf_counter() - t0) / epochs
+
+    for agent_id, h in histories.items():
+        cache.metrics(agent_id, h)  # 第一次读计算一次，之后命中
+    t0 = time.perf_counter()
+    for agent_id, h in histories.items():
+        cache.metrics(agent_id, h)
+    cached_s = time.perf_counter() - t0
+
+    return {
+        "agents": agents,
+        "full_ms": full_s * 1000, "cached_ms": cached_s * 1000,
+        "epoch_ms": epoch_s * 1000, "rebuild_ms": rebuild_s * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cached risk metrics vs per-request recompute")
+    parser.add_argument("--agents", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--history", type=int, default=100)
+    parser.add_argument("--epochs", type=int, default=100, help="epoch updates to average over")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"numpy: {'yes' if np is not None else 'no (batch rebuild falls back to per-agent)'}")
+    print(f"{'agents':>8}{'full/request(ms)':>18}{'cached/request(ms)':>20}{'epoch update(ms)':>18}{'rebuild(ms)':>13}")
+    for n in args.agents:
+        r = run(n, args.history, args.epochs, random.Random(args.seed))
+        print(f"{r['agents']:>8}{r['full_ms']:>18.1f}{r['cached_ms']:>20.2f}{r['epoch_ms']:>18.1f}{r['rebuild_ms']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+策略沙盒基准测试
+对比 test_strategy_code 的耗时：
+  legacy      每个 tick 重新 exec 源码 + 实例化 MyStrategy + 重设 SIGALRM / RLIMIT_AS
+  persistent  每轮一个常驻实例，代码只编译一次，每 tick 只设 CPU 计时器
+
+策略取自 data/agents/*/strategy.py。这些策略是实盘接口 (on_price_update(prices))，
+沙盒要求 on_tick(market_data)，因此先用 backtest_sweep.adapt_live_strategy 改写再送进 test_strategy_code。
+改写后仍无法通过语法 / 安全 / 结构检查的策略不计入对比，单独列出数量。
+注意：常驻模式下策略状态跨 tick 保留，回测结果 (PnL) 与旧模式不同是预期行为。
+
+用法:
+    python scripts/bench_strategy_sandbox.py --rounds 15
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "arena_server"))
+
+from backtest_sweep import adapt_live_strategy as adapt
+from strategy_sandbox import test_strategy_code
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+async def run_one(code: str, rounds: int, persistent: bool, seed: int) -> tuple:
+    random.seed(seed)  # 两种模式使用相同的模拟行情
+    start = time.perf_counter()
+    result = await test_strategy_code(code, backtest_rounds=rounds, persistent=persistent)
+    return time.perf_counter() - start, result
+
+
+async def main(args):
+    paths = sorted(glob.glob(os.path.join(ROOT, "data", "agents", "*", "strategy.py")))
+    print(f"strategies={len(paths)} rounds={args.rounds} ticks/round=100")
+    print(f"{'agent':>24}{'status':>22}{'legacy(s)':>12}{'persistent(s)':>15}{'speedup':>10}")
+    legacy_total, persistent_total, rows = 0.0, 0.0, 0
+    rejected = 0
+    for path in paths:
+        with open(path) as f:
+            code = adapt(f.read())
+        agent = os.path.basename(os.path.dirname(path))
+        old, old_result = await run_one(code, args.rounds, False, args.seed)
+        new, new_result = await run_one(code, args.rounds, True, args.seed)
+        if old_result.error_type in ("SYNTAX_ERROR", "SECURITY_VIOLATION", "STRUCTURE_ERROR"):
+            rejected += 1
+            continue
+        status = "passed" if new_result.passed else (new_result.error_type or "failed")
+        print(f"{agent:>24}{status:>22}{old:>12.3f}{new:>15.3f}{old / max(new, 1e-9):>9.1f}x")
+        legacy_total += old
+        persistent_total += new
+        rows += 1
+    if rows:
+        print(f"\n{'total':>24}{rows:>22}{legacy_total:>12.3f}{persistent_total:>15.3f}"
+              f"{legacy_total / max(persistent_total, 1e-9):>9.1f}x")
+    print(f"rejected before backtest (syntax/security/structure): {rejected}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark strategy sandbox execution modes")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+估值索引基准测试
+对比：每次查询全量重算排行榜 (旧行为) vs. ValuationIndex 增量维护
+
+每个 tick：随机改动一部分币价 + 一部分账户成交，然后查询 top-50 与某个 Agent 的名次
+(对应 dashboard 轮询 /leaderboard、/stats 的负载)。
+
+两个场景：
+- poll:    两次轮询之间只有少量成交/改价 (常态)
+- refresh: 每次查询前都有一轮较大范围的价格刷新 (约 10% 账户变脏，最坏情况)
+
+用法:
+    python scripts/bench_valuation_index.py --sizes 1000 10000 50000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "arena_server"))
+
+from matching import MatchingEngine, Position
+
+
+def build_engine(n_accounts: int, n_symbols: int, positions_per_account: int, rng) -> MatchingEngine:
+    engine = MatchingEngine()
+    symbols = [f"MEME{i}" for i in range(n_symbols)]
+    engine.update_prices({sym: {"priceUsd": rng.uniform(0.1, 10)} for sym in symbols})
+    for i in range(n_accounts):
+        account = engine.register_agent(f"Agent_{i:06d}")
+        for sym in rng.sample(symbols, positions_per_account):
+            account.positions[sym] = Position(symbol=sym, amount=rng.uniform(1, 50),
+                                              avg_price=engine.current_prices[sym])
+        account.balance = rng.uniform(0, 1000)
+    engine.get_leaderboard()  # 建立索引
+    return engine
+
+
+def run(n_accounts: int, args, price_churn: float, fill_churn: float) -> dict:
+    rng = random.Random(args.seed)
+    engine = build_engine(n_accounts, args.symbols, args.positions, rng)
+    symbols = list(engine.current_prices)
+    agents = list(engine.accounts)
+
+    def mutate():
+        changed = rng.sample(symbols, max(1, int(len(symbols) * price_churn)))
+        engine.update_prices({sym: {"priceUsd": engine.current_prices[sym] * rng.uniform(0.95, 1.05)}
+                              for sym in changed})
+        for aid in rng.sample(agents, max(1, int(len(agents) * fill_churn))):
+            engine.accounts[aid].balance += rng.uniform(-1, 1)
+            engine.mark_account_dirty(aid)
+
+    # 旧行为：每次查询全量重算 + 排序
+    full = 0.0
+    for _ in range(args.ticks):
+        mutate()
+        probe = rng.choice(agents)
+        t0 = time.perf_counter()
+        rankings = engine.compute_leaderboard()
+        rankings[:50]
+        next(i for i, r in enumerate(rankings) if r[0] == probe)
+        full += time.perf_counter() - t0
+
+    # 增量索引
+    incremental = 0.0
+    for _ in range(args.ticks):
+        mutate()
+        probe = rng.choice(agents)
+        t0 = time.perf_counter()
+        engine.get_top(50)
+        engine.get_rank(probe)
+        incremental += time.perf_counter() - t0
+
+    return {
+        "accounts": n_accounts,
+        "full_ms": full / args.ticks * 1000,
+        "incremental_ms": incremental / args.ticks * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark incremental valuation index vs full recompute")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--positions", type=int, default=5)
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    scenarios = {
+        "poll": (0.002, 0.002),  # 每 tick 改价币种比例, 成交账户比例
+        "refresh": (0.02, 0.01),
+    }
+    print(f"{'scenario':<10}{'accounts':>10}{'full(ms)':>12}{'index(ms)':>12}{'speedup':>10}")
+    for name, (price_churn, fill_churn) in scenarios.items():
+        for n in args.sizes:
+            r = run(n, args, price_churn, fill_churn)
+            speedup = r["full_ms"] / r["incremental_ms"] if r["incremental_ms"] else float("inf")
+            print(f"{name:<10}{r['accounts']:>10}{r['full_ms']:>12.2f}{r['incremental_ms']:>12.2f}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+下单管线压测 (进程内，离线)
+对比：旧的内联路径 (撮合 → 归因 → 组内广播 → Council → 回执)
+     vs. OrderPipeline (微批撮合 → 立即回执，成交后处理异步)
+
+组内广播以"最慢对端"延迟模拟 (--slow-peer-ms)，统计 1k 并发 Agent 的回执延迟 p50/p99。
+
+用法:
+    python scripts/load_test_order_pipeline.py --agents 1000 --orders 5 --slow-peer-ms 50
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "arena_server"))
+
+from group_manager import GroupManager
+from matching import OrderSide
+from order_pipeline import OrderPipeline, OrderQueueFull
+
+
+SYMBOLS = [f"MEME{i}" for i in range(50)]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))] if values else 0.0
+
+
+def build(n_agents: int) -> GroupManager:
+    gm = GroupManager()
+    for i in range(n_agents):
+        gm.register_agent(f"Agent_{i:05d}")
+    gm.update_prices({sym: {"priceUsd": 1.0 + i} for i, sym in enumerate(SYMBOLS)})
+    return gm
+
+
+async def agent_loop(agent_id: str, orders: int, place, latencies: list, rng: random.Random):
+    for _ in range(orders):
+        await asyncio.sleep(rng.uniform(0, 0.02))  # 思考时间
+        t0 = time.perf_counter()
+        try:
+            await place(agent_id, rng.choice(SYMBOLS), OrderSide.BUY, rng.uniform(1, 10))
+        except OrderQueueFull:
+            latencies.append(None)
+            continue
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+
+async def run_mode(mode: str, args) -> dict:
+    gm = build(args.agents)
+    rng = random.Random(args.seed)
+    slow = args.slow_peer_ms / 1000
+
+    async def post_trade(event=None):
+        await asyncio.sleep(slow)  # 组内广播等待最慢的对端
+        await asyncio.sleep(0.001)  # Council 记录
+
+    if mode == "inline":
+        async def place(agent_id, symbol, side, amount):
+            group = gm.get_group(agent_id)
+            result = await group.engine.execute_order(agent_id, symbol, side, amount)
+            if result[0]:
+                await post_trade()
+            return result
+        pipeline = None
+    else:
+        pipeline = OrderPipeline(gm, post_trade=post_trade, post_trade_workers=args.workers)
+        place = pipeline.submit
+
+    latencies = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # execute_order 每笔都会 print
+        await asyncio.gather(*(
+            agent_loop(agent_id, args.orders, place, latencies, random.Random(rng.random()))
+            for agent_id in list(gm.agent_to_group)
+        ))
+    elapsed = time.perf_counter() - start
+
+    acked = [x for x in latencies if x is not None]
+    result = {
+        "mode": mode,
+        "orders": len(latencies),
+        "rejected": len(latencies) - len(acked),
+        "p50": percentile(acked, 50),
+        "p99": percentile(acked, 99),
+        "throughput": len(acked) / elapsed,
+    }
+    if pipeline is not None:
+        result["avg_batch"] = pipeline.stats()["avg_batch_size"]
+        await pipeline.stop()
+    return result
+
+
+async def main(args):
+    print(f"agents={args.agents} orders/agent={args.orders} slow_peer={args.slow_peer_ms}ms")
+    print(f"{'mode':<10}{'orders':>8}{'rejected':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'ops/s':>10}{'batch':>8}")
+    for mode in ("inline", "pipeline"):
+        r = await run_mode(mode, args)
+        print(f"{r['mode']:<10}{r['orders']:>8}{r['rejected']:>10}{r['p50']:>10.2f}{r['p99']:>10.2f}"
+              f"{r['throughput']:>10.0f}{r.get('avg_batch', 1):>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test order ack latency")
+    parser.add_argument("--agents", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=5)
+    parser.add_argument("--slow-peer-ms", type=float, default=50)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
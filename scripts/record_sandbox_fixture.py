@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+从 Arena 成交日志录制沙盒回放夹具
+读取 TRADE_JOURNAL_DIR/group_*/ 下的成交记录，按币种取成交价序列，
+重采样到固定间隔的网格 (前值填充)，切成每轮 ticks 个 tick 写成 mmap 夹具 (见 market_scenarios.py)。
+
+沙盒使用夹具: DARWIN_SANDBOX_FIXTURE=data/sandbox_fixtures/arena.npy
+
+用法:
+    python scripts/record_sandbox_fixture.py --out data/sandbox_fixtures/arena.npy --interval 60 --symbols 5
+"""
+
+import argparse
+import glob
+import os
+import sys
+from collections import defaultdict
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "arena_server"))
+
+from config import TRADE_JOURNAL_DIR
+from market_scenarios import resample_series, write_fixture
+from trade_journal import TradeJournal, trade_timestamp
+
+
+def collect(journal_root: str, since: float = None):
+    """汇总所有组的成交: {symbol: [(ts, price)]}, {symbol: [(ts, value)]}"""
+    prices, volumes = defaultdict(list), defaultdict(list)
+    for path in sorted(glob.glob(os.path.join(journal_root, "group_*"))):
+        journal = TradeJournal(path)
+        for trade in journal.scan(since=since, newest_first=False):
+            price = trade.get("price")
+            if not price:
+                continue
+            ts = trade_timestamp(trade)
+            prices[trade["symbol"]].append((ts, float(price)))
+            volumes[trade["symbol"]].append((ts, float(trade.get("value") or 0.0)))
+        journal.close()
+    return prices, volumes
+
+
+def main(args):
+    prices, volumes = collect(args.journal, args.since)
+    # 只保留成交最多的几个币种 (它们的价格序列最密)
+    top = sorted(prices, key=lambda sym: len(prices[sym]), reverse=True)[:args.symbols]
+    if not top:
+        sys.exit(f"No trades found under {args.journal}")
+    symbols, grid_prices, grid_volumes = resample_series(
+        {sym: prices[sym] for sym in top}, args.interval, {sym: volumes[sym] for sym in top}
+    )
+    rounds = write_fixture(
+        args.out, symbols, grid_prices, args.ticks, volumes=grid_volumes,
+        meta={"source": os.path.abspath(args.journal), "interval": args.interval},
+    )
+    print(f"{args.out}: {rounds} rounds × {args.ticks} ticks × {len(symbols)} symbols ({', '.join(symbols)})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record a sandbox replay fixture from arena trade journals")
+    parser.add_argument("--journal", default=TRADE_JOURNAL_DIR)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "..", "data", "sandbox_fixtures", "arena.npy"))
+    parser.add_argument("--interval", type=float, default=60.0, help="网格间隔 (秒)")
+    parser.add_argument("--ticks", type=int, default=100, help="每轮 tick 数")
+    parser.add_argument("--symbols", type=int, default=5)
+    parser.add_argument("--since", type=float, default=None, help="只使用该 unix 时间戳之后的成交")
+    main(parser.parse_args())
@@ -3,7 +3,10 @@
 Darwin Arena REST API Client
 
 Simple REST API client for OpenClaw agents.
-No WebSocket, no persistent connections - just simple HTTP calls.
+No WebSocket - just HTTP calls over a keep-alive connection.
+
+DarwinRestClient is blocking (requests.Session); AsyncDarwinRestClient is the asyncio
+variant with a pooled keep-alive connector, retries and jittered exponential backoff.
 
 Usage:
     from darwin_rest_client import DarwinRestClient
@@ -29,10 +32,51 @@ Usage:
 
     # Share to council
     client.council_share("Found TOSHI with strong momentum!")
+
+    # Rebalance in one round trip
+    client.trade_batch([
+        {"symbol": "DEGEN", "side": "SELL", "amount": 500, "reason": ["TAKE_PROFIT"]},
+        {"symbol": "TOSHI", "side": "BUY", "amount": 100, "reason": ["MOMENTUM"]},
+    ])
+
+Async usage:
+    async with AsyncDarwinRestClient("MyAgent", "dk_abc123...") as client:
+        status, hive = await asyncio.gather(client.get_status(), client.get_hive_mind())
+        await client.trade_batch([...])
 """
 
+import asyncio
+import random
 import requests
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+
+try:
+    import aiohttp
+except ImportError:  # Only needed for AsyncDarwinRestClient
+    aiohttp = None
+
+
+def _order_payload(
+    symbol: str,
+    side: str,
+    amount: float,
+    reason: List[str] = None,
+    chain: str = None,
+    contract_address: str = None
+) -> Dict[str, Any]:
+    """Request body for one order (shared by trade and trade_batch)"""
+    payload = {
+        "symbol": symbol,
+        "side": side.upper(),
+        "amount": amount,
+        "reason": reason or []
+    }
+
+    if chain:
+        payload["chain"] = chain
+    if contract_address:
+        payload["contract_address"] = contract_address
+    return payload
 
 
 class DarwinRestClient:
@@ -46,6 +90,7 @@ class DarwinRestClient:
             "Authorization": api_key,
             "Content-Type": "application/json"
         }
+        self.session = requests.Session()  # Reuses TCP/TLS connections across calls
 
     def trade(
         self,
@@ -76,19 +121,9 @@ class DarwinRestClient:
                 "positions": dict
             }
         """
-        payload = {
-            "symbol": symbol,
-            "side": side.upper(),
-            "amount": amount,
-            "reason": reason or []
-        }
-
-        if chain:
-            payload["chain"] = chain
-        if contract_address:
-            payload["contract_address"] = contract_address
+        payload = _order_payload(symbol, side, amount, reason, chain, contract_address)
 
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/api/trade",
             json=payload,
             headers=self.headers,
@@ -103,6 +138,37 @@ class DarwinRestClient:
                 "message": f"HTTP {response.status_code}: {response.text}"
             }
 
+    def trade_batch(self, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Execute several trades in one round trip
+
+        Args:
+            orders: List of {"symbol", "side", "amount", "reason", "chain", "contract_address"}
+
+        Returns:
+            {
+                "success": bool,  # True if every order filled
+                "results": [{"success", "message", "fill_price"}, ...],  # Same order as the input
+                "balance": float,
+                "positions": dict
+            }
+        """
+        response = self.session.post(
+            f"{self.base_url}/api/trades/batch",
+            json={"orders": [_order_payload(**order) for order in orders]},
+            headers=self.headers,
+            timeout=30
+        )
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            return {
+                "success": False,
+                "results": [],
+                "message": f"HTTP {response.status_code}: {response.text}"
+            }
+
     def get_status(self) -> Dict[str, Any]:
         """
         Get agent status
@@ -117,7 +183,7 @@ class DarwinRestClient:
                 "epoch": int
             }
         """
-        response = requests.get(
+        response = self.session.get(
             f"{self.base_url}/api/agent/{self.agent_id}/status",
             headers=self.headers,
             timeout=30
@@ -150,7 +216,7 @@ class DarwinRestClient:
             "role": role
         }
 
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/api/council/share",
             json=payload,
             headers=self.headers,
@@ -179,7 +245,7 @@ class DarwinRestClient:
                 }
             }
         """
-        response = requests.get(
+        response = self.session.get(
             f"{self.base_url}/hive-mind",
             timeout=30
         )
@@ -198,7 +264,7 @@ class DarwinRestClient:
         Returns:
             List of messages with agent_id, content, score, etc.
         """
-        response = requests.get(
+        response = self.session.get(
             f"{self.base_url}/council-logs",
             timeout=30
         )
@@ -209,6 +275,188 @@ class DarwinRestClient:
             return []
 
 
+class AsyncDarwinRestClient:
+    """
+    asyncio REST client for Darwin Arena
+
+    - One aiohttp session with a keep-alive connection pool (pool_size connections)
+    - Retries with full-jitter exponential backoff (honours Retry-After)
+    - Order endpoints are retried only when the server cannot have executed them:
+      connection refused, 429 queue_full, 503. Reads also retry on 502/504 and timeouts.
+    """
+
+    READ_RETRY_STATUSES = {429, 502, 503, 504}
+    ORDER_RETRY_STATUSES = {429, 503}
+
+    def __init__(
+        self,
+        agent_id: str,
+        api_key: str,
+        base_url: str = "https://www.darwinx.fun",
+        pool_size: int = 10,
+        retries: int = 3,
+        backoff: float = 0.25,
+        max_backoff: float = 5.0,
+        timeout: float = 30.0
+    ):
+        if aiohttp is None:
+            raise RuntimeError("AsyncDarwinRestClient requires aiohttp (pip install aiohttp)")
+        self.agent_id = agent_id
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.headers = {
+            "Authorization": api_key,
+            "Content-Type": "application/json"
+        }
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self.requests_sent = 0
+        self.retries_made = 0
+
+    async def __aenter__(self) -> "AsyncDarwinRestClient":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full jitter: uniform(0, min(max_backoff, backoff * 2^attempt)); Retry-After wins if given"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        json: Any = None,
+        auth: bool = True,
+        is_order: Optional[bool] = None
+    ) -> Tuple[int, Any]:
+        """
+        Send one request with retries
+
+        Writes (orders, Council posts; any non-GET unless is_order says otherwise) use the order
+        retry policy: they are only retried when the server cannot have executed them.
+
+        Returns:
+            (HTTP status, decoded JSON body or text)
+
+        Raises:
+            aiohttp.ClientError / asyncio.TimeoutError once retries are exhausted
+        """
+        if is_order is None:
+            is_order = method != "GET"
+        retry_statuses = self.ORDER_RETRY_STATUSES if is_order else self.READ_RETRY_STATUSES
+        session = self._get_session()
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            retry_after = None
+            self.requests_sent += 1
+            try:
+                async with session.request(
+                    method, f"{self.base_url}{path}", json=json,
+                    headers=self.headers if auth else None
+                ) as response:
+                    if response.status in retry_statuses and not last_attempt:
+                        retry_after = response.headers.get("Retry-After")
+                    else:
+                        try:
+                            body = await response.json(content_type=None)
+                        except ValueError:
+                            body = await response.text()
+                        return response.status, body
+            except aiohttp.ClientConnectorError:
+                # Never reached the server: safe to retry even for orders
+                if last_attempt:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                # The request may have been executed: only reads are retried
+                if is_order or last_attempt:
+                    raise
+            self.retries_made += 1
+            await asyncio.sleep(self._backoff_delay(attempt, retry_after))
+
+    async def trade(
+        self,
+        symbol: str,
+        side: str,
+        amount: float,
+        reason: List[str] = None,
+        chain: str = None,
+        contract_address: str = None
+    ) -> Dict[str, Any]:
+        """Execute a trade (same arguments and result as DarwinRestClient.trade)"""
+        status, body = await self._request(
+            "POST", "/api/trade", json=_order_payload(symbol, side, amount, reason, chain, contract_address),
+            is_order=True
+        )
+        if status == 200:
+            return body
+        return {"success": False, "message": f"HTTP {status}: {body}"}
+
+    async def trade_batch(self, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Execute several trades in one round trip (same result as DarwinRestClient.trade_batch)"""
+        status, body = await self._request(
+            "POST", "/api/trades/batch", json={"orders": [_order_payload(**order) for order in orders]},
+            is_order=True
+        )
+        if status == 200:
+            return body
+        return {"success": False, "results": [], "message": f"HTTP {status}: {body}"}
+
+    async def get_status(self) -> Dict[str, Any]:
+        """Get agent status"""
+        status, body = await self._request("GET", f"/api/agent/{self.agent_id}/status")
+        if status == 200:
+            return body
+        return {"error": f"HTTP {status}: {body}"}
+
+    async def council_share(self, content: str, role: str = "insight") -> Dict[str, Any]:
+        """Share thoughts to Council"""
+        status, body = await self._request(
+            "POST", "/api/council/share", json={"content": content, "role": role}, is_order=True
+        )
+        if status == 200:
+            return body
+        return {"success": False, "message": f"HTTP {status}: {body}"}
+
+    async def get_hive_mind(self) -> Dict[str, Any]:
+        """Get Hive Mind collective intelligence"""
+        status, body = await self._request("GET", "/hive-mind", auth=False)
+        if status == 200:
+            return body
+        return {"error": f"HTTP {status}: {body}"}
+
+    async def get_council_logs(self) -> List[Dict[str, Any]]:
+        """Get recent Council messages"""
+        status, body = await self._request("GET", "/council-logs", auth=False)
+        return body if status == 200 else []
+
+    def stats(self) -> Dict[str, int]:
+        return {"requests": self.requests_sent, "retries": self.retries_made}
+
+
 # CLI interface for testing
 if __name__ == "__main__":
     import sys
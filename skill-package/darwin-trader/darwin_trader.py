@@ -15,9 +15,10 @@ Darwin Arena is responsible for:
 """
 
 import asyncio
+import itertools
 import json
 import sys
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import aiohttp
 
 # Global state
@@ -25,7 +26,13 @@ ws_connection: Optional[aiohttp.ClientWebSocketResponse] = None
 http_session: Optional[aiohttp.ClientSession] = None
 listener_task: Optional[asyncio.Task] = None
 message_handlers = {}  # Callbacks for different message types
-response_queue: Optional[asyncio.Queue] = None  # Queue for order/status responses
+
+# Request multiplexing: every order/status/council request carries a client-assigned "id"
+# and the server echoes it on the reply, so many requests can be in flight on one socket.
+pending_requests: Dict[str, Tuple[asyncio.Future, str]] = {}  # id -> (future, expected reply type)
+_request_ids = itertools.count(1)
+RESPONSE_TYPES = {"order_result", "orders_result", "state", "council_submitted", "error"}
+MAX_BATCH_ORDERS = 32  # Server limit for one "orders" message
 
 agent_state = {
     "agent_id": None,
@@ -90,18 +97,14 @@ async def darwin_connect(agent_id: str, arena_url: str = "wss://www.darwinx.fun"
         # Update state
         agent_state.update({
             "agent_id": agent_id,
-            "balance": data.get("balance", 1000),
-            "positions": data.get("positions", {}),
+            "balance": data["balance"] if data.get("balance") is not None else 1000,
+            "positions": data.get("positions") or {},
             "tokens": data.get("tokens", []),
             "connected": True,
             "arena_url": arena_url,
             "group_id": data.get("group_id", "unknown")
         })
 
-        # Initialize response queue
-        global response_queue
-        response_queue = asyncio.Queue()
-        
         # Start background message listener
         global listener_task
         listener_task = asyncio.create_task(_message_listener())
@@ -126,50 +129,65 @@ async def darwin_connect(agent_id: str, arena_url: str = "wss://www.darwinx.fun"
             "message": f"❌ Connection failed: {str(e)}"
         }
 
-async def darwin_trade(action: str, symbol: str, amount: float, reason: str = None, chain: str = None, contract_address: str = None) -> Dict[str, Any]:
+async def _request(message: dict, expected_type: str, timeout: float = 5.0) -> dict:
     """
-    Execute a trade.
-
-    Args:
-        action: "buy" or "sell"
-        symbol: Token symbol (e.g., "TOSHI", "DEGEN")
-        amount: Amount in USD (for buy) or token quantity (for sell)
-        reason: Optional reason/tag for the trade
-        chain: Blockchain name (e.g., "base", "ethereum", "solana") - REQUIRED for accurate tracking
-        contract_address: Token contract address - REQUIRED for accurate tracking
-
-    Returns:
-        Trade execution result
+    Send a request tagged with a fresh id and wait for the reply carrying the same id.
 
-    Example:
-        darwin_trade(
-            action="buy",
-            symbol="TOSHI",
-            amount=50,
-            reason="MOMENTUM",
-            chain="base",
-            contract_address="0xAC1Bd2486aAf3B5C0fc3Fd868558b082a531B2B4"
-        )
+    Raises:
+        asyncio.TimeoutError: no reply within timeout
+        ConnectionError: the socket closed while waiting
     """
-    global ws_connection, agent_state
-
+    request_id = f"r{next(_request_ids)}"
+    future = asyncio.get_running_loop().create_future()
+    pending_requests[request_id] = (future, expected_type)
+    try:
+        await ws_connection.send_json({**message, "id": request_id})
+        result = await asyncio.wait_for(future, timeout=timeout)
+    finally:
+        pending_requests.pop(request_id, None)
+    if result.get("type") == "error":
+        raise Exception(result.get("message", "Server error"))
+    return result
+
+def _resolve_response(data: dict):
+    """Hand a reply to the request waiting for it."""
+    request_id = data.get("id")
+    if request_id is not None:
+        entry = pending_requests.get(request_id)
+    else:
+        # Older servers do not echo ids: answer the oldest request expecting this reply type.
+        # An id-less error can answer any request, so it goes to the oldest one still waiting.
+        is_error = data.get("type") == "error"
+        entry = next((e for e in pending_requests.values()
+                      if (is_error or e[1] == data.get("type")) and not e[0].done()), None)
+    if entry is not None and not entry[0].done():
+        entry[0].set_result(data)
+
+def _fail_pending(reason: str):
+    """Fail every in-flight request (connection lost)."""
+    for future, _ in list(pending_requests.values()):
+        if not future.done():
+            future.set_exception(ConnectionError(reason))
+
+def _check_connection() -> Optional[Dict[str, Any]]:
     if not agent_state["connected"]:
         return {"status": "error", "message": "❌ Not connected. Call darwin_connect() first."}
-
     if not ws_connection or ws_connection.closed:
         return {"status": "error", "message": "❌ WebSocket connection lost."}
+    return None
 
-    # Validate action
+def _build_order(action: str, symbol: str, amount: float, reason=None, chain: str = None,
+                 contract_address: str = None) -> Dict[str, Any]:
+    """Validate one order and build its wire format (raises ValueError)."""
     action = action.lower()
     if action not in ["buy", "sell"]:
-        return {"status": "error", "message": "❌ Action must be 'buy' or 'sell'"}
+        raise ValueError("Action must be 'buy' or 'sell'")
 
     # Note: Token pool restriction removed - agents can trade any token
     # Server will fetch price from DexScreener if not in cache
 
-    # Validate amount
     if amount <= 0:
-        return {"status": "error", "message": "❌ Amount must be positive"}
+        raise ValueError("Amount must be positive")
 
     # Normalize reason to list
     if reason is None:
@@ -179,9 +197,7 @@ async def darwin_trade(action: str, symbol: str, amount: float, reason: str = No
     else:
         reason_list = [reason]
 
-    # Send order to server
-    order = {
-        "type": "order",
+    return {
         "symbol": symbol,
         "side": action.upper(),
         "amount": amount,
@@ -190,33 +206,75 @@ async def darwin_trade(action: str, symbol: str, amount: float, reason: str = No
         "contract_address": contract_address or ""
     }
 
-    try:
-        await ws_connection.send_json(order)
+def _fill_summary(action: str, symbol: str, amount: float, fill_price: float) -> Dict[str, Any]:
+    quantity = amount / fill_price if action == "buy" else amount
+    return {
+        "action": action,
+        "symbol": symbol,
+        "quantity": quantity,
+        "price": fill_price,
+        "cost": amount if action == "buy" else quantity * fill_price,
+    }
 
-        # Wait for response from queue (populated by message listener)
-        result = await asyncio.wait_for(response_queue.get(), timeout=5.0)
+async def darwin_trade(action: str, symbol: str, amount: float, reason: str = None, chain: str = None, contract_address: str = None) -> Dict[str, Any]:
+    """
+    Execute a trade.
 
-        if result.get("type") != "order_result":
-            raise Exception(f"Unexpected response type: {result.get('type')}")
+    Args:
+        action: "buy" or "sell"
+        symbol: Token symbol (e.g., "TOSHI", "DEGEN")
+        amount: Amount in USD (for buy) or token quantity (for sell)
+        reason: Optional reason/tag for the trade
+        chain: Blockchain name (e.g., "base", "ethereum", "solana") - REQUIRED for accurate tracking
+        contract_address: Token contract address - REQUIRED for accurate tracking
 
-        # Update local state
-        agent_state["balance"] = result.get("balance", agent_state["balance"])
-        agent_state["positions"] = result.get("positions", agent_state["positions"])
+    Returns:
+        Trade execution result
 
-        if result.get("success"):
-            fill_price = result.get("fill_price", 0)
-            quantity = amount / fill_price if action == "buy" else amount
+    Example:
+        darwin_trade(
+            action="buy",
+            symbol="TOSHI",
+            amount=50,
+            reason="MOMENTUM",
+            chain="base",
+            contract_address="0xAC1Bd2486aAf3B5C0fc3Fd868558b082a531B2B4"
+        )
+    """
+    error = _check_connection()
+    if error:
+        return error
+
+    try:
+        order = _build_order(action, symbol, amount, reason, chain, contract_address)
+    except ValueError as e:
+        return {"status": "error", "message": f"❌ {e}"}
+    action = action.lower()
+
+    try:
+        result = await _request({"type": "order", **order}, "order_result")
+
+        # Update local state (balance is null if the server could not read the account)
+        if result.get("balance") is not None:
+            agent_state["balance"] = result["balance"]
+            agent_state["positions"] = result.get("positions") or agent_state["positions"]
+
+        if result.get("status") == "pending":
+            # Sharded server timed out: the order may still fill, so do not resend it
+            return {
+                "status": "pending",
+                "order_id": result.get("order_id"),
+                "message": f"⏳ {result.get('message', 'Order pending')} - do not retry"
+            }
+        elif result.get("success"):
+            fill = _fill_summary(action, symbol, amount, result.get("fill_price", 0))
 
             return {
                 "status": "success",
-                "action": action,
-                "symbol": symbol,
-                "quantity": quantity,
-                "price": fill_price,
-                "cost": amount if action == "buy" else quantity * fill_price,
+                **fill,
                 "balance": agent_state["balance"],
                 "positions": agent_state["positions"],
-                "message": f"✅ {action.upper()} {quantity:.2f} {symbol} @ ${fill_price:.6f}\n💰 New balance: ${agent_state['balance']:.2f}"
+                "message": f"✅ {action.upper()} {fill['quantity']:.2f} {symbol} @ ${fill['price']:.6f}\n💰 New balance: ${agent_state['balance']:.2f}"
             }
         else:
             return {
@@ -229,6 +287,74 @@ async def darwin_trade(action: str, symbol: str, amount: float, reason: str = No
     except Exception as e:
         return {"status": "error", "message": f"❌ Trade failed: {str(e)}"}
 
+async def darwin_trade_batch(orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Execute several trades in one round trip.
+
+    The legs are queued in order on the server and answered in a single frame,
+    so rebalancing N positions costs one round trip instead of N.
+
+    Args:
+        orders: List of dicts with the same fields as darwin_trade()
+                (action, symbol, amount, reason, chain, contract_address)
+
+    Returns:
+        Per-order results plus the final balance and positions
+
+    Example:
+        await darwin_trade_batch([
+            {"action": "sell", "symbol": "DEGEN", "amount": 500, "reason": "TAKE_PROFIT",
+             "chain": "base", "contract_address": "0x4ed4E862860beD51a9570b96d89aF5E1B0Efefed"},
+            {"action": "buy", "symbol": "TOSHI", "amount": 100, "reason": "MOMENTUM",
+             "chain": "base", "contract_address": "0xAC1Bd2486aAf3B5C0fc3Fd868558b082a531B2B4"},
+        ])
+    """
+    error = _check_connection()
+    if error:
+        return error
+    if not orders or len(orders) > MAX_BATCH_ORDERS:
+        return {"status": "error", "message": f"❌ Batch must contain 1-{MAX_BATCH_ORDERS} orders"}
+
+    try:
+        legs = [_build_order(o.get("action", ""), o.get("symbol"), o.get("amount", 0), o.get("reason"),
+                             o.get("chain"), o.get("contract_address")) for o in orders]
+    except (ValueError, AttributeError) as e:
+        return {"status": "error", "message": f"❌ Invalid order in batch: {e}"}
+
+    try:
+        result = await _request({"type": "orders", "orders": legs}, "orders_result", timeout=15.0)
+    except asyncio.TimeoutError:
+        return {"status": "error", "message": "❌ Batch timeout - no response from server"}
+    except Exception as e:
+        return {"status": "error", "message": f"❌ Batch failed: {str(e)}"}
+
+    if result.get("balance") is not None:
+        agent_state["balance"] = result["balance"]
+        agent_state["positions"] = result.get("positions") or agent_state["positions"]
+
+    legs_out = []
+    for leg, reply in zip(legs, result.get("results", [])):
+        action = leg["side"].lower()
+        if reply.get("success"):
+            legs_out.append({"status": "success", **_fill_summary(action, leg["symbol"], leg["amount"], reply.get("fill_price", 0))})
+        elif reply.get("status") == "pending":
+            legs_out.append({"status": "pending", "action": action, "symbol": leg["symbol"],
+                             "order_id": reply.get("order_id"), "message": reply.get("message")})
+        else:
+            legs_out.append({"status": "error", "action": action, "symbol": leg["symbol"],
+                             "message": reply.get("message", "Unknown error")})
+    filled = sum(1 for leg in legs_out if leg["status"] == "success")
+
+    if not legs_out:
+        return {"status": "error", "message": f"❌ Batch rejected: {result.get('message', 'Unknown error')}"}
+    return {
+        "status": "success" if filled == len(legs_out) else "partial" if filled else "error",
+        "results": legs_out,
+        "balance": agent_state["balance"],
+        "positions": agent_state["positions"],
+        "message": f"{'✅' if filled == len(legs_out) else '⚠️'} {filled}/{len(legs_out)} orders filled\n💰 New balance: ${agent_state['balance']:.2f}"
+    }
+
 async def darwin_status() -> Dict[str, Any]:
     """
     Get current trading status.
@@ -236,18 +362,13 @@ async def darwin_status() -> Dict[str, Any]:
     Returns:
         Current balance, positions, and PnL
     """
-    if not agent_state["connected"]:
-        return {"status": "error", "message": "❌ Not connected. Call darwin_connect() first."}
+    error = _check_connection()
+    if error:
+        return error
 
     # Request state from server
     try:
-        await ws_connection.send_json({"type": "get_state"})
-
-        # Wait for response from queue (populated by message listener)
-        result = await asyncio.wait_for(response_queue.get(), timeout=5.0)
-
-        if result.get("type") != "state":
-            raise Exception(f"Unexpected response type: {result.get('type')}")
+        result = await _request({"type": "get_state"}, "state")
 
         # Update local state
         agent_state["balance"] = result.get("balance", agent_state["balance"])
@@ -303,9 +424,9 @@ async def _message_listener():
                     data = json.loads(msg.data)
                     msg_type = data.get("type")
                     
-                    # Route responses to queue for darwin_trade/darwin_status/darwin_council_share
-                    if msg_type in ["order_result", "state", "council_submitted"]:
-                        await response_queue.put(data)
+                    # Route replies to the request that is waiting for them (matched by id)
+                    if msg_type in RESPONSE_TYPES:
+                        _resolve_response(data)
                     
                     # Handle different message types
                     elif msg_type == "hot_patch":
@@ -344,6 +465,7 @@ async def _message_listener():
                 break
     
     finally:
+        _fail_pending("WebSocket connection closed")
         print("🎧 Message listener stopped")
 
 def _handle_hot_patch(data: dict):
@@ -433,30 +555,19 @@ async def darwin_council_share(content: str, role: str = "insight") -> Dict[str,
             role="insight"
         )
     """
-    global ws_connection, response_queue
-    
     if not ws_connection or ws_connection.closed:
         return {
             "status": "error",
             "message": "❌ Not connected to arena"
         }
     
-    if not response_queue:
-        response_queue = asyncio.Queue()
-    
     try:
-        # Send council submission
-        await ws_connection.send_json({
+        # Send council submission and wait for its reply
+        response = await _request({
             "type": "council_submit",
             "role": role,
             "content": content
-        })
-        
-        # Wait for response
-        response = await asyncio.wait_for(
-            response_queue.get(),
-            timeout=10.0
-        )
+        }, "council_submitted", timeout=10.0)
         
         if response.get("type") == "council_submitted":
             success = response.get("success", False)
@@ -527,6 +638,7 @@ async def main():
         print("\nCommands:")
         print("  connect <agent_id> [arena_url] [api_key]")
         print("  trade <buy|sell> <symbol> <amount> [reason]")
+        print("  batch '<json list of orders>'")
         print("  status")
         print("  disconnect")
         sys.exit(1)
@@ -551,6 +663,13 @@ async def main():
         result = await darwin_trade(action, symbol, amount, reason)
         print(json.dumps(result, indent=2))
 
+    elif command == "batch":
+        if len(sys.argv) < 3:
+            print("Usage: batch '[{\"action\": \"buy\", \"symbol\": \"TOSHI\", \"amount\": 50}, ...]'")
+            sys.exit(1)
+        result = await darwin_trade_batch(json.loads(sys.argv[2]))
+        print(json.dumps(result, indent=2))
+
     elif command == "status":
         result = await darwin_status()
         print(json.dumps(result, indent=2))
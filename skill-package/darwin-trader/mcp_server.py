@@ -7,7 +7,7 @@ Exposes darwin_trader functions to OpenClaw via Model Context Protocol
 import asyncio
 import json
 from typing import Any, Dict
-from darwin_trader import darwin_connect, darwin_trade, darwin_status, darwin_disconnect
+from darwin_trader import darwin_connect, darwin_trade, darwin_trade_batch, darwin_status, darwin_disconnect
 
 # MCP Server using stdio transport
 async def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
@@ -28,7 +28,7 @@ async def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
                             "properties": {
                                 "command": {
                                     "type": "string",
-                                    "enum": ["connect", "trade", "status", "disconnect"],
+                                    "enum": ["connect", "trade", "batch", "status", "disconnect"],
                                     "description": "Command to execute"
                                 },
                                 "agent_id": {
@@ -59,6 +59,11 @@ async def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
                                 "reason": {
                                     "type": "string",
                                     "description": "Trade reason (optional)"
+                                },
+                                "orders": {
+                                    "type": "array",
+                                    "items": {"type": "object"},
+                                    "description": "Orders for batch: [{action, symbol, amount, reason, chain, contract_address}, ...]"
                                 }
                             },
                             "required": ["command"]
@@ -88,6 +93,9 @@ async def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
                     reason = arguments.get("reason")
                     result = await darwin_trade(action, symbol, amount, reason)
 
+                elif command == "batch":
+                    result = await darwin_trade_batch(arguments.get("orders", []))
+
                 elif command == "status":
                     result = await darwin_status()
 
@@ -235,17 +235,19 @@ class SmartStrategy:
         """
         Check positions for auto-close (5 minute timeout)
 
+        All timed-out positions are sold in one /api/trades/batch round trip.
+
         Returns:
             List of close results
         """
-        results = []
         current_time = time.time()
 
         # Get current status
         status = self.client.get_status()
         positions = status.get("positions", {})
 
-        # Check each position
+        # Collect every position to close
+        orders = []
         for symbol, buy_time in list(self.buy_history.items()):
             hold_time = current_time - buy_time
 
@@ -264,20 +266,23 @@ class SmartStrategy:
                         # Generate exit tags
                         tags, reasoning = self.analyze_exit(symbol, hold_time, pnl)
 
-                        # Sell 97% of position value (to account for slippage)
-                        sell_amount = value * 0.97
-
                         print(f"⏰ Auto-closing {symbol}: {amount:.6f} tokens, ${value:.2f} value, {pnl:+.1%} PnL")
 
-                        result = self.trade_with_tags(
-                            symbol=symbol,
-                            side="SELL",
-                            amount=sell_amount,
-                            tags=tags,
-                            reasoning=reasoning
-                        )
+                        # Share analysis to Council BEFORE trading (required!)
+                        self.client.council_share(f"💭 {reasoning}\n🏷️  {', '.join(tags)}", role="insight")
+
+                        # Sell 97% of position value (to account for slippage)
+                        orders.append({"symbol": symbol, "side": "SELL", "amount": value * 0.97, "reason": tags})
+
+        if not orders:
+            return []
 
-                        results.append(result)
+        batch = self.client.trade_batch(orders)
+        results = batch.get("results") or [
+            {"success": False, "symbol": order["symbol"], "message": batch.get("message")} for order in orders
+        ]
+        for order in orders:
+            self.buy_history.pop(order["symbol"], None)
 
         return results
 
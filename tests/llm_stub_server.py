@@ -0,0 +1,111 @@
+"""
+本地 LLM 桩服务 (测试用)
+在后台线程里起一个 HTTP 服务，兼容 OpenAI (/chat/completions) 与 Anthropic (/v1/messages) 格式，
+让 llm_client.call_llm 不依赖外部服务即可端到端测试。
+
+回复规则：
+- 议事厅批量评分 prompt (围栏中的 JSON 发言数组) → {id: 分数} JSON 对象，分数 = score_for(内容)
+- 其他 prompt → reply 文本
+
+用法:
+    with LLMStubServer(delay=0.05) as stub:
+        provider = LLMProvider("stub", stub.url, "stub-model", "key", api_format="openai")
+        ...
+        assert stub.requests == 1
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BATCH_PATTERN = re.compile(r"```json\n(.*?)\n```", re.S)
+
+
+def batch_entries(prompt: str) -> list:
+    """议事厅批量评分 prompt 中的发言 [{id, agent_id, role, content}]；不是评分 prompt 时为空"""
+    match = BATCH_PATTERN.search(prompt)
+    return json.loads(match.group(1)) if match else []
+
+
+def score_for(content: str) -> int:
+    """确定性的桩分数：按内容长度落在 0-10"""
+    return len(content) % 11
+
+
+class LLMStubServer:
+    def __init__(self, delay: float = 0.0, reply: str = "OK", status: int = 200):
+        self.delay = delay
+        self.reply = reply
+        self.status = status
+        self.requests = 0
+        self.prompts = []
+        self.max_concurrent = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def answer(self, prompt: str) -> str:
+        entries = batch_entries(prompt)
+        if entries:
+            return json.dumps({entry["id"]: score_for(entry["content"]) for entry in entries})
+        return self.reply
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive，连接池测试可复用连接
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+                with stub._lock:
+                    stub.requests += 1
+                    stub.prompts.append(prompt)
+                    stub._active += 1
+                    stub.max_concurrent = max(stub.max_concurrent, stub._active)
+                try:
+                    if stub.delay:
+                        time.sleep(stub.delay)
+                    text = stub.answer(prompt)
+                    if self.path.endswith("/v1/messages"):
+                        payload = {"content": [{"type": "text", "text": text}]}
+                    else:
+                        payload = {"choices": [{"message": {"role": "assistant", "content": text}}]}
+                    data = json.dumps(payload).encode()
+                    self.send_response(stub.status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                finally:
+                    with stub._lock:
+                        stub._active -= 1
+
+        return Handler
+
+    def start(self) -> "LLMStubServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "LLMStubServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,159 @@
+"""
+🧪 Columnar Account Store - Test Suite
+
+测试列式账户存储后端：
+1. 与默认 dict 后端执行相同交易序列，余额/持仓/排行完全一致
+2. AccountView / PositionView 兼容原 AgentAccount API (含删除后读取 avg_price)
+3. 向量化 pnl_history 追加与 PnL 分位数
+4. 账户删除后行与持仓槽被复用；旧的 AccountView 脱离，不会读写复用该行的新账户
+"""
+
+import asyncio
+import random
+import sys
+import os
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from matching import MatchingEngine, OrderSide, AgentAccount, Position
+from account_store import AccountView
+
+
+SYMBOLS = [f"TOK{i}" for i in range(15)]
+
+
+async def _replay(engine, seed):
+    rng = random.Random(seed)
+    agents = [f"Agent_{i:02d}" for i in range(30)]
+    for agent in agents:
+        engine.register_agent(agent)
+    engine.update_prices({sym: {"priceUsd": rng.uniform(0.5, 2.0)} for sym in SYMBOLS})
+    for step in range(600):
+        agent = rng.choice(agents)
+        symbol = rng.choice(SYMBOLS)
+        if rng.random() < 0.6:
+            await engine.execute_order(agent, symbol, OrderSide.BUY, rng.uniform(1, 40))
+        else:
+            pos = engine.accounts[agent].positions.get(symbol)
+            if pos:
+                fraction = 1.0 if rng.random() < 0.3 else 0.5
+                await engine.execute_order(agent, symbol, OrderSide.SELL,
+                                           pos.amount * engine.current_prices[symbol] * 0.99 * fraction)
+        if step % 100 == 0:
+            engine.update_prices({sym: {"priceUsd": rng.uniform(0.5, 2.0)}
+                                  for sym in rng.sample(SYMBOLS, 4)})
+            engine.record_pnl_snapshot()
+
+
+def _close(a, b):
+    return abs(a - b) < 1e-9
+
+
+def test_columnar_matches_dict_backend():
+    async def run():
+        plain = MatchingEngine(store="dict")
+        columnar = MatchingEngine(store="columnar")
+        await _replay(plain, 11)
+        await _replay(columnar, 11)
+
+        assert isinstance(columnar.accounts["Agent_00"], AccountView)
+        for agent_id, acc in plain.accounts.items():
+            view = columnar.accounts[agent_id]
+            assert _close(acc.balance, view.balance)
+            assert set(acc.positions) == set(view.positions)
+            for sym, pos in acc.positions.items():
+                assert _close(pos.amount, view.positions[sym].amount)
+                assert _close(pos.avg_price, view.positions[sym].avg_price)
+            assert len(acc.pnl_history) == len(view.pnl_history)
+            assert all(_close(x, y) for x, y in zip(acc.pnl_history, view.pnl_history))
+
+        for (a1, p1, v1), (a2, p2, v2) in zip(plain.get_leaderboard(), columnar.get_leaderboard()):
+            assert _close(p1, p2) and _close(v1, v2)
+        vec = {r[0]: r for r in columnar.compute_leaderboard()}
+        for agent_id, pnl, value in plain.compute_leaderboard():
+            assert _close(vec[agent_id][1], pnl) and _close(vec[agent_id][2], value)
+        assert all(_close(x, y) for x, y in zip(plain.pnl_percentiles([10, 50, 90]),
+                                                 columnar.pnl_percentiles([10, 50, 90])))
+
+    asyncio.run(run())
+
+
+def test_view_api_compat():
+    engine = MatchingEngine(store="columnar")
+    account = engine.register_agent("Agent_A")
+    account.balance = 500
+    account.positions["X"] = Position(symbol="X", amount=2.0, avg_price=10.0)
+    pos = account.positions["X"]
+    pos.amount += 1.0
+    assert account.positions["X"].amount == 3.0
+    assert account.total_value == 530.0
+    assert account.get_total_value({"X": 20.0}) == 560.0
+
+    # 删除后仍可读取 (execute_order 在 del 之后读取 pos.avg_price)
+    del account.positions["X"]
+    assert pos.avg_price == 10.0 and "X" not in account.positions
+
+    # 历史写入 / 截断
+    for i in range(120):
+        account.pnl_history.append(float(i))
+    assert len(account.pnl_history) == 100 and account.pnl_history[0] == 20.0
+    account.pnl_history = account.pnl_history[-10:]
+    assert list(account.pnl_history) == [float(i) for i in range(110, 120)]
+
+    # 外部构造的 AgentAccount 写入时被转存
+    restored = AgentAccount(agent_id="Agent_B", balance=42.0)
+    restored.positions["Y"] = Position(symbol="Y", amount=1.0, avg_price=3.0)
+    engine.accounts["Agent_B"] = restored
+    assert isinstance(engine.accounts["Agent_B"], AccountView)
+    assert engine.accounts["Agent_B"].get_total_value() == 45.0
+
+
+def test_rows_and_slots_are_reused():
+    engine = MatchingEngine(store="columnar")
+    for i in range(10):
+        acc = engine.register_agent(f"Agent_{i}")
+        acc.positions["X"] = Position(symbol="X", amount=1.0, avg_price=1.0)
+    rows, slots = len(engine.store.agent_ids), engine.store._slot_top
+    for i in range(5):
+        engine.accounts.pop(f"Agent_{i}")
+    for i in range(5):
+        acc = engine.register_agent(f"New_{i}")
+        acc.positions["Y"] = Position(symbol="Y", amount=1.0, avg_price=1.0)
+    assert len(engine.store.agent_ids) == rows
+    assert engine.store._slot_top == slots
+    assert len(engine.get_leaderboard()) == 10
+
+    # 删除后仍被持有的视图保留删除时的数值，写入不影响复用该行的新账户
+    stale = engine.accounts["Agent_5"]
+    stale_row = engine.store.rows["Agent_5"]
+    engine.accounts.pop("Agent_5")
+    fresh = engine.register_agent("Fresh")
+    assert engine.store.rows["Fresh"] == stale_row
+    stale.balance = 1.0
+    stale.positions["Z"] = Position(symbol="Z", amount=9.0, avg_price=9.0)
+    assert fresh.balance != 1.0 and set(fresh.positions) == set()
+    assert set(stale.positions) == {"X", "Z"}
+    assert stale.get_total_value() == 1.0 + 1.0 + 81.0
+
+def run_all_tests():
+    tests = [
+        test_columnar_matches_dict_backend,
+        test_view_api_compat,
+        test_rows_and_slots_are_reused,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,127 @@
+"""
+🧪 Attribution Analyzer - Test Suite
+
+测试流式归因统计：
+1. 累计统计 (Welford) 与逐笔重算一致，analyze() / generate_hot_patch() 输出不变
+2. 滚动时间窗口按桶滑出，"epoch" 窗口在 start_epoch 后清零
+3. 待复盘 BUY 按到期时间出堆：未到期不复盘，缺价格留到下次，过期丢弃，队列有上限
+"""
+
+import statistics
+import sys
+import os
+from datetime import datetime, timedelta
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from attribution import AttributionAnalyzer, RollingStats, RunningStats
+
+
+def trade(side, symbol, tags, pnl=None, price=1.0, when=None):
+    return {"agent_id": "A", "symbol": symbol, "side": side, "amount": 1, "price": price, "value": price,
+            "reason": tags, "time": (when or datetime.now()).isoformat(), "trade_pnl": pnl}
+
+
+def test_running_stats_matches_batch():
+    samples = [5.0, -2.5, 12.0, 0.0, 7.25, -9.0, 3.0]
+    stats = RunningStats()
+    for x in samples:
+        stats.add(x)
+    assert abs(stats.mean - statistics.mean(samples)) < 1e-9
+    assert abs(stats.variance - statistics.variance(samples)) < 1e-9
+    assert stats.wins == 4
+
+    left, right = RunningStats(), RunningStats()
+    for x in samples[:3]:
+        left.add(x)
+    for x in samples[3:]:
+        right.add(x)
+    left.merge(right)
+    assert left.count == 7 and abs(left.m2 - stats.m2) < 1e-9
+
+
+def test_analyze_output_unchanged():
+    analyzer = AttributionAnalyzer()
+    pnls = [8.0, 6.0, 9.0, -1.0, 7.0]
+    for pnl in pnls:
+        analyzer.record_trade(trade("SELL", "PEPE", ["TAKE_PROFIT"], pnl))
+    for pnl in [-5.0, -4.0, 1.0]:
+        analyzer.record_trade(trade("SELL", "WIF", ["STOP_LOSS"], pnl))
+
+    report = analyzer.analyze()
+    assert report["total_trades"] == 8
+    assert report["tag_stats"]["TAKE_PROFIT"] == {
+        "total_trades": 5, "winning_trades": 4, "avg_pnl": round(sum(pnls) / 5, 2),
+        "win_rate": 80.0, "status": "EFFECTIVE", "weight": 1.0,
+    }
+    assert report["top_performers"][0]["tag"] == "TAKE_PROFIT"
+    assert report["bottom_performers"][-1]["tag"] == "STOP_LOSS"
+    assert analyzer.generate_hot_patch() == {"boost": ["TAKE_PROFIT"], "penalize": ["STOP_LOSS"]}
+
+
+def test_rolling_windows_and_epoch():
+    window = RollingStats(3600, buckets=60)
+    window.add(0, 1.0)
+    window.add(1800, 3.0)
+    assert window.snapshot(1800).count == 2
+    assert window.snapshot(3600 + 30).count == 1  # 第一个桶滑出
+    assert window.snapshot(7200).count == 0 and not window.buckets
+
+    analyzer = AttributionAnalyzer()
+    now = datetime.now()
+    analyzer.record_trade(trade("SELL", "PEPE", ["MOMENTUM"], 4.0, when=now - timedelta(hours=3)))
+    analyzer.record_trade(trade("SELL", "PEPE", ["MOMENTUM"], 2.0, when=now))
+    assert analyzer.window_report("1h")["MOMENTUM"]["total_trades"] == 1
+    assert analyzer.window_report("1d")["MOMENTUM"]["avg_pnl"] == 3.0
+    assert analyzer.window_report("epoch")["MOMENTUM"]["std_pnl"] == round(2 ** 0.5, 2)
+
+    analyzer.start_epoch()
+    assert analyzer.window_report("epoch") == {}
+    assert analyzer.analyze()["tag_stats"]["MOMENTUM"]["total_trades"] == 2  # 累计统计不受影响
+
+
+def test_pending_review_heap():
+    analyzer = AttributionAnalyzer(review_interval=600, pending_limit=3)
+    now = datetime.now()
+    analyzer.record_trade(trade("BUY", "PEPE", ["BREAKOUT"], price=1.0, when=now - timedelta(seconds=700)))
+    analyzer.record_trade(trade("BUY", "WIF", ["DIP_BUY"], price=2.0, when=now - timedelta(seconds=650)))
+    analyzer.record_trade(trade("BUY", "PEPE", ["BREAKOUT"], price=1.0, when=now))
+
+    prices = {"PEPE": 1.1}
+    assert analyzer.review_pending_trades(prices, now=now.timestamp()) == 1
+    assert analyzer.tag_performance["BREAKOUT"].total_trades == 1
+    assert abs(analyzer.tag_performance["BREAKOUT"].avg_pnl - 10.0) < 1e-9
+    assert len(analyzer.pending) == 2  # WIF 缺价格留到下次 + 未到期的 PEPE
+
+    # 超过到期时间一个 review_interval 仍缺价格 → 过期丢弃
+    assert analyzer.review_pending_trades(prices, now=now.timestamp() + 560) == 0
+    assert len(analyzer.pending) == 1 and analyzer.dropped_pending == 1
+
+    for i in range(4):
+        analyzer.record_trade(trade("BUY", "PEPE", ["BREAKOUT"], when=now + timedelta(seconds=i)))
+    assert len(analyzer.pending) == 3 and analyzer.dropped_pending == 3
+
+
+def run_all_tests():
+    tests = [
+        test_running_stats_matches_batch,
+        test_analyze_output_unchanged,
+        test_rolling_windows_and_epoch,
+        test_pending_review_heap,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,126 @@
+"""
+🧪 Backtest Sweep - Test Suite
+
+测试批量策略回测：
+1. 实盘接口策略 (on_price_update) 改写后在沙盒里下单
+2. 多个策略在同一组场景上并行回测，按综合评分排名，失败的策略排在最后
+3. 相同 seed 的两次批量回测结果一致；独立解释器模式返回相同结构
+"""
+
+import asyncio
+import sys
+import os
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from backtest_sweep import adapt_live_strategy, evaluate_strategy, run_sweep, sweep_in_subprocess
+
+# 实盘接口：买入金额是美元
+LIVE_STRATEGY = """
+from typing import Dict
+
+class MyStrategy:
+    def __init__(self):
+        self.last: Dict[str, float] = {}
+
+    def on_price_update(self, prices: dict):
+        for symbol, data in prices.items():
+            last = self.last.get(symbol)
+            self.last[symbol] = data["priceUsd"]
+            if last and data["priceUsd"] > last * 1.01 and data["liquidity"] > 0:
+                print("chasing", symbol)
+                return {"symbol": symbol, "side": "buy", "amount": 100.0}
+        return None
+"""
+
+IDLE_STRATEGY = """
+class MyStrategy:
+    def __init__(self):
+        pass
+
+    def on_tick(self, market_data):
+        return []
+"""
+
+BROKEN_STRATEGY = """
+class MyStrategy:
+    def __init__(self):
+        pass
+
+    def on_tick(self, market_data):
+        return market_data['missing']
+"""
+
+FORBIDDEN_STRATEGY = """
+import os
+
+class MyStrategy:
+    def __init__(self):
+        pass
+
+    def on_tick(self, market_data):
+        return []
+"""
+
+
+def test_adapted_live_strategy_trades():
+    code = adapt_live_strategy(LIVE_STRATEGY)
+    assert "typing" not in code and "def on_tick" in code
+
+    row = evaluate_strategy("live", LIVE_STRATEGY, rounds=3, ticks=50, seed=1)
+    assert row.status == "ok", row.error
+    assert len(row.round_pnls) == 3
+    assert any(p != 0 for p in row.round_pnls)  # 决策被转换成了沙盒订单
+
+
+def test_sweep_ranks_population():
+    strategies = {
+        "live": LIVE_STRATEGY,
+        "idle": IDLE_STRATEGY,
+        "broken": BROKEN_STRATEGY,
+        "forbidden": FORBIDDEN_STRATEGY,
+    }
+    rows = run_sweep(strategies, rounds=3, ticks=50, seed=7, fixture=None, workers=2)
+    assert [row.rank for row in rows] == [1, 2, 3, 4]
+    by_name = {row.name: row for row in rows}
+    assert by_name["broken"].status == "failed"
+    assert by_name["forbidden"].status == "rejected"
+    assert {row.name for row in rows[:2]} == {"live", "idle"}
+    assert rows[0].composite_score >= rows[1].composite_score
+
+    again = run_sweep({"live": LIVE_STRATEGY}, rounds=3, ticks=50, seed=7, fixture=None, workers=1)
+    assert again[0].round_pnls == by_name["live"].round_pnls  # 同一 seed → 同一组路径
+
+
+def test_sweep_in_subprocess():
+    rows = asyncio.run(sweep_in_subprocess(
+        {"live": LIVE_STRATEGY, "idle": IDLE_STRATEGY}, timeout=60,
+        rounds=2, ticks=30, seed=3, fixture=None, workers=2,
+    ))
+    assert len(rows) == 2
+    assert all(row.status == "ok" for row in rows)
+    assert sorted(row.rank for row in rows) == [1, 2]
+
+
+def run_all_tests():
+    tests = [
+        test_adapted_live_strategy_trades,
+        test_sweep_ranks_population,
+        test_sweep_in_subprocess,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,221 @@
+"""
+🧪 Council Store - Test Suite
+
+测试议事厅归档与分页：
+1. CouncilArchive 按稀疏偏移 seek 读取任意区间，重开目录后索引仍在
+2. 内存只保留最近 hot_sessions 个会话，更早的会话溢出到归档；归档的 Epoch 又收到消息时读回内存
+3. page / recent 游标分页跨越内存与归档
+4. 恢复时使用持久化的贡献值聚合，不再重放全部消息
+5. 格式错误或为负数的游标抛出 InvalidCursor
+6. 事件循环中的溢出在后台线程写入，写完前会话仍可读；写入期间会话有变化则作废这份归档
+7. 删除 Agent 时热会话与归档文件里的发言都被删除，重开目录后仍不可见
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from council import Council, InvalidCursor, MessageRole
+from council_store import CouncilArchive
+
+
+def make_council(directory: str, hot_sessions: int = 2) -> Council:
+    return Council(llm_scoring=False, archive_dir=directory, hot_sessions=hot_sessions)
+
+
+def fill(council: Council, epochs, per_epoch: int):
+    async def run():
+        for epoch in epochs:
+            council.start_session(epoch, winner_id=f"W{epoch}")
+            await council.submit_message(epoch, f"W{epoch}", MessageRole.WINNER, f"epoch {epoch} winning move")
+            for i in range(per_epoch - 1):
+                await council.submit_message(epoch, f"A{i % 3}", MessageRole.INSIGHT, f"e{epoch} note {i}")
+            council.close_session(epoch)
+        await council.flush_archive()
+
+    asyncio.run(run())
+
+
+def test_archive_seek_and_reopen():
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = CouncilArchive(tmp, stride=4)
+        rows = [[i, "A", "insight", f"msg {i} 中文", "2024-01-01T00:00:00", float(i)] for i in range(10)]
+        archive.write(7, "W", rows)
+        assert archive.read(7, 5, 3) == rows[5:8]
+        assert archive.read(7, 8) == rows[8:]
+        assert archive.read(7, 10) == [] and archive.read(8) == []
+        assert archive.index[7]["offsets"][0] == 0 and len(archive.index[7]["offsets"]) == 3
+
+        reopened = CouncilArchive(tmp, stride=4)
+        assert 7 in reopened and reopened.count(7) == 10 and reopened.winner(7) == "W"
+        reopened.remove(7)
+        assert 7 not in CouncilArchive(tmp) and not os.path.exists(os.path.join(tmp, "epoch_7.jsonl"))
+
+
+def test_spill_keeps_recent_sessions_hot():
+    with tempfile.TemporaryDirectory() as tmp:
+        council = make_council(tmp, hot_sessions=2)
+        fill(council, range(1, 6), per_epoch=5)
+        assert sorted(council.sessions) == [4, 5]
+        assert council.archive.epochs() == [1, 2, 3]
+        assert council.spilled == {1, 2, 3} and not council.dirty_sessions & {1, 2, 3}
+        assert council.epochs() == [1, 2, 3, 4, 5]
+        assert council.get_winner_wisdom(2) == "epoch 2 winning move"
+        assert council.message_count == 25
+
+        # 已归档的 Epoch 又收到消息：读回内存，之后重新溢出
+        asyncio.run(council.submit_message(1, "Late", MessageRole.INSIGHT, "late reply"))
+        assert 1 in council.sessions and 1 not in council.archive
+        assert council.message_total(1) == 6
+        council.spill()
+        assert council.archive.count(1) == 6 and 1 not in council.sessions
+
+        # 重启：消息序号从归档继续
+        assert make_council(tmp).message_count == 6 + 5 + 5
+
+
+def test_page_and_recent_cursors():
+    with tempfile.TemporaryDirectory() as tmp:
+        council = make_council(tmp, hot_sessions=1)
+        fill(council, range(1, 4), per_epoch=5)
+
+        for epoch in (1, 3):  # 归档会话与内存会话同一套游标
+            seen, cursor = [], None
+            while True:
+                page = council.page(epoch, cursor=cursor, limit=2)
+                seen.extend(m["id"] for m in page["messages"])
+                assert page["total"] == 5
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            assert len(seen) == 5 and seen == sorted(seen)
+
+        seen, cursor = [], None
+        while True:
+            page = council.recent(limit=4, cursor=cursor)
+            seen.extend((m["epoch"], m["id"]) for m in page["messages"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert len(seen) == 15
+        assert seen == sorted(seen, reverse=True)
+
+
+def test_restore_uses_persisted_scores():
+    with tempfile.TemporaryDirectory() as tmp:
+        council = make_council(tmp, hot_sessions=2)
+        fill(council, range(1, 4), per_epoch=3)
+        data = council.serialize_sessions()
+        scores = dict(council.contribution_scores)
+        assert sorted(int(e) for e in data) == [2, 3]
+
+        restored = make_council(tmp, hot_sessions=2)
+        restored.restore_sessions({**data, "1": data["2"]}, scores=scores)  # Redis 中残留的已归档会话被忽略
+        assert restored.contribution_scores == scores
+        assert sorted(restored.sessions) == [2, 3] and restored.current_epoch == 3
+        assert restored.message_count == 9
+        assert restored.page(1)["total"] == 3  # 来自归档而不是 Redis 残留
+
+        legacy = make_council(tmp, hot_sessions=2)
+        legacy.restore_sessions(data)  # 旧数据没有聚合：只能由内存会话重新累加
+        assert abs(sum(legacy.contribution_scores.values())
+                   - sum(m.score for s in legacy.sessions.values() for m in s.messages)) < 1e-9
+        assert legacy.drain_dirty_scores() == legacy.contribution_scores
+
+
+def test_invalid_cursors_rejected():
+    council = Council(llm_scoring=False)
+    fill(council, range(1, 3), per_epoch=3)
+    for cursor in ("abc", "-1", "1.5"):
+        try:
+            council.page(1, cursor=cursor)
+            assert False, f"page accepted {cursor!r}"
+        except InvalidCursor:
+            pass
+    for cursor in ("2", "x:1", "2:-1", "-2:1", "2:"):
+        try:
+            council.recent(cursor=cursor)
+            assert False, f"recent accepted {cursor!r}"
+        except InvalidCursor:
+            pass
+    # 越界的位置按会话长度截断
+    assert [m["id"] for m in council.recent(limit=10, cursor="2:99")["messages"]] == \
+        [m["id"] for m in council.recent(limit=10)["messages"]]
+
+
+def test_spill_writes_in_background():
+    with tempfile.TemporaryDirectory() as tmp:
+        council = make_council(tmp, hot_sessions=1)
+
+        async def run():
+            council.start_session(1, winner_id="W1")
+            await council.submit_message(1, "W1", MessageRole.WINNER, "first")
+            council.start_session(2, winner_id="W2")
+            # 写入在后台线程进行：会话仍在内存中可读，尚未出现在归档索引
+            assert 1 in council.sessions and 1 not in council.archive
+            assert council.page(1)["total"] == 1
+            await council.flush_archive()
+            assert 1 not in council.sessions and council.archive.count(1) == 1
+            assert council.spilled == {1}
+
+            # 写入期间又收到消息：保留内存会话并作废归档，下次溢出写入完整内容
+            council.start_session(3, winner_id="W3")
+            await council.submit_message(2, "Late", MessageRole.INSIGHT, "late reply")
+            await council.flush_archive()
+            assert 2 in council.sessions and 2 not in council.archive
+            council.spill()
+            await council.flush_archive()
+            assert 2 not in council.sessions and council.archive.count(2) == 1
+
+        asyncio.run(run())
+
+
+def test_delete_agent_scrubs_archive():
+    with tempfile.TemporaryDirectory() as tmp:
+        council = make_council(tmp)
+        fill(council, range(1, 6), per_epoch=7)  # 每个 Epoch: 1 条赢家 + A0/A1/A2 各 2 条
+        assert council.archive.epochs() == [1, 2, 3] and sorted(council.sessions) == [4, 5]
+
+        removed = asyncio.run(council.delete_agent("A1"))
+        assert removed == 10
+        assert "A1" not in council.contribution_scores
+        for epoch in range(1, 6):
+            page = council.page(epoch)
+            assert page["total"] == 5 and all(m["agent_id"] != "A1" for m in page["messages"])
+        assert all(m["agent_id"] != "A1" for m in council.recent(limit=100)["messages"])
+        assert council.get_winner_wisdom(2) == "epoch 2 winning move"  # 其他人的发言与赢家不变
+
+        reopened = CouncilArchive(tmp)
+        assert reopened.count(1) == 5 and all(row[1] != "A1" for row in reopened.read(1))
+        assert CouncilArchive(tmp).remove_agent("A1") == 0  # 没有可删的消息时不重写
+
+
+def run_all_tests():
+    tests = [
+        test_archive_seek_and_reopen,
+        test_spill_keeps_recent_sessions_hot,
+        test_page_and_recent_cursors,
+        test_restore_uses_persisted_scores,
+        test_invalid_cursors_rejected,
+        test_spill_writes_in_background,
+        test_delete_agent_scrubs_archive,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
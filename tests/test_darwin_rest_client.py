@@ -0,0 +1,157 @@
+"""
+🧪 darwin_rest_client - Test Suite
+
+测试 REST 客户端：
+1. 同步客户端复用 Session，trade_batch 一次请求发送全部订单
+2. 异步客户端读请求遇到 503 / 连接错误时退避重试，Retry-After 优先
+3. 异步客户端下单只在服务端不可能已执行时重试 (429 / 连接失败)，下单超时直接抛出；Council 发言等写请求同样处理
+"""
+
+import asyncio
+import sys
+import os
+
+# 添加 skill-package/darwin-trader 到路径
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "skill-package", "darwin-trader"))
+
+from darwin_rest_client import AsyncDarwinRestClient, DarwinRestClient, aiohttp
+
+
+class FakeResponse:
+    def __init__(self, status, body=None, headers=None):
+        self.status = status
+        self.status_code = status
+        self.body = body
+        self.headers = headers or {}
+        self.text = str(body)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def json(self, content_type=None):
+        return self.body
+
+
+class FakeSyncResponse(FakeResponse):
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """按顺序返回预置的响应或抛出预置的异常，并记录请求"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+        self.closed = False
+
+    def _next(self, method, url, json):
+        self.calls.append((method, url, json))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def request(self, method, url, json=None, headers=None):
+        return self._next(method, url, json)
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        return self._next("POST", url, json)
+
+
+def make_client(outcomes):
+    client = AsyncDarwinRestClient("A", "dk_test", base_url="http://arena", retries=2, backoff=0.001)
+    client._session = FakeSession(outcomes)
+    return client
+
+
+def test_sync_batch_uses_session():
+    client = DarwinRestClient("A", "dk_test", base_url="http://arena")
+    client.session = FakeSession([FakeSyncResponse(200, {"success": True, "results": [{}, {}]})])
+    result = client.trade_batch([
+        {"symbol": "PEPE", "side": "buy", "amount": 100, "reason": ["MOMENTUM"]},
+        {"symbol": "WIF", "side": "sell", "amount": 10, "chain": "solana"},
+    ])
+    assert result["success"] and len(client.session.calls) == 1
+    method, url, body = client.session.calls[0]
+    assert url == "http://arena/api/trades/batch"
+    assert [o["side"] for o in body["orders"]] == ["BUY", "SELL"]
+    assert body["orders"][1]["chain"] == "solana" and body["orders"][1]["reason"] == []
+
+
+def test_reads_retry_with_backoff():
+    async def run():
+        client = make_client([
+            FakeResponse(503),
+            aiohttp.ClientConnectionError("reset"),
+            FakeResponse(200, {"balance": 900}),
+        ])
+        status = await client.get_status()
+        assert status == {"balance": 900}
+        assert client.stats() == {"requests": 3, "retries": 2}
+
+        client = make_client([FakeResponse(502)] * 3)
+        status = await client.get_status()
+        assert status["error"].startswith("HTTP 502")  # 重试耗尽后返回最后的响应
+
+    asyncio.run(run())
+
+    client = make_client([])
+    assert client._backoff_delay(0, "2") == 2.0
+    assert client._backoff_delay(0, "120") == client.max_backoff
+    assert all(0 <= client._backoff_delay(3) <= client.backoff * 8 for _ in range(20))
+
+
+def test_orders_retry_only_when_not_executed():
+    async def run():
+        client = make_client([
+            FakeResponse(429, {"detail": "queue_full"}, {"Retry-After": "0"}),
+            FakeResponse(200, {"success": True, "results": [{"success": True}]}),
+        ])
+        result = await client.trade_batch([{"symbol": "PEPE", "side": "BUY", "amount": 100}])
+        assert result["success"] and len(client._session.calls) == 2
+
+        # 504 可能已在服务端成交：下单不重试
+        client = make_client([FakeResponse(504, "gateway timeout")])
+        result = await client.trade("PEPE", "BUY", 100)
+        assert not result["success"] and len(client._session.calls) == 1
+
+        client = make_client([asyncio.TimeoutError()])
+        try:
+            await client.trade("PEPE", "BUY", 100)
+            assert False, "timeout should propagate for orders"
+        except asyncio.TimeoutError:
+            pass
+        assert len(client._session.calls) == 1
+
+        # Council 发言也是写请求：502 时可能已入库，不重试
+        client = make_client([FakeResponse(502, "bad gateway"), FakeResponse(200, {"success": True})])
+        result = await client.council_share("insight")
+        assert not result["success"] and len(client._session.calls) == 1
+
+    asyncio.run(run())
+
+
+def run_all_tests():
+    tests = [
+        test_sync_batch_uses_session,
+        test_reads_retry_with_backoff,
+        test_orders_retry_only_when_not_executed,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
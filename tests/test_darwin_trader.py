@@ -0,0 +1,147 @@
+"""
+🧪 darwin_trader WebSocket Client - Test Suite
+
+测试客户端的请求多路复用：
+1. 并发的 darwin_trade / darwin_status 各自按 id 拿到自己的回执 (服务端乱序回复)
+2. darwin_trade_batch 发送一条 orders 消息，逐笔结果在一帧中返回
+3. 旧服务端不回传 id 时按回执类型匹配最早的请求；不带 id 的 error 交给最早的在途请求
+4. 连接断开时在途请求立即失败
+"""
+
+import asyncio
+import sys
+import os
+
+# 添加 skill-package/darwin-trader 到路径
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "skill-package", "darwin-trader"))
+
+import darwin_trader
+
+
+class FakeSocket:
+    """记录发出的请求；回执由测试通过 _resolve_response 注入 (代替监听任务)"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self.arrived = asyncio.Event()
+
+    async def send_json(self, message):
+        self.sent.append(message)
+        self.arrived.set()
+
+
+def connect(socket):
+    darwin_trader.ws_connection = socket
+    darwin_trader.pending_requests.clear()
+    darwin_trader.agent_state.update({"connected": True, "balance": 1000, "positions": {}})
+
+
+async def wait_sent(socket, n):
+    while len(socket.sent) < n:
+        socket.arrived.clear()
+        await socket.arrived.wait()
+
+
+def test_concurrent_requests_matched_by_id():
+    async def run():
+        socket = FakeSocket()
+        connect(socket)
+        calls = asyncio.gather(
+            darwin_trader.darwin_trade("buy", "PEPE", 100, "MOMENTUM"),
+            darwin_trader.darwin_status(),
+            darwin_trader.darwin_trade("buy", "WIF", 50),
+        )
+        task = asyncio.ensure_future(calls)
+        await wait_sent(socket, 3)
+        ids = [m["id"] for m in socket.sent]
+        assert len(set(ids)) == 3 and len(darwin_trader.pending_requests) == 3
+
+        # 服务端乱序回复
+        darwin_trader._resolve_response({"type": "order_result", "id": ids[2], "success": True,
+                                         "fill_price": 2.0, "balance": 850, "positions": {}})
+        darwin_trader._resolve_response({"type": "state", "id": ids[1], "balance": 850, "positions": {}, "pnl": 0})
+        darwin_trader._resolve_response({"type": "order_result", "id": ids[0], "success": True,
+                                         "fill_price": 0.5, "balance": 850, "positions": {}})
+        pepe, status, wif = await task
+        assert pepe["symbol"] == "PEPE" and pepe["quantity"] == 200
+        assert wif["symbol"] == "WIF" and wif["quantity"] == 25
+        assert status["status"] == "success" and status["balance"] == 850
+        assert not darwin_trader.pending_requests
+
+    asyncio.run(run())
+
+
+def test_batch_orders_single_frame():
+    async def run():
+        socket = FakeSocket()
+        connect(socket)
+        task = asyncio.ensure_future(darwin_trader.darwin_trade_batch([
+            {"action": "buy", "symbol": "PEPE", "amount": 100, "reason": "MOMENTUM"},
+            {"action": "sell", "symbol": "WIF", "amount": 10},
+        ]))
+        await wait_sent(socket, 1)
+        request = socket.sent[0]
+        assert request["type"] == "orders" and [o["side"] for o in request["orders"]] == ["BUY", "SELL"]
+        darwin_trader._resolve_response({
+            "type": "orders_result", "id": request["id"], "success": False,
+            "results": [{"success": True, "fill_price": 0.5, "message": "ok"},
+                        {"success": False, "fill_price": 0.0, "message": "Insufficient position to sell"}],
+            "balance": 900, "positions": {"PEPE": {"amount": 200}},
+        })
+        result = await task
+        assert result["status"] == "partial" and result["balance"] == 900
+        assert result["results"][0]["quantity"] == 200 and result["results"][1]["status"] == "error"
+
+        bad = await darwin_trader.darwin_trade_batch([{"action": "hold", "symbol": "PEPE", "amount": 1}])
+        assert bad["status"] == "error" and len(socket.sent) == 1  # 本地校验失败不发送
+
+    asyncio.run(run())
+
+
+def test_legacy_server_and_disconnect():
+    async def run():
+        socket = FakeSocket()
+        connect(socket)
+        first = asyncio.ensure_future(darwin_trader.darwin_status())
+        second = asyncio.ensure_future(darwin_trader.darwin_trade("buy", "PEPE", 100))
+        await wait_sent(socket, 2)
+        # 旧服务端：回执不带 id，按类型匹配
+        darwin_trader._resolve_response({"type": "order_result", "success": True, "fill_price": 1.0,
+                                         "balance": 900, "positions": {}})
+        assert (await second)["status"] == "success" and not first.done()
+
+        # 不带 id 的 error (如服务端解析失败) 交给最早的在途请求，而不是让它等到超时
+        third = asyncio.ensure_future(darwin_trader.darwin_trade("sell", "PEPE", 50))
+        await wait_sent(socket, 3)
+        darwin_trader._resolve_response({"type": "error", "message": "Invalid JSON"})
+        status = await first
+        assert status["status"] == "error" and "Invalid JSON" in status["message"] and not third.done()
+
+        darwin_trader._fail_pending("WebSocket connection closed")
+        result = await third
+        assert result["status"] == "error" and "closed" in result["message"]
+
+    asyncio.run(run())
+
+
+def run_all_tests():
+    tests = [
+        test_concurrent_requests_matched_by_id,
+        test_batch_orders_single_frame,
+        test_legacy_server_and_disconnect,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
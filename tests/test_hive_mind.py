@@ -0,0 +1,143 @@
+"""
+🧪 Hive Mind - Test Suite
+
+测试增量归因：
+1. 引擎写入成交即更新标签 / 币种 / 组合统计，报告在没有新成交时走缓存
+2. 回看窗口按成交笔数滑动，滑出窗口的 SELL 贡献被减掉，入场 BUY 过期
+3. 趋势按时间窗口比较 (最近窗口 vs 前一个窗口)
+4. 创建时用引擎已有的成交回灌
+5. 出错的成交观察者被记录并跳过，不影响成交入库与其他观察者
+"""
+
+import sys
+import os
+from datetime import datetime, timedelta
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from hive_mind import HiveMind
+from matching import MatchingEngine
+
+
+def buy(agent, symbol, tags, when=None):
+    return {"time": (when or datetime.now()).isoformat(), "agent_id": agent, "symbol": symbol,
+            "side": "BUY", "reason": tags, "trade_pnl": None}
+
+
+def sell(agent, symbol, pnl, tags=None, when=None):
+    return {"time": (when or datetime.now()).isoformat(), "agent_id": agent, "symbol": symbol,
+            "side": "SELL", "reason": tags or [], "trade_pnl": pnl}
+
+
+def test_incremental_attribution():
+    engine = MatchingEngine()
+    hive = HiveMind(engine)
+
+    engine.record_trade(buy("A", "PEPE", ["MOMENTUM", "BREAKOUT"]))
+    engine.record_trade(sell("A", "PEPE", 5.0, ["TAKE_PROFIT", "PNL_5"]))
+    engine.record_trade(buy("A", "PEPE", ["MOMENTUM", "BREAKOUT"]))
+    engine.record_trade(sell("A", "PEPE", 3.0, ["TAKE_PROFIT"]))
+    engine.record_trade(buy("B", "WIF", ["DIP_BUY"]))
+    engine.record_trade(sell("B", "WIF", -4.0, ["STOP_LOSS"]))
+
+    report = hive.analyze_alpha()
+    assert report["MOMENTUM"]["trades"] == 2 and report["MOMENTUM"]["win_rate"] == 100.0
+    assert report["MOMENTUM"]["by_token"]["PEPE"]["avg_pnl"] == 4.0
+    assert report["TAKE_PROFIT"]["trades"] == 2
+    assert "PNL_5" not in report and "DIP_BUY" not in report  # 信息标签跳过；样本不足不报告
+    assert report["_meta"]["best_combos"][0]["combo"] == ["BREAKOUT", "MOMENTUM"]
+    assert hive.get_agent_profile("A") == {"MOMENTUM": 2, "BREAKOUT": 2}
+
+    assert hive.analyze_alpha() is report  # 没有新成交 → 缓存
+    engine.record_trade(sell("B", "WIF", -2.0))
+    assert hive.analyze_alpha()["DIP_BUY"]["trades"] == 2
+
+
+def test_lookback_window_eviction():
+    engine = MatchingEngine()
+    hive = HiveMind(engine, lookback=4)
+
+    engine.record_trade(buy("A", "PEPE", ["MOMENTUM"]))
+    engine.record_trade(sell("A", "PEPE", 1.0))
+    engine.record_trade(sell("A", "PEPE", 2.0))
+    assert hive.tag_stats["MOMENTUM"]["trades"] == 2
+
+    engine.record_trade(buy("B", "WIF", ["DIP_BUY"]))
+    engine.record_trade(sell("A", "PEPE", 3.0))  # BUY 滑出窗口，这笔没有入场标签
+    assert hive.tag_stats["MOMENTUM"]["trades"] == 2
+    assert ("A", "PEPE") not in hive._last_buy
+
+    engine.record_trade(sell("B", "WIF", 1.0))
+    engine.record_trade(sell("B", "WIF", 1.0))  # 两笔 MOMENTUM 的 SELL 都已滑出
+    assert "MOMENTUM" not in hive.tag_stats and "MOMENTUM" not in hive.tag_by_token
+    assert hive.get_agent_profile("A") == {}
+    assert hive.tag_stats["DIP_BUY"]["trades"] == 2
+
+
+def test_time_window_trend():
+    engine = MatchingEngine()
+    hive = HiveMind(engine, trend_window=600)
+    now = datetime.now()
+    for i in range(5):
+        engine.record_trade(buy("A", "PEPE", ["MOMENTUM"], when=now - timedelta(seconds=1000 - i)))
+        engine.record_trade(sell("A", "PEPE", 1.0, when=now - timedelta(seconds=900 - i)))
+    for i in range(5):
+        engine.record_trade(buy("A", "PEPE", ["MOMENTUM"], when=now - timedelta(seconds=300 - i)))
+        engine.record_trade(sell("A", "PEPE", 4.0, when=now - timedelta(seconds=200 - i)))
+    assert hive.analyze_alpha()["MOMENTUM"]["recent_trend"] == "improving"
+
+    # 超过两个窗口的样本被丢弃
+    engine.record_trade(sell("A", "PEPE", 4.0, when=now + timedelta(seconds=1200)))
+    assert all(ts > now.timestamp() for ts, _ in hive.tag_history["MOMENTUM"])
+
+
+def test_backfill_from_engine():
+    engine = MatchingEngine()
+    engine.record_trade(buy("A", "PEPE", ["MOMENTUM"]))
+    engine.record_trade(sell("A", "PEPE", 2.0))
+    engine.record_trade(sell("A", "PEPE", -1.0))
+
+    hive = HiveMind(engine)
+    assert hive.tag_stats["MOMENTUM"] == {"wins": 1, "losses": 1, "total_pnl": 1.0, "trades": 2}
+    hive.reset()
+    assert not hive.tag_stats and hive.analyze_alpha().keys() == {"_meta"}
+
+
+def test_failing_observer_is_isolated():
+    engine = MatchingEngine()
+
+    def broken(trade):
+        raise KeyError("boom")
+
+    engine.trade_observers.append(broken)
+    hive = HiveMind(engine)
+    engine.record_trade(buy("A", "PEPE", ["MOMENTUM"]))
+    engine.record_trade(sell("A", "PEPE", 1.0))
+    assert len(engine.trade_history) == 2 and engine.observer_errors == 2
+    assert hive.get_agent_profile("A") == {"MOMENTUM": 1}
+
+
+def run_all_tests():
+    tests = [
+        test_incremental_attribution,
+        test_lookback_window_eviction,
+        test_time_window_trend,
+        test_backfill_from_engine,
+        test_failing_observer_is_isolated,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
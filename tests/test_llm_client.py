@@ -0,0 +1,143 @@
+"""
+🧪 LLM Client - Test Suite
+
+测试 llm_client 的连接池 / 限流 / 对冲请求 (通过本地 LLM 桩服务)：
+1. 每个 provider 复用一个长连接 client
+2. 令牌桶：超过速率的调用排队等待，超过截止时间才放弃 (排在别人后面等锁也计入截止时间)
+3. 主 provider 超过近期 p95 未返回时对冲到下一个 provider，先返回者胜出
+4. 每个 provider 的延迟直方图 / 错误计数
+"""
+
+import asyncio
+import sys
+import os
+import time
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import llm_client
+from llm_client import LLMProvider, TokenBucket, call_llm, llm_stats
+from llm_stub_server import LLMStubServer
+
+
+def use_providers(*providers):
+    saved = list(llm_client._providers)
+    llm_client._providers[:] = list(providers)
+    return saved
+
+
+def test_pooled_client_reused():
+    async def run(stub):
+        provider = LLMProvider("stub", stub.url, "stub-model", "key", api_format="openai")
+        saved = use_providers(provider)
+        try:
+            assert await call_llm([{"role": "user", "content": "hi"}], max_retries=0) == "OK"
+            client = provider.client
+            assert await call_llm([{"role": "user", "content": "again"}], max_retries=0) == "OK"
+            assert provider.client is client
+            await llm_client.close_clients()
+            assert provider._client is None
+        finally:
+            llm_client._providers[:] = saved
+
+    with LLMStubServer() as stub:
+        asyncio.run(run(stub))
+        assert stub.requests == 2
+
+
+def test_token_bucket_queues_with_deadline():
+    async def run():
+        bucket = TokenBucket(capacity=2, window=0.2)  # 10 个/秒
+        assert await bucket.acquire() and await bucket.acquire()
+        start = time.monotonic()
+        assert await bucket.acquire(timeout=1.0)  # 排队等待而不是直接拒绝
+        assert time.monotonic() - start >= 0.05
+        assert not await bucket.acquire(timeout=0.01)  # 截止时间前等不到令牌
+        assert bucket.rejected == 1 and bucket.waiting == 0
+        assert not bucket.try_acquire()
+
+        # 队首等待者持有锁等令牌：后来者按自己的截止时间放弃，而不是等到队首拿到令牌
+        slow = TokenBucket(capacity=1, window=1.0)
+        assert await slow.acquire()
+        head = asyncio.ensure_future(slow.acquire(timeout=5.0))
+        await asyncio.sleep(0)
+        start = time.monotonic()
+        assert not await slow.acquire(timeout=0.05)
+        assert time.monotonic() - start < 0.5 and slow.rejected == 1
+        head.cancel()
+        await asyncio.gather(head, return_exceptions=True)
+        assert not slow._lock.locked() and slow.waiting == 0
+
+    asyncio.run(run())
+
+
+def test_hedge_to_fallback_when_primary_slow():
+    async def run(slow, fast):
+        primary = LLMProvider("primary", slow.url, "m", "k", api_format="openai")
+        backup = LLMProvider("fallback_1", fast.url, "m", "k", api_format="anthropic")
+        for _ in range(llm_client._HEDGE_MIN_SAMPLES):
+            primary.stats.record(0.02)  # 近期 p95 = 20ms
+        saved = use_providers(primary, backup)
+        try:
+            start = time.monotonic()
+            text = await call_llm([{"role": "user", "content": "score"}], max_retries=0)
+            elapsed = time.monotonic() - start
+            await llm_client.close_clients()
+        finally:
+            llm_client._providers[:] = saved
+        return text, elapsed, primary, backup
+
+    with LLMStubServer(delay=0.5, reply="SLOW") as slow, LLMStubServer(reply="FAST") as fast:
+        text, elapsed, primary, backup = asyncio.run(run(slow, fast))
+    assert text == "FAST" and elapsed < 0.4
+    assert primary.stats.hedges == 1 and primary.stats.hedge_wins == 1
+    assert backup.stats.requests == 1 and primary.consecutive_failures == 0
+
+
+def test_stats_histogram():
+    async def run(stub):
+        provider = LLMProvider("stub", stub.url, "stub-model", "key", api_format="openai")
+        saved = use_providers(provider)
+        try:
+            for _ in range(3):
+                await call_llm([{"role": "user", "content": "hi"}], max_retries=0)
+            return llm_stats()["stub"]
+        finally:
+            await llm_client.close_clients()
+            llm_client._providers[:] = saved
+
+    with LLMStubServer() as stub:
+        stats = asyncio.run(run(stub))
+    assert stats["requests"] == 3 and stats["errors"] == 0
+    assert sum(stats["latency_histogram"].values()) == 3
+    assert stats["p95_seconds"] is None  # 样本不足时不对冲
+
+    with LLMStubServer(status=500) as broken:
+        stats = asyncio.run(run(broken))
+    assert stats["errors"] == 3 and not any(stats["latency_histogram"].values())
+
+
+def run_all_tests():
+    tests = [
+        test_pooled_client_reused,
+        test_token_bucket_queues_with_deadline,
+        test_hedge_to_fallback_when_primary_slow,
+        test_stats_histogram,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,123 @@
+"""
+🧪 Market Scenarios - Test Suite
+
+测试沙盒回测行情场景：
+1. 向量化生成的形状，以及 seed 相同 → 路径相同
+2. 价格序列重采样 + mmap 夹具写入 / 加载 / 循环回放
+3. StrategySandbox 使用固定 seed / 夹具时回测结果可复现
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+import numpy as np
+
+from market_scenarios import generate_scenario, load_fixture, resample_series, write_fixture
+from strategy_sandbox import StrategySandbox
+
+MOMENTUM_STRATEGY = """
+class MyStrategy:
+    def __init__(self):
+        self.last = {}
+
+    def on_tick(self, market_data):
+        orders = []
+        for symbol, price in market_data['prices'].items():
+            if symbol in self.last and price > self.last[symbol] * 1.01:
+                orders.append({'symbol': symbol, 'side': 'BUY', 'amount': 5})
+            self.last[symbol] = price
+        return orders
+"""
+
+
+def test_seeded_generation():
+    a = generate_scenario(["A", "B", "C"], rounds=4, ticks=50, seed=7)
+    b = generate_scenario(["A", "B", "C"], rounds=4, ticks=50, seed=7)
+    c = generate_scenario(["A", "B", "C"], rounds=4, ticks=50, seed=8)
+    assert a.prices.shape == (4, 50, 3)
+    assert np.array_equal(a.prices, b.prices)
+    assert not np.array_equal(a.prices, c.prices)
+    assert (a.prices > 0).all()
+
+    tick, prices, market_data = next(a.round(1).frames())
+    assert tick == 0 and prices == market_data['prices']
+    assert prices["A"] == a.prices[1, 0, 0]
+    market_data['prices']["A"] = -1.0  # 策略改动副本不影响成交价
+    assert prices["A"] > 0
+
+
+def test_fixture_roundtrip():
+    with tempfile.TemporaryDirectory() as tmp:
+        series = {
+            "ETH": [(1000.0 + i * 30, 2000.0 + i) for i in range(500)],
+            "SOL": [(1015.0 + i * 60, 100.0 + i * 0.1) for i in range(250)],
+        }
+        volumes = {"ETH": [(1000.0, 50.0), (1010.0, 25.0)]}
+        symbols, prices, traded = resample_series(series, interval=60, volumes=volumes)
+        assert symbols == ["ETH", "SOL"]
+        assert prices.shape[1] == 2
+        # 网格从两个币种都有价格的 1015s 开始；ETH 前值填充取 1000s 那笔
+        assert prices[0, 0] == 2000.0 and prices[0, 1] == 100.0
+        assert prices[1, 0] == 2002.0  # 1075s → ETH 1060s 那笔
+        assert traded[:, 0].sum() == 75.0
+
+        path = os.path.join(tmp, "fixtures", "arena.npy")
+        rounds = write_fixture(path, symbols, prices, ticks_per_round=40, volumes=traded, meta={"source": "test"})
+        assert rounds == prices.shape[0] // 40
+
+        scenario = load_fixture(path)
+        assert isinstance(scenario.prices, np.memmap)
+        assert scenario.symbols == ["ETH", "SOL"] and scenario.meta["source"] == "test"
+        assert load_fixture(path) is scenario  # 同一进程内缓存
+        assert len(scenario.round(rounds)) == 40  # 超出轮数时循环回放
+        first = [p for _, p, _ in scenario.round(0).frames()]
+        again = [p for _, p, _ in scenario.round(rounds).frames()]
+        assert first == again
+
+
+def test_sandbox_reproducible_paths():
+    async def run():
+        results = []
+        for _ in range(2):
+            sandbox = StrategySandbox(backtest_rounds=3, seed=123)
+            results.append(await sandbox.test_strategy(MOMENTUM_STRATEGY))
+        assert results[0].passed, results[0].error_message
+        assert results[0].predicted_pnl == results[1].predicted_pnl
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "replay.npy")
+            source = generate_scenario(["X", "Y"], rounds=1, ticks=300, seed=5)
+            write_fixture(path, ["X", "Y"], source.prices[0], ticks_per_round=100)
+            replay = await StrategySandbox(backtest_rounds=4, fixture=path).test_strategy(MOMENTUM_STRATEGY)
+            assert replay.passed, replay.error_message
+            assert replay.backtest_rounds == 4
+
+    asyncio.run(run())
+
+
+def run_all_tests():
+    tests = [
+        test_seeded_generation,
+        test_fixture_roundtrip,
+        test_sandbox_reproducible_paths,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,143 @@
+"""
+🧪 Merged Views - Test Suite
+
+测试 GroupManager 的跨组合并视图：
+1. 账户索引随注册 / 删除 / 恢复 / 换组同步，与逐组合并结果一致
+2. 价格取最近一次写入，记录来源组；快照按版本缓存
+3. 最近成交环形缓冲按时间新 → 旧，包含从日志恢复的组；重置时清空
+4. 删除 Agent 的成交记录时同时从环形缓冲中剔除，成交视图版本递增
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from group_manager import GroupManager
+from matching import OrderSide
+
+
+def _naive_accounts(gm):
+    merged = {}
+    for group in gm.groups.values():
+        merged.update(group.engine.accounts)
+    return merged
+
+
+def test_accounts_index_tracks_membership():
+    gm = GroupManager()
+    for i in range(120):
+        gm.register_agent(f"Agent_{i}")
+    assert len(gm.groups) > 1
+    assert dict(gm.accounts) == _naive_accounts(gm)
+
+    version = gm.views.versions["accounts"]
+    gm.remove_agent("Agent_5")
+    assert "Agent_5" not in gm.accounts
+    assert gm.views.versions["accounts"] > version
+
+    gm.restore_agent("Agent_5", 500.0, {}, group_id=1)
+    assert gm.accounts["Agent_5"].balance == 500.0
+    assert gm.accounts["Agent_5"] is gm.groups[1].engine.accounts["Agent_5"]
+    assert dict(gm.accounts) == _naive_accounts(gm)
+
+
+def test_prices_latest_write_wins():
+    gm = GroupManager()
+    for i in range(120):
+        gm.register_agent(f"Agent_{i}")
+    gm.update_prices({"TOK": {"priceUsd": 1.0}})
+    first = gm.current_prices
+    assert first["TOK"] == 1.0
+    assert gm.current_prices is first  # 版本未变，复用快照
+
+    gm.groups[1].engine.update_prices({"TOK": {"priceUsd": 1.5}})
+    assert gm.current_prices["TOK"] == 1.5
+    assert gm.price_source("TOK") == 1
+    assert first["TOK"] == 1.0  # 旧快照不受后续写入影响
+
+
+def test_recent_trades_ring():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            gm = GroupManager(journal_dir=tmp)
+            for i in range(60):
+                gm.register_agent(f"Agent_{i}")
+            gm.update_prices({"TOK": {"priceUsd": 1.0}})
+            for i in (0, 55, 1, 56):
+                engine = gm.get_group(f"Agent_{i}").engine
+                await engine.execute_order(f"Agent_{i}", "TOK", OrderSide.BUY, 10)
+            trades = gm.trade_history
+            assert [t["agent_id"] for t in trades] == ["Agent_56", "Agent_1", "Agent_55", "Agent_0"]
+            assert gm.trade_history is trades
+            for group in gm.groups.values():
+                group.engine.trade_history.close()
+
+            # 重启：从各组日志恢复的成交按时间归并进环形缓冲
+            gm2 = GroupManager(journal_dir=tmp)
+            gm2.ensure_group(0)
+            gm2.ensure_group(1)
+            assert [t["agent_id"] for t in gm2.trade_history] == ["Agent_56", "Agent_1", "Agent_55", "Agent_0"]
+
+            # 重置竞技场：各组 trade_history 与全局环形缓冲一起清空
+            version = gm2.trades_version
+            for group in gm2.groups.values():
+                group.engine.trade_history.clear()
+            gm2.views.clear_trades()
+            assert gm2.trade_history == () and gm2.trades_version > version
+            for group in gm2.groups.values():
+                group.engine.trade_history.close()
+
+    asyncio.run(run())
+
+
+def test_remove_agent_trades_purges_ring():
+    async def run():
+        gm = GroupManager()
+        for i in range(60):
+            gm.register_agent(f"Agent_{i}")
+        gm.update_prices({"TOK": {"priceUsd": 1.0}})
+        for i in (0, 55, 0, 1):
+            engine = gm.get_group(f"Agent_{i}").engine
+            await engine.execute_order(f"Agent_{i}", "TOK", OrderSide.BUY, 10)
+        assert len(gm.trade_history) == 4
+
+        version = gm.views.versions["trades"]
+        gm.remove_agent_trades("Agent_0")
+        assert [t["agent_id"] for t in gm.trade_history] == ["Agent_1", "Agent_55"]
+        assert gm.views.versions["trades"] > version
+        assert all(t["agent_id"] != "Agent_0" for t in gm.scan_trades())
+
+        # 没有该 Agent 的成交时不改版本 (响应缓存继续命中)
+        version = gm.views.versions["trades"]
+        gm.remove_agent_trades("Agent_0")
+        assert gm.views.versions["trades"] == version
+
+    asyncio.run(run())
+
+
+def run_all_tests():
+    tests = [
+        test_accounts_index_tracks_membership,
+        test_prices_latest_write_wins,
+        test_recent_trades_ring,
+        test_remove_agent_trades_purges_ring,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,155 @@
+"""
+🧪 Observer Feed - Test Suite
+
+测试 /ws/observer 的推送流：
+1. 增量只包含变化的排行行 / 计数 / 新成交 / 事件，没有变化时不发帧
+2. 每帧只序列化一次，扇出给所有观众
+3. 慢观众队列满时改发最新快照
+4. serve：欢迎消息 + 快照，之后推送增量，resync 返回快照
+"""
+
+import asyncio
+import json
+import sys
+import os
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from observer_feed import ObserverFeed
+
+
+class FakeArena:
+    def __init__(self):
+        self.epoch = 1
+        self.rankings = [("A", 5.0, 10500.0, True), ("B", 1.0, 10100.0, False), ("C", -2.0, 9800.0, True)]
+        self.trades = []
+        self.observers = 1
+
+    def state(self):
+        return {"epoch": self.epoch, "rankings": list(self.rankings),
+                "stats": {"connected_observers": self.observers, "trade_count": len(self.trades)}}
+
+    def trade(self, agent_id, symbol):
+        self.trades.insert(0, {"time": f"t{len(self.trades)}", "agent_id": agent_id, "side": "BUY",
+                               "symbol": symbol, "amount": 1.0, "price": 1.0, "value": 1.0})
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.incoming = asyncio.Queue()
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def receive_json(self):
+        item = await self.incoming.get()
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+
+def make_feed(arena, **kwargs):
+    feed = ObserverFeed(arena.state, lambda: arena.trades, **kwargs)
+    feed._stale = False
+    return feed
+
+
+def test_delta_contains_only_changes():
+    arena = FakeArena()
+    feed = make_feed(arena)
+    first = feed.tick()
+    assert first["version"] == 1 and len(first["ranks"]) == 3
+    assert feed.tick() is None  # 没有变化不发帧
+
+    arena.rankings[0], arena.rankings[1] = ("B", 6.0, 10600.0, False), ("A", 5.0, 10500.0, True)
+    arena.rankings.pop()
+    arena.trade("B", "PEPE")
+    feed.publish("council", agent_id="A", content="hi")  # 没有观众时不登记事件
+    delta = feed.tick()
+    assert delta["version"] == 2
+    assert delta["ranks"] == [[1, "B", 6.0, 10600.0, False], [2, "A", 5.0, 10500.0, True]]
+    assert delta["removed"] == ["C"] and delta["stats"] == {"trade_count": 1}
+    assert [f["symbol"] for f in delta["fills"]] == ["PEPE"] and "events" not in delta
+
+    arena.trade("A", "WIF")
+    arena.trade("C", "BONK")
+    delta = feed.tick()
+    assert [f["symbol"] for f in delta["fills"]] == ["BONK", "WIF"]
+    snapshot = feed.snapshot()
+    assert [row[1] for row in snapshot["rankings"]] == ["B", "A"]
+    assert [f["symbol"] for f in snapshot["fills"]] == ["BONK", "WIF", "PEPE"]
+
+
+def test_fan_out_and_slow_observer_resync():
+    async def run():
+        arena = FakeArena()
+        feed = make_feed(arena, queue_size=2)
+        fast, slow = asyncio.Queue(maxsize=2), asyncio.Queue(maxsize=2)
+        feed.observers = {1: fast, 2: slow}
+        for i in range(3):
+            arena.rankings[0] = ("A", 5.0 + i, 10500.0, True)
+            feed.publish("council", agent_id="A", content=f"msg {i}")
+            feed.tick()
+            if not fast.empty():
+                fast.get_nowait()  # 快观众及时消费
+        frames = [slow.get_nowait() for _ in range(slow.qsize())]
+        assert feed.resyncs == 1
+        assert json.loads(frames[0])["type"] == "snapshot" and json.loads(frames[0])["version"] == 3
+        assert feed.deltas == 3
+
+    asyncio.run(run())
+
+
+def test_serve_snapshot_deltas_and_resync():
+    async def run():
+        arena = FakeArena()
+        feed = ObserverFeed(arena.state, lambda: arena.trades)
+        ws = FakeWebSocket()
+        task = asyncio.create_task(feed.serve(ws, welcome={"type": "welcome"}))
+        await asyncio.sleep(0.01)
+        assert [m["type"] for m in ws.sent] == ["welcome", "snapshot"]
+        assert len(ws.sent[1]["rankings"]) == 3
+
+        arena.trade("A", "PEPE")
+        feed.publish("epoch_end", epoch=1)
+        feed.tick()
+        await ws.incoming.put({"type": "resync"})
+        await asyncio.sleep(0.01)
+        delta, resync = ws.sent[2], ws.sent[3]
+        assert delta["type"] == "delta" and delta["version"] == ws.sent[1]["version"] + 1
+        assert delta["events"] == [{"kind": "epoch_end", "epoch": 1}]
+        assert resync["type"] == "snapshot" and resync["version"] == delta["version"]
+
+        await ws.incoming.put(ConnectionError("closed"))
+        try:
+            await task
+        except ConnectionError:
+            pass
+        assert not feed.observers
+
+    asyncio.run(run())
+
+
+def run_all_tests():
+    tests = [
+        test_delta_contains_only_changes,
+        test_fan_out_and_slow_observer_resync,
+        test_serve_snapshot_deltas_and_resync,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
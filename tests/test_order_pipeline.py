@@ -0,0 +1,173 @@
+"""
+🧪 Order Pipeline - Test Suite
+
+测试下单管线：
+1. 回执不等待慢的成交后处理 (Council / 广播)
+2. 同一 Agent 的订单保持 FIFO，且多 Agent 被合并成微批
+3. 队列超限时抛出 OrderQueueFull (背压)
+4. 批内缺失价格只查询一次
+5. 归因在撮合时同步记录：成交后队列满时只丢弃广播，归因不丢
+"""
+
+import asyncio
+import sys
+import os
+import time
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from group_manager import GroupManager
+from matching import OrderSide
+from order_pipeline import OrderPipeline, OrderQueueFull
+from price_oracle import PriceOracle, MockDexScreenerBackend
+
+
+def _group_manager(n_agents=10):
+    gm = GroupManager()
+    for i in range(n_agents):
+        gm.register_agent(f"Agent_{i}")
+    gm.update_prices({"TOK": {"priceUsd": 1.0}})
+    return gm
+
+
+def test_ack_does_not_wait_for_post_trade():
+    async def run():
+        handled = []
+
+        async def slow_post_trade(event):
+            await asyncio.sleep(0.5)  # 模拟慢 WebSocket 对端
+            handled.append(event.request.agent_id)
+
+        gm = _group_manager()
+        pipeline = OrderPipeline(gm, post_trade=slow_post_trade)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            pipeline.submit(f"Agent_{i}", "TOK", OrderSide.BUY, 10) for i in range(10)
+        ))
+        assert all(r.success for r in results)
+        assert time.perf_counter() - start < 0.25
+        assert handled == []
+
+        await pipeline.drain()
+        assert sorted(handled) == sorted(f"Agent_{i}" for i in range(10))
+        await pipeline.stop()
+
+    asyncio.run(run())
+
+
+def test_fifo_per_agent_and_micro_batching():
+    async def run():
+        gm = _group_manager(5)
+        pipeline = OrderPipeline(gm)
+        # Agent_0 先买后卖：若顺序错乱，卖单会因无持仓而失败
+        tasks = []
+        for i in range(5):
+            tasks.append(pipeline.submit(f"Agent_{i}", "TOK", OrderSide.BUY, 100))
+            tasks.append(pipeline.submit(f"Agent_{i}", "TOK", OrderSide.SELL, 50))
+        results = await asyncio.gather(*tasks)
+        assert all(r.success for r in results), [r.message for r in results]
+        assert pipeline.batches < len(tasks)
+        assert max(r.batch_size for r in results) > 1
+        await pipeline.stop()
+
+    asyncio.run(run())
+
+
+def test_backpressure():
+    async def run():
+        gm = _group_manager(2)
+        pipeline = OrderPipeline(gm, per_agent_limit=3, per_group_limit=100)
+        tasks = [asyncio.ensure_future(pipeline.submit("Agent_0", "TOK", OrderSide.BUY, 1))
+                 for _ in range(3)]
+        await asyncio.sleep(0)  # 入队但尚未撮合
+        try:
+            await pipeline.submit("Agent_0", "TOK", OrderSide.BUY, 1)
+            assert False, "expected OrderQueueFull"
+        except OrderQueueFull as e:
+            assert e.scope == "agent" and e.limit == 3
+        # 其他 Agent 不受影响
+        assert (await pipeline.submit("Agent_1", "TOK", OrderSide.BUY, 1)).success
+        await asyncio.gather(*tasks)
+        assert pipeline.rejected == 1
+        await pipeline.stop()
+
+        # 组队列已满：被拒绝的 Agent 不留下空的排队队列
+        pipeline = OrderPipeline(gm, per_agent_limit=3, per_group_limit=1)
+        first = asyncio.ensure_future(pipeline.submit("Agent_0", "TOK", OrderSide.BUY, 1))
+        await asyncio.sleep(0)
+        try:
+            await pipeline.submit("Agent_1", "TOK", OrderSide.BUY, 1)
+            assert False, "expected OrderQueueFull"
+        except OrderQueueFull as e:
+            assert e.scope == "group"
+        executor = next(iter(pipeline.executors.values()))
+        assert "Agent_1" not in executor.queues
+        await first
+        await pipeline.stop()
+
+    asyncio.run(run())
+
+
+def test_batch_prefetches_missing_prices_once():
+    async def run():
+        gm = _group_manager(20)
+        oracle = PriceOracle(backend=MockDexScreenerBackend({"NEW": 2.0}, latency=0.01))
+        for group in gm.groups.values():
+            group.engine.oracle = oracle
+        pipeline = OrderPipeline(gm)
+        results = await asyncio.gather(*(
+            pipeline.submit(f"Agent_{i}", "NEW", OrderSide.BUY, 10) for i in range(20)
+        ))
+        assert all(r.success for r in results)
+        assert len({r.fill_price for r in results}) == 1
+        assert oracle.backend.calls == 1
+        await pipeline.stop()
+
+    asyncio.run(run())
+
+
+def test_attribution_survives_full_post_trade_queue():
+    async def run():
+        async def stuck_post_trade(event):
+            await asyncio.sleep(10)  # 广播对端卡住：队列很快塞满
+
+        gm = _group_manager(10)
+        pipeline = OrderPipeline(gm, post_trade=stuck_post_trade, post_trade_limit=2, post_trade_workers=1)
+        results = await asyncio.gather(*(
+            pipeline.submit(f"Agent_{i}", "TOK", OrderSide.BUY, 10, ["MOMENTUM"]) for i in range(10)
+        ))
+        assert all(r.success for r in results)
+        assert pipeline.post_trade_dropped > 0  # 广播被丢弃
+
+        attribution = gm.get_group("Agent_0").attribution
+        assert len(attribution.pending) == 10  # 每笔 BUY 都进入待复盘
+        assert pipeline.stats()["attribution_errors"] == 0
+        await pipeline.stop()
+
+    asyncio.run(run())
+
+
+def run_all_tests():
+    tests = [
+        test_ack_does_not_wait_for_post_trade,
+        test_fifo_per_agent_and_micro_batching,
+        test_backpressure,
+        test_batch_prefetches_missing_prices_once,
+        test_attribution_survives_full_post_trade_queue,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,143 @@
+"""
+🧪 Position Lots - Test Suite
+
+测试批次持仓 (FIFO lots)：
+1. LotQueue 先进先出平仓、跨批次部分成交、队头压缩、超过上限时合并
+2. MatchingEngine 批次模式：SELL 记录附逐批次已实现盈亏，均价持仓照常维护
+3. HiveMind 按批次入场标签精确归因 (多次加仓、不同标签)
+4. 移除 Agent / 重置时删除批次；标签表超过上限时压缩并重编号，未平仓批次的标签不变
+"""
+
+import asyncio
+import sys
+import os
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from group_manager import GroupManager
+from hive_mind import HiveMind
+from matching import MatchingEngine, OrderSide
+from position_lots import LotBook, LotQueue
+
+
+def test_lot_queue_fifo():
+    queue = LotQueue()
+    queue.push(10, 1.0, 100, 1)
+    queue.push(5, 2.0, 200, 2)
+    queue.push(5, 3.0, 300, 3)
+
+    fills, remaining = queue.consume(12)
+    assert fills == [(10, 1.0, 100, 1), (2, 2.0, 200, 2)] and remaining == 0
+    assert len(queue) == 2 and queue.head == 1
+    assert queue.total == 8
+
+    fills, remaining = queue.consume(10)
+    assert [f[3] for f in fills] == [2, 3] and remaining == 2
+    assert len(queue) == 0 and queue.head == 0 and len(queue.amounts) == 0  # 消费过半后压缩
+
+    capped = LotQueue()
+    for i in range(5):
+        capped.push(1, float(i + 1), i, i, merge_tags=lambda a, b: 99, limit=3)
+    assert len(capped) == 3
+    assert capped.amounts[-1] == 3 and capped.prices[-1] == 4.0 and capped.tags[-1] == 99
+
+
+def test_lot_book_fallback_and_tags():
+    book = LotBook(max_lots=2)
+    book.open("A", "PEPE", 1, 1.0, 0, ["MOMENTUM"])
+    book.open("A", "PEPE", 1, 2.0, 1, ["BREAKOUT"])
+    book.open("A", "PEPE", 1, 3.0, 2, ["MOMENTUM"])  # 超过上限：并入上一个批次，标签取并集
+    assert [lot["reason"] for lot in book.lots("A", "PEPE")] == [["MOMENTUM"], ["BREAKOUT", "MOMENTUM"]]
+
+    realized = book.close("A", "PEPE", 4, 4.0, fallback_price=2.0)
+    assert [lot["amount"] for lot in realized] == [1, 2, 1]
+    assert realized[0]["trade_pnl"] == 300.0 and realized[1]["entry_price"] == 2.5
+    assert realized[2]["reason"] == [] and realized[2]["entry_time"] is None  # 没有批次记录的部分按均价
+
+    book.open("A", "PEPE", 1, 1.0, 3, ["DIP"])
+    book.open("A", "PEPE", 1, 1.0, 4, ["NEW"], new_position=True)  # 持仓被外部清空后重建
+    assert [lot["reason"] for lot in book.lots("A", "PEPE")] == [["NEW"]]
+
+
+def test_engine_lot_mode():
+    async def run():
+        engine = MatchingEngine(lots=True)
+        engine.register_agent("A")
+        engine.update_prices({"PEPE": {"priceUsd": 1.0}})
+        await engine.execute_order("A", "PEPE", OrderSide.BUY, 100, ["MOMENTUM"])
+        engine.update_prices({"PEPE": {"priceUsd": 2.0}})
+        await engine.execute_order("A", "PEPE", OrderSide.BUY, 100, ["DIP_BUY"])
+        engine.update_prices({"PEPE": {"priceUsd": 3.0}})
+        held = engine.accounts["A"].positions["PEPE"].amount
+        await engine.execute_order("A", "PEPE", OrderSide.SELL, held * 0.9 * 3.0, ["TAKE_PROFIT"])  # SELL 金额按美元计
+        return engine
+
+    engine = asyncio.run(run())
+    sell = engine.trade_history[0]
+    assert sell["side"] == "SELL"
+    assert [lot["reason"] for lot in sell["lots"]] == [["MOMENTUM"], ["DIP_BUY"]]
+    first, second = sell["lots"]
+    assert first["trade_pnl"] > second["trade_pnl"] > 0
+    assert abs(sum(lot["amount"] for lot in sell["lots"]) - sell["amount"]) < 1e-9
+    assert len(engine.lots.lots("A", "PEPE")) == 1  # 剩余的 DIP_BUY 批次
+
+    hive = HiveMind(engine)
+    assert hive.tag_stats["MOMENTUM"]["total_pnl"] == first["trade_pnl"]
+    assert hive.tag_stats["DIP_BUY"]["total_pnl"] == second["trade_pnl"]
+    assert hive.tag_stats["TAKE_PROFIT"]["total_pnl"] == sell["trade_pnl"]
+
+    plain = MatchingEngine(lots=False)
+    assert plain.lots is None
+
+
+def test_lot_book_cleanup_and_tag_bound():
+    book = LotBook(max_tags=8)
+    for i in range(40):
+        book.open(f"A{i % 4}", "PEPE", 1, 1.0, i, [f"TAG_{i}"])
+        book.close(f"A{i % 4}", "PEPE", 1, 1.0, fallback_price=1.0)  # 平仓：该组合不再被引用
+    book.open("B", "WIF", 1, 1.0, 0, ["KEEP"])
+    book.open("B", "WIF", 1, 1.0, 1, ["KEEP", "ME"])
+    assert len(book._tag_table) <= 8
+    for i in range(20):
+        book.open("C", "PEPE", 1, 1.0, i, [f"LIVE_{i}"])
+    # 仍被引用的组合超过上限：阈值放宽，标签全部保留且不串号
+    assert [lot["reason"] for lot in book.lots("B", "WIF")] == [["KEEP"], ["KEEP", "ME"]]
+    assert [lot["reason"] for lot in book.lots("C", "PEPE")] == [[f"LIVE_{i}"] for i in range(20)]
+
+    book.remove_agent("C")
+    assert book.lots("C", "PEPE") == [] and ("B", "WIF") in book.queues
+    book.clear()
+    assert len(book) == 0 and book._tag_table == [()]
+
+    gm = GroupManager()
+    gm.register_agent("A")
+    engine = gm.get_group("A").engine
+    engine.lots = LotBook()
+    engine.lots.open("A", "PEPE", 1, 1.0, 0, ["MOMENTUM"])
+    gm.remove_agent("A")
+    assert len(engine.lots) == 0
+
+
+def run_all_tests():
+    tests = [
+        test_lot_queue_fifo,
+        test_lot_book_fallback_and_tags,
+        test_engine_lot_mode,
+        test_lot_book_cleanup_and_tag_bound,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
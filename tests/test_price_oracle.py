@@ -0,0 +1,201 @@
+"""
+🧪 Price Oracle - Test Suite
+
+测试共享价格预言机：
+1. 并发请求合并 (同一 symbol 只打一次上游)
+2. 已知地址的冷查询批量化
+3. stale-while-revalidate
+4. 多个 MatchingEngine 共享同一个预言机
+5. 跨组持仓价格刷新 (去重 + 原子快照)
+6. Agent 提供的合约地址不能改写其他人的价格 (可信地址 + baseToken.symbol 校验)
+7. 上游出错保留旧价；批量失败后退避，不退化成逐个 /search
+"""
+
+import asyncio
+import sys
+import os
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from price_oracle import PriceOracle, MockDexScreenerBackend
+from matching import MatchingEngine, Position
+from price_refresh import PriceRefresher
+
+
+PRICES = {f"TOK{i}": 1.0 + i for i in range(40)}
+
+
+def _oracle(**kwargs) -> PriceOracle:
+    backend = MockDexScreenerBackend(PRICES, latency=0.01)
+    return PriceOracle(backend=backend, **kwargs)
+
+
+def test_concurrent_lookups_are_coalesced():
+    async def run():
+        oracle = _oracle()
+        results = await asyncio.gather(*(oracle.get_price("TOK1") for _ in range(50)))
+        assert all(r == PRICES["TOK1"] for r in results)
+        assert oracle.backend.calls == 1
+        assert oracle.counters["coalesced"] == 49
+        # 第二轮全部命中缓存
+        await asyncio.gather(*(oracle.get_price("TOK1") for _ in range(10)))
+        assert oracle.backend.calls == 1
+        assert oracle.stats()["hits"] == 10
+
+    asyncio.run(run())
+
+
+def test_known_addresses_are_batched():
+    async def run():
+        oracle = _oracle()
+        addresses = oracle.backend.addresses
+        symbols = sorted(PRICES)
+        results = await asyncio.gather(
+            *(oracle.get_price(sym, addresses[sym]) for sym in symbols)
+        )
+        assert results == [PRICES[sym] for sym in symbols]
+        # 40 个地址 → 2 次 /tokens (每批最多 30 个)，没有 /search
+        assert oracle.backend.token_calls == 2
+        assert oracle.backend.search_calls == 0
+
+    asyncio.run(run())
+
+
+def test_unknown_symbol_is_negatively_cached():
+    async def run():
+        oracle = _oracle()
+        assert await oracle.get_price("NOPE") is None
+        assert await oracle.get_price("NOPE") is None
+        assert oracle.backend.calls == 1
+
+    asyncio.run(run())
+
+
+def test_stale_price_served_while_revalidating():
+    async def run():
+        oracle = _oracle(ttl=0.0, stale_ttl=60)
+        assert await oracle.get_price("TOK2") == PRICES["TOK2"]
+        oracle.backend.prices["TOK2"] = 99.0
+
+        # 已过期 → 立即返回旧价，并在后台刷新
+        assert await oracle.get_price("TOK2") == PRICES["TOK2"]
+        assert oracle.counters["stale_hits"] == 1
+        await asyncio.sleep(0.05)
+        assert oracle.peek("TOK2") == 99.0
+
+    asyncio.run(run())
+
+
+def test_engines_share_one_oracle():
+    async def run():
+        oracle = _oracle()
+        engines = [MatchingEngine(oracle=oracle) for _ in range(5)]
+        prices = await asyncio.gather(
+            *(engine._fetch_price_realtime("TOK3") for engine in engines)
+        )
+        assert prices == [PRICES["TOK3"]] * 5
+        assert oracle.backend.calls == 1
+
+    asyncio.run(run())
+
+
+def test_refresh_dedupes_symbols_across_groups():
+    async def run():
+        oracle = _oracle()
+        engines = [MatchingEngine(oracle=oracle) for _ in range(10)]
+        for i, engine in enumerate(engines):
+            account = engine.register_agent(f"Agent_{i}")
+            for sym in ("TOK1", "TOK2", f"TOK{10 + i}"):
+                account.positions[sym] = Position(symbol=sym, amount=1.0, avg_price=1.0)
+
+        refresher = PriceRefresher(oracle, concurrency=4)
+        snapshot = await refresher.refresh(engines)
+
+        # 2 个共同持仓 + 10 个各自持仓 = 12 个 symbol，各查一次
+        assert snapshot.requested == 12
+        assert snapshot.coverage == 1.0
+        assert oracle.backend.calls == 12
+        for engine in engines:
+            assert engine.price_snapshot_version == snapshot.version
+            assert engine.current_prices["TOK1"] == PRICES["TOK1"]
+        assert refresher.stats()["last_pass"]["updated"] == 12
+
+    asyncio.run(run())
+
+
+def test_untrusted_address_cannot_set_price():
+    async def run():
+        backend = MockDexScreenerBackend({**PRICES, "SCAM": 1e6}, latency=0.01)
+        scam = backend.addresses["SCAM"]
+        oracle = PriceOracle(backend=backend, addresses={"TOK2": backend.addresses["TOK2"]})
+
+        # 首次出现的地址指向别的代币：symbol 不符 → 丢弃该地址，按 symbol 搜索
+        assert await oracle.get_price("TOK1", scam) == PRICES["TOK1"]
+        assert oracle.counters["symbol_mismatches"] == 1
+        assert oracle._addresses["TOK1"] == backend.addresses["TOK1"]
+
+        # 之后不同的地址被忽略，配置的地址不会被覆盖
+        assert await oracle.get_price("TOK1", scam) == PRICES["TOK1"]
+        assert await oracle.get_price("TOK2", scam) == PRICES["TOK2"]
+        assert oracle.fresh("TOK2") == PRICES["TOK2"]
+        assert oracle.counters["address_conflicts"] == 2
+        assert oracle._addresses["TOK2"] == backend.addresses["TOK2"]
+
+    asyncio.run(run())
+
+
+def test_upstream_errors_keep_stale_and_back_off():
+    async def run():
+        oracle = _oracle(ttl=0.0, stale_ttl=60, negative_ttl=0.2)
+        addresses = oracle.backend.addresses
+        symbols = [f"TOK{i}" for i in range(5)]
+        await asyncio.gather(*(oracle.get_price(sym, addresses[sym]) for sym in symbols))
+
+        oracle.backend.failing = True
+        calls = oracle.backend.calls
+        assert await oracle.fetch("TOK1") == PRICES["TOK1"]  # 批量失败 → 保留旧价
+        assert oracle.backend.calls == calls + 1 and oracle.backend.search_calls == 0
+
+        # 退避期内：其他已知地址的 symbol 不打上游，直接给旧价
+        results = await asyncio.gather(*(oracle.fetch(sym) for sym in symbols))
+        assert results == [PRICES[sym] for sym in symbols]
+        assert oracle.backend.calls == calls + 1
+        assert oracle.counters["backoff_skips"] == 4
+
+        # 退避结束、上游恢复后正常刷新
+        await asyncio.sleep(0.25)
+        oracle.backend.failing = False
+        oracle.backend.prices["TOK1"] = 42.0
+        assert await oracle.fetch("TOK1") == 42.0
+        assert oracle.backend.search_calls == 0
+
+    asyncio.run(run())
+
+
+def run_all_tests():
+    tests = [
+        test_concurrent_lookups_are_coalesced,
+        test_known_addresses_are_batched,
+        test_unknown_symbol_is_negatively_cached,
+        test_stale_price_served_while_revalidating,
+        test_engines_share_one_oracle,
+        test_refresh_dedupes_symbols_across_groups,
+        test_untrusted_address_cannot_set_price,
+        test_upstream_errors_keep_stale_and_back_off,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
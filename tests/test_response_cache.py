@@ -0,0 +1,138 @@
+"""
+🧪 Response Cache - Test Suite
+
+测试热门只读端点的响应缓存：
+1. 版本键不变时复用同一份字节，键变化才重建；ttl 过期后重建
+2. If-None-Match 命中返回 304 (不重算)，内容没变的重建同样 304；弱 ETag / 列表 / *
+3. 每个端点的命中率统计与查询参数 LRU
+4. 版本计数：成交 / 价格 / Epoch 快照推进引擎版本，议事厅发言推进 council.version
+"""
+
+import asyncio
+import json
+import sys
+import os
+import time
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from response_cache import ResponseCache, etag_matches
+from group_manager import GroupManager
+from matching import OrderSide
+from council import Council, MessageRole
+
+
+class Builder:
+    """记录重建次数的负载生成器"""
+
+    def __init__(self, data):
+        self.data = data
+        self.calls = 0
+
+    def __call__(self, headers):
+        self.calls += 1
+        return self.data
+
+
+def test_versioned_reuse_and_ttl():
+    cache = ResponseCache()
+    build = Builder({"rankings": [1, 2, 3]})
+    status, first = cache.fetch("/leaderboard", 1, build)
+    status2, second = cache.fetch("/leaderboard", 1, build)
+    assert status == status2 == 200 and build.calls == 1
+    assert second is first and json.loads(first.body) == {"rankings": [1, 2, 3]}
+
+    build.data = {"rankings": [3, 2, 1]}
+    _, third = cache.fetch("/leaderboard", 2, build)
+    assert build.calls == 2 and third.etag != first.etag
+
+    cache.fetch("/stats", 1, build, ttl=0.05)
+    cache.fetch("/stats", 1, build, ttl=0.05)
+    assert build.calls == 3
+    time.sleep(0.06)
+    cache.fetch("/stats", 1, build, ttl=0.05)
+    assert build.calls == 4
+
+
+def test_conditional_requests():
+    cache = ResponseCache()
+    build = Builder([{"id": "MSG-000001"}])
+    _, entry = cache.fetch("/council-logs", 1, build)
+    status, _ = cache.fetch("/council-logs", 1, build, if_none_match=entry.etag)
+    assert status == 304 and build.calls == 1
+
+    # 版本变了但内容相同：重建一次，仍然 304
+    status, rebuilt = cache.fetch("/council-logs", 2, build, if_none_match=entry.etag)
+    assert status == 304 and build.calls == 2 and rebuilt.etag == entry.etag
+
+    assert etag_matches(f'W/{entry.etag}', entry.etag)
+    assert etag_matches(f'"other", {entry.etag}', entry.etag)
+    assert etag_matches("*", entry.etag)
+    assert not etag_matches('"other"', entry.etag) and not etag_matches(None, entry.etag)
+
+
+def test_headers_params_and_stats():
+    cache = ResponseCache(variants=2)
+
+    def build(headers):
+        headers["X-Next-Cursor"] = "abc"
+        return []
+
+    _, entry = cache.fetch("/council-logs", 1, build, params=(("limit", "50"),))
+    assert entry.headers == {"X-Next-Cursor": "abc"}
+
+    for agent in ("A", "B", "A", "C", "A"):
+        cache.fetch("/trades", 1, Builder([agent]), params=(("agent_id", agent),))
+    stats = cache.stats()["/trades"]
+    assert stats["hits"] == 2 and stats["misses"] == 3 and stats["hit_rate"] == 0.4
+    assert stats["cached_variants"] == 2  # LRU: B 被淘汰
+    assert ("agent_id", "B") not in cache.entries["/trades"]
+
+
+def test_engine_and_council_versions():
+    gm = GroupManager()
+    gm.register_agent("A")
+    engine = gm.get_group("A").engine
+    engine.update_prices({"PEPE": {"priceUsd": 1.0}})
+
+    v0, t0 = gm.version, gm.trades_version
+    ok, _, _ = asyncio.run(engine.execute_order("A", "PEPE", OrderSide.BUY, 100.0))
+    assert ok and gm.version > v0 and gm.trades_version > t0
+
+    v1 = gm.version
+    engine.update_prices({"PEPE": {"priceUsd": 1.1}})
+    assert gm.version > v1  # 持仓币种价格变化
+
+    v2, t2 = gm.version, gm.trades_version
+    engine.record_pnl_snapshot()
+    assert gm.version > v2 and gm.trades_version == t2  # Epoch 快照不影响成交视图
+
+    council = Council(llm_scoring=False)
+    c0 = council.version
+    asyncio.run(council.submit_message(1, "A", MessageRole.INSIGHT, "PEPE momentum looks strong"))
+    assert council.version > c0
+
+
+def run_all_tests():
+    tests = [
+        test_versioned_reuse_and_ttl,
+        test_conditional_requests,
+        test_headers_params_and_stats,
+        test_engine_and_council_versions,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
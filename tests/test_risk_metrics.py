@@ -0,0 +1,154 @@
+"""
+🧪 Risk Metrics Cache - Test Suite
+
+测试风险指标的增量缓存：
+1. 逐期追加的摘要与 calculate_composite_score 全量重算一致
+2. 滑动窗口淘汰最旧样本后仍与窗口内全量重算一致
+3. 摘要按顺序合并 = 序列拼接后重算 (/stats 全体指标)；to_state / from_state 往返不丢信息
+4. 批量重算 (有 numpy 时向量化) 与逐个累加一致
+5. MatchingEngine Epoch 结束时更新缓存；AscensionTracker 读摘要
+"""
+
+import random
+import sys
+import os
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from metrics import calculate_composite_score
+from risk_metrics import (RiskMetricsCache, RiskSeries, RiskSummary, batch_summaries, population_metrics,
+                          population_summary, summarize)
+from matching import MatchingEngine
+from chain import AscensionTracker
+
+
+def reference(returns, values=None):
+    """原先 /leaderboard 的全量算法"""
+    if values is None:
+        values = [10000.0]
+        for pnl in returns:
+            values.append(values[-1] * (1 + pnl / 100))
+    return calculate_composite_score(returns, values, sum(returns))
+
+
+def assert_close(got, expected):
+    for key, value in expected.items():
+        assert abs(got[key] - value) <= 1e-6 + 1e-3 * abs(value), (key, got[key], value)
+
+
+def random_returns(rng, n):
+    return [round(rng.gauss(0.5, 6.0), 2) for _ in range(n)]
+
+
+def test_incremental_matches_full_recompute():
+    rng = random.Random(7)
+    for n in (1, 2, 3, 10, 40):
+        returns = random_returns(rng, n)
+        series = RiskSeries()
+        for pnl in returns:
+            series.append(pnl)
+        assert_close(series.metrics(), reference(returns))
+    assert_close(summarize([2.0, 3.0, 1.5]).metrics(), reference([2.0, 3.0, 1.5]))  # 没有负收益
+    assert_close(summarize([2.0, -3.0, 1.5]).metrics(), reference([2.0, -3.0, 1.5]))  # 只有一个负收益
+
+
+def test_sliding_window_eviction():
+    rng = random.Random(11)
+    returns = random_returns(rng, 50)
+    series = RiskSeries(limit=20)
+    for pnl in returns:
+        series.append(pnl)
+    assert list(series.window) == returns[-20:]
+    assert_close(series.metrics(), reference(returns[-20:]))
+
+
+def test_merge_equals_concatenation():
+    rng = random.Random(3)
+    histories = [random_returns(rng, n) for n in (5, 0, 12, 1, 8)]
+    concatenated = [pnl for history in histories for pnl in history]
+    assert_close(population_metrics(summarize(h) for h in histories), reference(concatenated))
+    assert population_metrics([])["composite_score"] == 0.0
+
+    # 分片 worker 上报的状态可无损还原后再合并
+    restored = [RiskSummary.from_state(summarize(h).to_state()) for h in histories]
+    assert_close(population_summary(restored).metrics(), reference(concatenated))
+
+
+def test_batch_matches_incremental():
+    rng = random.Random(5)
+    histories = {f"A{i}": random_returns(rng, rng.randint(0, 30)) for i in range(25)}
+    histories["flat"] = [0.0, 0.0, 0.0]
+    histories["wiped"] = [-100.0, 5.0]
+    batch = batch_summaries(histories)
+    for agent_id, history in histories.items():
+        assert_close(batch[agent_id].metrics(), summarize(history).metrics())
+        assert_close(batch[agent_id].metrics(), reference(history))
+
+
+def test_engine_updates_cache_at_epoch_end():
+    engine = MatchingEngine()
+    engine.register_agent("A")
+    engine.register_agent("B")
+    rng = random.Random(9)
+    for _ in range(6):
+        engine.accounts["A"].balance *= 1 + rng.uniform(-0.1, 0.1)
+        engine.record_pnl_snapshot()
+    history = list(engine.accounts["A"].pnl_history)
+    assert_close(engine.risk_metrics("A"), reference(history))
+    assert engine.risk.rebuilds == 0  # 全部由 Epoch 结束时的增量更新维护
+
+    engine.accounts["A"].pnl_history = history[:3]  # 外部改写 (如恢复)：按历史重建
+    assert_close(engine.risk_metrics("A"), reference(history[:3]))
+    assert engine.risk.rebuilds == 1
+
+    cache = RiskMetricsCache(limit=4)
+    cache.rebuild({"A": history, "B": []})
+    assert list(cache.series["A"].window) == history[-4:]
+    assert_close(cache.metrics("A", history[-4:]), reference(history[-4:]))
+
+
+def test_ascension_reads_summary():
+    tracker = AscensionTracker()
+    rng = random.Random(1)
+    value = 10000.0
+    returns, values = [], [10000.0]
+    for _ in range(8):
+        value *= 1 + rng.uniform(-0.08, 0.12)
+        pnl = (value / 10000.0 - 1) * 100
+        returns.append(pnl)
+        values.append(value)
+        tracker.record_epoch_result([("A", pnl, value), ("B", -1.0, 9900.0)])
+    stats = tracker.get_stats("A")
+    expected = calculate_composite_score(returns, values, sum(returns))
+    for key in ("composite_score", "sharpe_ratio", "sortino_ratio", "max_drawdown"):
+        assert abs(stats[key] - expected[key]) <= 1e-3 * max(1.0, abs(expected[key])), key
+
+    tracker._risk.clear()  # 恢复后没有摘要：按历史重建
+    assert tracker.get_stats("A")["sharpe_ratio"] == stats["sharpe_ratio"]
+
+
+def run_all_tests():
+    tests = [
+        test_incremental_matches_full_recompute,
+        test_sliding_window_eviction,
+        test_merge_equals_concatenation,
+        test_batch_matches_incremental,
+        test_engine_updates_cache_at_epoch_end,
+        test_ascension_reads_summary,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
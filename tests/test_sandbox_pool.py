@@ -0,0 +1,131 @@
+"""
+🧪 Sandbox Pool - Test Suite
+
+测试策略沙盒进程池 (真实 worker 子进程)：
+1. 合法策略在 worker 中通过验证，完成回调收到结果
+2. 墙钟超时杀掉 worker，任务记为 timeout，worker 重启后继续处理任务
+3. 队列已满时 submit 抛出 SandboxQueueFull；被拒绝的提交不占用任务序号
+"""
+
+import asyncio
+import sys
+import os
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from sandbox_pool import SandboxPool, SandboxQueueFull
+
+VALID_STRATEGY = """
+class MyStrategy:
+    def __init__(self):
+        self.last = {}
+
+    def on_tick(self, market_data):
+        orders = []
+        for symbol, price in market_data.get('prices', {}).items():
+            if symbol in self.last and price < self.last[symbol] * 0.98:
+                orders.append({'symbol': symbol, 'side': 'BUY', 'amount': 10})
+            self.last[symbol] = price
+        return orders
+"""
+
+# 每个 tick 都在单 tick CPU 预算之内，但整个回测远超墙钟超时
+SLOW_STRATEGY = """
+class MyStrategy:
+    def __init__(self):
+        self.ticks = 0
+
+    def on_tick(self, market_data):
+        total = 0
+        for i in range(2 * 10 ** 6):
+            total += i
+        return []
+"""
+
+
+def test_valid_strategy_passes():
+    async def run():
+        completed = []
+
+        async def on_complete(job):
+            completed.append(job.job_id)
+
+        pool = SandboxPool(workers=1, queue_limit=4, job_timeout=60, on_complete=on_complete)
+        await pool.start()
+        try:
+            job = pool.submit("Agent_A", VALID_STRATEGY, rounds=3)
+            assert job.status == "queued"
+            await pool.wait(job.job_id, timeout=60)
+            assert job.status == "passed", job.message
+            assert job.allowed
+            assert job.result["backtest_rounds"] == 3
+            assert "test_log" not in job.to_dict()["test_result"]
+            assert completed == [job.job_id]
+            assert pool.stats()["outcomes"]["passed"] == 1
+        finally:
+            await pool.stop()
+
+    asyncio.run(run())
+
+
+def test_wall_clock_timeout_restarts_worker():
+    async def run():
+        pool = SandboxPool(workers=1, queue_limit=4, job_timeout=1.5)
+        await pool.start()
+        try:
+            slow = pool.submit("Agent_A", SLOW_STRATEGY, rounds=10)
+            valid = pool.submit("Agent_B", VALID_STRATEGY, rounds=2)
+            await pool.wait(slow.job_id, timeout=30)
+            assert slow.status == "timeout"
+            assert not slow.allowed
+
+            await pool.wait(valid.job_id, timeout=60)
+            assert valid.status == "passed", valid.message
+            assert pool.stats()["worker_restarts"] >= 1
+        finally:
+            await pool.stop()
+
+    asyncio.run(run())
+
+
+def test_queue_full():
+    async def run():
+        pool = SandboxPool(workers=1, queue_limit=1, job_timeout=1.0)
+        try:
+            # 调度协程尚未取走任务，第二个提交超过上限
+            job = pool.submit("Agent_A", VALID_STRATEGY, rounds=1)
+            try:
+                pool.submit("Agent_A", VALID_STRATEGY, rounds=1)
+                assert False, "expected SandboxQueueFull"
+            except SandboxQueueFull as e:
+                assert e.limit == 1
+            assert pool.stats()["rejected_queue_full"] == 1
+            assert job.seq == pool.last_seq == 1
+        finally:
+            await pool.stop()
+
+    asyncio.run(run())
+
+
+def run_all_tests():
+    tests = [
+        test_valid_strategy_passes,
+        test_wall_clock_timeout_restarts_worker,
+        test_queue_full,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,232 @@
+"""
+🧪 Sharded Arena - Test Suite
+
+测试分片模式：
+1. 一致性哈希环：新增 worker 只迁移约 1/N 的组
+2. 两个真实 worker 进程：订单按 agent → group → worker 路由，回执带余额 / 持仓
+3. 全局排行榜 / 统计 / epoch 排名由各 worker 汇总归并；组内结算数据与排行榜风险列来自持有该组的 worker
+4. 下单超时返回未决 (pending) + order_id，迟到的回执更新状态并补做成交后处理
+5. 持久化：账户从 worker 拉取保存，重启后按保存的 group_id 恢复到 worker；删除 Agent 同步到 worker
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from council import Council
+from group_manager import GroupManager
+from matching import OrderSide
+from sharding import GroupDirectory, HashRing, ShardRouter
+from state_persistence import StatePersistence, TrackedDict
+
+
+def test_hash_ring_moves_few_groups():
+    keys = [f"group:{i}" for i in range(2000)]
+    ring = HashRing(range(4))
+    before = {key: ring.node_for(key) for key in keys}
+    assert set(before.values()) == {0, 1, 2, 3}
+
+    ring.add(4)
+    moved = [key for key in keys if ring.node_for(key) != before[key]]
+    # 理想情况下 1/5 的组迁移到新 worker，且只会迁往新 worker
+    assert 0.1 < len(moved) / len(keys) < 0.3
+    assert all(ring.node_for(key) == 4 for key in moved)
+
+
+def test_directory_is_sticky():
+    directory = GroupDirectory()
+    groups = [directory.assign(f"Agent_{i}")[0] for i in range(60)]
+    assert directory.assign("Agent_3") == (groups[3], False)
+    assert len(directory.members) > 1  # 超过组大小后开新组
+
+
+def test_orders_routed_to_worker_processes():
+    async def run():
+        events = []
+
+        async def post_trade(event):
+            events.append(event)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            router = ShardRouter(2, post_trade=post_trade, socket_dir=tmp, summary_interval=0.1)
+            await router.start()
+            processes = list(router.processes)
+            try:
+                agents = [f"Agent_{i}" for i in range(60)]  # 2 个组 (< 100 人时每组 50)
+                for agent_id in agents:
+                    await router.assign_agent(agent_id)
+                assert {router.worker_for_agent(a) for a in agents} == {0, 1}
+
+                await router.update_prices({"TOK": {"priceUsd": 2.0}})
+                result = await router.submit("Agent_4", "TOK", OrderSide.BUY, 100)
+                assert result.success, result.message
+                assert result.fill_price >= 2.0  # 含滑点
+                assert result.positions["TOK"]["amount"] > 0
+                assert result.balance < 1000
+
+                account = await router.get_account("Agent_4")
+                assert account["balance"] == result.balance and "pnl" in account
+                await router.drain()
+                assert events and events[0].group.group_id == router.directory.agent_to_group["Agent_4"]
+                assert events[0].group.attribution is None
+
+                await router.refresh_summaries()
+                board = router.get_leaderboard()
+                assert {entry[0] for entry in board} == set(agents)
+                assert [e[1] for e in board] == sorted((e[1] for e in board), reverse=True)
+                assert router.get_stats()["total_agents"] == 60
+                assert set(router.get_stats()["workers"]) == {0, 1}
+
+                rankings, reports = await router.end_epoch()
+                assert len(rankings) == 60
+                # 组内结算来自持有该组的 worker：下过单的 Agent 不再是初始余额
+                group_id = router.directory.agent_to_group["Agent_4"]
+                assert set(reports) == set(router.directory.members)
+                assert len(reports[group_id]["rankings"]) == len(router.group_members(group_id))
+                assert reports[group_id]["agents"]["Agent_4"]["balance"] < 1000
+                assert "hive_patch" in reports[group_id]
+
+                # 第二个 Epoch 后 pnl_history 满 2 条：风险列由 worker 随汇总上报
+                await router.end_epoch()
+                await router.refresh_summaries()
+                metrics = router.leaderboard_risk("Agent_4")
+                assert metrics is not None and "composite_score" in metrics
+                assert router.leaderboard_risk("Nobody") is None
+                assert set(router.population_risk()) >= {"sharpe_ratio", "max_drawdown"}
+                versions = {wid: risk["version"] for wid, risk in router.risk.items()}
+                await router.refresh_summaries()  # 版本未变：不再重复上报
+                assert {wid: risk["version"] for wid, risk in router.risk.items()} == versions
+            finally:
+                await router.stop()
+            assert not any(p.is_alive() for p in processes)
+
+    asyncio.run(run())
+
+
+class SlowShardClient:
+    """回执由测试手动给出的 worker 连接"""
+
+    timeout = 0.05
+
+    def __init__(self):
+        self.futures = []
+
+    def send(self, op, **args):
+        future = asyncio.get_running_loop().create_future()
+        self.futures.append(future)
+        return future
+
+
+def test_shard_timeout_returns_pending_order():
+    async def run():
+        events = []
+
+        async def post_trade(event):
+            events.append(event)
+
+        router = ShardRouter(1, post_trade=post_trade)
+        client = router.clients[0] = SlowShardClient()
+
+        result = await router.submit("Agent_1", "TOK", OrderSide.BUY, 100)
+        assert result.pending and not result.success and result.order_id
+        assert router.order_status(result.order_id)["status"] == "pending"
+
+        # worker 最终成交：状态更新，成交后处理照常进行
+        client.futures[0].set_result({"success": True, "message": "ok", "fill_price": 2.0,
+                                      "balance": 900.0, "positions": {"TOK": {"amount": 49.0}}})
+        await asyncio.sleep(0)
+        status = router.order_status(result.order_id)
+        assert status["status"] == "filled" and status["balance"] == 900.0
+        await router.drain()
+        assert len(events) == 1 and events[0].request.agent_id == "Agent_1"
+
+        # 断连：结果未知
+        second = await router.submit("Agent_1", "TOK", OrderSide.SELL, 10)
+        client.futures[1].set_exception(ConnectionError("shard 0 disconnected"))
+        await asyncio.sleep(0)
+        assert router.order_status(second.order_id)["status"] == "unknown"
+        assert router.stats()["unresolved_orders"] == 2
+
+    asyncio.run(run())
+
+
+def test_accounts_saved_and_restored_through_workers():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            router = ShardRouter(2, socket_dir=tmp, summary_interval=60)
+            await router.start()
+            try:
+                for i in range(60):
+                    await router.assign_agent(f"Agent_{i}")
+                # StatePersistence 在分片模式下经 RPC 收集：新注册的账户全部待保存
+                persistence = StatePersistence(None, GroupManager(), Council(), TrackedDict(),
+                                               get_meta=lambda: (1, 0, 0.0), shards=router)
+                first = persistence.collect(await persistence._pull_accounts(full=False))
+                assert len(first.agents) == 60 and len(persistence._known_agents) == 60
+
+                # 之后只含变更的账户，带最近成交
+                await router.update_prices({"TOK": {"priceUsd": 2.0}})
+                result = await router.submit("Agent_55", "TOK", OrderSide.BUY, 100)
+                assert result.success, result.message
+                delta = persistence.collect(await persistence._pull_accounts(full=False))
+                assert set(delta.agents) == {"Agent_55"}
+                assert delta.trade_history and delta.trade_history[0]["agent_id"] == "Agent_55"
+                again = persistence.collect(await persistence._pull_accounts(full=False))
+                assert not again.agents and again.trade_history is None
+
+                saved = (await router.collect_accounts(full=True))["agents"]
+                assert len(saved) == 60
+                trades = delta.trade_history
+            finally:
+                await router.stop()
+
+            restored = ShardRouter(3, socket_dir=tmp, summary_interval=60)
+            await restored.start()
+            try:
+                await restored.restore_accounts(saved, trades)
+                group_id = saved["Agent_55"]["group_id"]
+                assert restored.directory.agent_to_group["Agent_55"] == group_id
+                account = await restored.get_account("Agent_55")
+                assert account["balance"] == saved["Agent_55"]["balance"] < 1000
+                assert account["positions"]["TOK"]["amount"] > 0
+                assert restored.get_stats()["total_agents"] == 60
+                # 新注册的 Agent 不会复用已恢复的组编号之外的旧编号
+                assert (await restored.assign_agent("Agent_new")).group_id in restored.directory.members
+
+                assert await restored.remove_agent("Agent_55")
+                assert await restored.get_account("Agent_55") is None
+                current = (await restored.collect_accounts())["current"]
+                assert "Agent_55" not in current and len(current) == 60
+            finally:
+                await restored.stop()
+
+    asyncio.run(run())
+
+
+def run_all_tests():
+    tests = [
+        test_hash_ring_moves_few_groups,
+        test_directory_is_sticky,
+        test_orders_routed_to_worker_processes,
+        test_shard_timeout_returns_pending_order,
+        test_accounts_saved_and_restored_through_workers,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
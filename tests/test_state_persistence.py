@@ -0,0 +1,178 @@
+"""
+🧪 State Persistence - Test Suite
+
+测试 Redis 增量持久化 (使用内存版 Redis 替身)：
+1. 只写变更的账户 / API Key / 议事厅会话，删除变成 HDEL
+2. 全量快照整表替换，能清理残留字段；load_full_state 读回一致
+3. 写入失败时变更并入下一次保存
+"""
+
+import asyncio
+import sys
+import os
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from council import Council, MessageRole
+from group_manager import GroupManager
+from matching import OrderSide
+from redis_state import RedisStateManager, KEY_AGENTS, KEY_API_KEYS, KEY_COUNCIL
+from state_persistence import StatePersistence, TrackedDict
+
+
+class FakeRedis:
+    """足够 RedisStateManager 使用的内存 Redis (decode_responses=True 语义)"""
+
+    def __init__(self):
+        self.data = {}
+        self.fail = False
+        self.commands = []
+
+    def ping(self):
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def rename(self, src, dst):
+        self.data[dst] = self.data.pop(src)
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def hdel(self, key, *fields):
+        for f in fields:
+            self.data.get(key, {}).pop(f, None)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.ops.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        if self.redis.fail:
+            raise ConnectionError("redis down")
+        self.redis.commands.extend(op[0] for op in self.ops)
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.ops]
+
+
+def _setup(n_agents=20):
+    fake = FakeRedis()
+    redis_state = RedisStateManager(client=fake)
+    gm = GroupManager()
+    for i in range(n_agents):
+        gm.register_agent(f"Agent_{i}")
+    gm.update_prices({"TOK": {"priceUsd": 1.0}})
+    council = Council()
+    keys = TrackedDict({f"dk_{i}": f"Agent_{i}" for i in range(n_agents)})
+    persistence = StatePersistence(redis_state, gm, council, keys, get_meta=lambda: (3, 0, 0.0))
+    return fake, redis_state, gm, council, keys, persistence
+
+
+def test_delta_writes_only_changes():
+    async def run():
+        fake, redis_state, gm, council, keys, persistence = _setup()
+        first = await persistence.flush()
+        assert first["kind"] == "snapshot" and first["agents"] == 20
+
+        group = gm.get_group("Agent_3")
+        await group.engine.execute_order("Agent_3", "TOK", OrderSide.BUY, 100)
+        gm.update_prices({"TOK": {"priceUsd": 2.0}})  # 价格变化不触发持久化
+        keys["dk_new"] = "Agent_3"
+        del keys["dk_5"]
+        gm.remove_agent("Agent_7")
+        await council.submit_message(3, "Agent_3", MessageRole.INSIGHT, "Momentum entries on TOK worked well.")
+
+        fake.commands.clear()
+        delta = await persistence.flush()
+        assert delta["kind"] == "delta"
+        assert delta["agents"] == 1 and delta["removed_agents"] == 1
+        assert delta["api_keys"] == 2 and delta["council_sessions"] == 1
+        assert "delete" not in fake.commands and "rename" not in fake.commands
+
+        assert fake.data[KEY_AGENTS].keys() == {f"Agent_{i}" for i in range(20)} - {"Agent_7"}
+        assert "dk_new" in fake.data[KEY_API_KEYS] and "dk_5" not in fake.data[KEY_API_KEYS]
+        assert "3" in fake.data[KEY_COUNCIL]
+
+        # 没有变化时跳过
+        assert await persistence.flush() == {}
+        assert persistence.skipped == 1
+
+    asyncio.run(run())
+
+
+def test_snapshot_compacts_and_round_trips():
+    async def run():
+        fake, redis_state, gm, council, keys, persistence = _setup(5)
+        fake.data[KEY_AGENTS] = {"Ghost": "{}"}  # 增量路径遗漏的残留字段
+        await persistence.flush(snapshot=True)
+        assert "Ghost" not in fake.data[KEY_AGENTS]
+
+        loaded = redis_state.load_full_state()
+        assert loaded["epoch"] == 3
+        assert set(loaded["agents"]) == {f"Agent_{i}" for i in range(5)}
+        assert loaded["api_keys"] == dict(keys)
+
+    asyncio.run(run())
+
+
+def test_failed_write_is_retried():
+    async def run():
+        fake, redis_state, gm, council, keys, persistence = _setup(5)
+        await persistence.flush()
+
+        await gm.get_group("Agent_1").engine.execute_order("Agent_1", "TOK", OrderSide.BUY, 10)
+        fake.fail = True
+        assert await persistence.flush() == {}
+        assert persistence.errors == 1
+
+        fake.fail = False
+        await gm.get_group("Agent_2").engine.execute_order("Agent_2", "TOK", OrderSide.BUY, 10)
+        result = await persistence.flush()
+        assert result["agents"] == 2
+        assert '"TOK"' in fake.data[KEY_AGENTS]["Agent_1"]
+
+    asyncio.run(run())
+
+
+def run_all_tests():
+    tests = [
+        test_delta_writes_only_changes,
+        test_snapshot_compacts_and_round_trips,
+        test_failed_write_is_retried,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,147 @@
+"""
+🧪 State Snapshot - Test Suite
+
+测试 StateManager 的二进制快照存档：
+1. 异步保存 → 重新加载，账户 / 分组 / 议事厅 / 晋级数据一致
+2. 抓取后的成交不会混进正在写的快照；未变化的会话复用压缩字节，LLM 分数回填后重新编码
+3. 没有二进制快照时仍能加载旧的 JSON 存档
+"""
+
+import asyncio
+import json
+import sys
+import os
+import tempfile
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+import state_manager as sm
+from chain import AscensionTracker
+from council import Council, MessageRole
+from group_manager import GroupManager
+from matching import OrderSide
+from state_snapshot import SnapshotReader
+
+
+def _use_tmp_dir(tmp):
+    sm.SNAPSHOT_FILE = os.path.join(tmp, "arena_state.bin")
+    sm.STATE_FILE = os.path.join(tmp, "arena_state.json")
+    sm.SEED_FILE = os.path.join(tmp, "seed_state.json")
+
+
+def _arena(n_agents=5):
+    gm = GroupManager()
+    for i in range(n_agents):
+        gm.register_agent(f"Agent_{i}")
+    gm.update_prices({"TOK": {"priceUsd": 2.0}})
+    council = Council()
+    tracker = AscensionTracker()
+    return gm, council, tracker, sm.StateManager(gm, council, tracker)
+
+
+def test_async_save_and_load_round_trip():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            _use_tmp_dir(tmp)
+            gm, council, tracker, manager = _arena()
+            await gm.get_group("Agent_1").engine.execute_order("Agent_1", "TOK", OrderSide.BUY, 100)
+            council.start_session(4, "Agent_1")
+            await council.submit_message(4, "Agent_1", MessageRole.WINNER, "Bought TOK on the volume spike.")
+            tracker.l2_qualified.add("Agent_1")
+            tracker.ascended.add("Agent_1")
+
+            assert await manager.save_state_async(7)
+            assert manager.stats()["last_save"]["bytes"] == os.path.getsize(sm.SNAPSHOT_FILE)
+
+            gm2, council2, tracker2, manager2 = _arena(0)
+            meta = manager2.load_state()
+            assert meta["current_epoch"] == 7
+            assert set(gm2.agent_to_group) == {f"Agent_{i}" for i in range(5)}
+            acc = gm2.get_group("Agent_1").engine.accounts["Agent_1"]
+            orig = gm.get_group("Agent_1").engine.accounts["Agent_1"]
+            assert acc.balance == orig.balance
+            assert acc.positions["TOK"].amount == orig.positions["TOK"].amount
+            assert council2.sessions[4].messages[0].content == "Bought TOK on the volume spike."
+            assert council2.contribution_scores == council.contribution_scores
+            assert tracker2.ascended == {"Agent_1"} and tracker2.l2_qualified == {"Agent_1"}
+
+    asyncio.run(run())
+
+
+def test_capture_is_isolated_and_sessions_reused():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            _use_tmp_dir(tmp)
+            gm, council, tracker, manager = _arena()
+            for epoch in range(3):
+                council.start_session(epoch, "Agent_0")
+            captured = manager.capture(1)
+            # 抓取之后的成交不应出现在这次快照里
+            await gm.get_group("Agent_2").engine.execute_order("Agent_2", "TOK", OrderSide.BUY, 100)
+            manager._write_snapshot(captured)
+            with SnapshotReader(sm.SNAPSHOT_FILE) as reader:
+                rows = {row[0]: row for _, chunk in reader.iter_sections("agents.") for row in chunk}
+            assert rows["Agent_2"][2] == []
+
+            assert manager.save_state(2)
+            assert manager.last_save["reused_sessions"] == 3
+            message = await council.submit_message(1, "Agent_0", MessageRole.INSIGHT, "Mean reversion failed today.")
+            assert manager.save_state(3)
+            assert manager.last_save["reused_sessions"] == 2
+
+            # LLM 分数原地回填：条数 / 状态不变，但会话必须重新编码
+            council._apply_llm_score(message, 9.5)
+            assert manager.save_state(4)
+            assert manager.last_save["reused_sessions"] == 2
+            gm2, council2, tracker2, manager2 = _arena(0)
+            manager2.load_state()
+            assert council2.sessions[1].messages[0].score == 9.5
+
+    asyncio.run(run())
+
+
+def test_legacy_json_state_still_loads():
+    with tempfile.TemporaryDirectory() as tmp:
+        _use_tmp_dir(tmp)
+        legacy = {
+            "current_epoch": 3,
+            "agents": {"Agent_X": {"balance": 950.0, "positions": {"TOK": {"amount": 10, "avg_price": 5.0}}}},
+            "council_sessions": {"2": {"epoch": 2, "is_open": False, "winner_id": "Agent_X", "messages": [
+                {"id": "MSG-000001", "agent_id": "Agent_X", "role": "winner", "content": "hi.",
+                 "timestamp": "2026-01-01T00:00:00", "score": 4.0}]}},
+            "council_scores": {"Agent_X": 4.0},
+            "ascension": {"ascended": ["Agent_X"]},
+        }
+        with open(sm.STATE_FILE, "w") as f:
+            json.dump(legacy, f)
+
+        gm, council, tracker, manager = _arena(0)
+        state = manager.load_state()
+        assert state["current_epoch"] == 3
+        assert gm.get_group("Agent_X").engine.accounts["Agent_X"].balance == 950.0
+        assert council.sessions[2].messages[0].score == 4.0
+        assert tracker.ascended == {"Agent_X"}
+
+
+def run_all_tests():
+    tests = [
+        test_async_save_and_load_round_trip,
+        test_capture_is_isolated_and_sessions_reused,
+        test_legacy_json_state_still_loads,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -151,6 +151,34 @@ class MyStrategy:
         return []
 """
 
+# 🐢 超出单 tick CPU 预算
+SLOW_TICK_STRATEGY = """
+class MyStrategy:
+    def __init__(self):
+        self.ticks = 0
+
+    def on_tick(self, market_data):
+        self.ticks += 1
+        if self.ticks == 3:
+            total = 0
+            for i in range(10 ** 9):
+                total += i
+        return []
+"""
+
+# 🧠 跨 tick 保留状态
+COUNTING_STRATEGY = """
+class MyStrategy:
+    def __init__(self):
+        self.ticks = 0
+
+    def on_tick(self, market_data):
+        self.ticks += 1
+        if self.ticks == 5:
+            return [{'symbol': 'VIRTUAL', 'side': 'BUY', 'amount': 1}]
+        return []
+"""
+
 
 # ========== 测试函数 ==========
 
@@ -348,6 +376,35 @@ async def test_validation_api():
     print(f"   Message: {message[:100]}...")
 
 
+async def test_persistent_session():
+    """测试常驻策略实例"""
+    print("\n" + "="*60)
+    print("♻️ Test 8: Persistent Strategy Session")
+    print("="*60)
+
+    engine = BacktestEngine(initial_balance=10000.0)
+    symbols = ['VIRTUAL', 'BRETT', 'DEGEN']
+    market_history = engine.generate_mock_market_data(symbols, num_ticks=20)
+
+    print("\n✅ Testing state kept across ticks, code compiled once...")
+    for _ in range(3):
+        success, results, logs = engine.run_backtest(COUNTING_STRATEGY, market_history, symbols)
+        assert success, f"Backtest should succeed: {logs[-3:]}"
+        assert any("Tick 4: BUY" in log for log in logs), "Strategy state should persist between ticks"
+    assert engine.executor.compile_count == 1, f"Expected 1 compile, got {engine.executor.compile_count}"
+    print(f"   PASS: 3 rounds, {engine.executor.compile_count} compile")
+
+    print("\n❌ Testing per-tick CPU budget...")
+    executor = SandboxExecutor()
+    with executor.load_strategy(SLOW_TICK_STRATEGY, tick_cpu_budget=0.2) as session:
+        assert session.error is None, session.error
+        results = [session.on_tick({'tick': i, 'prices': {}}) for i in range(4)]
+    assert results[1][0] and not results[2][0], "Third tick should exceed the CPU budget"
+    assert "timeout" in results[2][2].lower()
+    assert results[3][0], "Session should keep working after a timed-out tick"
+    print(f"   PASS: {results[2][2]}")
+
+
 async def run_all_tests():
     """运行所有测试"""
     print("\n" + "="*80)
@@ -362,6 +419,7 @@ async def run_all_tests():
         ("Backtest Engine", test_backtest_engine),
         ("Full Sandbox System", test_full_sandbox),
         ("Validation API", test_validation_api),
+        ("Persistent Session", test_persistent_session),
     ]
 
     passed = 0
@@ -0,0 +1,136 @@
+"""
+🧪 Trade Journal - Test Suite
+
+测试成交日志：
+1. 兼容原 deque 接口 (appendleft / [0] / 迭代顺序 / 热缓存上限)；纯内存模式同样按 since / until 过滤
+2. 段滚动 + 按时间 / Agent / 币种扫描超出热缓存的深度历史
+3. 重启后从段文件恢复 (热缓存与扫描结果一致)，截断尾部残缺记录
+4. 删除 Agent 后其旧成交不再返回，同名新成交不受影响
+"""
+
+import sys
+import os
+import tempfile
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from trade_journal import TradeJournal
+from group_manager import GroupManager
+
+
+def _trade(i, agent="Agent_0", symbol="TOK", side="BUY"):
+    return {"time": f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}", "agent_id": agent, "symbol": symbol,
+            "side": side, "amount": 1.0, "price": 1.0 + i, "value": 1.0, "reason": ["MOMENTUM"]}
+
+
+def test_deque_compatibility_in_memory():
+    journal = TradeJournal(hot_size=5)
+    for i in range(8):
+        journal.appendleft(_trade(i))
+    assert len(journal) == 5
+    assert journal[0]["price"] == 8.0
+    assert [t["price"] for t in journal] == [8.0, 7.0, 6.0, 5.0, 4.0]
+    assert [t["price"] for t in journal.scan(limit=2)] == [8.0, 7.0]
+    journal.clear()
+    assert not journal and list(journal.scan()) == []
+
+    for i in range(4):
+        journal.appendleft(_trade(i, agent=f"Agent_{i % 2}"), ts=1000.0 + i)
+    assert [t["price"] for t in journal.scan(since=1001, until=1003)] == [3.0, 2.0]
+    assert [t["price"] for t in journal.scan(since=1001, until=1003, newest_first=False)] == [2.0, 3.0]
+    assert [t["price"] for t in journal.scan(since=1002, agent_id="Agent_1")] == [4.0]
+    journal.remove_agent("Agent_1")
+    assert [t["price"] for t in journal.scan(until=1003)] == [3.0, 1.0]
+    journal.clear()
+    assert not journal and list(journal.scan()) == []
+
+
+def test_segmented_scan_beyond_hot_ring():
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = TradeJournal(tmp, hot_size=10, segment_bytes=2048)
+        for i in range(300):
+            journal.appendleft(_trade(i, agent=f"Agent_{i % 3}", symbol=("A" if i % 2 else "B")), ts=1000.0 + i)
+        assert len(journal) == 10
+        assert len(journal.segments) > 1
+
+        everything = list(journal.scan())
+        assert len(everything) == 300
+        assert everything[0]["price"] == 300.0 and everything[-1]["price"] == 1.0
+
+        window = list(journal.scan(since=1100, until=1110))
+        assert [t["price"] for t in window] == [float(i + 1) for i in range(109, 99, -1)]
+
+        agent_sym = list(journal.scan(agent_id="Agent_1", symbol="A", newest_first=False))
+        expected = [i for i in range(300) if i % 3 == 1 and i % 2 == 1]
+        assert [t["price"] for t in agent_sym] == [float(i + 1) for i in expected]
+        assert len(list(journal.scan(agent_id="Agent_2", limit=7))) == 7
+        journal.close()
+
+
+def test_recovery_after_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = TradeJournal(tmp, hot_size=20, segment_bytes=4096)
+        for i in range(100):
+            journal.appendleft(_trade(i), ts=2000.0 + i)
+        journal.close()
+
+        # 模拟写入中途崩溃：最新段尾部追加半条记录
+        with open(journal.segments[-1].path, "ab") as f:
+            f.write(b"\x10\x00\x00\x00partial")
+
+        reopened = TradeJournal(tmp, hot_size=20, segment_bytes=4096)
+        assert reopened.records == 100
+        assert [t["price"] for t in reopened] == [float(i + 1) for i in range(99, 79, -1)]
+        reopened.appendleft(_trade(100), ts=2100.0)
+        assert next(reopened.scan())["price"] == 101.0
+        assert len(list(reopened.scan())) == 101
+        reopened.close()
+
+
+def test_remove_agent():
+    with tempfile.TemporaryDirectory() as tmp:
+        gm = GroupManager(journal_dir=tmp)
+        gm.register_agent("Agent_A")
+        gm.register_agent("Agent_B")
+        journal = gm.get_group("Agent_A").engine.trade_history
+        for i in range(10):
+            journal.appendleft(_trade(i, agent="Agent_A" if i % 2 else "Agent_B"), ts=3000.0 + i)
+
+        gm.remove_agent_trades("Agent_A")
+        assert all(t["agent_id"] == "Agent_B" for t in journal)
+        assert gm.scan_trades(agent_id="Agent_A") == []
+        assert len(gm.scan_trades()) == 5
+
+        journal.appendleft(_trade(20, agent="Agent_A"))
+        assert len(gm.scan_trades(agent_id="Agent_A")) == 1
+
+        # 删除记录在重启后仍然生效
+        journal.close()
+        reopened = TradeJournal(journal.journal_dir)
+        assert len(list(reopened.scan(agent_id="Agent_A"))) == 1
+        reopened.close()
+
+
+def run_all_tests():
+    tests = [
+        test_deque_compatibility_in_memory,
+        test_segmented_scan_beyond_hot_ring,
+        test_recovery_after_restart,
+        test_remove_agent,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
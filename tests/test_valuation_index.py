@@ -0,0 +1,153 @@
+"""
+🧪 Valuation Index - Test Suite
+
+测试增量估值索引：
+1. 随机成交 + 价格变化后与全量重算结果一致
+2. top-k / 名次查询
+3. 删除账户、外部直接修改后标脏
+4. GroupManager 跨组归并排行与全局名次
+"""
+
+import asyncio
+import random
+import sys
+import os
+
+# 添加父目录与 arena_server 到路径 (arena_server 内部使用裸模块名导入)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "arena_server"))
+
+from matching import MatchingEngine, OrderSide
+from group_manager import GroupManager
+from valuation_index import RankedList
+
+
+SYMBOLS = [f"TOK{i}" for i in range(20)]
+
+
+def _prices(rng):
+    return {sym: {"priceUsd": rng.uniform(0.5, 2.0)} for sym in SYMBOLS}
+
+
+async def _random_trades(engine, agents, rng, n):
+    for _ in range(n):
+        agent = rng.choice(agents)
+        symbol = rng.choice(SYMBOLS)
+        if rng.random() < 0.7:
+            await engine.execute_order(agent, symbol, OrderSide.BUY, rng.uniform(1, 50))
+        else:
+            pos = engine.accounts[agent].positions.get(symbol)
+            if pos:
+                await engine.execute_order(agent, symbol, OrderSide.SELL,
+                                           pos.amount * engine.current_prices[symbol] * 0.5)
+
+
+def _same(a, b):
+    assert [r[0] for r in a] == [r[0] for r in b] or \
+        sorted(round(r[1], 9) for r in a) == sorted(round(r[1], 9) for r in b)
+    by_id = {r[0]: r for r in b}
+    for agent_id, pnl, value in a:
+        assert abs(by_id[agent_id][1] - pnl) < 1e-9
+        assert abs(by_id[agent_id][2] - value) < 1e-9
+
+
+def test_ranked_list_order_statistics():
+    rng = random.Random(1)
+    ranked = RankedList(load=8)
+    values = [(rng.random(), f"a{i}") for i in range(500)]
+    for v in values:
+        ranked.add(v)
+    for v in values[::3]:
+        ranked.remove(v)
+    expected = sorted(set(values) - set(values[::3]))
+    assert list(ranked) == expected
+    assert ranked.head(10) == expected[:10]
+    for v in expected[::17]:
+        assert ranked.bisect_left(v) == expected.index(v)
+
+
+def test_index_matches_full_recompute():
+    async def run():
+        rng = random.Random(7)
+        engine = MatchingEngine()
+        agents = [f"Agent_{i:03d}" for i in range(60)]
+        for agent in agents:
+            engine.register_agent(agent)
+        engine.update_prices(_prices(rng))
+
+        for _ in range(5):
+            await _random_trades(engine, agents, rng, 200)
+            _same(engine.get_leaderboard(), engine.compute_leaderboard())
+            # 只改部分币价
+            engine.update_prices({sym: {"priceUsd": rng.uniform(0.5, 2.0)}
+                                  for sym in rng.sample(SYMBOLS, 5)})
+            _same(engine.get_leaderboard(), engine.compute_leaderboard())
+
+        board = engine.get_leaderboard()
+        assert engine.get_top(5) == board[:5]
+        for i, (agent_id, _, _) in enumerate(board):
+            assert engine.get_rank(agent_id) == i + 1
+
+    asyncio.run(run())
+
+
+def test_removal_and_direct_mutation():
+    engine = MatchingEngine()
+    for i in range(5):
+        engine.register_agent(f"Agent_{i}")
+    del engine.accounts["Agent_0"]
+    engine.accounts.pop("Agent_1")
+    assert [r[0] for r in engine.get_leaderboard()] == ["Agent_2", "Agent_3", "Agent_4"]
+
+    engine.accounts["Agent_4"].balance += 500
+    engine.mark_account_dirty("Agent_4")
+    assert engine.get_top(1)[0][0] == "Agent_4"
+    assert engine.get_rank("Agent_0") is None
+
+
+def test_group_manager_merged_rankings():
+    async def run():
+        rng = random.Random(3)
+        gm = GroupManager()
+        agents = [f"Agent_{i:03d}" for i in range(120)]
+        for agent in agents:
+            gm.register_agent(agent)
+        assert len(gm.groups) > 1
+        gm.update_prices(_prices(rng))
+        for group in gm.groups.values():
+            await _random_trades(group.engine, sorted(group.members), rng, 150)
+
+        merged = gm.get_leaderboard()
+        full = sorted(
+            (r for g in gm.groups.values() for r in g.engine.compute_leaderboard()),
+            key=lambda x: x[1], reverse=True,
+        )
+        _same(merged, full)
+        assert gm.get_top(10) == merged[:10]
+        for i, (agent_id, _, _) in enumerate(merged[:30]):
+            assert gm.get_rank(agent_id) == i + 1
+
+    asyncio.run(run())
+
+
+def run_all_tests():
+    tests = [
+        test_ranked_list_order_statistics,
+        test_index_matches_full_recompute,
+        test_removal_and_direct_mutation,
+        test_group_manager_merged_rankings,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()